@@ -0,0 +1,119 @@
+from __future__ import division
+from __future__ import print_function
+from builtins import object
+from typing import Any, Dict, List, Tuple
+
+import os
+import random
+import pickle
+from collections import deque
+
+import numpy as np
+
+class OptimizerCheckpoint(object):
+    ''' Periodically save the state of an optimization run to resume it later.
+
+        The solvers (pyOpt) don't expose their population or swarm state, so all objective function
+        evaluations are recorded instead (per phase, in call order) together with the solver seed,
+        the optimizer bookkeeping (best solution, counters) and the random number generator states.
+        On resume, the solvers are started again with the same seed and the recorded evaluations
+        are given back in the same order, so they follow the same path up to the checkpoint without
+        computing the objective function and continue from there as the uninterrupted run would.
+    '''
+
+    def __init__(self, filename, interval=10):
+        # type: (str, int) -> None
+        self.filename = filename
+        self.interval = interval
+        self.phase = 'global'     # current phase, one of global, local, done
+        self.seed = None          # type: float
+        self.evaluations = {'global': [], 'local': []}   # type: Dict[str, List[Tuple]]
+        self.attrs = {}           # type: Dict[str, Any]
+        self.rng_states = None    # type: Tuple
+        self.local_starts = []    # type: List[np._ArrayLike]   # solutions the local optimization was started from
+        self.mpi_size = 1
+        self.replay = deque()     # type: deque
+        self.resumed = False
+
+    def load(self):
+        # type: () -> bool
+        if not os.path.exists(self.filename):
+            return False
+        with open(self.filename, 'rb') as f:
+            state = pickle.load(f)
+        self.phase = state['phase']
+        self.seed = state['seed']
+        self.evaluations = state['evaluations']
+        self.attrs = state['attrs']
+        self.rng_states = state['rng_states']
+        self.local_starts = state['local_starts']
+        self.mpi_size = state['mpi_size']
+        self.resumed = True
+        return True
+
+    def save(self, optimizer):
+        # type: (Optimizer) -> None
+        ''' write state of optimizer to file (written to a temporary file first, so a crash while
+            writing leaves the previous checkpoint intact) '''
+        state = {
+            'phase': self.phase,
+            'seed': self.seed,
+            'evaluations': self.evaluations,
+            'attrs': {a: getattr(optimizer, a) for a in optimizer.checkpoint_attrs},
+            'rng_states': (np.random.get_state(), random.getstate()),
+            'local_starts': self.local_starts,
+            'mpi_size': optimizer.mpi_size,
+        }
+        tmp_file = self.filename + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(state, f, protocol=2)
+        os.rename(tmp_file, self.filename)
+
+    def restoreAttributes(self, optimizer):
+        # type: (Optimizer) -> None
+        for a in self.attrs:
+            setattr(optimizer, a, self.attrs[a])
+
+    def startPhase(self, phase):
+        # type: (str) -> bool
+        ''' start a phase or restart it when resuming (recorded evaluations of it will be replayed),
+            returns if this is a new phase '''
+        if self.phase == phase and self.resumed:
+            self.replay = deque(self.evaluations.get(phase, []))
+            if not self.replay:
+                self.restoreRandomState()
+            return False
+        self.phase = phase
+        self.replay = deque()
+        if phase in self.evaluations:
+            self.evaluations[phase] = []
+        return True
+
+    def getReplay(self, x):
+        # type: (np._ArrayLike) -> Tuple
+        ''' get recorded evaluation for x if it is the next one to replay, otherwise None '''
+        if not self.replay:
+            return None
+        x_rec, f, g, fail = self.replay[0]
+        if not np.array_equal(x_rec, np.asarray(x)):
+            print("Checkpoint: solver left the recorded path, evaluating again from here")
+            self.replay.clear()
+            return None
+        self.replay.popleft()
+        if not self.replay:
+            # at the state of the checkpoint now
+            self.restoreRandomState()
+        return f, g, fail
+
+    def restoreRandomState(self):
+        # type: () -> None
+        if self.rng_states is not None:
+            np.random.set_state(self.rng_states[0])
+            random.setstate(self.rng_states[1])
+
+    def record(self, optimizer, x, f, g, fail):
+        # type: (Optimizer, np._ArrayLike, float, np._ArrayLike, bool) -> None
+        evals = self.evaluations[self.phase]
+        evals.append((np.array(x, dtype=np.float64), f, np.array(g, dtype=np.float64), fail))
+        if len(evals) % self.interval == 0:
+            self.save(optimizer)
@@ -0,0 +1,110 @@
+from __future__ import division
+from __future__ import print_function
+from builtins import object
+from typing import Any, Dict, List, Tuple
+
+import os
+import pickle
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+class EvaluationCache(object):
+    ''' Cache of objective function evaluations (objective value, constraint values, fail flag and
+        additional values of the optimizer) keyed on the decision vector.
+
+        Points are matched exactly or, if tolerance > 0, after rounding to multiples of tolerance.
+        At most max_size entries are kept, the least recently used ones are dropped. The cache can
+        be saved to a file and loaded again by later runs of the same problem (checked with a
+        signature of model and options).
+    '''
+
+    def __init__(self, max_size=10000, tolerance=0.0, filename=None, signature=''):
+        # type: (int, float, str, str) -> None
+        self.max_size = max_size
+        self.tolerance = tolerance
+        self.filename = filename
+        self.signature = signature
+        self.entries = OrderedDict()   # type: OrderedDict
+        self.hits = 0
+        self.misses = 0
+        self.loaded = 0
+
+    @staticmethod
+    def getSignature(config, files, name):
+        # type: (Dict[str, Any], List[str], str) -> str
+        ''' get hash of the options, files (e.g. model) and optimizer name that evaluations depend on '''
+        ignore = ('evaluationCache', 'optimizationCheckpoint', 'optimizationResume', 'checkpointInterval',
+                  'show', 'verbose')
+        sha = hashlib.sha1(name.encode('utf-8'))
+        for k in sorted(config.keys()):
+            v = config[k]
+            if k.startswith(ignore) or not isinstance(v, (str, int, float, bool, list, type(None))):
+                continue
+            sha.update('{}={!r};'.format(k, v).encode('utf-8'))
+        for f in files:
+            if f and os.path.exists(f):
+                with open(f, 'rb') as fh:
+                    sha.update(fh.read())
+        return sha.hexdigest()
+
+    def getKey(self, x):
+        # type: (np._ArrayLike) -> bytes
+        x = np.asarray(x, dtype=np.float64)
+        if self.tolerance > 0:
+            return np.round(x / self.tolerance).astype(np.int64).tobytes()
+        return x.tobytes()
+
+    def get(self, x):
+        # type: (np._ArrayLike) -> Tuple
+        ''' get cached (f, g, fail, info) for x or None '''
+        key = self.getKey(x)
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries[key] = entry   # most recently used now
+        self.hits += 1
+        return entry
+
+    def add(self, x, f, g, fail, info=None):
+        # type: (np._ArrayLike, float, np._ArrayLike, bool, Dict) -> None
+        key = self.getKey(x)
+        self.entries.pop(key, None)
+        self.entries[key] = (f, np.array(g, dtype=np.float64), fail, info or {})
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def load(self):
+        # type: () -> bool
+        if not self.filename or not os.path.exists(self.filename):
+            return False
+        with open(self.filename, 'rb') as f:
+            state = pickle.load(f)
+        if state['signature'] != self.signature or state['tolerance'] != self.tolerance:
+            print("Not using cached evaluations from {} (different model or options)".format(self.filename))
+            return False
+        for key, entry in state['entries']:
+            self.entries[key] = entry
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        self.loaded = len(self.entries)
+        return True
+
+    def save(self):
+        # type: () -> None
+        if not self.filename:
+            return
+        state = {'signature': self.signature, 'tolerance': self.tolerance,
+                 'entries': list(self.entries.items())}
+        tmp_file = self.filename + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(state, f, protocol=2)
+        os.rename(tmp_file, self.filename)
+
+    def printStats(self, prefix=''):
+        # type: (str) -> None
+        calls = self.hits + self.misses
+        print("{}evaluation cache: {} hits, {} misses ({:.1f}% hit rate), {} entries ({} loaded from file)".format(
+              prefix, self.hits, self.misses, 100.0*self.hits/max(calls, 1), len(self.entries), self.loaded))
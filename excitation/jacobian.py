@@ -0,0 +1,242 @@
+from __future__ import division
+from __future__ import print_function
+from builtins import range
+from builtins import object
+from typing import Any, Callable, Dict, List, Tuple
+
+import time
+import multiprocessing
+
+import numpy as np
+
+# optimizer used by worker processes (inherited when forking the pool, so each worker keeps its
+# own initialized model, simulation etc. for all evaluations)
+_worker_optimizer = None
+
+def _initWorker():
+    # no plots or visualization from worker processes
+    _worker_optimizer.config['showOptimizationGraph'] = 0
+    _worker_optimizer.config['showOptimizationTrajs'] = 0
+    _worker_optimizer.config['showModelVisualization'] = 0
+    _worker_optimizer.opt_prob.is_gradient = True
+
+def _evaluatePoint(args):
+    # type: (Tuple[np._ArrayLike, np._ArrayLike]) -> Tuple[float, np._ArrayLike, bool, Dict]
+    x, mask = args
+    _worker_optimizer.constraint_mask = mask
+    f, g, fail = _worker_optimizer.objectiveFunc(x)
+    _worker_optimizer.constraint_mask = None
+    return f, np.array(g, dtype=np.float64), fail, _worker_optimizer.getEvaluationInfo()
+
+
+class GradientEvaluator(object):
+    ''' base class for gradients of objective and constraints given to the local solvers as
+        sens_type function of pyOpt, keeps the timing of gradients and local iterations '''
+
+    def __init__(self):
+        # type: () -> None
+        self.iteration_times = []   # type: List[float]
+        self.gradient_times = []    # type: List[float]
+        self.last_call = None       # type: float
+
+    def computeGradient(self, x, f0, g0):
+        # type: (np._ArrayLike, float, np._ArrayLike) -> Tuple[np._ArrayLike, np._ArrayLike, int]
+        raise NotImplementedError
+
+    def getDescription(self):
+        # type: () -> str
+        raise NotImplementedError
+
+    def __call__(self, x, f, g):
+        # type: (np._ArrayLike, np._ArrayLike, np._ArrayLike) -> Tuple[np._ArrayLike, np._ArrayLike, int]
+        ''' get gradient of objective and jacobian of constraints at x (with values f and g at x) '''
+        start = time.time()
+        if self.last_call is not None:
+            self.iteration_times.append(start - self.last_call)
+        x = np.array(x, dtype=np.float64).ravel()
+        f0 = np.atleast_1d(f)[0]
+        g0 = np.array(g, dtype=np.float64).ravel()
+        df, dg, fail = self.computeGradient(x, f0, g0)
+        self.gradient_times.append(time.time() - start)
+        self.last_call = time.time()
+        print("gradient ({}) in {:.2f}s".format(self.getDescription(), self.gradient_times[-1]))
+        return df, dg, fail
+
+    def close(self):
+        # type: () -> None
+        pass
+
+    def printStats(self):
+        # type: () -> None
+        if not self.gradient_times:
+            return
+        print("{} gradients ({}), mean {:.2f}s per gradient".format(
+              len(self.gradient_times), self.getDescription(), np.mean(self.gradient_times)), end='')
+        if self.iteration_times:
+            print(", mean wall time per local iteration {:.2f}s".format(np.mean(self.iteration_times)))
+        else:
+            print("")
+
+
+class FiniteDifferenceJacobian(GradientEvaluator):
+    ''' Finite difference gradients of objective and constraints for the local solvers, used as
+        sens_type function of pyOpt.
+
+        Perturbed points are evaluated concurrently in a pool of worker processes (forked from the
+        optimizer on the first gradient, they keep their models for the whole local optimization)
+        or in this process if processes is 1. Forward or central differences are used with either
+        a fixed step or a step relative to the range of the variable bounds (steps that would leave
+        the bounds are taken to the other side). With sparse set and if the optimizer knows which
+        constraints depend on a variable (getConstraintDependencies), the other derivatives are
+        zero and only the dependent constraints are requested for its perturbation (as
+        constraint_mask). This only saves time if objectiveFunc skips the other constraints, as
+        PostureOptimizer does for collisions of other postures. TrajectoryOptimizer computes all
+        of them, every perturbation needs the simulation for the objective and torques anyway.
+    '''
+
+    def __init__(self, optimizer, lower, upper, method='forward', step=0.1, relative_step=False,
+                 processes=1, sparse=False):
+        # type: (Optimizer, np._ArrayLike, np._ArrayLike, str, float, bool, int, bool) -> None
+        super(FiniteDifferenceJacobian, self).__init__()
+        if method not in ['forward', 'central']:
+            raise ValueError("unknown finite difference method {}".format(method))
+        self.optimizer = optimizer
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.upper = np.asarray(upper, dtype=np.float64)
+        self.method = method
+        self.processes = processes
+        if relative_step:
+            self.steps = step * (self.upper - self.lower)
+        else:
+            self.steps = np.full(self.lower.size, step)
+        self.dependencies = optimizer.getConstraintDependencies() if sparse else None   # type: np._ArrayLike
+        self.pool = None
+        self.num_evaluations = 0
+
+    def getPerturbations(self, x):
+        # type: (np._ArrayLike) -> Tuple[List[np._ArrayLike], np._ArrayLike, np._ArrayLike]
+        ''' get perturbed points and their step (signed, zero for unused) for each variable, for
+            central differences the steps are for forward and backward points '''
+        h = self.steps.copy()
+        points = []
+        fwd = np.zeros(x.size)
+        bwd = np.zeros(x.size)
+        for j in range(x.size):
+            up = x[j] + h[j] <= self.upper[j]
+            down = x[j] - h[j] >= self.lower[j]
+            if self.method == 'central' and up and down:
+                fwd[j], bwd[j] = h[j], -h[j]
+            elif up or not down:
+                fwd[j] = h[j]
+            else:
+                fwd[j] = -h[j]
+        for j in range(x.size):
+            dx = x.copy()
+            dx[j] += fwd[j]
+            points.append(dx)
+        for j in np.nonzero(bwd)[0]:
+            dx = x.copy()
+            dx[j] += bwd[j]
+            points.append(dx)
+        return points, fwd, bwd
+
+    def evaluatePoints(self, points, masks):
+        # type: (List[np._ArrayLike], List[np._ArrayLike]) -> List[Tuple]
+        opt = self.optimizer
+        results = [None]*len(points)   # type: List[Tuple]
+        todo = []
+        for i in range(len(points)):
+            entry = opt.cache.get(points[i]) if opt.cache else None
+            if entry is not None:
+                results[i] = entry
+            else:
+                todo.append(i)
+
+        if self.processes > 1:
+            global _worker_optimizer
+            if self.pool is None:
+                _worker_optimizer = opt
+                if hasattr(multiprocessing, 'get_context'):
+                    ctx = multiprocessing.get_context('fork')
+                else:
+                    ctx = multiprocessing
+                self.pool = ctx.Pool(self.processes, initializer=_initWorker)
+            computed = self.pool.map(_evaluatePoint, [(points[i], masks[i]) for i in todo])
+        else:
+            old_gradient = getattr(opt.opt_prob, 'is_gradient', False)
+            opt.opt_prob.is_gradient = True
+            computed = []
+            for i in todo:
+                opt.constraint_mask = masks[i]
+                f, g, fail = opt.objectiveFunc(points[i])
+                opt.constraint_mask = None
+                computed.append((f, np.array(g, dtype=np.float64), fail, opt.getEvaluationInfo()))
+            opt.opt_prob.is_gradient = old_gradient
+
+        for i, res in zip(todo, computed):
+            results[i] = res
+            if self.processes > 1:
+                # evaluated in other process, keep best solution and count here
+                opt.iter_cnt += 1
+                opt.keepBest(points[i], res[0], res[1], res[3])
+            if opt.cache and masks[i] is None:
+                opt.cache.add(points[i], *res)
+        return results
+
+    def getDescription(self):
+        # type: () -> str
+        return "{} differences, {} evaluations in {} processes".format(self.method, self.num_evaluations,
+                                                                       self.processes)
+
+    def computeGradient(self, x, f0, g0):
+        # type: (np._ArrayLike, float, np._ArrayLike) -> Tuple[np._ArrayLike, np._ArrayLike, int]
+        points, fwd, bwd = self.getPerturbations(x)
+        var_ids = list(range(x.size)) + list(np.nonzero(bwd)[0])
+        if self.dependencies is None:
+            masks = [None]*len(points)   # type: List[np._ArrayLike]
+        else:
+            masks = [self.dependencies[:, j] for j in var_ids]
+        results = self.evaluatePoints(points, masks)
+        self.num_evaluations = len(points)
+
+        f_p = np.array([r[0] for r in results[:x.size]])
+        g_p = np.array([r[1] for r in results[:x.size]]).reshape(x.size, g0.size)
+        fail = int(any([r[2] for r in results]))
+        df = np.zeros(x.size)
+        dg = np.zeros((g0.size, x.size))
+        central = np.nonzero(bwd)[0]
+        one_sided = np.nonzero(bwd == 0)[0]
+        df[one_sided] = (f_p[one_sided] - f0) / fwd[one_sided]
+        dg[:, one_sided] = ((g_p[one_sided] - g0) / fwd[one_sided, None]).T
+        if central.size:
+            f_m = np.array([r[0] for r in results[x.size:]])
+            g_m = np.array([r[1] for r in results[x.size:]]).reshape(central.size, g0.size)
+            df[central] = (f_p[central] - f_m) / (2*fwd[central])
+            dg[:, central] = ((g_p[central] - g_m) / (2*fwd[central, None])).T
+        if self.dependencies is not None:
+            dg[~self.dependencies] = 0.0
+        return df, dg, fail
+
+    def close(self):
+        # type: () -> None
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+class AnalyticGradient(GradientEvaluator):
+    ''' gradients computed by a function of the optimizer (e.g. TrajectoryOptimizer.objectiveGradient) '''
+
+    def __init__(self, func):
+        # type: (Callable[[np._ArrayLike, float, np._ArrayLike], Tuple[np._ArrayLike, np._ArrayLike, int]]) -> None
+        super(AnalyticGradient, self).__init__()
+        self.func = func
+
+    def getDescription(self):
+        # type: () -> str
+        return "analytic"
+
+    def computeGradient(self, x, f0, g0):
+        # type: (np._ArrayLike, float, np._ArrayLike) -> Tuple[np._ArrayLike, np._ArrayLike, int]
+        return self.func(x, f0, g0)
@@ -0,0 +1,167 @@
+from __future__ import division
+from __future__ import print_function
+from builtins import range
+from builtins import object
+from typing import Any, Callable, Dict, List, Tuple
+
+import time
+import multiprocessing
+
+import numpy as np
+from colorama import Fore
+
+# optimizer and shared best objective value used by worker processes (inherited when forking the pool)
+_worker_optimizer = None
+_incumbent = None
+
+def _initWorker():
+    # no plots or visualization from worker processes
+    _worker_optimizer.config['showOptimizationGraph'] = 0
+    _worker_optimizer.config['showOptimizationTrajs'] = 0
+    _worker_optimizer.config['showModelVisualization'] = 0
+    # worker processes can't start own processes for finite differences
+    if 'jacobianProcesses' in _worker_optimizer.config and _worker_optimizer.config['jacobianProcesses'] > 1:
+        _worker_optimizer.config['jacobianProcesses'] = 1
+    # evaluations are not recorded, a resumed run starts the local optimizations again
+    _worker_optimizer.checkpoint = None
+
+def _refineStart(args):
+    # type: (Tuple[int, np._ArrayLike, float]) -> Dict[str, Any]
+    index, x0, stop_ratio = args
+    opt = _worker_optimizer
+    opt.last_best_f = np.inf
+    opt.last_best_sol = np.array([])
+    opt.iter_cnt = 0
+    opt.start_monitor = StartMonitor(index, _incumbent, stop_ratio, min_evaluations=len(x0)+2)
+    for i in range(len(x0)):
+        opt.opt_prob.getVar(i).value = x0[i]
+
+    start = time.time()
+    stopped = False
+    try:
+        opt.runLocalSolver(opt.opt_prob)
+    except StopLocalOptimization:
+        stopped = True
+    # best solution (and values kept with it)
+    attrs = {a: getattr(opt, a) for a in opt.checkpoint_attrs if a != 'iter_cnt'}
+    return {'start': index, 'f': opt.last_best_f, 'attrs': attrs, 'stopped': stopped,
+            'evaluations': opt.start_monitor.evaluations, 'time': time.time() - start}
+
+
+class StopLocalOptimization(Exception):
+    ''' raised from the objective function to end the local optimization of a start early '''
+    pass
+
+
+class StartMonitor(object):
+    ''' Shares the best feasible objective value between the local optimizations of all starts and
+        stops a start once its best value (the current one while it has no feasible solution) is
+        more than stop_ratio times the best one of all starts. '''
+
+    def __init__(self, index, incumbent, stop_ratio, min_evaluations):
+        # type: (int, multiprocessing.Value, float, int) -> None
+        self.index = index
+        self.incumbent = incumbent
+        self.stop_ratio = stop_ratio
+        self.min_evaluations = min_evaluations
+        self.evaluations = 0
+
+    def update(self, optimizer, f):
+        # type: (Optimizer, float) -> None
+        self.evaluations += 1
+        best = optimizer.last_best_f
+        with self.incumbent.get_lock():
+            if best < self.incumbent.value:
+                self.incumbent.value = best
+            incumbent = self.incumbent.value
+        if not np.isfinite(best):
+            best = f
+        if self.stop_ratio and self.evaluations >= self.min_evaluations and np.isfinite(incumbent) \
+                and best > incumbent*self.stop_ratio:
+            print(Fore.YELLOW + "start {}: objective {} is far from best start ({}), stopping".format(
+                self.index, best, incumbent) + Fore.RESET)
+            raise StopLocalOptimization()
+
+
+class MultiStart(object):
+    ''' Local optimization of several starting points (e.g. the best diverse solutions of the global
+        optimization) in separate worker processes (forked from the optimizer, one start per worker
+        at a time). The starts share their best objective value and clearly inferior starts stop
+        early (see StartMonitor). '''
+
+    def __init__(self, optimizer, processes=0, stop_ratio=1.5):
+        # type: (Optimizer, int, float) -> None
+        self.optimizer = optimizer
+        self.processes = processes or multiprocessing.cpu_count()
+        self.stop_ratio = stop_ratio
+
+    @staticmethod
+    def selectStarts(candidates, lower, upper, num_starts, min_distance, is_feasible):
+        # type: (List[Tuple[np._ArrayLike, float, np._ArrayLike]], np._ArrayLike, np._ArrayLike, int, float, Callable) -> List[np._ArrayLike]
+        ''' select up to num_starts of the (x, f, g) candidates, best objective values first (feasible
+            ones before infeasible ones), skipping candidates closer than min_distance (rms distance
+            relative to the variable ranges) to an already selected one '''
+        ranges = np.asarray(upper, dtype=np.float64) - np.asarray(lower, dtype=np.float64)
+        ranges[ranges == 0] = 1.0
+        order = sorted(range(len(candidates)), key=lambda i: candidates[i][1])
+        starts = []   # type: List[np._ArrayLike]
+        infeasible = []   # type: List[np._ArrayLike]
+
+        def isDiverse(x, selected):
+            for s in selected:
+                if np.sqrt(np.mean(((x - s) / ranges)**2)) < min_distance:
+                    return False
+            return True
+
+        for i in order:
+            x = np.asarray(candidates[i][0], dtype=np.float64)
+            if not np.isfinite(candidates[i][1]) or not isDiverse(x, starts):
+                continue
+            if is_feasible(candidates[i][2]):
+                starts.append(x)
+                if len(starts) == num_starts:
+                    break
+            elif len(infeasible) < num_starts and isDiverse(x, infeasible):
+                infeasible.append(x)
+        for x in infeasible:
+            if len(starts) == num_starts:
+                break
+            if isDiverse(x, starts):
+                starts.append(x)
+        return starts
+
+    def run(self, starts):
+        # type: (List[np._ArrayLike]) -> List[Dict[str, Any]]
+        global _worker_optimizer, _incumbent
+        opt = self.optimizer
+        _worker_optimizer = opt
+        _incumbent = multiprocessing.Value('d', opt.last_best_f)
+        if hasattr(multiprocessing, 'get_context'):
+            ctx = multiprocessing.get_context('fork')
+        else:
+            ctx = multiprocessing
+        processes = min(self.processes, len(starts))
+        print("Refining {} starts in {} processes".format(len(starts), processes))
+        pool = ctx.Pool(processes, initializer=_initWorker)
+        try:
+            results = pool.map(_refineStart, [(i, starts[i], self.stop_ratio) for i in range(len(starts))],
+                               chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+        return results
+
+    @staticmethod
+    def printReport(results):
+        # type: (List[Dict[str, Any]]) -> None
+        best = min(results, key=lambda r: r['f'])
+        for r in results:
+            if np.isfinite(r['f']):
+                status = 'best feasible {}'.format(r['f'])
+            else:
+                status = 'no feasible solution'
+            if r['stopped']:
+                status += ', stopped early'
+            color = Fore.GREEN if r is best and np.isfinite(r['f']) else ''
+            print(color + "start {}: {}, {} evaluations in {:.1f}s".format(r['start'], status, r['evaluations'],
+                                                                          r['time']) + Fore.RESET)
@@ -2,18 +2,12 @@ from __future__ import division
 from __future__ import print_function
 from builtins import range
 from builtins import object
-from typing import List, Tuple, Dict
+from typing import Any, List, Tuple, Dict
 import sys
 import random
 
 import numpy as np
 import numpy.linalg as la
-import matplotlib
-import matplotlib.pyplot as plt
-
-from distutils.version import LooseVersion
-if LooseVersion(matplotlib.__version__) >= LooseVersion('1.5'):
-    plt.style.use('seaborn-pastel')
 
 try:
     from mpi4py import MPI
@@ -27,9 +21,24 @@ from colorama import Fore
 import iDynTree; iDynTree.init_helpers(); iDynTree.init_numpy_helpers()
 
 from identification.helpers import eulerAnglesToRotationMatrix
+from excitation.checkpoint import OptimizerCheckpoint
+from excitation.evaluationCache import EvaluationCache
+from excitation.jacobian import GradientEvaluator, FiniteDifferenceJacobian
+from excitation.multiStart import MultiStart
+
+def getPyplot():
+    ''' import pyplot only when something is plotted (slow to load) '''
+    import matplotlib
+    import matplotlib.pyplot as plt
+
+    from distutils.version import LooseVersion
+    if LooseVersion(matplotlib.__version__) >= LooseVersion('1.5'):
+        plt.style.use('seaborn-pastel')
+    return plt
 
 def plotter(config, data=None, filename=None):
     #type: (Dict, np._ArrayLike, str) -> None
+    plt = getPyplot()
     fig = plt.figure(1)
     fig.clear()
     if False:
@@ -174,9 +183,18 @@ class Optimizer(object):
 
         self.iter_cnt = 0   # iteration counter
         self.last_g = None  # type: List[float]    # last constraint values
+        self.constraint_mask = None   # type: np._ArrayLike   # constraints objectiveFunc needs to compute (None for all)
         self.is_global = False
         self.local_iter_max = "(unknown)"
 
+        # local optimization from several of the best global solutions
+        self.num_starts = self.config['multiStartLocal'] if 'multiStartLocal' in self.config else 1
+        self.global_candidates = []   # type: List[Tuple[np._ArrayLike, float, np._ArrayLike]]
+        self.start_monitor = None     # type: StartMonitor
+
+        # attributes that are saved with checkpoints (and restored on resume)
+        self.checkpoint_attrs = ['iter_cnt', 'last_best_f', 'last_best_sol']
+
         # init parallel runs
         self.parallel = parallel
         if parallel:
@@ -191,6 +209,29 @@ class Optimizer(object):
         if self.config['showOptimizationGraph']:
             self.initGraph()
 
+        # save optimization state periodically to resume later
+        self.checkpoint = None   # type: OptimizerCheckpoint
+        if 'optimizationCheckpoint' in self.config and self.config['optimizationCheckpoint']:
+            filename = self.config['optimizationCheckpoint']
+            if self.parallel:
+                filename += '.{}'.format(self.mpi_rank)
+            interval = self.config['checkpointInterval'] if 'checkpointInterval' in self.config else 10
+            self.checkpoint = OptimizerCheckpoint(filename, interval)
+
+        # reuse evaluations of points that were already evaluated
+        self.cache = None   # type: EvaluationCache
+        if 'evaluationCache' in self.config and self.config['evaluationCache']:
+            filename = self.config['evaluationCacheFile'] if 'evaluationCacheFile' in self.config else None
+            if filename and self.parallel:
+                filename += '.{}'.format(self.mpi_rank)
+            urdf_real = self.config['urdf_real'] if 'urdf_real' in self.config else None
+            signature = EvaluationCache.getSignature(self.config, [self.config['urdf'], urdf_real, self.world],
+                                                     type(self).__name__)
+            self.cache = EvaluationCache(max_size=self.config['evaluationCacheSize'],
+                                         tolerance=self.config['evaluationCacheTolerance'],
+                                         filename=filename, signature=signature)
+            self.cache.load()
+
         # init link data
         self.link_cuboid_hulls = {}  # type: Dict[str, List]
         for i in range(self.model.num_links):
@@ -234,8 +275,9 @@ class Optimizer(object):
         # type: (np._ArrayLike) -> bool
         raise NotImplementedError
 
-    def testConstraints(self, g):
-        # type: (np._ArrayLike) -> bool
+    def testConstraints(self, g, quiet=False):
+        # type: (np._ArrayLike, bool) -> bool
+        ''' if constraint values g are feasible, prints the violated ones unless quiet '''
         raise NotImplementedError
 
     def getLinkDistance(self, l0_name, l1_name, joint_q):
@@ -245,8 +287,8 @@ class Optimizer(object):
         from fcl import fcl, collision_data, transform
 
         #get link rotation and position in world frame
-        q = iDynTree.VectorDynSize.fromList(joint_q)
-        self.model.dynComp.setRobotState(q, self.dq_zero, self.dq_zero, self.world_gravity)
+        self.model.buffers.setVector('q', joint_q)
+        self.model.dynComp.setRobotState(self.model.buffers.q, self.dq_zero, self.dq_zero, self.world_gravity)
 
         if l0_name in self.model.linkNames:    # if robot link
             f0 = self.model.dynComp.getFrameIndex(l0_name)
@@ -325,9 +367,8 @@ class Optimizer(object):
                     p_id = self.visualizer.display_index
                     q0 = self.visualizer.angles[p_id*self.num_dofs:(p_id+1)*self.num_dofs]
 
-                q = iDynTree.VectorDynSize.fromList(q0)
-                dq = iDynTree.VectorDynSize.fromList([0.0]*self.num_dofs)
-                self.model.dynComp.setRobotState(q, dq, dq, self.world_gravity)
+                self.model.buffers.setVector('q', q0)
+                self.model.dynComp.setRobotState(self.model.buffers.q, self.dq_zero, self.dq_zero, self.world_gravity)
                 self.visualizer.addIDynTreeModel(self.model.dynComp, self.link_cuboid_hulls,
                         self.model.linkNames, self.config['ignoreLinksForCollision'])
                 if self.world:
@@ -360,10 +401,122 @@ class Optimizer(object):
         and a fail flag'''
         raise NotImplementedError
 
+    def getGradientEvaluator(self, opt_prob):
+        # type: (pyOpt.Optimization) -> GradientEvaluator
+        ''' get gradient function for the local solver (non-parallel runs), None to let pyOpt
+        compute finite differences '''
+        if 'jacobianProcesses' in self.config and self.config['jacobianProcesses']:
+            # own finite differences (in worker processes)
+            variables = [opt_prob.getVar(i) for i in range(len(opt_prob.getVarSet()))]
+            return FiniteDifferenceJacobian(self, [v.lower for v in variables], [v.upper for v in variables],
+                                            method=self.config['jacobianMethod'],
+                                            step=self.config['jacobianStep'],
+                                            relative_step=self.config['jacobianRelativeStep'],
+                                            processes=self.config['jacobianProcesses'],
+                                            sparse=self.config['jacobianSparse'])
+        return None
+
+    def getConstraintDependencies(self):
+        # type: () -> np._ArrayLike
+        ''' get boolean matrix (constraints x variables) of which constraint depends on which
+        variable or None if unknown '''
+        return None
+
+    def getEvaluationInfo(self):
+        # type: () -> Dict[str, Any]
+        ''' additional values of the last objective function evaluation to keep in the cache '''
+        return {}
+
+    def usesReducedFidelity(self):
+        # type: () -> bool
+        ''' if evaluations can currently be estimates at reduced fidelity (these are not cached) '''
+        return False
+
+    def keepBest(self, x, f, g, info):
+        # type: (np._ArrayLike[float], float, np._ArrayLike, Dict[str, Any]) -> None
+        ''' keep solution if it is the best feasible one (for evaluations that were not computed
+        by objectiveFunc) '''
+        if f < self.last_best_f and self.testConstraints(g):
+            self.last_best_f = f
+            self.last_best_sol = x
+
+    def evaluate(self, x, test=False):
+        # type: (np._ArrayLike[float], bool) -> Tuple[float, np._ArrayLike, bool]
+        ''' objective function given to the solvers, records evaluations for checkpoints and
+        replays the recorded ones when resuming '''
+        rec = self.checkpoint.getReplay(x) if self.checkpoint else None
+        if rec is not None:
+            f, g, fail = rec
+            if self.cache and not self.usesReducedFidelity():
+                self.cache.add(x, *rec)
+        else:
+            entry = self.cache.get(x) if self.cache else None
+            if entry is not None:
+                f, g, fail, info = entry
+                g = g.copy()
+                self.last_g = g
+                self.keepBest(x, f, g, info)
+            else:
+                f, g, fail = self.objectiveFunc(x, test)
+                if self.cache and not self.usesReducedFidelity():
+                    self.cache.add(x, f, g, fail, self.getEvaluationInfo())
+
+            if self.checkpoint:
+                self.checkpoint.record(self, x, f, g, fail)
+
+        if self.is_global and self.num_starts > 1:
+            # keep as possible start of local optimization
+            self.global_candidates.append((np.array(x, dtype=np.float64), f, np.array(g, dtype=np.float64)))
+        if self.start_monitor:
+            self.start_monitor.update(self, f)
+        return f, g, fail
+
+    def isFeasible(self, g):
+        # type: (np._ArrayLike) -> bool
+        ''' test constraints without printing the violated ones '''
+        return self.testConstraints(g, quiet=True)
+
+    def loadCheckpoint(self):
+        # type: () -> None
+        ''' load checkpoint to resume from (if it exists and resuming is enabled) '''
+        if not self.checkpoint or not ('optimizationResume' in self.config and self.config['optimizationResume']):
+            return
+        if not self.checkpoint.load():
+            print("No checkpoint found at {}, starting new optimization".format(self.checkpoint.filename))
+            return
+        if self.checkpoint.mpi_size != self.mpi_size:
+            print(Fore.RED + "Checkpoint was saved with {} processes, need the same number to resume".format(
+                self.checkpoint.mpi_size) + Fore.RESET)
+            sys.exit(1)
+        self.checkpoint.restoreAttributes(self)
+        print(Fore.GREEN + "Resuming {} optimization from checkpoint {} ({} evaluations recorded)".format(
+            self.checkpoint.phase, self.checkpoint.filename,
+            sum([len(e) for e in self.checkpoint.evaluations.values()])) + Fore.RESET)
+
+    def getSeed(self):
+        # type: () -> float
+        ''' get seed for the global solver (0..1), fixed from config, of resumed run or random '''
+        if self.checkpoint and self.checkpoint.seed is not None:
+            return self.checkpoint.seed
+        if 'optimizationSeed' in self.config and self.config['optimizationSeed'] is not None:
+            seed = self.config['optimizationSeed']
+        else:
+            seed = random.SystemRandom().random()
+        if self.checkpoint:
+            self.checkpoint.seed = seed
+        return seed
+
+    def startPhase(self, phase):
+        # type: (str) -> None
+        ''' start the global or local optimization (or mark the end with 'done') and save a checkpoint '''
+        if self.checkpoint and self.checkpoint.startPhase(phase):
+            self.checkpoint.save(self)
+
     def initGraph(self):
         if self.mpi_rank > 0:
             return
         # init graphing of objective function value
+        plt = getPyplot()
         self.fig = plt.figure(0)
         self.ax1 = self.fig.add_subplot(1,1,1)
         plt.ion()
@@ -381,6 +534,7 @@ class Optimizer(object):
             return
         # draw all optimization steps, mark the ones that are within constraints
         #if (self.iter_cnt % self.updateGraphEveryVals) == 0:
+        plt = getPyplot()
         color = 'g'
         line = self.ax1.plot(self.xar, self.yar, marker='.', markeredgecolor=color, markerfacecolor=color, color="0.75")
         markers = np.where(self.x_constr)[0]
@@ -437,6 +591,92 @@ class Optimizer(object):
                         self.last_best_f = other_best_f
                         self.last_best_sol = other_best_sol
 
+    def getLocalSolver(self):
+        # type: () -> pyOpt.Optimizer
+        ''' after using global optimization, refine solution with gradient based method init
+        optimizer (more or less local) '''
+        import pyOpt
+
+        if self.config['localSolver'] == 'SLSQP':
+            opt2 = pyOpt.SLSQP()   #sequential least squares
+            opt2.setOption('MAXIT', self.config['localOptIterations'])
+            if self.config['verbose']:
+                opt2.setOption('IPRINT', 0)
+        elif self.config['localSolver'] == 'IPOPT':
+            opt2 = pyOpt.IPOPT()
+            opt2.setOption('linear_solver', 'ma57')  #mumps or hsl: ma27, ma57, ma77, ma86, ma97 or mkl: pardiso
+            opt2.setOption('max_iter', self.config['localOptIterations'])
+            if self.config['verbose']:
+                opt2.setOption('print_level', 4)  #0 none ... 5 max
+            else:
+                opt2.setOption('print_level', 0)  #0 none ... 5 max
+        elif self.config['localSolver'] == 'PSQP':
+            opt2 = pyOpt.PSQP()
+            opt2.setOption('MIT', self.config['localOptIterations'])  # max iterations
+            #opt2.setOption('MFV', ??)  # max function evaluations
+        elif self.config['localSolver'] == 'COBYLA':
+            if parallel:
+                opt2 = pyOpt.COBYLA(pll_type='POA')
+            else:
+                opt2 = pyOpt.COBYLA()
+            opt2.setOption('MAXFUN', self.config['localOptIterations'])  # max iterations
+            opt2.setOption('RHOBEG', 0.1)  # initial step size
+            if self.config['verbose']:
+                opt2.setOption('IPRINT', 2)
+        return opt2
+
+    def runLocalSolver(self, opt_prob):
+        # type: (pyOpt.Optimization) -> None
+        ''' run local solver from the current variable values of opt_prob '''
+        opt2 = self.getLocalSolver()
+        if self.config['localSolver'] in ['COBYLA', 'CONMIN']:
+            opt2(opt_prob, store_hst=False)
+        else:
+            if parallel:
+                opt2(opt_prob, sens_step=0.1, sens_mode='pgc', store_hst=False)
+            else:
+                gradient = self.getGradientEvaluator(opt_prob)
+                if gradient:
+                    try:
+                        opt2(opt_prob, sens_type=gradient, store_hst=False)
+                    finally:
+                        gradient.close()
+                    gradient.printStats()
+                else:
+                    opt2(opt_prob, sens_step=0.1, store_hst=False)
+
+    def getLocalStarts(self, opt_prob):
+        # type: (pyOpt.Optimization) -> List[np._ArrayLike]
+        ''' get solutions to start the local optimization from, the best constrained solution from
+        the last run (might be better than what solver thinks) or several of the best diverse solutions
+        of the global optimization '''
+        if self.num_starts > 1:
+            if self.parallel:
+                print("Multiple local starts are not used with MPI, starting from best solution")
+            elif self.global_candidates:
+                variables = [opt_prob.getVar(i) for i in range(len(opt_prob.getVarSet()))]
+                min_distance = self.config['multiStartMinDistance'] if 'multiStartMinDistance' in self.config else 0.05
+                starts = MultiStart.selectStarts(self.global_candidates, [v.lower for v in variables],
+                                                 [v.upper for v in variables], self.num_starts, min_distance,
+                                                 self.isFeasible)
+                if starts:
+                    return starts
+        return [self.last_best_sol]
+
+    def runMultiStart(self, starts):
+        # type: (List[np._ArrayLike]) -> None
+        ''' run local optimizations from all starts in worker processes and keep best result '''
+        processes = self.config['multiStartProcesses'] if 'multiStartProcesses' in self.config else 0
+        stop_ratio = self.config['multiStartStopRatio'] if 'multiStartStopRatio' in self.config else 0
+        multi_start = MultiStart(self, processes=processes, stop_ratio=stop_ratio)
+        results = multi_start.run(starts)
+        multi_start.printReport(results)
+        for r in results:
+            self.iter_cnt += r['evaluations']
+            if r['f'] < self.last_best_f:
+                for a in r['attrs']:
+                    setattr(self, a, r['attrs'][a])
+
     def runOptimizer(self, opt_prob):
         # type: (pyOpt.Optimization) -> np._ArrayLike[float]
         ''' call global followed by local optimizer, return solution '''
@@ -445,9 +685,12 @@ class Optimizer(object):
 
         initial = [v.value for v in list(opt_prob.getVarSet().values())]
 
-        if self.config['useGlobalOptimization']:
+        self.loadCheckpoint()
+        phase = self.checkpoint.phase if self.checkpoint else 'global'
+        seed = self.getSeed()
+
+        if self.config['useGlobalOptimization'] and phase == 'global':
             ### optimize using pyOpt (global)
-            sr = random.SystemRandom()
             if self.config['globalSolver'] == 'NSGA2':
                 if parallel:
                     opt = pyOpt.NSGA2(pll_type='POA') # genetic algorithm
@@ -459,7 +702,7 @@ class Optimizer(object):
                 opt.setOption('maxGen', self.config['globalOptIterations'])   # Maximum Number of Generations
                 opt.setOption('PrintOut', 0)    # Flag to Turn On Output to files (0-None, 1-Subset, 2-All)
                 opt.setOption('xinit', 1)       # Use Initial Solution Flag (0 - random population, 1 - use given solution)
-                opt.setOption('seed', sr.random())   # Random Number Seed 0..1 (0 - Auto based on time clock)
+                opt.setOption('seed', seed)   # Random Number Seed 0..1 (0 - Auto based on time clock)
                 #pCross_real    0.6     Probability of Crossover of Real Variable (0.6-1.0)
                 opt.setOption('pMut_real', 0.5)   # Probablity of Mutation of Real Variables (1/nreal)
                 #eta_c  10.0    # Distribution Index for Crossover (5-20) must be > 0
@@ -480,7 +723,7 @@ class Optimizer(object):
                 opt.setOption('printOuterIters', 1)
                 opt.setOption('SwarmSize', self.config['globalOptSize'])
                 opt.setOption('xinit', 1)
-                opt.setOption('seed', sr.random()*self.mpi_size) #(self.mpi_rank+1)/self.mpi_size)
+                opt.setOption('seed', seed*self.mpi_size) #(self.mpi_rank+1)/self.mpi_size)
                 #opt.setOption('vcrazy', 1e-2)
                 #TODO: how to properly limit max number of function calls?
                 # no. func calls = (SwarmSize * inner) * outer + SwarmSize
@@ -501,6 +744,7 @@ class Optimizer(object):
             if self.config['verbose']:
                 print('Running global optimization with {}'.format(self.config['globalSolver']))
             self.is_global = True
+            self.startPhase('global')
             opt(opt_prob, store_hst=False) #, xstart=initial)
 
             if self.mpi_rank == 0:
@@ -509,64 +753,43 @@ class Optimizer(object):
             self.gather_solutions()
 
         ### pyOpt local
-        if self.config['useLocalOptimization']:
+        if self.config['useLocalOptimization'] and phase != 'done':
             print("Runnning local gradient based solver")
 
-            # TODO: run local optimization for e.g. the three last best results (global solutions
-            # could be more or less optimal within their local minima)
-
-            # after using global optimization, refine solution with gradient based method init
-            # optimizer (more or less local)
-            if self.config['localSolver'] == 'SLSQP':
-                opt2 = pyOpt.SLSQP()   #sequential least squares
-                opt2.setOption('MAXIT', self.config['localOptIterations'])
-                if self.config['verbose']:
-                    opt2.setOption('IPRINT', 0)
-            elif self.config['localSolver'] == 'IPOPT':
-                opt2 = pyOpt.IPOPT()
-                opt2.setOption('linear_solver', 'ma57')  #mumps or hsl: ma27, ma57, ma77, ma86, ma97 or mkl: pardiso
-                opt2.setOption('max_iter', self.config['localOptIterations'])
-                if self.config['verbose']:
-                    opt2.setOption('print_level', 4)  #0 none ... 5 max
-                else:
-                    opt2.setOption('print_level', 0)  #0 none ... 5 max
-            elif self.config['localSolver'] == 'PSQP':
-                opt2 = pyOpt.PSQP()
-                opt2.setOption('MIT', self.config['localOptIterations'])  # max iterations
-                #opt2.setOption('MFV', ??)  # max function evaluations
-            elif self.config['localSolver'] == 'COBYLA':
-                if parallel:
-                    opt2 = pyOpt.COBYLA(pll_type='POA')
-                else:
-                    opt2 = pyOpt.COBYLA()
-                opt2.setOption('MAXFUN', self.config['localOptIterations'])  # max iterations
-                opt2.setOption('RHOBEG', 0.1)  # initial step size
-                if self.config['verbose']:
-                    opt2.setOption('IPRINT', 2)
-
             self.iter_max = self.local_iter_max
 
-            # use best constrained solution from last run (might be better than what solver thinks)
-            if len(self.last_best_sol) > 0:
-                for i in range(len(opt_prob.getVarSet())):
-                    opt_prob.getVar(i).value = self.last_best_sol[i]
+            if phase == 'local':
+                # resuming, start from the same solutions as before
+                starts = self.checkpoint.local_starts
+            else:
+                starts = self.getLocalStarts(opt_prob)
+                if self.checkpoint:
+                    self.checkpoint.local_starts = starts
 
             if self.config['verbose']:
                 print('Runing local optimization with {}'.format(self.config['localSolver']))
             self.is_global = False
-            if self.config['localSolver'] in ['COBYLA', 'CONMIN']:
-                opt2(opt_prob, store_hst=False)
+            self.startPhase('local')
+            if len(starts) > 1:
+                self.runMultiStart(starts)
             else:
-                if parallel:
-                    opt2(opt_prob, sens_step=0.1, sens_mode='pgc', store_hst=False)
-                else:
-                    opt2(opt_prob, sens_step=0.1, store_hst=False)
+                if len(starts[0]) > 0:
+                    for i in range(len(opt_prob.getVarSet())):
+                        opt_prob.getVar(i).value = starts[0][i]
+                self.runLocalSolver(opt_prob)
 
             self.gather_solutions()
 
+        self.startPhase('done')
+
+        if self.cache:
+            self.cache.save()
+            self.cache.printStats('process {}: '.format(self.mpi_rank) if self.parallel else '')
+
         if self.mpi_rank == 0:
-            sol = opt_prob.solution(0)
-            print(sol)
+            if phase != 'done':
+                sol = opt_prob.solution(0)
+                print(sol)
             #sol_vec = np.array([sol.getVar(x).value for x in range(0,len(sol.getVarSet()))])
 
             if len(self.last_best_sol) > 0:
@@ -0,0 +1,146 @@
+from __future__ import division
+from __future__ import print_function
+from builtins import range
+from builtins import object
+from typing import Callable, Dict, Tuple
+
+import time
+
+import numpy as np
+
+class TrajectoryTable(object):
+    ''' Dense time-indexed table of a trajectory, rendered ahead of time with Trajectory.getSamples
+        at a fixed rate. Values at a tick are looked up in constant time, values between ticks are
+        interpolated (cubic hermite with the tabled derivatives, so the error stays far below
+        the sampling step). Static posture trajectories are held (not interpolated).
+    '''
+
+    def __init__(self, trajectory, duration, frequency, start_time=0.0):
+        # type: (Trajectory, float, float, float) -> None
+        self.frequency = frequency
+        self.period = 1.0/frequency
+        self.start_time = start_time
+        self.num_samples = int(round(duration*frequency))
+
+        # one extra sample to interpolate up to the end
+        self.times = start_time + np.arange(self.num_samples+1)*self.period
+        self.angles, self.velocities, self.accelerations = trajectory.getSamples(self.times)
+        self.interpolate = np.any(self.velocities)
+
+    @classmethod
+    def fromTrajectory(cls, config, trajectory, duration):
+        # type: (Dict, Trajectory, float) -> TrajectoryTable
+        ''' render table at the excitation frequency, starting at a time with zero velocity '''
+        step = 1.0/config['excitationFrequency']
+        start_t = 0.0
+        while not trajectory.wait_for_zero_vel(start_t):
+            start_t += step
+        return cls(trajectory, duration, config['excitationFrequency'], start_t)
+
+    def getSample(self, k):
+        # type: (int) -> Tuple[np._ArrayLike, np._ArrayLike, np._ArrayLike]
+        ''' get angles, velocities and accelerations at tick k '''
+        return self.angles[k], self.velocities[k], self.accelerations[k]
+
+    def lookup(self, t):
+        # type: (float) -> Tuple[np._ArrayLike, np._ArrayLike, np._ArrayLike]
+        ''' get angles, velocities and accelerations at trajectory time t (clamped to table) '''
+        s = (t - self.start_time) * self.frequency
+        k = min(max(int(np.floor(s)), 0), self.num_samples-1)
+        u = min(max(s - k, 0.0), 1.0)
+        if not self.interpolate or u == 0.0:
+            return self.getSample(k)
+
+        # cubic hermite basis
+        h = self.period
+        u2 = u*u
+        u3 = u2*u
+        h00 = 2*u3 - 3*u2 + 1
+        h10 = u3 - 2*u2 + u
+        h01 = -2*u3 + 3*u2
+        h11 = u3 - u2
+        q0, q1 = self.angles[k], self.angles[k+1]
+        v0, v1 = self.velocities[k], self.velocities[k+1]
+        a0, a1 = self.accelerations[k], self.accelerations[k+1]
+        angles = h00*q0 + h*h10*v0 + h01*q1 + h*h11*v1
+        velocities = h00*v0 + h*h10*a0 + h01*v1 + h*h11*a1
+        accelerations = a0 + u*(a1 - a0)
+        return angles, velocities, accelerations
+
+
+class TrajectoryPlayer(object):
+    ''' Play back a TrajectoryTable in real time. send(angles, velocities, accelerations) is called
+        for each tick at its deadline and a log of deadline, start and end of each tick is kept.
+        Ticks that are more than one period late are skipped.
+
+        now and delay can be given for other clocks (e.g. yarp.Time), waiting is done with delay
+        until spin seconds before the deadline and busy waiting for the rest.
+    '''
+
+    def __init__(self, table, send, now=time.time, delay=time.sleep, spin=0.0002):
+        # type: (TrajectoryTable, Callable, Callable[[], float], Callable[[float], None], float) -> None
+        self.table = table
+        self.send = send
+        self.now = now
+        self.delay = delay
+        self.spin = spin
+        self.stopped = False
+
+        n = self.table.num_samples
+        self.log_deadline = np.zeros(n)
+        self.log_start = np.zeros(n)
+        self.log_end = np.zeros(n)
+        self.log_sent = np.zeros(n, dtype=bool)
+        self.num_ticks = 0
+
+    def stop(self):
+        # type: () -> None
+        self.stopped = True
+
+    def play(self, t_start=None):
+        # type: (float) -> None
+        period = self.table.period
+        if t_start is None:
+            t_start = self.now()
+        for k in range(self.table.num_samples):
+            if self.stopped:
+                break
+            deadline = t_start + k*period
+            wait = deadline - self.now()
+            if wait > self.spin:
+                self.delay(wait - self.spin)
+            while self.now() < deadline:
+                pass
+
+            start = self.now()
+            self.log_deadline[k] = deadline
+            self.log_start[k] = start
+            if start - deadline <= period:
+                angles, velocities, accelerations = self.table.getSample(k)
+                self.send(angles, velocities, accelerations)
+                self.log_sent[k] = True
+            self.log_end[k] = self.now()
+            self.num_ticks = k+1
+
+    def getTimingLog(self):
+        # type: () -> Dict[str, np._ArrayLike]
+        ''' per tick deadline, start and end times, lateness (of end to deadline) and whether the
+            tick was finished before the next deadline '''
+        n = self.num_ticks
+        lateness = self.log_end[:n] - self.log_deadline[:n]
+        return {
+            'deadline': self.log_deadline[:n],
+            'start': self.log_start[:n],
+            'end': self.log_end[:n],
+            'lateness': lateness,
+            'met': self.log_sent[:n] & (lateness < self.table.period),
+        }
+
+    def printTimingLog(self):
+        # type: () -> None
+        log = self.getTimingLog()
+        if not self.num_ticks:
+            return
+        print("playback: {}/{} ticks met deadline at {:.0f} Hz, lateness mean {:.3f}ms, max {:.3f}ms".format(
+              np.sum(log['met']), self.num_ticks, self.table.frequency, np.mean(log['lateness'])*1000,
+              np.max(log['lateness'])*1000))
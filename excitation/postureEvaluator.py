@@ -0,0 +1,268 @@
+from __future__ import division
+from __future__ import print_function
+from builtins import range
+from builtins import object
+from typing import Any, Callable, Dict, List, Tuple
+
+import time
+from collections import OrderedDict
+
+import numpy as np
+import numpy.linalg as la
+from colorama import Fore
+
+
+class PostureEvaluator(object):
+    ''' Parameter error of a set of static postures for the posture optimization, same as estimating
+        the parameters with Identification.estimateParameters from the simulated postures.
+
+        Regressor rows and simulated torques of each distinct posture are computed once and kept. The
+        samples of a posture are the same rows, so the least squares problems are solved with the rows
+        of the distinct postures weighted with the square root of their sample counts (same normal
+        equations and singular values as the rows of all samples). The constraint LMIs of the SDP
+        don't depend on the data, so they are converted to solver matrices only once.
+    '''
+
+    def __init__(self, idf, max_postures=10000):
+        # type: (Identification, int) -> None
+        self.idf = idf
+        self.model = idf.model
+        self.opt = idf.opt
+        self.max_postures = max_postures
+
+        self.postures = OrderedDict()    # type: OrderedDict   # regressor rows of postures (least recently used first)
+        self.distances = OrderedDict()   # type: OrderedDict   # collision distances of postures
+
+        self.sdp_blocks = None   # type: Tuple
+        self.xBaseReal = None    # type: np._ArrayLike
+
+        self.evaluations = 0
+        self.fallbacks = 0
+        self.eval_time = 0.0
+
+    @staticmethod
+    def isSupported(opt):
+        # type: (Dict[str, Any]) -> bool
+        ''' if the options allow estimating from the information matrix of the postures (fixed base,
+            constant base projection, simulated torques and OLS or SDP estimation without a priori
+            params, essential params or weighting) '''
+        return bool(opt['identifyGravityParamsOnly'] and opt['useStructuralRegressor'] and
+                    opt['simulateTorques'] and not opt['floatingBase'] and
+                    not opt['useBasisProjection'] and not opt['useAPriori'] and
+                    not opt['useEssentialParams'] and not opt['useWLS'] and
+                    not opt['filterRegressor'] and not opt['identifyClosestToCAD'] and
+                    not opt['constrainUsingNL'] and not opt['noChange'] and
+                    opt['estimateWith'] != 'std_direct')
+
+    @staticmethod
+    def getKey(q):
+        # type: (np._ArrayLike) -> bytes
+        return np.ascontiguousarray(q, dtype=np.float64).tobytes()
+
+    def getSamplePostures(self, trajectory):
+        # type: (FixedPositionTrajectory) -> Tuple[np._ArrayLike, np._ArrayLike]
+        ''' get distinct postures of the samples used for identification (like simulateTrajectory and
+            Data.init_from_data) and the number of samples of each '''
+        freq = self.opt['excitationFrequency']
+        times = np.arange(0, int(trajectory.getPeriodLength()*freq)) / freq
+        q = trajectory.getSamples(times)[0]
+        if self.opt['useDeg']:
+            q = np.deg2rad(q)
+        skip = self.opt['skipSamples'] + 1
+        q = q[0:(len(q) // skip)*skip:skip]
+        return np.unique(q, axis=0, return_counts=True)
+
+    def getPosture(self, q):
+        # type: (np._ArrayLike) -> Tuple[np._ArrayLike, np._ArrayLike]
+        ''' get base regressor and simulated torques of posture q (like Model.computeRegressors) '''
+        key = self.getKey(q)
+        entry = self.postures.pop(key, None)
+        if entry is None:
+            m = self.model
+            pos = np.array(q, dtype=np.float64)
+            zeros = np.zeros(m.num_dofs)
+            regressor = m.getRegressor(pos, zeros, zeros)
+            if self.opt['useRegressorForSimulation']:
+                torques = regressor.dot(m.xStdModel[m.identified_params])
+            else:
+                samples = {'positions': np.array([pos]), 'velocities': np.array([zeros]),
+                           'accelerations': np.array([zeros])}
+                if self.opt['useRBDL']:
+                    torques = m.simulateDynamicsRBDL(samples, 0)
+                else:
+                    torques = m.simulateDynamicsIDynTree(samples, 0)
+            torques = np.nan_to_num(torques)
+            regressor = regressor.dot(m.Pb)
+            entry = (regressor, torques)
+            while len(self.postures) >= self.max_postures:
+                self.postures.popitem(last=False)
+        self.postures[key] = entry
+        return entry
+
+    def getDistances(self, q, compute):
+        # type: (np._ArrayLike, Callable[[np._ArrayLike], np._ArrayLike]) -> np._ArrayLike
+        ''' get collision distances of posture q, computed with compute(q) if not known yet '''
+        key = self.getKey(q)
+        dists = self.distances.pop(key, None)
+        if dists is None:
+            dists = compute(q)
+            while len(self.distances) >= self.max_postures:
+                self.distances.popitem(last=False)
+        self.distances[key] = dists
+        return dists
+
+    @staticmethod
+    def getStackedRows(entries, counts):
+        # type: (List[Tuple], np._ArrayLike) -> Tuple[np._ArrayLike, np._ArrayLike]
+        ''' get base regressor rows and torques of the postures weighted with the square root of
+            their sample counts '''
+        w = np.sqrt(np.asarray(counts, dtype=np.float64))
+        Y = np.vstack([w[i]*entries[i][0] for i in range(len(entries))])
+        tau = np.concatenate([w[i]*entries[i][1] for i in range(len(entries))])
+        return Y, tau
+
+    @staticmethod
+    def reduceRows(Y, tau):
+        # type: (np._ArrayLike, np._ArrayLike) -> Tuple[np._ArrayLike, np._ArrayLike]
+        ''' get R and Q.T*tau from the QR decomposition of Y, ||tau - Y*x||^2 is ||Q.T*tau - R*x||^2
+            up to a constant (like the QR of YBase in SDP.identifyFeasibleStandardParameters) '''
+        Q, R = la.qr(Y)
+        return R, Q.T.dot(tau)
+
+    def initSDP(self):
+        # type: () -> None
+        ''' get the constraint LMIs as cvxopt matrices (with the variables u and delta of
+            SDP.identifyFeasibleStandardParameters) '''
+        import cvxopt
+        from sympy import Symbol
+        from identification.sdp import SDP
+        from identification import sdp_helpers
+
+        idf = self.idf
+        m = self.model
+        if idf.sdp is None:
+            idf.sdp = SDP(idf)
+        idf.sdp.initSDP_LMIs(idf)
+        delete_cols = idf.sdp.delete_cols
+
+        # std params that are variables (delta)
+        delta_params = [m.identified_params[i] for i in range(len(m.identified_params)) if i not in delete_cols]
+        variables = [Symbol('u')] + list(m.param_syms[delta_params])
+        Gs = []
+        hs = []
+        for (LMis, LM0) in sdp_helpers.lmi_to_coeffs(idf.sdp.LMIs_marg, variables, split_blocks=True):
+            Gs.append(cvxopt.matrix([(-LMi).flatten().astype(float).tolist() for LMi in LMis]))
+            hs.append(cvxopt.matrix(LM0.astype(float).tolist()))
+
+        # regularized non-identifiable params
+        p_nid = []   # type: List[int]
+        if self.opt['useRegressorRegularization']:
+            p_nid = list(set(m.non_id).difference(set(delete_cols)).intersection(set(m.identified_params)))
+        if not set(p_nid).issubset(delta_params):
+            # regularization of params that are not variables, only handled by SDP class
+            self.sdp_blocks = False
+            return
+        nid_idx = [delta_params.index(p) for p in p_nid]
+        K = np.delete(m.K, delete_cols, axis=1)
+        self.sdp_blocks = (Gs, hs, K, p_nid, nid_idx)
+
+    def solveSDP(self, Y, tau, rho2_norm_sqr, base_error):
+        # type: (np._ArrayLike, np._ArrayLike, float, float) -> np._ArrayLike
+        ''' solve constrained OLS for std params given the (weighted) base regressor rows Y and
+            torques tau, None if there is no optimal solution '''
+        import cvxopt
+        import cvxopt.solvers
+
+        m = self.model
+        Gs, hs, K, p_nid, nid_idx = self.sdp_blocks
+        num_delta = K.shape[1]
+
+        R, h = self.reduceRows(Y, tau)
+        M = R.dot(K)
+        if len(p_nid):
+            l = (float(base_error) / len(p_nid)) * self.opt['regularizationFactor']
+            S = np.zeros((len(p_nid), num_delta))
+            S[np.arange(len(p_nid)), nid_idx] = l
+            M = np.vstack((M, S))
+            h = np.concatenate((h, l*m.xStdModel[p_nid]))
+
+        # LMI [[u - rho2, e.T], [e, I]] >= 0 with e = h - M*delta
+        n = M.shape[0] + 1
+        G = np.zeros((1 + num_delta, n, n))
+        G[0, 0, 0] = -1.0
+        G[1:, 0, 1:] = M.T
+        G[1:, 1:, 0] = M.T
+        h0 = np.identity(n)
+        h0[0, 0] = -rho2_norm_sqr
+        h0[0, 1:] = h
+        h0[1:, 0] = h
+
+        c = cvxopt.matrix([1.0] + [0.0]*num_delta)
+        cvxopt.solvers.options['maxiters'] = 100
+        cvxopt.solvers.options['show_progress'] = False
+        sdpout = cvxopt.solvers.sdp(c, Gs=[cvxopt.matrix(np.ascontiguousarray(G.reshape(1 + num_delta, n*n).T))] + Gs,
+                                    hs=[cvxopt.matrix(h0)] + hs)
+        if sdpout['status'] != 'optimal':
+            return None
+
+        xStd = np.squeeze(np.asarray(sdpout['x']))[1:]
+        delete_cols = self.idf.sdp.delete_cols
+        for col in delete_cols:
+            xStd = np.insert(xStd, col, 0)
+        xStd[delete_cols] = m.xStdModel[delete_cols]
+        return xStd
+
+    def getParameterError(self, postures, counts):
+        # type: (np._ArrayLike, np._ArrayLike) -> float
+        ''' get squared error of base params identified from the postures (each held for counts
+            samples) to the real ones, None if the estimation has to be done with Identification '''
+        start = time.time()
+        idf = self.idf
+        m = self.model
+        self.evaluations += 1
+
+        entries = [self.getPosture(q) for q in postures]
+        Y, tau = self.getStackedRows(entries, counts)
+
+        # OLS base params, same as lstsq of the base regressor of all samples in
+        # Identification.identifyBaseParameters (with the default cutoff for the number of its rows)
+        rcond = np.finfo(np.float64).eps * max(np.sum(counts)*entries[0][0].shape[0], Y.shape[1])
+        xBase = la.lstsq(Y, tau, rcond=rcond)[0]
+        if self.xBaseReal is None:
+            self.xBaseReal = m.K.dot(idf.xStdReal[m.identified_params])
+
+        if self.opt['constrainToConsistent']:
+            # regression error of OLS solution
+            residuals = np.array([la.norm(e[1] - e[0].dot(xBase)) for e in entries])
+            rho2_norm_sqr = np.sum(counts*residuals**2)
+            base_error = np.sum(counts*residuals) / np.sum(counts)
+
+            if self.sdp_blocks is None:
+                self.initSDP()
+            xStd = None
+            if self.sdp_blocks:
+                try:
+                    xStd = self.solveSDP(Y, tau, rho2_norm_sqr, base_error)
+                except (la.LinAlgError, ValueError, ArithmeticError):
+                    xStd = None
+            if xStd is None:
+                self.fallbacks += 1
+                self.eval_time += time.time() - start
+                return None
+            m.xStd = xStd
+            xBase = m.K.dot(xStd)
+
+        m.xBase = xBase
+        idf.xBaseReal = self.xBaseReal
+        self.eval_time += time.time() - start
+        return la.norm(self.xBaseReal - xBase)**2
+
+    def printStats(self):
+        # type: () -> None
+        if not self.evaluations:
+            return
+        print("Parameter estimation from cached postures: {} evaluations in {:.1f}s, {} distinct postures".format(
+            self.evaluations, self.eval_time, len(self.postures)))
+        if self.fallbacks:
+            print(Fore.YELLOW + "{} evaluations were estimated with full identification (no optimal SDP "
+                  "solution)".format(self.fallbacks) + Fore.RESET)
@@ -4,14 +4,16 @@ from builtins import range
 from builtins import object
 from typing import List, Tuple, Dict, Callable, Any
 
+import time
+
 import numpy as np
-import matplotlib.pyplot as plt
 import pyOpt
 import iDynTree; iDynTree.init_helpers(); iDynTree.init_numpy_helpers()
 
-from identification.helpers import URDFHelpers
+from identification.helpers import URDFHelpers, RobotDescription
 from excitation.trajectoryGenerator import FixedPositionTrajectory
-from excitation.optimizer import plotter, Optimizer
+from excitation.optimizer import plotter, getPyplot, Optimizer
+from excitation.postureEvaluator import PostureEvaluator
 
 
 class PostureOptimizer(Optimizer):
@@ -30,10 +32,9 @@ class PostureOptimizer(Optimizer):
         self.num_postures = self.config['numStaticPostures']
         self.posture_time = self.config['staticPostureTime']
 
-        self.idyn_model = iDynTree.Model()
-        iDynTree.modelFromURDF(self.config['urdf'], self.idyn_model)
-
-        self.neighbors = URDFHelpers.getNeighbors(self.idyn_model)
+        description = RobotDescription.get(self.config['urdf'])
+        self.idyn_model = description.getIDynTreeModel()
+        self.neighbors = description.getNeighbors()
 
         # amount of collision checks to be done
         eff_links = self.model.num_links - len(self.config['ignoreLinksForCollision']) + len(self.world_links)
@@ -54,16 +55,58 @@ class PostureOptimizer(Optimizer):
         self.num_constraints -= self.num_postures * (len(nb_pairs) +        # neighbors
                                   len(self.config['ignoreLinkPairsForCollision']))  # custom combinations
 
+        # link pairs to check for collisions in each posture
+        self.collision_pairs = self.getCollisionPairs()
+
+        # estimate parameters from cached regressors of the postures if the options allow it
+        self.evaluator = PostureEvaluator(idf)
+        self.fast_evaluation = 'postureFastEvaluation' in self.config and self.config['postureFastEvaluation']
+        if self.fast_evaluation and not PostureEvaluator.isSupported(idf.opt):
+            print("Options not supported for fast posture evaluation, using full identification")
+            self.fast_evaluation = False
+        self.eval_stats = [0, 0.0]   # count and time of objective function evaluations
+
         # only generate output from main process
         if self.mpi_rank > 0:
             self.config['verbose'] = 0
 
         self.initVisualizer()
 
-    def testConstraints(self, g):
+    def testConstraints(self, g, quiet=False):
         return np.all(g > 0.0)
 
+    def getCollisionPairs(self):
+        # type: () -> List[Tuple[str, str]]
+        ''' get pairs of links (and world links) that need to be checked for collisions '''
+        pairs = []  # type: List[Tuple[str, str]]
+        all_links = self.model.linkNames + self.world_links
+        for l0 in range(len(all_links)):
+            for l1 in range(l0+1, len(all_links)):
+                l0_name = all_links[l0]
+                l1_name = all_links[l1]
+
+                if l0_name in self.config['ignoreLinksForCollision'] \
+                        or l1_name in self.config['ignoreLinksForCollision']:
+                    continue
+                if [l0_name, l1_name] in self.config['ignoreLinkPairsForCollision'] or \
+                   [l1_name, l0_name] in self.config['ignoreLinkPairsForCollision']:
+                    continue
+
+                # neighbors can't collide with a proper joint range, so ignore
+                if l0 < self.model.num_links and l1 < self.model.num_links:
+                    if l0_name in self.neighbors[l1_name]['links'] or l1_name in self.neighbors[l0_name]['links']:
+                        continue
+
+                pairs.append((l0_name, l1_name))
+        return pairs
+
+    def getPostureDistances(self, q):
+        # type: (np._ArrayLike) -> np._ArrayLike
+        ''' get distances of all collision pairs for the joint angles q of one posture '''
+        return np.array([self.getLinkDistance(l0_name, l1_name, q) for (l0_name, l1_name) in self.collision_pairs])
+
     def objectiveFunc(self, x, test=False):
+        start = time.time()
         self.iter_cnt += 1
         if self.mpi_size > 1:
             print("process {}, iter #{}/{}".format(self.mpi_rank, self.iter_cnt, self.iter_max))
@@ -72,7 +115,6 @@ class PostureOptimizer(Optimizer):
 
         # init vars
         fail = False
-        f = 0.0
         #g = np.zeros((self.num_postures, self.model.num_links, self.model.num_links))
         #assert(g.size == self.num_constraints)  # needs to stay in sync
         g = np.zeros(self.num_constraints)
@@ -80,54 +122,46 @@ class PostureOptimizer(Optimizer):
         # test constraints
         # check for each link that it does not collide with any other link (parent/child shouldn't be possible)
 
-        g_cnt = 0
         if self.config['verbose'] > 1:
             print('checking collisions')
+        per_posture = len(self.collision_pairs)
         for p in range(self.num_postures):
+            g_p = slice(p*per_posture, (p+1)*per_posture)
+            # (skip constraints that are not needed, e.g. for gradients of other postures)
+            if self.constraint_mask is not None and not np.any(self.constraint_mask[g_p]):
+                continue
             if self.config['verbose'] > 1:
                 print("Posture {}".format(p))
             q = x[p*self.num_dofs:(p+1)*self.num_dofs]
-
-            for l0 in range(self.model.num_links + len(self.world_links)):
-                for l1 in range(self.model.num_links + len(self.world_links)):
-                    l0_name = (self.model.linkNames + self.world_links)[l0]
-                    l1_name = (self.model.linkNames + self.world_links)[l1]
-
-                    if (l0 >= l1):  # don't need, distance is the same in both directions; same link never collides
-                        continue
-                    if l0_name in self.config['ignoreLinksForCollision'] \
-                            or l1_name in self.config['ignoreLinksForCollision']:
-                        continue
-                    if [l0_name, l1_name] in self.config['ignoreLinkPairsForCollision'] or \
-                       [l1_name, l0_name] in self.config['ignoreLinkPairsForCollision']:
-                        continue
-
-                    # neighbors can't collide with a proper joint range, so ignore
-                    if l0 < self.model.num_links and l1 < self.model.num_links:
-                        if l0_name in self.neighbors[l1_name]['links'] or l1_name in self.neighbors[l0_name]['links']:
-                            continue
-
-                    if l0 < l1:
-                        g[g_cnt] = self.getLinkDistance(l0_name, l1_name, q)
-                        g_cnt += 1
+            # same postures have the same distances, only check each distinct posture once
+            g[g_p] = self.evaluator.getDistances(q, self.getPostureDistances)
+            if self.constraint_mask is not None:
+                g[g_p] *= self.constraint_mask[g_p]
 
         # check those links that are very close or collide again with mesh (simplified versions or full)
         # TODO: possibly limit distance of overall COM from hip (simple balance?)
 
-        # simulate with current angles
         angles = self.vecToParam(x)
         self.trajectory.initWithAngles(angles)
-        old_verbose = self.config['verbose']
-        self.config['verbose'] = 0
-        trajectory_data, data = self.sim_func(self.config, self.trajectory, model=self.model)
+        f = None
+        if self.fast_evaluation and not self.config['showOptimizationTrajs']:
+            # estimate from regressors and torques of the distinct postures of the samples
+            postures, counts = self.evaluator.getSamplePostures(self.trajectory)
+            f = self.evaluator.getParameterError(postures, counts)
+
+        if f is None:
+            # simulate with current angles
+            old_verbose = self.config['verbose']
+            self.config['verbose'] = 0
+            trajectory_data, data = self.sim_func(self.config, self.trajectory, model=self.model)
 
-        # identify parameters with this trajectory
-        self.idf.data.init_from_data(trajectory_data)
-        self.idf.estimateParameters()
-        self.config['verbose'] = old_verbose
+            # identify parameters with this trajectory
+            self.idf.data.init_from_data(trajectory_data)
+            self.idf.estimateParameters()
+            self.config['verbose'] = old_verbose
 
-        if self.config['showOptimizationTrajs']:
-            plotter(self.config, data=trajectory_data)
+            if self.config['showOptimizationTrajs']:
+                plotter(self.config, data=trajectory_data)
 
         '''
         # get objective function value: identified parameter distance (from 'real')
@@ -147,7 +181,8 @@ class PostureOptimizer(Optimizer):
         param_error = self.idf.xStdReal[id_grav] - self.idf.model.xStd[id_grav_id]
         '''
         param_error = self.idf.xBaseReal - self.idf.model.xBase
-        f = np.linalg.norm(param_error)**2 #+ np.std(param_error)
+        if f is None:
+            f = np.linalg.norm(param_error)**2 #+ np.std(param_error)
 
         c = self.testConstraints(g)
         if self.config['showOptimizationGraph'] and not self.opt_prob.is_gradient and self.mpi_rank == 0:
@@ -175,9 +210,29 @@ class PostureOptimizer(Optimizer):
         elif not c:
             print('Constraints not met.')
 
+        self.eval_stats[0] += 1
+        self.eval_stats[1] += time.time() - start
+
         return f, g, fail
 
 
+    def printEvaluationStats(self):
+        # type: () -> None
+        count, duration = self.eval_stats
+        if count:
+            print("{} objective evaluations in {:.1f}s ({:.2f} evaluations/s)".format(count, duration,
+                                                                                  count / duration))
+        self.evaluator.printStats()
+
+    def getConstraintDependencies(self):
+        # type: () -> np._ArrayLike
+        # collision constraints of a posture only depend on its angles
+        per_posture = self.num_constraints // self.num_postures
+        deps = np.zeros((self.num_constraints, self.num_postures*self.num_dofs), dtype=bool)
+        for p in range(self.num_postures):
+            deps[p*per_posture:(p+1)*per_posture, p*self.num_dofs:(p+1)*self.num_dofs] = True
+        return deps
+
     def addVarsAndConstraints(self, opt_prob):
         # type: (pyOpt.Optimization) -> None
         ''' add variables, define bounds
@@ -236,7 +291,7 @@ class PostureOptimizer(Optimizer):
         ## describe optimization problem with pyOpt classes
 
         # Instanciate Optimization Problem
-        self.opt_prob = pyOpt.Optimization('Posture optimization', self.objectiveFunc)
+        self.opt_prob = pyOpt.Optimization('Posture optimization', self.evaluate)
 
         # set if the available pyOpt doesn't have gradient flag (telling when objfunc is called for gradient)
         if 'is_gradient' not in self.opt_prob.__dict__:
@@ -257,11 +312,13 @@ class PostureOptimizer(Optimizer):
             self.local_iter_max = ((num_vars + self.num_constraints)  // self.mpi_size) * self.config['localOptIterations']
 
         sol_vec = self.runOptimizer(self.opt_prob)
+        self.printEvaluationStats()
 
         angles = self.vecToParam(sol_vec)
         self.trajectory.initWithAngles(angles)
 
         # keep plot windows open (if any)
+        plt = getPyplot()
         plt.ioff()
         plt.show(block=True)
 
@@ -0,0 +1,188 @@
+from __future__ import division
+from __future__ import print_function
+from builtins import range
+from builtins import object
+from typing import Dict, List, Tuple
+
+import os
+import shutil
+import tempfile
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue   # python 2
+
+import numpy as np
+
+class SampleRecorder(object):
+    ''' Record samples with fixed size fields into preallocated chunks of a ring of buffers.
+        Full chunks are written to disk by a background thread (if spill is set) and their buffer
+        is reused, so memory stays constant for long recordings. Appending is thread safe.
+
+        fields: dict of field name -> shape of one sample (() for scalars)
+    '''
+
+    def __init__(self, fields, chunk_size=10000, num_buffers=3, spill=True, dtype=np.float64):
+        # type: (Dict[str, Tuple], int, int, bool, np.dtype) -> None
+        self.fields = fields
+        self.chunk_size = chunk_size
+        self.spill = spill
+        self.dtype = dtype
+        self.lock = threading.Lock()
+
+        self.free_buffers = queue.Queue()   # type: queue.Queue
+        for i in range(num_buffers - 1):
+            self.free_buffers.put(self._newBuffer())
+        self.buffer = self._newBuffer()
+        self.pos = 0              # next row in current buffer
+        self.num_chunks = 0       # number of completed chunks
+        self.num_samples = 0
+        self.chunks = []          # type: List[Dict[str, np._ArrayLike]]   # full chunks (if not spilling)
+
+        if self.spill:
+            self.spill_dir = tempfile.mkdtemp(prefix='excitation_')
+            self.write_queue = queue.Queue()   # type: queue.Queue
+            self.writer = threading.Thread(target=self._writeChunks)
+            self.writer.daemon = True
+            self.writer.start()
+
+    def _newBuffer(self):
+        # type: () -> Dict[str, np._ArrayLike]
+        return {k: np.empty((self.chunk_size,) + tuple(s), dtype=self.dtype) for k, s in self.fields.items()}
+
+    def _writeChunks(self):
+        # type: () -> None
+        ''' writer thread, saves full chunks to files and returns the buffers for reuse '''
+        while True:
+            item = self.write_queue.get()
+            if item is None:
+                break
+            idx, buf = item
+            np.savez(self._chunkFile(idx), **buf)
+            self.free_buffers.put(buf)
+
+    def _chunkFile(self, idx):
+        # type: (int) -> str
+        return os.path.join(self.spill_dir, 'chunk_{:06d}.npz'.format(idx))
+
+    def _finishChunk(self):
+        # type: () -> None
+        if self.spill:
+            self.write_queue.put((self.num_chunks, self.buffer))
+            try:
+                self.buffer = self.free_buffers.get_nowait()
+            except queue.Empty:
+                # writer can't keep up, need one more buffer
+                self.buffer = self._newBuffer()
+        else:
+            self.chunks.append(self.buffer)
+            self.buffer = self._newBuffer()
+        self.num_chunks += 1
+        self.pos = 0
+
+    def append(self, **values):
+        # type: (**np._ArrayLike) -> None
+        ''' add one sample, values for all fields must be given '''
+        with self.lock:
+            for k in self.fields:
+                self.buffer[k][self.pos] = values[k]
+            self.pos += 1
+            self.num_samples += 1
+            if self.pos == self.chunk_size:
+                self._finishChunk()
+
+    def extend(self, **values):
+        # type: (**np._ArrayLike) -> None
+        ''' add several samples at once (first dimension of all values) '''
+        with self.lock:
+            n = len(values[list(self.fields.keys())[0]])
+            start = 0
+            while start < n:
+                num = min(n - start, self.chunk_size - self.pos)
+                for k in self.fields:
+                    self.buffer[k][self.pos:self.pos+num] = values[k][start:start+num]
+                self.pos += num
+                self.num_samples += num
+                start += num
+                if self.pos == self.chunk_size:
+                    self._finishChunk()
+
+    def getArrays(self):
+        # type: () -> Dict[str, np._ArrayLike]
+        ''' stop recording and get all recorded samples as arrays '''
+        with self.lock:
+            if self.spill:
+                # wait for writer and load written chunks
+                self.write_queue.put(None)
+                self.writer.join()
+                chunks = []
+                for idx in range(self.num_chunks):
+                    with np.load(self._chunkFile(idx)) as f:
+                        chunks.append({k: f[k] for k in self.fields})
+                shutil.rmtree(self.spill_dir, ignore_errors=True)
+                self.spill = False
+                self.chunks = chunks
+            chunks = list(self.chunks)
+            chunks.append({k: self.buffer[k][:self.pos] for k in self.fields})
+            return {k: np.concatenate([c[k] for c in chunks], axis=0) for k in self.fields}
+
+
+class TimingStats(object):
+    ''' Running statistics of a periodic loop (period, jitter to deadlines, missed deadlines and
+        dropped messages) with constant memory. '''
+
+    def __init__(self, period):
+        # type: (float) -> None
+        self.period = period
+        self.last = None        # type: float
+        self.num = 0
+        self.period_sum = 0.0
+        self.period_sq_sum = 0.0
+        self.period_max = 0.0
+        self.jitter_max = 0.0
+        self.missed = 0
+        self.dropped = 0
+
+    def tick(self, now, deadline=None):
+        # type: (float, float) -> None
+        ''' register one loop iteration at time now (that was supposed to happen at deadline) '''
+        if self.last is not None:
+            dt = now - self.last
+            self.num += 1
+            self.period_sum += dt
+            self.period_sq_sum += dt*dt
+            self.period_max = max(self.period_max, dt)
+        self.last = now
+        if deadline is not None:
+            self.jitter_max = max(self.jitter_max, abs(now - deadline))
+
+    def checkDropped(self, now):
+        # type: (float) -> int
+        ''' detect messages that are missing by the gap of their time stamps, returns the number
+            of dropped messages since the previous one '''
+        dropped = 0
+        if self.last is not None and now - self.last > 1.5*self.period:
+            dropped = int(round((now - self.last) / self.period)) - 1
+            self.dropped += dropped
+        return dropped
+
+    def toDict(self, prefix):
+        # type: (str) -> Dict[str, float]
+        mean = self.period_sum / max(self.num, 1)
+        std = np.sqrt(max(self.period_sq_sum / max(self.num, 1) - mean*mean, 0))
+        return {
+            prefix + '_period_mean': mean,
+            prefix + '_period_std': std,
+            prefix + '_period_max': self.period_max,
+            prefix + '_jitter_max': self.jitter_max,
+            prefix + '_missed_deadlines': self.missed,
+            prefix + '_dropped_messages': self.dropped,
+        }
+
+    def printStats(self, name):
+        # type: (str) -> None
+        d = self.toDict('t')
+        print("{}: period {:.2f}ms (std {:.2f}ms, max {:.2f}ms), max jitter {:.2f}ms, {} missed deadlines, "
+              "{} dropped messages".format(name, d['t_period_mean']*1000, d['t_period_std']*1000,
+              d['t_period_max']*1000, d['t_jitter_max']*1000, self.missed, self.dropped))
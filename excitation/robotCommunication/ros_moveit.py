@@ -3,8 +3,9 @@ from __future__ import print_function
 from builtins import range
 from builtins import object
 import sys
+from typing import Dict, List
 import numpy as np
-#import threading
+import threading
 
 import rospy
 import moveit_commander
@@ -12,31 +13,70 @@ import moveit_commander
 from trajectory_msgs.msg import JointTrajectoryPoint
 from sensor_msgs.msg import JointState
 
+from excitation.playback import TrajectoryTable
+from excitation.robotCommunication.recorder import SampleRecorder, TimingStats
+
 # records the states obtained from joint_states messages
 class RecordJointStates(object):
-    def __init__(self):
+    ''' record joint_states messages into preallocated chunks (spilled to disk for long runs).
+        Storage is created with the number of joints of the first message, messages after
+        max_samples are ignored. Dropped messages are detected from gaps in the header sequence
+        numbers, irregular timing from the message time stamps. '''
+
+    def __init__(self, period, max_samples=None, online=None):
         #rospy.init_node('joint_states_listener')
-        #self.lock = threading.Lock()
-        self.name = []
-        self.positions = []
-        self.velocities = []
-        self.torques = []
-        self.times = []
-        self.next = True
+        self.lock = threading.Lock()
+        self.name = []  # type: List[str]
+        self.recorder = None   # type: SampleRecorder
+        self.max_samples = max_samples
+        self.stats = TimingStats(period)
+        self.last_seq = None   # type: int
+        self.non_monotonic = 0
+        self.online = online   # optional OnlineWorker that gets each sample (queued)
         self.listen()
 
     def listen(self):
-        rospy.Subscriber('joint_states', JointState, self.joint_states_callback)
+        self.subscriber = rospy.Subscriber('joint_states', JointState, self.joint_states_callback)
+
+    def stop(self):
+        self.subscriber.unregister()
+
+    def getNumSamples(self):
+        with self.lock:
+            return self.recorder.num_samples if self.recorder else 0
 
     #callback function: when a joint_states message arrives, save the values
     def joint_states_callback(self, msg):
-        self.name = msg.name
-        self.positions.append(msg.position)
-        self.velocities.append(msg.velocity)
-        self.torques.append(msg.effort)   #ros "effort" is force for linear or torque for rotational joints
-        self.times.append(msg.header.stamp.secs + msg.header.stamp.nsecs / 1.0e9)
-
-def main(config, trajectory, data):
+        with self.lock:
+            if self.recorder is None:
+                self.name = list(msg.name)
+                n = len(msg.name)
+                self.recorder = SampleRecorder({'positions': (n,), 'velocities': (n,), 'torques': (n,),
+                                                'times': ()})
+            elif self.max_samples is not None and self.recorder.num_samples >= self.max_samples:
+                return
+
+            t = msg.header.stamp.secs + msg.header.stamp.nsecs / 1.0e9
+            seq = msg.header.seq
+            if self.last_seq is not None and seq > self.last_seq + 1:
+                self.stats.dropped += seq - self.last_seq - 1
+            self.last_seq = seq
+            if self.stats.last is not None and t <= self.stats.last:
+                self.non_monotonic += 1
+            self.stats.tick(t)
+
+            #ros "effort" is force for linear or torque for rotational joints
+            self.recorder.append(positions=np.asarray(msg.position), velocities=np.asarray(msg.velocity),
+                                 torques=np.asarray(msg.effort), times=t)
+        if self.online:
+            self.online.addSample(t, msg.position[0::2], msg.effort[0::2])
+
+    def getArrays(self):
+        # type: () -> Dict[str, np._ArrayLike]
+        with self.lock:
+            return self.recorder.getArrays()
+
+def main(config, trajectory, data, online=None):
     moveit_commander.roscpp_initialize(sys.argv)
     rospy.init_node('excitation_move_group', anonymous=False)
     #robot = moveit_commander.RobotCommander()
@@ -62,38 +102,26 @@ def main(config, trajectory, data):
 
     # generate trajectory and send in one message to moveit
     duration = config['args'].periods*trajectory.getPeriodLength()
-    sent_positions = list()
-    sent_time = list()
-    sent_velocities = list()
-    sent_accelerations = list()
-
     step = 1.0/200   # data rate of 200 Hz
     start_t = 0
     while not trajectory.wait_for_zero_vel(start_t):
         start_t+=step
-    t = start_t
+    table = TrajectoryTable(trajectory, duration, 1.0/step, start_t)
 
     # add trajectory points to plan
-    while t < start_t+duration:
-        trajectory.setTime(t)
+    for k in range(table.num_samples):
         point = JointTrajectoryPoint()
-        for i in range(0, config['num_dofs']):
-            q = trajectory.getAngle(i)
-            point.positions.append(q)
-            dq = trajectory.getVelocity(i)
-            point.velocities.append(dq)
-            ddq = trajectory.getAcceleration(i)
-            point.accelerations.append(ddq)
-
-        point.time_from_start = rospy.Duration(t)
+        angles, velocities, accelerations = table.getSample(k)
+        point.positions = angles.tolist()
+        point.velocities = velocities.tolist()
+        point.accelerations = accelerations.tolist()
+        point.time_from_start = rospy.Duration(table.times[k])
         plan.joint_trajectory.points.append(point)
-        #if t == start_t:
+        #if k == 0:
         #    print np.rad2deg(point.positions)
-        sent_positions.append(point.positions)
-        sent_velocities.append(point.velocities)
-        sent_accelerations.append(point.accelerations)
-        sent_time.append(t)
-        t+=step
+    sent_positions = table.angles[:table.num_samples]
+    sent_velocities = table.velocities[:table.num_samples]
+    sent_accelerations = table.accelerations[:table.num_samples]
 
     # move to start position
     group.set_joint_value_target(plan.joint_trajectory.points[0].positions)
@@ -101,18 +129,24 @@ def main(config, trajectory, data):
     group.go()
 
     # record measurements
-    jSt = RecordJointStates()
-    group.execute(plan, wait=False)
     num_sent = len(sent_positions)
+    jSt = RecordJointStates(step, max_samples=num_sent, online=online)
+    group.execute(plan, wait=False)
     start_t = rospy.get_time()
-    while len(jSt.positions) < num_sent: # and rospy.get_time() < start_t+duration
+    waited = 0
+    while jSt.getNumSamples() < num_sent: # and rospy.get_time() < start_t+duration
         # gets data in thread
         rospy.sleep(step)
-
-    data['Q'] = np.array(jSt.positions[0:num_sent])[:,0::2]
-    data['V'] = np.array(jSt.velocities[0:num_sent])[:,0::2]
-    data['T'] = np.array(jSt.times[0:num_sent])
-    data['Tau'] = np.array(jSt.torques[0:num_sent])[:,0::2]
+        waited += 1
+        if online and waited % 200 == 0:
+            online.printStatus()
+    jSt.stop()
+
+    states = jSt.getArrays()
+    data['Q'] = states['positions'][:, 0::2]
+    data['V'] = states['velocities'][:, 0::2]
+    data['T'] = states['times']
+    data['Tau'] = states['torques'][:, 0::2]
     data['measured_frequency'] = data['Q'].shape[0] / duration
     data['Qsent'] = np.array(sent_positions);
     data['QdotSent'] = np.array(sent_velocities);
@@ -120,3 +154,9 @@ def main(config, trajectory, data):
 
     print("got {} samples in {}s.".format(data['Q'].shape[0], duration), end=' ')
     print("(about {} Hz)".format(data['measured_frequency']))
+
+    # timing statistics (saved with the measurements)
+    data.update(jSt.stats.toDict('timing_receive'))
+    jSt.stats.printStats("received joint states")
+    if jSt.non_monotonic:
+        print("warning, {} joint states with non-increasing time stamps!".format(jSt.non_monotonic))
@@ -1,11 +1,15 @@
 from __future__ import division
 from __future__ import print_function
 from builtins import map
-from builtins import range
 import sys
+import time
+import threading
 import yarp
 import numpy as np
 
+from excitation.playback import TrajectoryTable, TrajectoryPlayer
+from excitation.robotCommunication.recorder import SampleRecorder, TimingStats
+
 def gen_position_msg(msg_port, angles):
     bottle = msg_port.prepare()
     bottle.clear()
@@ -19,7 +23,36 @@ def gen_command(msg_port, command):
     bottle.fromString("({}) 0".format(command))
     return bottle
 
-def main(config, trajectory, out):
+def decode_list(value):
+    ''' get values of a bottle list as array (parsed at once instead of per item) '''
+    return np.array(value.asList().toString().split(), dtype=np.float64)
+
+class CommandStreamer(threading.Thread):
+    ''' send the samples of a trajectory table to the robot at their deadlines (with yarp time) '''
+
+    def __init__(self, port, table, recorder):
+        super(CommandStreamer, self).__init__()
+        self.port = port
+        self.recorder = recorder
+        self.player = TrajectoryPlayer(table, self.send, now=yarp.Time.now, delay=yarp.Time.delay)
+        self.stats = TimingStats(table.period)
+        self.daemon = True
+
+    def send(self, angles, velocities, accelerations):
+        gen_position_msg(self.port, angles)
+        self.port.write()
+        now = yarp.Time.now()
+        self.stats.tick(now)
+        self.recorder.append(Qsent=angles, QdotSent=velocities, QddotSent=accelerations, Tsent=now)
+
+    def run(self):
+        self.player.play()
+        log = self.player.getTimingLog()
+        self.stats.missed = int(np.sum(~log['met']))
+        if log['start'].size:
+            self.stats.jitter_max = float(np.max(np.abs(log['start'] - log['deadline'])))
+
+def main(config, trajectory, out, online=None):
     # connect to yarp and open output port
     yarp.Network.init()
     yarp.Time.useNetworkClock("/clock")
@@ -34,113 +67,88 @@ def main(config, trajectory, out):
 
     portName = '/excitation/state:'
     data_port = yarp.BufferedPortBottle()
+    data_port.setStrict()   # queue all incoming messages until they are read
     data_port.open(portName+"i")
     yarp.Network.connect(portName+'o', portName+'i')
 
-    t_init = yarp.Time.now()
-    t_elapsed = 0.0
+    num_dofs = config['num_dofs']
+    period = 1.0/config['excitationFrequency']
     duration = config['args'].periods*trajectory.getPeriodLength()   #init overall run duration to a periodic length
-
-    measured_positions = list()
-    measured_velocities = list()
-    measured_accelerations = list()
-    measured_torques = list()
-    measured_time = list()
-
-    sent_positions = list()
-    sent_time = list()
-    sent_velocities = list()
-    sent_accelerations = list()
-
-    # try high level p correction when using velocity ctrl
-    #e = [0] * config['num_dofs']
-    #velocity_correction = [0] * config['num_dofs']
-
-    waited_for_start = 0
-    started = False
-    while t_elapsed < duration:
-        trajectory.setTime(t_elapsed)
-        target_angles = [trajectory.getAngle(i) for i in range(0, config['num_dofs'])]
-        target_velocities = [trajectory.getVelocity(i) for i in range(0, config['num_dofs'])]
-        target_accelerations = [trajectory.getAcceleration(i) for i in range(0, config['num_dofs'])]
-        #for i in range(0, config['num_dofs']):
-        #    target_velocities[i]+=velocity_correction[i]
-
-        # make sure we start moving at a position with zero velocity
-        if not started:
-            started = trajectory.wait_for_zero_vel(t_elapsed)
-            t_elapsed = yarp.Time.now() - t_init
-            waited_for_start = t_elapsed
-
-            if started:
-                # set angles and wait one period to have settled at zero velocity position
-                gen_position_msg(command_port, target_angles)
-                command_port.write()
-
-                print("waiting to arrive at an initial position...", end=' ')
-                sys.stdout.flush()
-                yarp.Time.delay(trajectory.getPeriodLength())
-                t_init+=trajectory.getPeriodLength()
-                duration+=waited_for_start
-                print("ok.")
+    table = TrajectoryTable.fromTrajectory(config, trajectory, duration)
+
+    sent = SampleRecorder({'Qsent': (num_dofs,), 'QdotSent': (num_dofs,), 'QddotSent': (num_dofs,),
+                           'Tsent': ()})
+    measured = SampleRecorder({'Q': (num_dofs,), 'V': (num_dofs,), 'Tau': (num_dofs,), 'T': ()})
+    receive_stats = TimingStats(period)
+
+    # set angles and wait one period to have settled at zero velocity position
+    gen_position_msg(command_port, table.getSample(0)[0])
+    command_port.write()
+    print("waiting to arrive at an initial position...", end=' ')
+    sys.stdout.flush()
+    yarp.Time.delay(trajectory.getPeriodLength())
+    print("ok.")
+
+    # drop states received while waiting
+    while data_port.getPendingReads() > 0:
+        data_port.read(False)
+
+    streamer = CommandStreamer(command_port, table, sent)
+    streamer.start()
+
+    # receive measurements until all targets are sent (and the last state arrived)
+    zeros = np.zeros(num_dofs)
+    while streamer.is_alive() or data_port.getPendingReads() > 0:
+        data_out = data_port.read(False)
+        if data_out is None:
+            time.sleep(period/4)
             continue
 
-        # set target angles
-        gen_position_msg(command_port, target_angles)
-        command_port.write()
-
-        sent_positions.append(target_angles)
-        sent_velocities.append(target_velocities)
-        sent_accelerations.append(target_accelerations)
-        sent_time.append(yarp.Time.now())
-
-        # get and wait for next value, so sync to GYM loop
-        data_out = data_port.read(shouldWait=True)
-
-        b_positions = data_out.get(0).asList()
-        b_velocities = data_out.get(1).asList()
-        b_torques = data_out.get(2).asList()
+        positions = decode_list(data_out.get(0))
+        velocities = decode_list(data_out.get(1))
+        torques = decode_list(data_out.get(2))
         d_time = data_out.get(3).asDouble()
 
-        positions = np.zeros(config['num_dofs'])
-        velocities = np.zeros(config['num_dofs'])
-        accelerations = np.zeros(config['num_dofs'])
-        torques = np.zeros(config['num_dofs'])
-
-        if config['num_dofs'] == b_positions.size():
-            for i in range(0, config['num_dofs']):
-                positions[i] = b_positions.get(i).asDouble()
-                velocities[i] = b_velocities.get(i).asDouble()
-                torques[i] = b_torques.get(i).asDouble()
-        else:
-            print("warning, wrong amount of values received! ({} DOFS vs. {})".format(config['num_dofs'], b_positions.size()))
-
-        # test manual correction for position error
-        #p = 0
-        #for i in range(0, config['num_dofs']):
-        #    e[i] = (angles[i] - positions[i])
-        #    velocity_correction[i] = e[i]*p
+        if positions.size != num_dofs or velocities.size != num_dofs or torques.size != num_dofs:
+            print("warning, wrong amount of values received! ({} DOFS vs. {})".format(num_dofs, positions.size))
+            positions = velocities = torques = zeros
+
+        receive_stats.checkDropped(d_time)
+        receive_stats.tick(d_time)
 
         # collect measurement data
-        measured_positions.append(positions)
-        measured_velocities.append(velocities)
-        measured_torques.append(torques)
-        measured_time.append(d_time)
-        t_elapsed = d_time - t_init
+        measured.append(Q=positions, V=velocities, Tau=torques, T=d_time)
+
+        # identify from the stream of samples (queued for the worker thread of online)
+        if online:
+            online.addSample(d_time, positions, torques)
+            if measured.num_samples % int(config['excitationFrequency']) == 0:
+                online.printStatus()
 
     # clean up
+    streamer.join()
     command_port.close()
     data_port.close()
-    out['Q'] = np.array(measured_positions); del measured_positions
-    out['Qsent'] = np.array(sent_positions);
-    out['QdotSent'] = np.array(sent_velocities);
-    out['QddotSent'] = np.array(sent_accelerations);
-    out['V'] = np.array(measured_velocities); del measured_velocities
-    out['Tau'] = np.array(measured_torques); del measured_torques
-    out['T'] = np.array(measured_time); del measured_time
 
-    out['measured_frequency'] = len(sent_positions)/duration
+    m = measured.getArrays()
+    s = sent.getArrays()
+    out['Q'] = m['Q']
+    out['Qsent'] = s['Qsent']
+    out['QdotSent'] = s['QdotSent']
+    out['QddotSent'] = s['QddotSent']
+    out['V'] = m['V']
+    out['Tau'] = m['Tau']
+    out['T'] = m['T']
+
+    out['measured_frequency'] = s['Tsent'].shape[0]/duration
+
+    # timing statistics (saved with the measurements)
+    out.update(streamer.stats.toDict('timing_command'))
+    out.update(receive_stats.toDict('timing_receive'))
 
     # some stats
     print("got {} samples in {}s.".format(out['Q'].shape[0], duration), end=' ')
     print("(about {} Hz)".format(out['measured_frequency']))
+    streamer.stats.printStats("command loop")
+    streamer.player.printTimingLog()
+    receive_stats.printStats("received states")
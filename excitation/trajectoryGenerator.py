@@ -11,9 +11,11 @@ from identification.model import Model
 from identification.data import Data
 
 
-def simulateTrajectory(config, trajectory, model=None, measurements=None):
-    # type: (Dict, Trajectory, Model, np._ArrayLike) -> Tuple[Dict, Data]
+def simulateTrajectory(config, trajectory, model=None, measurements=None, keep_std=True, sample_step=1):
+    # type: (Dict, Trajectory, Model, np._ArrayLike, bool, int) -> Tuple[Dict, Data]
     # generate data arrays for simulation and regressor building
+    # (without keep_std, only the base regressor is kept in model, see Model.computeRegressors)
+    # with sample_step > 1, only every sample_step-th sample of the excitationFrequency grid is used
     old_sim = config['simulateTorques']
     config['simulateTorques'] = True
 
@@ -31,45 +33,27 @@ def simulateTrajectory(config, trajectory, model=None, measurements=None):
 
     data = Data(config)
     trajectory_data = {}   # type: Dict[str, Union[List, np._ArrayLike]]
-    trajectory_data['target_positions'] = []
-    trajectory_data['target_velocities'] = []
-    trajectory_data['target_accelerations'] = []
-    trajectory_data['torques'] = []
-    trajectory_data['times'] = []
 
+    # sample trajectory for all times at once
     freq = config['excitationFrequency']
-    for t in range(0, int(trajectory.getPeriodLength()*freq)):
-        trajectory.setTime(t/freq)
-        q = np.array([trajectory.getAngle(d) for d in range(config['num_dofs'])])
-        if config['useDeg']:
-            q = np.deg2rad(q)
-        trajectory_data['target_positions'].append(q)
-
-        qdot = np.array([trajectory.getVelocity(d) for d in range(config['num_dofs'])])
-        if config['useDeg']:
-            qdot = np.deg2rad(qdot)
-        trajectory_data['target_velocities'].append(qdot)
-
-        qddot = np.array([trajectory.getAcceleration(d) for d in range(config['num_dofs'])])
-        if config['useDeg']:
-            qddot = np.deg2rad(qddot)
-        trajectory_data['target_accelerations'].append(qddot)
-
-        trajectory_data['times'].append(t/freq)
-        trajectory_data['torques'].append(np.zeros(config['num_dofs']+fb))
-
-    num_samples = len(trajectory_data['times'])
-
-    #convert lists to numpy arrays
-    trajectory_data['target_positions'] = np.array(trajectory_data['target_positions'])
+    times = np.arange(0, int(trajectory.getPeriodLength()*freq), sample_step) / freq
+    q, qdot, qddot = trajectory.getSamples(times)
+    if config['useDeg']:
+        q = np.deg2rad(q)
+        qdot = np.deg2rad(qdot)
+        qddot = np.deg2rad(qddot)
+
+    num_samples = len(times)
+
+    trajectory_data['target_positions'] = q
     trajectory_data['positions'] = trajectory_data['target_positions']
-    trajectory_data['target_velocities'] = np.array(trajectory_data['target_velocities'])
+    trajectory_data['target_velocities'] = qdot
     trajectory_data['velocities'] = trajectory_data['target_velocities']
-    trajectory_data['target_accelerations'] = np.array(trajectory_data['target_accelerations'])
+    trajectory_data['target_accelerations'] = qddot
     trajectory_data['accelerations'] = trajectory_data['target_accelerations']
-    trajectory_data['torques'] = np.array(trajectory_data['torques'])
-    trajectory_data['times'] = np.array(trajectory_data['times'])
-    trajectory_data['measured_frequency'] = freq
+    trajectory_data['torques'] = np.zeros((num_samples, config['num_dofs']+fb))
+    trajectory_data['times'] = times
+    trajectory_data['measured_frequency'] = freq / sample_step
     trajectory_data['base_velocity'] = np.zeros( (num_samples, 6) )
     trajectory_data['base_acceleration'] = np.zeros( (num_samples, 6) )
 
@@ -125,7 +109,7 @@ def simulateTrajectory(config, trajectory, model=None, measurements=None):
     old_offset = config['startOffset']
     config['startOffset'] = 0
     data.init_from_data(trajectory_data)
-    model.computeRegressors(data)
+    model.computeRegressors(data, keep_std=keep_std)
     trajectory_data['torques'][:,:] = data.samples['torques'][:,:]
 
     '''
@@ -177,6 +161,20 @@ class Trajectory(object):
     def wait_for_zero_vel(self, t_elapsed):
         raise NotImplementedError()
 
+    def getSamples(self, times):
+        # type: (np._ArrayLike) -> Tuple[np._ArrayLike, np._ArrayLike, np._ArrayLike]
+        ''' get angles, velocities and accelerations of all dofs (rows) at each time '''
+        angles = np.empty((len(times), self.dofs))
+        velocities = np.empty_like(angles)
+        accelerations = np.empty_like(angles)
+        for k in range(len(times)):
+            self.setTime(times[k])
+            for d in range(self.dofs):
+                angles[k, d] = self.getAngle(d)
+                velocities[k, d] = self.getVelocity(d)
+                accelerations[k, d] = self.getAcceleration(d)
+        return angles, velocities, accelerations
+
 
 class PulsedTrajectory(Trajectory):
     ''' pulsating trajectory generator for one joint using fourier series from
@@ -278,6 +276,18 @@ class PulsedTrajectory(Trajectory):
         else: thresh = np.deg2rad(5.0)
         return abs(self.getVelocity(0)) < thresh
 
+    def getSamples(self, times):
+        # type: (np._ArrayLike) -> Tuple[np._ArrayLike, np._ArrayLike, np._ArrayLike]
+        ''' get angles, velocities and accelerations of all dofs (rows) at each time '''
+        samples = [o.getSamples(times) for o in self.oscillators]
+        return tuple(np.array([s[i] for s in samples]).T for i in range(3))
+
+    def getSampleDerivatives(self, times):
+        # type: (np._ArrayLike) -> List[Tuple[np._ArrayLike, np._ArrayLike, np._ArrayLike]]
+        ''' get derivatives of angles, velocities and accelerations at each time for each dof with
+            respect to the params of its oscillator (see OscillationGenerator.getSampleDerivatives) '''
+        return [o.getSampleDerivatives(times) for o in self.oscillators]
+
 
 class OscillationGenerator(object):
     def __init__(self, w_f, a, b, q0, nf, use_deg):
@@ -328,6 +338,62 @@ class OscillationGenerator(object):
             ddq = np.rad2deg(ddq)
         return ddq
 
+    def getSamples(self, times):
+        # type: (np._ArrayLike) -> Tuple[np._ArrayLike, np._ArrayLike, np._ArrayLike]
+        ''' get angles, velocities and accelerations for an array of times at once '''
+        wl = self.w_f*np.arange(1, self.nf+1)
+        a = np.asarray(self.a, dtype=np.float64)[:self.nf]
+        b = np.asarray(self.b, dtype=np.float64)[:self.nf]
+        sin = np.sin(np.outer(times, wl))
+        cos = np.cos(np.outer(times, wl))
+        q = sin.dot(a/wl) - cos.dot(b/wl) + self.nf*self.q0
+        dq = cos.dot(a) + sin.dot(b)
+        ddq = -sin.dot(a*wl) + cos.dot(b*wl)
+        if self.use_deg:
+            q = np.rad2deg(q)
+            dq = np.rad2deg(dq)
+            ddq = np.rad2deg(ddq)
+        return q, dq, ddq
+
+    def getSampleDerivatives(self, times):
+        # type: (np._ArrayLike) -> Tuple[np._ArrayLike, np._ArrayLike, np._ArrayLike]
+        ''' get derivatives of angles, velocities and accelerations (as given by getSamples) for an
+            array of times with respect to the params [w_f, q0, a_1..a_nf, b_1..b_nf], each
+            of shape (len(times), 2+2*nf) '''
+        l = np.arange(1, self.nf+1)
+        wl = self.w_f*l
+        a = np.asarray(self.a, dtype=np.float64)[:self.nf]
+        b = np.asarray(self.b, dtype=np.float64)[:self.nf]
+        t = np.asarray(times, dtype=np.float64)[:, None]
+        sin = np.sin(t*wl)
+        cos = np.cos(t*wl)
+        num_params = 2+2*self.nf
+        dq = np.zeros((len(times), num_params))
+        ddq = np.zeros_like(dq)
+        dddq = np.zeros_like(dq)
+
+        # pulsation
+        dq[:, 0] = (a*(t*cos/self.w_f - sin/(self.w_f*wl)) + b*(t*sin/self.w_f + cos/(self.w_f*wl))).sum(axis=1)
+        ddq[:, 0] = (-a*l*t*sin + b*l*t*cos).sum(axis=1)
+        dddq[:, 0] = (-a*l*(sin + wl*t*cos) + b*l*(cos - wl*t*sin)).sum(axis=1)
+
+        # sin/cos coefficients
+        dq[:, 2:2+self.nf] = sin/wl
+        dq[:, 2+self.nf:] = -cos/wl
+        ddq[:, 2:2+self.nf] = cos
+        ddq[:, 2+self.nf:] = sin
+        dddq[:, 2:2+self.nf] = -sin*wl
+        dddq[:, 2+self.nf:] = cos*wl
+
+        if self.use_deg:
+            dq = np.rad2deg(dq)
+            ddq = np.rad2deg(ddq)
+            dddq = np.rad2deg(dddq)
+
+        # offset (given in the same unit as the angles)
+        dq[:, 1] = self.nf
+        return dq, ddq, dddq
+
 
 class FixedPositionTrajectory(Trajectory):
     """ generate static 'trajectories' """
@@ -337,6 +403,7 @@ class FixedPositionTrajectory(Trajectory):
         self.time = 0.0
         self.use_deg = self.config['useDeg']
         self.angles = None  # type: List[Dict[str, any]]
+        self.dofs = self.config['num_dofs']
 
     def initWithAngles(self, angles):
         # type: (List[Dict[str, Any]]) -> None
@@ -347,15 +414,32 @@ class FixedPositionTrajectory(Trajectory):
         '''
         self.angles = angles
         self.posLength = angles[1]['start_time'] - angles[0]['start_time']
+        self.start_times = np.array([a['start_time'] for a in angles], dtype=np.float64)
+        self.posture_angles = np.array([a['angles'] for a in angles], dtype=np.float64)
+
+    def getPostureIndex(self, t):
+        # type: (float) -> int
+        ''' get index of posture at time t (first posture that started at most one posture length
+            before), -1 if there is none '''
+        # postures are equally spaced, so guess index and correct for rounding
+        idx = int(np.ceil((t - self.posLength - self.start_times[0]) / self.posLength))
+        idx = min(max(idx, 0), len(self.start_times))
+        if idx > 0 and self.start_times[idx-1] >= t - self.posLength:
+            idx -= 1
+        elif idx < len(self.start_times) and self.start_times[idx] < t - self.posLength:
+            idx += 1
+        if idx >= len(self.start_times):
+            return -1
+        return idx
 
     def getAngle(self, dof):
         # type: (int) -> float
         """ get angle at current time for joint dof """
 
         if np.any(self.angles):
-            for angle_set in self.angles:
-                if angle_set['start_time'] >= self.time - self.posLength:
-                    return angle_set['angles'][dof]
+            idx = self.getPostureIndex(self.time)
+            if idx >= 0:
+                return self.posture_angles[idx, dof]
 
             # if no angle found (shouldn't happen)
             print('Warning: no angle found for time {}'.format(self.time))
@@ -446,3 +530,15 @@ class FixedPositionTrajectory(Trajectory):
     def wait_for_zero_vel(self, t_elapsed):
         return True
 
+    def getSamples(self, times):
+        # type: (np._ArrayLike) -> Tuple[np._ArrayLike, np._ArrayLike, np._ArrayLike]
+        ''' get angles, velocities and accelerations of all dofs (rows) at each time '''
+        if not np.any(self.angles):
+            return super(FixedPositionTrajectory, self).getSamples(times)
+        idx = np.searchsorted(self.start_times, np.asarray(times) - self.posLength, side='left')
+        angles = self.posture_angles[np.minimum(idx, len(self.start_times)-1)]
+        if np.any(idx >= len(self.start_times)):
+            print('Warning: no angle found for some times after {}'.format(self.start_times[-1]))
+            angles[idx >= len(self.start_times)] = 0.0
+        return angles, np.zeros_like(angles), np.zeros_like(angles)
+
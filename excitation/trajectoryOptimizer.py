@@ -4,18 +4,19 @@ from builtins import range
 from builtins import object
 from typing import List, Dict, Tuple, Union
 
+import time
 import numpy as np
 import numpy.linalg as la
-import matplotlib.pyplot as plt
 import pyOpt
 import iDynTree; iDynTree.init_helpers(); iDynTree.init_numpy_helpers()
 from colorama import Fore
 
 from identification.model import Model
 from identification.data import Data
-from identification.helpers import URDFHelpers
+from identification.helpers import URDFHelpers, RobotDescription
 from excitation.trajectoryGenerator import simulateTrajectory, Trajectory, PulsedTrajectory
-from excitation.optimizer import plotter, Optimizer
+from excitation.optimizer import plotter, getPyplot, Optimizer
+from excitation.jacobian import AnalyticGradient
 
 
 class TrajectoryOptimizer(Optimizer):
@@ -71,6 +72,21 @@ class TrajectoryOptimizer(Optimizer):
                 self.ainit[i,j] = self.binit[i,j] = self.config['trajectoryCoeffInit']
 
         self.last_best_f_f1 = 0
+        self.last_f1 = 0   # added cost of last evaluation
+
+        # reduced fidelity levels to screen candidates of the global optimization with
+        # ([frequency factor, collision sample step, promotion ratio], coarse to fine)
+        self.fidelity_schedule = self.config['multiFidelitySchedule'] if 'multiFidelitySchedule' in self.config else []
+        self.fidelity_schedule = self.fidelity_schedule or []
+        for level in self.fidelity_schedule:
+            # reduced sample grids need to be subsets of the full one (every n-th sample), otherwise
+            # limits checked on them are not checked at full fidelity
+            if not 0 < level[0] <= 1 or abs(1.0/level[0] - round(1.0/level[0])) > 1e-9:
+                raise ValueError("multiFidelitySchedule frequency factors need to be 1/n for an integer n "
+                                 "(got {})".format(level[0]))
+        self.fidelity_stats = [[0, 0.0] for l in range(len(self.fidelity_schedule)+1)]   # evaluations, time
+        self.last_reduced = False   # last evaluation was done at reduced fidelity
+        self.checkpoint_attrs.append('last_best_f_f1')
 
         self.num_constraints = self.num_dofs*4  # angle, velocity, torque limits
         if self.config['minVelocityConstraint']:
@@ -78,9 +94,9 @@ class TrajectoryOptimizer(Optimizer):
 
         # collision constraints
 
-        self.idyn_model = iDynTree.Model()
-        iDynTree.modelFromURDF(self.config['urdf'], self.idyn_model)
-        self.neighbors = URDFHelpers.getNeighbors(self.idyn_model)
+        description = RobotDescription.get(self.config['urdf'])
+        self.idyn_model = description.getIDynTreeModel()
+        self.neighbors = description.getNeighbors()
 
         # amount of collision checks to be done
         eff_links = self.model.num_links - len(self.config['ignoreLinksForCollision']) + len(self.world_links)
@@ -167,23 +183,105 @@ class TrajectoryOptimizer(Optimizer):
                 g = [10.0]*self.num_constraints
 
             fail = 1.0
+            self.last_f1 = 0
             return f, g, fail
 
         self.trajectory.initWithParams(a,b,q, self.nf, wf)
 
-        old_verbose = self.config['verbose']
-        self.config['verbose'] = 0
-        #old_floatingBase = self.config['floatingBase']
-        #self.config['floatingBase'] = 0
-        trajectory_data, data = self.sim_func(self.config, self.trajectory, model=self.model)
-
-        self.config['verbose'] = old_verbose
-        #self.config['floatingBase'] = old_floatingBase
+        # screen candidates of the global optimization with cheaper evaluations first
+        self.last_reduced = False
+        if self.is_global and self.fidelity_schedule and not test:
+            for level in range(len(self.fidelity_schedule)):
+                start = time.time()
+                f, g, f1, _ = self.evaluateTrajectory(level)
+                self.fidelity_stats[level][0] += 1
+                self.fidelity_stats[level][1] += time.time() - start
+                if not self.isPromoted(level, f+f1, g):
+                    print("objective function value at fidelity level {}: {}, not promoted".format(level, f+f1))
+                    self.last_reduced = True
+                    self.last_g = g
+                    self.last_f1 = f1
+                    return f+f1, g, 0.0
+
+        start = time.time()
+        f, g, f1, trajectory_data = self.evaluateTrajectory()
+        self.fidelity_stats[-1][0] += 1
+        self.fidelity_stats[-1][1] += time.time() - start
 
         self.last_trajectory_data = trajectory_data
         if self.config['showOptimizationTrajs']:
             plotter(self.config, data=trajectory_data)
 
+        self.last_g = g
+        self.last_f1 = f1
+
+        #add min join torques as second objective
+        if f1 > 0:
+            f+= f1
+            print("added cost: {}".format(f1))
+
+        c = self.testConstraints(g)
+        if c:
+            print(Fore.GREEN, end=' ')
+        else:
+            print(Fore.YELLOW, end=' ')
+
+        print("objective function value: {} (last best: {} + {})".format(f,
+                                                            self.last_best_f-self.last_best_f_f1,
+                                                            self.last_best_f_f1), end=' ')
+        print(Fore.RESET)
+
+        if self.config['verbose']:
+            if self.opt_prob.is_gradient:
+                print("(Gradient evaluation)")
+
+        if self.mpi_rank == 0 and not self.opt_prob.is_gradient and self.config['showOptimizationGraph']:
+            self.xar.append(self.iter_cnt)
+            self.yar.append(f)
+            self.x_constr.append(c)
+            self.updateGraph()
+
+        self.showVisualizerTrajectory(self.trajectory)
+
+        #keep last best solution (some solvers don't keep it)
+        if c and f < self.last_best_f:
+            self.last_best_f = f
+            self.last_best_f_f1 = f1
+            self.last_best_sol = x
+
+        print("\n\n")
+
+        fail = 0.0
+        #funcs = {}
+        #funcs['opt'] = f
+        #funcs['con'] = g
+        #return funcs, fail
+        return f, g, fail
+
+
+    def evaluateTrajectory(self, level=None):
+        # type: (int) -> Tuple[float, List[float], float, Dict]
+        ''' simulate the current trajectory and get objective function value, constraint values, added
+        cost for low torques and trajectory data, at full fidelity or at the given (reduced) level of
+        multiFidelitySchedule (lower sampling frequency, fewer samples checked for collisions) '''
+        collision_step = 10
+        sample_step = 1
+        if level is not None:
+            # use every n-th sample of the full grid
+            sample_step = int(round(1.0 / self.fidelity_schedule[level][0]))
+            collision_step = self.fidelity_schedule[level][1]
+        old_verbose = self.config['verbose']
+        self.config['verbose'] = 0
+        #old_floatingBase = self.config['floatingBase']
+        #self.config['floatingBase'] = 0
+        try:
+            # (only the base regressor is needed)
+            trajectory_data, data = self.sim_func(self.config, self.trajectory, model=self.model,
+                                                  keep_std=False, sample_step=sample_step)
+        finally:
+            self.config['verbose'] = old_verbose
+            #self.config['floatingBase'] = old_floatingBase
+
         f = np.linalg.cond(self.model.YBase)
         #f = np.log(np.linalg.det(model.YBase.T.dot(model.YBase)))   #fisher information matrix
 
@@ -225,13 +323,45 @@ class TrajectoryOptimizer(Optimizer):
         # check collision constraints
         # (for whole trajectory but only get closest distance as constraint value)
         c_s = self.num_constraints - self.num_coll_constraints  # start where collision constraints start
+        g[c_s:] = list(self.getCollisionDistances(trajectory_data['positions'], collision_step))
+
+        return f, g, f1, trajectory_data
+
+    def isPromoted(self, level, f, g):
+        # type: (int, float, List[float]) -> bool
+        ''' if a candidate that was evaluated at a reduced fidelity level is evaluated at the next level.
+        The reduced sample grid is a subset of the full one, so limits that are violated on it are also
+        violated on the full one (except for the minimal velocity) and only feasible candidates with objective values close enough to the
+        best (full fidelity) solution are promoted '''
+        if not self.isFeasible(g):
+            return False
+        return not np.isfinite(self.last_best_f) or f <= self.last_best_f*self.fidelity_schedule[level][2]
+
+    def usesReducedFidelity(self):
+        # type: () -> bool
+        return bool(self.is_global and self.fidelity_schedule)
+
+    def printFidelityStats(self):
+        # type: () -> None
+        if not self.fidelity_schedule:
+            return
+        levels = ['level {} ({}x frequency)'.format(l, self.fidelity_schedule[l][0])
+                  for l in range(len(self.fidelity_schedule))] + ['full fidelity']
+        for l in range(len(levels)):
+            count, duration = self.fidelity_stats[l]
+            print("{}: {} evaluations in {:.1f}s".format(levels[l], count, duration))
+
+    def getCollisionDistances(self, positions, step=10):
+        # type: (np._ArrayLike, int) -> np._ArrayLike
+        ''' get closest distance of each checked link pair over all (every step-th) joint positions '''
+        dists = np.full(self.num_coll_constraints, 1e10)
         if self.config['verbose'] > 1:
             print('checking collisions')
-        for p in range(0, trajectory_data['positions'].shape[0], 10):
+        for p in range(0, positions.shape[0], step):
             g_cnt = 0
             if self.config['verbose'] > 1:
                 print("Sample {}".format(p))
-            q = trajectory_data['positions'][p]
+            q = positions[p]
 
             for l0 in range(self.model.num_links + len(self.world_links)):
                 for l1 in range(self.model.num_links + len(self.world_links)):
@@ -254,55 +384,159 @@ class TrajectoryOptimizer(Optimizer):
 
                     if l0 < l1:
                         d = self.getLinkDistance(l0_name, l1_name, q)
-                        if d < g[c_s+g_cnt]:
-                            g[c_s+g_cnt] = d
+                        if d < dists[g_cnt]:
+                            dists[g_cnt] = d
                         g_cnt += 1
+        return dists
 
-        self.last_g = g
-
-        #add min join torques as second objective
-        if f1 > 0:
-            f+= f1
-            print("added cost: {}".format(f1))
+    def getEvaluationInfo(self):
+        return {'f1': self.last_f1}
 
-        c = self.testConstraints(g)
-        if c:
-            print(Fore.GREEN, end=' ')
+    def getGradientEvaluator(self, opt_prob):
+        if 'analyticGradient' in self.config and self.config['analyticGradient']:
+            if self.config['floatingBase'] or self.config['filterRegressor'] or \
+                    self.config['identifyGravityParamsOnly'] or self.config['useAPriori']:
+                print(Fore.YELLOW + "Analytic gradients are only available for fixed base models without "
+                      "regressor filtering, using finite differences" + Fore.RESET)
+            else:
+                return AnalyticGradient(self.objectiveGradient)
+        return super(TrajectoryOptimizer, self).getGradientEvaluator(opt_prob)
+
+    def getSampleDerivatives(self, times):
+        # type: (np._ArrayLike) -> np._ArrayLike
+        ''' get derivatives of simulated joint angles, velocities and accelerations (rad) with respect
+            to the solution variables, shape (3, len(times), num_dofs, num_vars) '''
+        nf = self.nf[0]
+        ab_len = self.num_dofs*nf
+        num_vars = 1 + self.num_dofs + 2*ab_len
+        scale = np.deg2rad(1.0) if self.config['useDeg'] else 1.0
+        derivatives = np.zeros((3, len(times), self.num_dofs, num_vars))
+        osc_derivatives = self.trajectory.getSampleDerivatives(times)
+        for n in range(self.num_dofs):
+            # oscillator params [wf, q0, a, b] -> solution vector [wf, q, a, b]
+            var_ids = [0, 1+n] + list(range(1+self.num_dofs+n*nf, 1+self.num_dofs+(n+1)*nf)) + \
+                      list(range(1+self.num_dofs+ab_len+n*nf, 1+self.num_dofs+ab_len+(n+1)*nf))
+            for i in range(3):
+                derivatives[i, :, n, var_ids] = osc_derivatives[n][i].T*scale
+        return derivatives
+
+    def objectiveGradient(self, x, f, g):
+        # type: (np._ArrayLike[float], float, np._ArrayLike) -> Tuple[np._ArrayLike, np._ArrayLike, int]
+        ''' get gradient of the objective function and jacobian of the constraints
+
+            The derivatives of the trajectory samples with respect to the solution variables are
+            analytic, chained with the derivatives of the regressor and torques with respect to
+            joint angles, velocities and accelerations (see Model.getRegressorDerivatives) and the
+            derivatives of the condition number (of its largest and smallest singular values).
+            The joint limit constraints use the derivatives at their extreme samples, the
+            collision constraints are differentiated numerically along the change of the joint
+            angles (without simulating again). The number of samples (depending on the pulsation)
+            is taken as constant.
+        '''
+        wf, q, a, b = self.vecToParams(x)
+        self.trajectory.initWithParams(a, b, q, self.nf, wf)
+
+        # sample trajectory as in simulateTrajectory
+        freq = self.config['excitationFrequency']
+        times = np.arange(0, int(self.trajectory.getPeriodLength()*freq)) / freq
+        pos, vel, acc = self.trajectory.getSamples(times)
+        if self.config['useDeg']:
+            pos = np.deg2rad(pos)
+            vel = np.deg2rad(vel)
+            acc = np.deg2rad(acc)
+        d_samples = self.getSampleDerivatives(times)   # angles, velocities, accelerations
+        num_samples = len(times)
+        num_vars = len(x)
+        dofs = self.num_dofs
+
+        # base regressor and its singular vectors
+        m = self.model
+        YStd = np.empty((num_samples*dofs, m.num_identified_params))
+        for t in range(num_samples):
+            YStd[t*dofs:(t+1)*dofs] = m.getRegressor(pos[t], vel[t], acc[t])
+        if not self.config['useStructuralRegressor']:
+            m.computeRegressorLinDepsQR(YStd)
+        if self.config['useBasisProjection']:
+            P = m.B
         else:
-            print(Fore.YELLOW, end=' ')
-
-        print("objective function value: {} (last best: {} + {})".format(f,
-                                                            self.last_best_f-self.last_best_f_f1,
-                                                            self.last_best_f_f1), end=' ')
-        print(Fore.RESET)
-
-        if self.config['verbose']:
-            if self.opt_prob.is_gradient:
-                print("(Gradient evaluation)")
-
-        if self.mpi_rank == 0 and not self.opt_prob.is_gradient and self.config['showOptimizationGraph']:
-            self.xar.append(self.iter_cnt)
-            self.yar.append(f)
-            self.x_constr.append(c)
-            self.updateGraph()
-
-        self.showVisualizerTrajectory(self.trajectory)
-
-        #keep last best solution (some solvers don't keep it)
-        if c and f < self.last_best_f:
-            self.last_best_f = f
-            self.last_best_f_f1 = f1
-            self.last_best_sol = x
-
-        print("\n\n")
-
-        fail = 0.0
-        #funcs = {}
-        #funcs['opt'] = f
-        #funcs['con'] = g
-        #return funcs, fail
-        return f, g, fail
+            P = m.Pb
+        U, S, Vt = la.svd(YStd.dot(P), full_matrices=False)
+
+        # d cond = d s_max / s_min - s_max / s_min^2 * d s_min with d s = u^T dY v
+        W = np.outer(U[:, 0], P.dot(Vt[0]))/S[-1] - np.outer(U[:, -1], P.dot(Vt[-1]))*S[0]/S[-1]**2
+        x_model = m.xStdModel[m.identified_params]
+        torques = YStd.dot(x_model).reshape(num_samples, dofs)
+
+        # derivatives of condition number and torques with respect to angles, velocities, accelerations
+        d_cond = np.empty((num_samples, 3, dofs))
+        d_torques = np.empty((num_samples, 3, dofs, dofs))   # sample, type, joint, torque of joint
+        for t in range(num_samples):
+            _, dY = m.getRegressorDerivatives(pos[t], vel[t], acc[t])
+            d_cond[t] = np.einsum('ijrc,rc->ij', dY, W[t*dofs:(t+1)*dofs])
+            d_torques[t] = dY.dot(x_model)
+        df = np.einsum('tij,itjv->v', d_cond, d_samples)
+
+        def torqueDerivative(t, n):
+            return np.einsum('ij,ijv->v', d_torques[t, :, :, n], d_samples[:, t])
+
+        # added cost for low torques
+        jn = self.model.jointNames
+        for n in range(dofs):
+            t = np.nanargmax(np.abs(torques[:, n]))
+            if self.limits[jn[n]]['torque']*0.1 - np.abs(torques[t, n]) > 0:
+                df -= np.sign(torques[t, n])*torqueDerivative(t, n)
+
+        # constraints
+        dg = np.zeros((self.num_constraints, num_vars))
+        for n in range(dofs):
+            dg[n] = -d_samples[0, np.argmin(pos[:, n]), n]
+            dg[dofs+n] = d_samples[0, np.argmax(pos[:, n]), n]
+            t = np.argmax(np.abs(vel[:, n]))
+            dg[2*dofs+n] = np.sign(vel[t, n])*d_samples[1, t, n]
+            t = np.nanargmax(np.abs(torques[:, n]))
+            dg[3*dofs+n] = np.sign(torques[t, n])*torqueDerivative(t, n)
+            if self.config['minVelocityConstraint']:
+                dg[4*dofs+n] = -dg[2*dofs+n]
+
+        if self.num_coll_constraints:
+            c_s = self.num_constraints - self.num_coll_constraints
+            dists = self.getCollisionDistances(pos)
+            step = 1e-3   # max change of a joint angle (rad)
+            for v in range(num_vars):
+                d_pos = d_samples[0, :, :, v]
+                scale = np.max(np.abs(d_pos))
+                if scale == 0:
+                    continue
+                dists_v = self.getCollisionDistances(pos + d_pos*step/scale)
+                dg[c_s:, v] = (dists_v - dists)/step*scale
+
+        return df, dg, 0
+
+    def getConstraintDependencies(self):
+        # type: () -> np._ArrayLike
+        # angle and velocity limits of a joint only depend on pulsation and the params of that
+        # joint, torques and collisions depend on all (only gives exact zero derivatives,
+        # objectiveFunc ignores constraint_mask as each evaluation simulates the whole trajectory)
+        ab_len = self.num_dofs*self.nf[0]
+        num_vars = 1 + self.num_dofs + 2*ab_len
+        deps = np.ones((self.num_constraints, num_vars), dtype=bool)
+        for n in range(self.num_dofs):
+            joint_vars = np.zeros(num_vars, dtype=bool)
+            joint_vars[0] = True
+            joint_vars[1+n] = True
+            joint_vars[1+self.num_dofs+n*self.nf[0]:1+self.num_dofs+(n+1)*self.nf[0]] = True
+            joint_vars[1+self.num_dofs+ab_len+n*self.nf[0]:1+self.num_dofs+ab_len+(n+1)*self.nf[0]] = True
+            rows = [n, self.num_dofs+n, 2*self.num_dofs+n]
+            if self.config['minVelocityConstraint']:
+                rows.append(4*self.num_dofs+n)
+            deps[rows] = joint_vars
+        return deps
 
+    def keepBest(self, x, f, g, info):
+        old_best_f = self.last_best_f
+        super(TrajectoryOptimizer, self).keepBest(x, f, g, info)
+        if self.last_best_f != old_best_f:
+            self.last_best_f_f1 = info['f1']
 
     def testBounds(self, x):
         #test variable bounds
@@ -319,12 +553,12 @@ class TrajectoryOptimizer(Optimizer):
         return res
 
 
-    def testConstraints(self, g):
+    def testConstraints(self, g, quiet=False):
         g = np.array(g)
         c_s = self.num_constraints - self.num_coll_constraints  # start where collision constraints start
         res = np.all(g[:c_s] <= self.config['minTolConstr'])
         res_c = np.all(g[c_s:] > 0)
-        if not res:
+        if not res and not quiet:
             print("constraints violated:")
             if True in np.in1d(list(range(1, 2*self.num_dofs)), np.where(g >= self.config['minTolConstr'])):
                 print("- angle limits")
@@ -382,17 +616,18 @@ class TrajectoryOptimizer(Optimizer):
         # condition number trajectory
 
         # Instanciate Optimization Problem
-        opt_prob = pyOpt.Optimization('Trajectory optimization', self.objectiveFunc)
+        opt_prob = pyOpt.Optimization('Trajectory optimization', self.evaluate)
         opt_prob.addObj('f')
         self.opt_prob = opt_prob
 
         self.addVarsAndConstraints(opt_prob)
         sol_vec = self.runOptimizer(opt_prob)
+        self.printFidelityStats()
 
         sol_wf, sol_q, sol_a, sol_b = self.vecToParams(sol_vec)
         self.trajectory.initWithParams(sol_a, sol_b, sol_q, self.nf, sol_wf)
 
         if self.config['showOptimizationGraph']:
-            plt.ioff()
+            getPyplot().ioff()
 
         return self.trajectory
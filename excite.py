@@ -38,6 +38,10 @@ config['jointNames'] = iDynTree.StringVector([])
 if not iDynTree.dofsListFromURDF(config['urdf'], config['jointNames']):
     sys.exit()
 config['num_dofs'] = len(config['jointNames'])
+if 'onlineIdentification' in config and config['onlineIdentification'] and config['floatingBase']:
+    print(Fore.RED + "onlineIdentification is only supported for fixed base models, disable it or floatingBase in {}".format(
+        args.config) + Fore.RESET)
+    sys.exit(1)
 
 #append parent dir for relative import
 #import os
@@ -80,19 +84,39 @@ def main():
     if args.dryrun:
         return
 
+    # identify recursively while exciting
+    online = None
+    if 'onlineIdentification' in config and config['onlineIdentification']:
+        from identification.model import Model
+        from identification.online import OnlineIdentification, OnlineWorker
+        online = OnlineIdentification(Model(config, config['urdf']), config, config['excitationFrequency'])
+        if config['exciteMethod'] in ['yarp', 'ros']:
+            # update from a worker thread, receiving the measurements only queues the samples
+            online = OnlineWorker(online)
+
     # excite real robot
     if config['exciteMethod'] == 'yarp':
         from excitation.robotCommunication import yarp_gym
-        yarp_gym.main(config, trajectory, traj_data)
+        yarp_gym.main(config, trajectory, traj_data, online)
     elif config['exciteMethod'] == 'ros':
         from excitation.robotCommunication import ros_moveit
-        ros_moveit.main(config, trajectory, traj_data)
+        ros_moveit.main(config, trajectory, traj_data, online)
     else:
         # or just use simulation data
         print("No excitation method given! Only doing simulation")
+        if online:
+            # stream simulated samples (positions are in rad already)
+            positions = np.rad2deg(traj_data['positions']) if config['useDeg'] else traj_data['positions']
+            for i in range(traj_data['times'].shape[0]):
+                online.addSample(traj_data['times'][i], positions[i], traj_data['torques'][i])
+            online.printResults()
         saveMeasurements(args.filename, traj_data)
         return
 
+    if online:
+        online.stop()
+        online.printResults()
+
     #adapt measured array sizes to input array sizes
     traj_data['Q'] = np.resize(traj_data['Q'], data.samples['positions'].shape)
     traj_data['V'] = np.resize(traj_data['V'], data.samples['velocities'].shape)
@@ -138,6 +162,8 @@ def main():
 def saveMeasurements(filename, data):
     # write sample arrays to data file
     if config['exciteMethod']:
+        # timing statistics of robot communication (scalars, if recorded)
+        timing = {k: data[k] for k in data if k.startswith('timing_')}
         np.savez(filename,
                  positions=data['Q'], positions_raw=data['Qraw'],
                  velocities=data['V'], velocities_raw=data['Vraw'],
@@ -147,7 +173,7 @@ def saveMeasurements(filename, data):
                  target_accelerations=np.deg2rad(data['QddotSent']),
                  base_velocity=data['base_velocity'], base_acceleration=data['base_acceleration'],
                  base_rpy=data['base_rpy'], contacts=data['contacts'],
-                 times=data['T'], frequency=data['measured_frequency'])
+                 times=data['T'], frequency=data['measured_frequency'], **timing)
     else:
         np.savez(filename,
                  positions=data['positions'], positions_raw=data['positions'],
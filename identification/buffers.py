@@ -0,0 +1,111 @@
+from __future__ import division
+from __future__ import absolute_import
+from builtins import object
+from typing import Any, List, Tuple
+import ctypes
+
+import numpy as np
+
+import iDynTree; iDynTree.init_helpers(); iDynTree.init_numpy_helpers()
+
+class DynamicsBuffers(object):
+    ''' One set of iDynTree containers for the per-sample dynamics of a model (robot state,
+        regressor, torque and jacobian outputs), used by the generator or dynamics computations
+        they belong to. They are allocated once and the inputs are written for each sample through
+        numpy views of the container memory instead of creating new objects (with fromList) for
+        each call. The containers are shared, so results need to be copied out (e.g. with toNumPy)
+        before the next sample is set. '''
+
+    def __init__(self, num_dofs, num_outputs, num_params, gravity):
+        # type: (int, int, int, List[float]) -> None
+        self.num_dofs = num_dofs
+
+        # joint state
+        self.q = iDynTree.VectorDynSize(num_dofs)
+        self.dq = iDynTree.VectorDynSize(num_dofs)
+        self.ddq = iDynTree.VectorDynSize(num_dofs)
+
+        # floating base state (base at world origin, only the rotation is set)
+        self.world_T_base = iDynTree.Transform.Identity()
+        self.world_R_base = iDynTree.Rotation.Identity()
+        self.base_velocity = iDynTree.Twist()
+        self.base_acceleration = iDynTree.ClassicalAcc()
+        self.base_acceleration_twist = iDynTree.Twist()   # (regressor generator takes a twist)
+
+        self.gravity = iDynTree.SpatialAcc.fromList(gravity)
+        self.gravity_twist = iDynTree.Twist.fromList(gravity)
+
+        # outputs
+        self.torques = iDynTree.VectorDynSize(num_dofs)
+        self.base_force = iDynTree.Wrench()
+        self.regressor = iDynTree.MatrixDynSize(num_outputs, num_params)
+        self.known_terms = iDynTree.VectorDynSize(num_outputs)
+        self.jacobian = iDynTree.MatrixDynSize(6, num_outputs)
+
+        # numpy views of the input containers (None if a container doesn't expose its memory)
+        self.views = {}
+        for name, shape in [('q', (num_dofs,)), ('dq', (num_dofs,)), ('ddq', (num_dofs,)),
+                            ('world_R_base', (3, 3)), ('base_velocity', (6,)),
+                            ('base_acceleration', (6,)), ('base_acceleration_twist', (6,))]:
+            self.views[name] = self.getView(getattr(self, name), shape)
+
+    @staticmethod
+    def getView(container, shape):
+        # type: (Any, Tuple[int, ...]) -> np._ArrayLike
+        ''' get a numpy array using the (row major) memory of an iDynTree container from its data
+            pointer, None if it is not available from the bindings '''
+        try:
+            address = int(container.data())
+        except (AttributeError, TypeError):
+            return None
+        buf = (ctypes.c_double * int(np.prod(shape))).from_address(address)
+        return np.ctypeslib.as_array(buf).reshape(shape)
+
+    def setVector(self, name, values):
+        # type: (str, np._ArrayLike) -> None
+        ''' set the input container with the given attribute name (e.g. 'q') from a numpy array,
+            written at once through its view or replaced by a new container without one '''
+        view = self.views[name]
+        if view is not None:
+            view[...] = values
+        else:
+            values = np.asarray(values, dtype=np.float64)
+            container = getattr(self, name)
+            if values.ndim == 2:
+                setattr(self, name, type(container)(*values.ravel().tolist()))
+            else:
+                setattr(self, name, type(container).fromList(values.tolist()))
+
+    def setJointState(self, pos, vel, acc):
+        # type: (np._ArrayLike, np._ArrayLike, np._ArrayLike) -> None
+        self.setVector('q', pos)
+        self.setVector('dq', vel)
+        self.setVector('ddq', acc)
+
+    def setBaseState(self, world_R_base, base_vel, base_acc):
+        # type: (np._ArrayLike, np._ArrayLike, np._ArrayLike) -> None
+        ''' set base rotation (see Model.getBaseRotations), base twist and classical acceleration
+            (both in world orientation frame) '''
+        self.setVector('world_R_base', world_R_base)
+        self.world_T_base.setRotation(self.world_R_base)
+        self.setVector('base_velocity', base_vel)
+        self.setVector('base_acceleration', base_acc)
+        self.setVector('base_acceleration_twist', base_acc)
+
+    def setGeneratorState(self, generator, floating_base):
+        # type: (iDynTree.DynamicsRegressorGenerator, bool) -> None
+        ''' set the buffered state for the regressor generator '''
+        if floating_base:
+            generator.setRobotState(self.q, self.dq, self.ddq, self.world_T_base, self.base_velocity,
+                                    self.base_acceleration_twist, self.gravity_twist)
+        else:
+            generator.setRobotState(self.q, self.dq, self.ddq, self.gravity_twist)
+
+    def setDynamicsState(self, dynComp, floating_base):
+        # type: (iDynTree.DynamicsComputations, bool) -> None
+        ''' set the buffered state for a DynamicsComputations instance '''
+        if floating_base:
+            dynComp.setRobotState(self.q, self.dq, self.ddq, self.world_T_base, self.base_velocity,
+                                  self.base_acceleration, self.gravity)
+        else:
+            dynComp.setRobotState(self.q, self.dq, self.ddq, self.gravity)
@@ -12,11 +12,9 @@ import scipy as sp
 from scipy import signal
 from scipy import misc
 from identification.helpers import Timer
+from identification import transforms
 import iDynTree; iDynTree.init_helpers(); iDynTree.init_numpy_helpers()
 
-import matplotlib.pyplot as plt
-from IPython import embed
-
 class Data(object):
     def __init__(self, opt):
         # type: (Dict[str, Any]) -> None
@@ -25,6 +23,7 @@ class Data(object):
         self.num_loaded_samples = 0    # no of samples from file
         self.num_used_samples = 0      # no of samples after skipping
         self.samples = {}     # type: Dict[str, np._ArrayLike]   #selected data (when using block selection)
+        self.contact_frames = []   # type: List[str]   # frame names of contact wrenches in 'contacts' (samples, contacts, 6)
 
         self.usedBlocks = list()     # type: List[int]
         self.unusedBlocks = list()   # type: List[int]
@@ -38,6 +37,8 @@ class Data(object):
         '''load data from numpy array'''
 
         self.samples = self.measurements = data.copy()
+        if 'contacts' in data:
+            self.setContacts(self.samples, data['contacts'])
         self.num_loaded_samples = self.samples['positions'].shape[0]
         self.num_used_samples = self.num_loaded_samples//(self.opt['skipSamples']+1)
         if self.opt['verbose']:
@@ -46,6 +47,26 @@ class Data(object):
         self.inited = True
 
 
+    @staticmethod
+    def getContactArray(contacts, frames):
+        # type: (Dict[str, np._ArrayLike], List[str]) -> np._ArrayLike
+        ''' get contact wrenches of frames from a dict of (samples, 6) arrays as one
+            (samples, contacts, 6) array '''
+        return np.stack([np.asarray(contacts[f], dtype=np.float64) for f in frames], axis=1)
+
+    def setContacts(self, samples, contacts, start=0):
+        # type: (Dict[str, np._ArrayLike], np._ArrayLike, int) -> None
+        ''' store contact wrenches (dict of frame name to (samples, 6) array, wrapped in a 0-d array
+            as in measurement files) as one array in samples['contacts'] and the frame order in
+            contact_frames '''
+        contacts = contacts.item(0) if isinstance(contacts, np.ndarray) else contacts
+        # 'dummy_sim' could be removed but is here for compatibility
+        self.contact_frames = [f for f in contacts.keys() if f != 'dummy_sim']
+        if len(self.contact_frames):
+            samples['contacts'] = self.getContactArray(contacts, self.contact_frames)[start:]
+        elif 'contacts' in samples:
+            del samples['contacts']
+
     def init_from_files(self, measurements_files):
         '''load data from measurements_files, optionally skipping some values'''
 
@@ -68,11 +89,7 @@ class Data(object):
                             if m[k].ndim == 0:
                                 if isinstance(m[k].item(0), dict):
                                     #contacts
-                                    contact_dict = {}
-                                    for c in m[k].item(0).keys():
-                                        if c != 'dummy_sim':   # could be removed but is here for compatibility
-                                            contact_dict[c] = m[k].item(0)[c][so:, :]
-                                    self.measurements[k] = np.array(contact_dict)
+                                    self.setContacts(self.measurements, m[k], so)
                                 else:
                                     self.measurements[k] = m[k]
                             elif m[k].ndim == 1:
@@ -83,12 +100,10 @@ class Data(object):
                             # following files, append data
                             if m[k].ndim == 0:
                                 if isinstance(m[k].item(0), dict):
-                                    #contacts
-                                    contact_dict = {}
-                                    for c in m[k].item(0).keys():
-                                        if c != 'dummy_sim':
-                                            contact_dict[c] = m[k].item(0)[c][so:, :]
-                                    self.measurements[k] = np.array(contact_dict)
+                                    #contacts, append in the frame order of the first file
+                                    wrenches = self.getContactArray(m[k].item(0), self.contact_frames)
+                                    self.measurements[k] = np.concatenate((self.measurements[k], wrenches[so:]),
+                                                                          axis=0)
                                 else:
                                     #TODO: get mean value of scalar values (needs to count how many values then)
                                     self.measurements[k] = m[k]
@@ -119,7 +134,6 @@ class Data(object):
             if self.opt['selectBlocksFromMeasurements']:
                 # fill only with starting block
                 for k in self.measurements.keys():
-                    #TODO: add contacts into this logic as well
                     if self.measurements[k].ndim == 0:
                         self.samples[k] = self.measurements[k]
                     elif self.measurements[k].ndim == 1:
@@ -155,12 +169,28 @@ class Data(object):
         self.num_selected_samples = self.samples['positions'].shape[0]
         self.num_used_samples = self.num_selected_samples//(self.opt['skipSamples']+1)
 
+    def getSampleRange(self, start, end=None):
+        # type: (int, int) -> Data
+        ''' get Data with views of the selected samples from start to end (e.g. to compute
+            regressors only for appended samples) '''
+        data = Data(self.opt)
+        data.contact_frames = self.contact_frames
+        for k in self.samples.keys():
+            if np.ndim(self.samples[k]) == 0:
+                data.samples[k] = self.samples[k]
+            else:
+                data.samples[k] = self.samples[k][start:end]
+        data.updateNumSamples()
+        data.inited = True
+        return data
+
     def removeLastSampleBlock(self):
         if self.opt['verbose']:
             print("removing block starting at {}".format(self.block_pos))
+        # keep view of remaining samples instead of copying
         for k in self.measurements.keys():
-            self.samples[k] = np.delete(self.samples[k], list(range(self.num_selected_samples - self.opt['blockSize'],
-                                                               self.num_selected_samples)), axis=0)
+            if self.samples[k].ndim > 0:
+                self.samples[k] = self.samples[k][:self.num_selected_samples - self.opt['blockSize']]
         self.updateNumSamples()
         if self.opt['verbose']:
             print("we now have {} samples selected (using {})".format(self.num_selected_samples, self.num_used_samples))
@@ -177,7 +207,6 @@ class Data(object):
         if self.opt['verbose']:
             print("getting next block: {}/{}".format(self.block_pos, self.num_loaded_samples))
 
-        #TODO: add contacts into this logic as well
         for k in self.measurements.keys():
             if self.measurements[k].ndim == 0:
                 mv = self.measurements[k]
@@ -297,32 +326,33 @@ class Data(object):
         self.model.getSubregressorsConditionNumbers()
         if self.opt['verbose']:
             print("assembling selected blocks...\n")
-        for k in self.measurements.keys():
-            if not len(self.usedBlocks):
-                break
 
-            #init with first block
-            (b, bs, cond, linkConds) = self.usedBlocks[0]
-            if self.measurements[k].ndim == 0:
-                self.samples[k] = self.measurements[k]
+        if len(self.usedBlocks):
+            # select all rows at once (a view for a single block, otherwise one copy)
+            blocks = [(b, bs) for (b, bs, cond, linkConds) in self.usedBlocks]
+            if len(blocks) == 1:
+                rows = slice(blocks[0][0], blocks[0][0] + blocks[0][1])  # type: Any
             else:
-                self.samples[k] = self.measurements[k][b:b+bs]
+                rows = np.concatenate([np.arange(b, b + bs) for (b, bs) in blocks])
 
-            #append
-            for i in range(1, len(self.usedBlocks)):
-                (b, bs, cond, linkConds) = self.usedBlocks[i]
-                #TODO: add contacts into this logic as well
+            for k in self.measurements.keys():
                 if self.measurements[k].ndim == 0:
                     self.samples[k] = self.measurements[k]
-                elif self.measurements[k].ndim == 1:
-                    mv = self.measurements[k][b:b + bs]
-                    #fix time offsets
-                    mv = mv - mv[0] + (mv[1]-mv[0]) #let values start with first time diff
-                    mv = mv + self.samples[k][-1]   #add after previous times
-                    self.samples[k] = np.concatenate((self.samples[k], mv), axis=0)
-                else:
-                    mv = self.measurements[k][b:b + bs,:]
-                    self.samples[k] = np.concatenate((self.samples[k], mv), axis=0)
+                    continue
+
+                self.samples[k] = self.measurements[k][rows]
+
+                if self.measurements[k].ndim == 1:
+                    #fix time offsets of appended blocks
+                    start = blocks[0][1]
+                    for (b, bs) in blocks[1:]:
+                        mv = self.samples[k][start:start + bs]
+                        first = mv[0]
+                        step = mv[1] - mv[0]
+                        mv -= first     #let values start with first time diff
+                        mv += step
+                        mv += self.samples[k][start-1]   #add after previous times
+                        start += bs
         self.updateNumSamples()
 
 
@@ -331,20 +361,13 @@ class Data(object):
 
         if self.opt['verbose']:
             print("removing near zero samples...", end=' ')
-        to_delete = list()
-        for t in range(self.num_loaded_samples):
-            if np.max(np.abs(self.samples['velocities'][t])) < self.opt['minVel']:
-                to_delete.append(t)
+        vels = self.samples['velocities'][:self.num_loaded_samples]
+        to_delete = np.where(np.max(np.abs(vels), axis=1) < self.opt['minVel'])[0]
 
-        for k in self.samples.keys():
-            if self.samples[k].ndim == 0:
-                #contacts
-                if isinstance(self.samples[k].item(0), dict):
-                    #contacts
-                    for c in self.samples[k].item(0).keys():
-                        self.samples[k].item(0)[c] = np.delete(self.samples[k].item(0)[c], to_delete, 0)
-            else:
-                self.samples[k] = np.delete(self.samples[k], to_delete, 0)
+        if len(to_delete):
+            for k in self.samples.keys():
+                if self.samples[k].ndim > 0:
+                    self.samples[k] = np.delete(self.samples[k], to_delete, 0)
         self.updateNumSamples()
         if self.opt['verbose']:
             print ("remaining samples: {}".format(self.num_used_samples))
@@ -389,6 +412,7 @@ class Data(object):
 
         def plot_filter(b,a):
             # Plot the frequency and phase response of the filter
+            import matplotlib.pyplot as plt
             w, h = sp.signal.freqz(b, a, worN=8000)
             plt.subplot(2, 1, 1)
             plt.plot(0.5*Fs*w / np.pi, np.abs(h), 'b')
@@ -520,13 +544,9 @@ class Data(object):
             if IMUlinVel is not None:
                 #rotate data to (estimated) world frame (iDynTree floating base wants that)
                 #TODO: use quaternions to avoid gimbal lock (orientation estimation needs to give quaternions already)
-                IMUlinAccWorld = np.zeros_like(IMUlinAcc)
-                IMUrotVelWorld = np.zeros_like(IMUrotVel)
-                for i in range(0, IMUlinAcc.shape[0]):
-                    rot = IMUrpy[i, :]
-                    R = iDynTree.Rotation.RPY(rot[0], rot[1], rot[2]).toNumPy()
-                    IMUlinAccWorld[i, :] = R.dot(IMUlinAcc[i, :])
-                    IMUrotVelWorld[i, :] = R.dot(IMUrotVel[i, :])
+                R = transforms.rpyToRotation(IMUrpy)
+                IMUlinAccWorld = transforms.rotateVectors(R, IMUlinAcc)
+                IMUrotVelWorld = transforms.rotateVectors(R, IMUrotVel)
                 np.copyto(IMUrotVel, IMUrotVelWorld)
 
                 grav_norm = np.mean(la.norm(IMUlinAccWorld, axis=1))
@@ -0,0 +1,69 @@
+from __future__ import division
+from __future__ import absolute_import
+from builtins import object
+import copy
+
+import numpy as np
+
+class FrictionRegressor(object):
+    ''' Friction columns of the stacked (std) regressor. For each sample, they are diagonal in the
+        joint rows (zero in floating base rows), so only the terms are stored: terms[n, j, t] is
+        the entry of friction parameter type t of joint j in the row of joint j of sample n
+        (constant friction: 1, symmetric velocity friction: dq, asymmetric: dq+ and dq-). Friction
+        column t*num_dofs+j (relative to friction_params_start) belongs to type t and joint j. '''
+
+    def __init__(self, velocities, num_dofs, fb, gravity_only, symmetric):
+        # type: (np._ArrayLike, int, int, bool, bool) -> None
+        self.num_dofs = num_dofs
+        self.fb = fb
+        self.terms = self.getTerms(np.asarray(velocities, dtype=np.float64), gravity_only, symmetric)
+
+    @staticmethod
+    def getTerms(velocities, gravity_only, symmetric):
+        # type: (np._ArrayLike, bool, bool) -> np._ArrayLike
+        ''' get friction terms (num_samples, num_dofs, friction types) from joint velocities '''
+        terms = [np.ones_like(velocities)]   # offsets/constant friction
+        if not gravity_only:
+            if symmetric:
+                terms.append(velocities)
+            else:
+                terms.append(np.where(velocities > 0, velocities, 0.0))
+                terms.append(np.where(velocities < 0, velocities, 0.0))
+        return np.stack(terms, axis=-1)
+
+    @property
+    def num_samples(self):
+        return self.terms.shape[0]
+
+    @property
+    def num_columns(self):
+        return self.terms.shape[2]*self.num_dofs
+
+    def append(self, other):
+        # type: (FrictionRegressor) -> FrictionRegressor
+        ''' get friction regressor with the samples of other appended '''
+        stacked = copy.copy(self)
+        stacked.terms = np.concatenate((self.terms, other.terms))
+        return stacked
+
+    def dot(self, x):
+        # type: (np._ArrayLike) -> np._ArrayLike
+        ''' product of the friction columns with friction params x (stacked rows) '''
+        out = np.zeros((self.num_samples, self.fb+self.num_dofs))
+        out[:, self.fb:] = np.einsum('njt,tj->nj', self.terms, np.reshape(x, (-1, self.num_dofs)))
+        return out.ravel()
+
+    def project(self, P):
+        # type: (np._ArrayLike) -> np._ArrayLike
+        ''' product of the friction columns with the matrix P (friction rows of a projection) '''
+        out = np.zeros((self.num_samples, self.fb+self.num_dofs, P.shape[1]))
+        out[:, self.fb:] = np.einsum('njt,tjm->njm', self.terms, P.reshape((-1, self.num_dofs, P.shape[1])))
+        return out.reshape((-1, P.shape[1]))
+
+    def toDense(self):
+        # type: () -> np._ArrayLike
+        ''' get friction columns as dense matrix (num_samples*(fb+num_dofs), num_columns) '''
+        dense = np.zeros((self.num_samples, self.fb+self.num_dofs, self.terms.shape[2], self.num_dofs))
+        j = np.arange(self.num_dofs)
+        dense[:, self.fb+j, :, j] = np.swapaxes(self.terms, 0, 1)
+        return dense.reshape((-1, self.num_columns))
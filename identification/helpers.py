@@ -7,6 +7,7 @@ from builtins import object
 import time
 from typing import cast, Any, List, Dict, Iterable, Union, Tuple, AnyStr
 import os
+import copy
 
 import numpy as np
 import numpy.linalg as la
@@ -17,6 +18,7 @@ from colorama import Fore
 from tqdm import tqdm
 
 import iDynTree
+from identification import transforms
 
 #define exception for python < 3
 import sys
@@ -53,35 +55,10 @@ def getNRMSE(data_ref, data_est, normalize=True, limits=None):
         return np.mean(rmsd) * 100
 
 def rotationMatrixToEulerAngles(R):
-    sy = np.sqrt(R[0,0] * R[0,0] +  R[1,0] * R[1,0])
-    singular = sy < 1e-6
-
-    if not singular:
-        x = np.arctan2(R[2,1] , R[2,2])
-        y = np.arctan2(-R[2,0], sy)
-        z = np.arctan2(R[1,0], R[0,0])
-    else:
-        x = np.arctan2(-R[1,2], R[1,1])
-        y = np.arctan2(-R[2,0], sy)
-        z = 0.0
-
-    return np.array([x, y, z])
+    return transforms.rotationToRPY(R)
 
 def eulerAnglesToRotationMatrix(theta):
-    R_x = np.array([[1,         0,                  0               ],
-                    [0,         np.cos(theta[0]), -np.sin(theta[0]) ],
-                    [0,         np.sin(theta[0]), np.cos(theta[0])  ]
-                   ])
-    R_y = np.array([[np.cos(theta[1]),    0,      np.sin(theta[1])  ],
-                    [0,                     1,      0               ],
-                    [-np.sin(theta[1]),   0,      np.cos(theta[1])  ]
-                   ])
-    R_z = np.array([[np.cos(theta[2]),    -np.sin(theta[2]),    0],
-                    [np.sin(theta[2]),    np.cos(theta[2]),     0],
-                    [0,                     0,                  1]
-                   ])
-    R = np.dot(R_z, np.dot( R_y, R_x ))
-    return R
+    return transforms.rpyToRotation(theta)
 
 class Progress(object):
     def __init__(self, config):
@@ -352,29 +329,242 @@ class ParamHelpers(object):
                     params[start+nd+nd+i] = friction[j]['f_velocity']
 
 
+class RobotDescription(object):
+    ''' process wide registry of parsed robot descriptions. Each URDF file is parsed only once,
+        the derived data (joint limits, friction, link geometry, neighbors, mesh bounds and meshes)
+        is computed on first request and kept until the file changes on disk. '''
+
+    _registry = {}   # type: Dict[str, RobotDescription]
+
+    @classmethod
+    def get(cls, urdf_file):
+        # type: (str) -> RobotDescription
+        ''' return the (cached) description for urdf_file, reload if the file was modified '''
+        path = os.path.abspath(urdf_file)
+        mtime = os.path.getmtime(path)
+        desc = cls._registry.get(path)
+        if desc is None or desc.mtime != mtime:
+            desc = cls(path, mtime)
+            cls._registry[path] = desc
+        return desc
+
+    @classmethod
+    def clear(cls):
+        # type: () -> None
+        cls._registry = {}
+
+    def __init__(self, urdf_file, mtime):
+        # type: (str, float) -> None
+        self.urdf_file = urdf_file
+        self.mtime = mtime
+
+        with open(urdf_file, 'r') as f:
+            self.xml = f.read()
+
+        # preserve comments
+        class PCBuilder(ET.TreeBuilder):
+            def comment(self, data):
+                self.start(ET.Comment, {})
+                self.data(data)
+                self.end(ET.Comment)
+        parser = ET.XMLParser(target=PCBuilder())
+        parser.feed(self.xml)
+        self.tree = ET.ElementTree(parser.close())
+
+        self._joint_limits = None    # type: Dict[str, Dict[str, float]]
+        self._joint_friction = None  # type: Dict[str, Dict[str, float]]
+        self._idyn_model = None      # type: iDynTree.Model
+        self._neighbors = {}         # type: Dict[bool, Dict[str, Dict[str, List[int]]]]
+        self._model_params = {}      # type: Dict[str, np._ArrayLike]
+        self._link_geometry = {}     # type: Dict[str, Tuple[List[float], List[float], List[float]]]
+        self._meshes = {}            # type: Dict[str, Any]
+        self._mesh_bounds = {}       # type: Dict[str, np._ArrayLike]
+        self._joints = None          # type: List[Dict[str, Any]]
+
+    def getTree(self, copy_tree=False):
+        # type: (bool) -> ET.ElementTree
+        ''' get parsed xml tree. Use copy_tree=True if the tree is going to be modified. '''
+        if copy_tree:
+            return copy.deepcopy(self.tree)
+        return self.tree
+
+    def getJointLimits(self):
+        # type: () -> Dict[str, Dict[str, float]]
+        ''' joint limits of revolute joints (in rad) '''
+        if self._joint_limits is None:
+            limits = {}    # type: Dict[str, Dict[str, float]]
+            for j in self.tree.findall('joint'):
+                name = j.attrib['name']
+                if j.attrib['type'] == 'revolute':
+                    l = j.find('limit')
+                    if l is not None:
+                        limits[name] = {}
+                        limits[name]['torque'] = float(l.attrib['effort'])  #this is not really the physical limit but controller limit
+                        limits[name]['lower'] = float(l.attrib['lower'])
+                        limits[name]['upper'] = float(l.attrib['upper'])
+                        limits[name]['velocity'] = float(l.attrib['velocity'])
+            self._joint_limits = limits
+        return self._joint_limits
+
+    def getJointFriction(self):
+        # type: () -> Dict[str, Dict[str, float]]
+        ''' friction values (joint friction = fc, damping = fv) of revolute joints '''
+        if self._joint_friction is None:
+            friction = {}  # type: Dict[str, Dict[str, float]]
+            for j in self.tree.findall('joint'):
+                name = j.attrib['name']
+                constant = 0.0
+                vel_dependent = 0.0
+                if j.attrib['type'] == 'revolute':
+                    l = j.find('dynamics')
+                    if l is not None:
+                        try:
+                            constant = float(l.attrib['friction'])
+                        except KeyError:
+                            constant = 0
+
+                        try:
+                            vel_dependent = float(l.attrib['damping'])
+                        except KeyError:
+                            vel_dependent = 0
+
+                    friction[name] = {}
+                    friction[name]['f_constant'] = constant
+                    friction[name]['f_velocity'] = vel_dependent
+            self._joint_friction = friction
+        return self._joint_friction
+
+    def getJoints(self):
+        # type: () -> List[Dict[str, Any]]
+        ''' kinematic description of the joints (type, parent and child link, origin and axis),
+            ordered so that the parent link of each joint is the root or a child of a previous one '''
+        if self._joints is None:
+            joints = []  # type: List[Dict[str, Any]]
+            for j in self.tree.findall('joint'):
+                origin = j.find('origin')
+                xyz = rpy = '0 0 0'
+                if origin is not None:
+                    xyz = origin.attrib.get('xyz', xyz)
+                    rpy = origin.attrib.get('rpy', rpy)
+                axis = j.find('axis')
+                axis = axis.attrib.get('xyz', '1 0 0') if axis is not None else '1 0 0'
+                joints.append({'name': j.attrib['name'], 'type': j.attrib['type'],
+                               'parent': j.find('parent').attrib['link'],
+                               'child': j.find('child').attrib['link'],
+                               'xyz': np.array([float(i) for i in xyz.split()]),
+                               'rpy': np.array([float(i) for i in rpy.split()]),
+                               'axis': np.array([float(i) for i in axis.split()])})
+
+            # sort from the root(s) outwards
+            children = set([j['child'] for j in joints])
+            known = set([j['parent'] for j in joints]).difference(children)
+            ordered = []  # type: List[Dict[str, Any]]
+            while len(ordered) < len(joints):
+                added = [j for j in joints if j['parent'] in known and j['child'] not in known]
+                if not added:
+                    break
+                for j in added:
+                    known.add(j['child'])
+                ordered.extend(added)
+            self._joints = ordered
+        return self._joints
+
+    def getIDynTreeModel(self):
+        # type: () -> iDynTree.Model
+        if self._idyn_model is None:
+            self._idyn_model = iDynTree.Model()
+            iDynTree.modelFromURDFString(self.xml, self._idyn_model)
+        return self._idyn_model
+
+    def getNeighbors(self, connected=True):
+        # type: (bool) -> Dict[str, Dict[str, List[int]]]
+        if connected not in self._neighbors:
+            self._neighbors[connected] = URDFHelpers.getNeighbors(self.getIDynTreeModel(), connected)
+        return self._neighbors[connected]
+
+    def getModelParameters(self, regrXml):
+        # type: (str) -> np._ArrayLike[float]
+        ''' get the inertial parameters (link frame relative) as ordered by a regressor structure '''
+        if regrXml not in self._model_params:
+            generator = iDynTree.DynamicsRegressorGenerator()
+            if not generator.loadRobotAndSensorsModelFromString(self.xml):
+                sys.exit()
+            #set regressor, otherwise getModelParameters segfaults
+            generator.loadRegressorStructureFromString(regrXml)
+            params = iDynTree.VectorDynSize(generator.getNrOfParameters())
+            generator.getModelParameters(params)
+            self._model_params[regrXml] = params.toNumPy()
+        return self._model_params[regrXml].copy()
+
+    def getLinkGeometry(self, link_name):
+        # type: (str) -> Tuple[List[float], List[float], List[float]]
+        ''' get box size, position and rotation of <visual> or <collision> box of a link '''
+        if link_name in self._link_geometry:
+            return self._link_geometry[link_name]
+
+        def getBoxAttribs(m, l):
+            box_size = m.attrib['size']
+            m = l.find('visual/origin')
+            if m is not None:
+                try:
+                    box_pos = m.attrib['xyz']
+                except:
+                    box_pos = '0 0 0'
+
+                try:
+                    box_rpy = m.attrib['rpy']
+                except:
+                    box_rpy = '0 0 0'
+            else:
+                box_pos = box_rpy = '0 0 0'
+            return box_size, box_pos, box_rpy
+
+        box_size = box_pos = box_rpy = [0.0, 0.0, 0.0]
+        for l in self.tree.findall('link'):
+            if l.attrib['name'] == link_name:
+                m = l.find('visual/geometry/box')
+                if m is not None:
+                    box_size, box_pos, box_rpy = getBoxAttribs(m, l)
+                else:
+                    m = l.find('visual/collision/box')
+                    if m is not None:
+                        box_size, box_pos, box_rpy = getBoxAttribs(m, l)
+                    else:
+                        box_size = box_pos = box_rpy = '0 0 0'   # type: ignore
+                box_size = [float(i) for i in box_size.split()]
+                box_pos = [float(i) for i in box_pos.split()]
+                box_rpy = [float(i) for i in box_rpy.split()]
+                break
+        self._link_geometry[link_name] = (box_size, box_pos, box_rpy)
+        return self._link_geometry[link_name]
+
+    def getMesh(self, mesh_file):
+        # type: (str) -> trimesh.Trimesh
+        ''' load a mesh file only once (don't modify the returned mesh in place) '''
+        if mesh_file not in self._meshes:
+            import trimesh
+            self._meshes[mesh_file] = trimesh.load_mesh(mesh_file)
+        return self._meshes[mesh_file]
+
+    def getMeshBounds(self, mesh_file):
+        # type: (str) -> np._ArrayLike[float]
+        ''' get axis aligned bounds of unscaled mesh as [[min x,y,z], [max x,y,z]] '''
+        if mesh_file not in self._mesh_bounds:
+            self._mesh_bounds[mesh_file] = np.array(self.getMesh(mesh_file).bounding_box.bounds)
+        return self._mesh_bounds[mesh_file].copy()
+
+
 class URDFHelpers(object):
     def __init__(self, paramHelpers, model, opt):
         # type: (ParamHelpers, model.Model, Dict) -> None
         self.paramHelpers = paramHelpers
         self.model = model
         self.opt = opt
-        self.parsed_xml = {}   # type: Dict[ET]
 
     def parseURDF(self, input_urdf):
         # type: (str) -> ET
-
-        try:
-            return self.parsed_xml[input_urdf]
-        except KeyError:
-            # preserve comments
-            class PCBuilder(ET.TreeBuilder):
-                def comment(self, data):
-                    self.start(ET.Comment, {})
-                    self.data(data)
-                    self.end(ET.Comment)
-            tree = ET.parse(input_urdf, parser=ET.XMLParser(target=PCBuilder()))
-            self.parsed_xml[input_urdf] = tree
-            return tree
+        ''' get the (shared) parsed tree of a urdf file. Don't modify the returned tree. '''
+        return RobotDescription.get(input_urdf).getTree()
 
     def replaceParamsInURDF(self, input_urdf, output_urdf, new_params):
         # type: (str, str, np._ArrayLike[float]) -> None
@@ -389,7 +579,8 @@ class URDFHelpers(object):
             per_link = 10
             xStdBary = self.paramHelpers.paramsLink2Bary(new_params)
 
-        tree = self.parseURDF(input_urdf)
+        # work on a copy, the parsed tree is shared
+        tree = RobotDescription.get(input_urdf).getTree(copy_tree=True)
 
         for l in tree.findall('link'):
             if l.attrib['name'] in self.model.linkNames:
@@ -482,43 +673,7 @@ class URDFHelpers(object):
     def getLinkGeometry(self, input_urdf, link_name):
         # type: (str, str) -> Tuple[List[float], List[float], List[float]]
 
-        tree = self.parseURDF(input_urdf)
-
-        def getBoxAttribs(m, l):
-            box_size = m.attrib['size']
-            m = l.find('visual/origin')
-            if m is not None:
-                try:
-                    box_pos = m.attrib['xyz']
-                except:
-                    box_pos = '0 0 0'
-
-                try:
-                    box_rpy = m.attrib['rpy']
-                except:
-                    box_rpy = '0 0 0'
-            else:
-                box_pos = box_rpy = '0 0 0'
-            return box_size, box_pos, box_rpy
-
-        box_size = box_pos = box_rpy = [0.0, 0.0, 0.0]
-        for l in tree.findall('link'):
-            if l.attrib['name'] == link_name:
-                link_found = True
-                m = l.find('visual/geometry/box')
-                if m is not None:
-                    box_size, box_pos, box_rpy = getBoxAttribs(m, l)
-                else:
-                    m = l.find('visual/collision/box')
-                    if m is not None:
-                        box_size, box_pos, box_rpy = getBoxAttribs(m, l)
-                    else:
-                        box_size = box_pos = box_rpy = '0 0 0'   # type: ignore
-                box_size = [float(i) for i in box_size.split()]
-                box_pos = [float(i) for i in box_pos.split()]
-                box_rpy = [float(i) for i in box_rpy.split()]
-                break
-        return (box_size, box_pos, box_rpy)
+        return RobotDescription.get(input_urdf).getLinkGeometry(link_name)
 
     @staticmethod
     def getNeighbors(idyn_model, connected=True):
@@ -565,7 +720,6 @@ class URDFHelpers(object):
             If no mesh file is found, a cube around the old COM is returned.
             Expects old_com in barycentric form! '''
 
-        import trimesh
         filename = self.getMeshPath(input_urdf, link_name)
 
         # box around current COM in case no mesh is availabe
@@ -580,7 +734,6 @@ class URDFHelpers(object):
         rot_0 = np.identity(3)
 
         if filename and os.path.exists(filename):
-            mesh = trimesh.load_mesh(filename)
             #TODO: get geometry origin attributes, rotate and shift mesh data
 
             #gazebo and urdf use 1m for 1 stl unit
@@ -588,7 +741,7 @@ class URDFHelpers(object):
             scale_y = float(self.mesh_scaling.split()[1])
             scale_z = float(self.mesh_scaling.split()[2])
 
-            bounding_box = mesh.bounding_box.bounds * scale_x * hullScale
+            bounding_box = RobotDescription.get(input_urdf).getMeshBounds(filename) * scale_x * hullScale
 
             # switch order of min/max if scaling is negative
             for s in range(0,3):
@@ -610,33 +763,12 @@ class URDFHelpers(object):
     @staticmethod
     def getJointLimits(input_urdf, use_deg=False):
         # type: (str, bool) -> Dict[str, Dict[str, float]]
-        import xml.etree.ElementTree as ET
-        tree = ET.parse(input_urdf)
-        limits = {}    # type: Dict[str, Dict[str, float]]
-        for j in tree.findall('joint'):
-            name = j.attrib['name']
-            torque = 0.0
-            lower = 0.0
-            upper = 0.0
-            velocity = 0.0
-            if j.attrib['type'] == 'revolute':
-                l = j.find('limit')
-                if l is not None:
-                    torque = float(l.attrib['effort'])  #this is not really the physical limit but controller limit
-                    lower = float(l.attrib['lower'])
-                    upper = float(l.attrib['upper'])
-                    velocity = float(l.attrib['velocity'])
-
-                    limits[name] = {}
-                    limits[name]['torque'] = float(torque)
-                    if use_deg:
-                        limits[name]['lower'] = np.rad2deg(lower)
-                        limits[name]['upper'] = np.rad2deg(upper)
-                        limits[name]['velocity'] = np.rad2deg(velocity)
-                    else:
-                        limits[name]['lower'] = lower
-                        limits[name]['upper'] = upper
-                        limits[name]['velocity'] = velocity
+        limits = copy.deepcopy(RobotDescription.get(input_urdf).getJointLimits())
+        if use_deg:
+            for name in limits:
+                limits[name]['lower'] = np.rad2deg(limits[name]['lower'])
+                limits[name]['upper'] = np.rad2deg(limits[name]['upper'])
+                limits[name]['velocity'] = np.rad2deg(limits[name]['velocity'])
         return limits
 
     @staticmethod
@@ -644,27 +776,4 @@ class URDFHelpers(object):
         # type: (AnyStr) -> Dict[AnyStr, Dict[AnyStr, float]]
         ''' return friction values for each revolute joint from a urdf'''
 
-        import xml.etree.ElementTree as ET
-        tree = ET.parse(input_urdf)
-        friction = {}  # type: Dict[AnyStr, Dict[AnyStr, float]]
-        for j in tree.findall('joint'):
-            name = j.attrib['name']
-            constant = 0.0
-            vel_dependent = 0.0
-            if j.attrib['type'] == 'revolute':
-                l = j.find('dynamics')
-                if l is not None:
-                    try:
-                        constant = float(l.attrib['friction'])
-                    except KeyError:
-                        constant = 0
-
-                    try:
-                        vel_dependent = float(l.attrib['damping'])
-                    except KeyError:
-                        vel_dependent = 0
-
-                friction[name] = {}
-                friction[name]['f_constant'] = constant
-                friction[name]['f_velocity'] = vel_dependent
-        return friction
+        return copy.deepcopy(RobotDescription.get(input_urdf).getJointFriction())
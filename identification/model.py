@@ -4,25 +4,32 @@ from __future__ import division
 from builtins import range
 from builtins import object
 import sys
-from typing import Any, Dict, List
+import hashlib
+from typing import Any, Dict, List, Tuple
 
 import numpy as np
 import numpy.linalg as la
 from scipy import signal
 import scipy.linalg as sla
-import sympy
-from sympy import symbols, Matrix
+
+from colorama import Fore
 
 import iDynTree; iDynTree.init_helpers(); iDynTree.init_numpy_helpers()
 import identification.helpers as helpers
-from identification.quaternion import Quaternion
+from identification import transforms
+from identification.friction import FrictionRegressor
+from identification.buffers import DynamicsBuffers
 from identification.data import Data
 
-from IPython import embed
-
 np.core.arrayprint._line_width = 160
 
 class Model(object):
+    # options that change the rows computed by computeRegressors
+    regressor_options = ['skipSamples', 'floatingBase', 'identifyFriction', 'identifyGravityParamsOnly',
+                         'identifySymmetricVelFriction', 'useStructuralRegressor', 'useBasisProjection',
+                         'filterRegressor', 'simulateTorques', 'useAPriori', 'useRBDL',
+                         'useRegressorForSimulation', 'regressorFloat32', 'addContacts', 'useStaticRegressor']
+
     def __init__(self, opt, urdf_file, regressor_file=None, regressor_init=True):
         # (Dict[str, Any, str, str]) -> None
         self.urdf_file = urdf_file
@@ -42,9 +49,12 @@ class Model(object):
         self.opt['useRegressorForSimulation'] = 0
         self.opt['addContacts'] = 1
 
+        # urdf is parsed only once and shared with other users of the same file
+        self.description = helpers.RobotDescription.get(urdf_file)
+
         # create generator instance and load model
         self.generator = iDynTree.DynamicsRegressorGenerator()
-        ret = self.generator.loadRobotAndSensorsModelFromFile(urdf_file)
+        ret = self.generator.loadRobotAndSensorsModelFromString(self.description.xml)
         if not ret:
             sys.exit()
 
@@ -94,6 +104,17 @@ class Model(object):
                 </regressor>'''
         self.generator.loadRegressorStructureFromString(regrXml)
         self.regrXml = regrXml
+        self.regressor_file = regressor_file
+
+        # kinematic structure for batch computation of static regressors (None: not checked yet)
+        self.static_regressor = None   # type: Dict[str, Any]
+
+        # stacked regressor of the data (without friction columns, see YStd)
+        self.regressor_stack = None   # type: np._ArrayLike
+        self.friction_regressor = None   # type: FrictionRegressor
+        self._YStd = None   # type: np._ArrayLike
+        # stacked rows of the data (to append rows of new samples, see appendRegressors)
+        self.regressor_state = None   # type: Dict[str, Any]
 
         if not regressor_file:
             import re
@@ -179,7 +200,10 @@ class Model(object):
             self.rbdlModel = rbdl.loadModel(self.urdf_file, floating_base=self.opt['floatingBase'], verbose=False)
             self.rbdlModel.gravity = np.array(self.gravity[0:3])
         self.dynComp = iDynTree.DynamicsComputations()
-        self.dynComp.loadRobotModelFromFile(self.urdf_file)
+        self.dynComp.loadRobotModelFromString(self.description.xml)
+
+        # iDynTree containers reused for the dynamics of each sample
+        self.buffers = self.getDynamicsBuffers()
 
         # get model parameters
         xStdModel = iDynTree.VectorDynSize(self.generator.getNrOfParameters())
@@ -205,79 +229,102 @@ class Model(object):
 
     def simulateDynamicsRBDL(self, samples, sample_idx, dynComp=None, xStdModel=None):
         # type: (Dict[str, np._ArrayLike], int, iDynTree.DynamicsComputations, np._ArrayLike[float]) -> np._ArrayLike[float]
+        ''' compute torques for one time step of measurements with RBDL (see simulateTrajectoryRBDL) '''
+        return self.simulateTrajectoryRBDL(samples, [sample_idx], xStdModel)[0]
+
+    def simulateTrajectoryRBDL(self, samples, sample_idx=None, xStdModel=None, rbdlModel=None):
+        # type: (Dict[str, np._ArrayLike], np._ArrayLike[int], np._ArrayLike[float], Any) -> np._ArrayLike[float]
+        ''' compute torques (with base forces first for floating base) for the samples at
+            sample_idx (all if None) with RBDL. The RBDL state vectors of all samples are built at
+            once in preallocated buffers and inverse dynamics writes into rows of the torque buffer. '''
         import rbdl
 
-        # read sample data
-        q = samples['positions'][sample_idx]
-        qdot = samples['velocities'][sample_idx]
-        qddot = samples['accelerations'][sample_idx]
-        fb = 0
-
         if xStdModel is None:
             xStdModel = self.xStdModel
+        if rbdlModel is None:
+            rbdlModel = self.rbdlModel
+        if sample_idx is None:
+            sample_idx = np.arange(samples['positions'].shape[0])
 
-        if self.opt['floatingBase']:
-            fb = 6
-            # The twist (linear/angular velocity) of the base, expressed in the world
-            # orientation frame and with respect to the base origin
-            # (samples are base frame)
-            base_velocity = samples['base_velocity'][sample_idx]
-            # The 6d classical acceleration (linear/angular acceleration) of the base
-            # expressed in the world orientation frame and with respect to the base
-            # origin
-            # (samples are base frame)
-            base_acc = samples['base_acceleration'][sample_idx]
-            rpy = samples['base_rpy'][sample_idx]
-
-            # the first three elements (0,1,2) of q are the position variables of the floating body
-            # elements 3,4,5 of q are the x,y,z components of the quaternion of the floating body
-            # the w component of the quaternion is appended at the end (?)
-            rotq = Quaternion.fromRPY(rpy[0], rpy[1], rpy[2])
-            q = np.concatenate((np.array([0,0,0]), rotq[0:3], q, np.array([rotq[3]])))
-
-            #q = np.concatenate((np.array([0,0,0, 0,0,0]), q, np.array([0])))
-            #how to get body id of base link (joint)?
-            #self.rbdlModel.SetQuaternion(4, rotq, q)
+        q, qdot, qddot = self.getRBDLStates(samples, sample_idx)
 
-            # the first three elements (0,1,2) of qdot is the linear velocity of the floating body
-            # elements 3,4,5 of qdot is the angular velocity of the floating body
-            # (world or base frame?)
-            qdot = np.concatenate([base_velocity, qdot])
-
-            # the first three elements (0,1,2) of qddot is the linear acceleration of the floating body
-            # elements 3,4,5 of qddot is the angular acceleration of the floating body
-            # (world or base frame?)
-            qddot = np.concatenate([base_acc, qddot])
-
-        # compute inverse dynamics with rbdl
+        # compute inverse dynamics with rbdl (rows of C ordered buffers are passed without copies)
         tau = np.zeros_like(qdot)
-        rbdl.InverseDynamics(self.rbdlModel, q, qdot, qddot, tau)
+        for n in range(q.shape[0]):
+            rbdl.InverseDynamics(rbdlModel, q[n], qdot[n], qddot[n], tau[n])
 
         if self.opt['identifyFriction']:
-            # add friction torques
-            # constant
-            sign = 1 #np.sign(vel)
-            p_constant = range(self.friction_params_start, self.friction_params_start+self.num_dofs)
-            tau[fb:] += sign*xStdModel[p_constant]
-
-            # vel dependents
-            if not self.opt['identifyGravityParamsOnly']:
-                # (take only first half of params as they are not direction dependent in urdf anyway)
-                p_vel = range(self.friction_params_start+self.num_dofs, self.friction_params_start+self.num_dofs*2)
-                tau[fb:] += xStdModel[p_vel]*qdot[fb:]
+            self.addFrictionTorques(tau, qdot[:, qdot.shape[1]-self.num_dofs:], xStdModel)
 
         return tau
 
+    def getRBDLStates(self, samples, sample_idx):
+        # type: (Dict[str, np._ArrayLike], np._ArrayLike[int]) -> Tuple[np._ArrayLike, np._ArrayLike, np._ArrayLike]
+        ''' get the RBDL q, qdot and qddot vectors of the samples at sample_idx as rows of C ordered
+            arrays '''
+        # read sample data (once for all samples)
+        pos = np.asarray(samples['positions'][sample_idx], dtype=np.float64)
+        vel = np.asarray(samples['velocities'][sample_idx], dtype=np.float64)
+        acc = np.asarray(samples['accelerations'][sample_idx], dtype=np.float64)
+        num_samples = pos.shape[0]
 
-    def simulateDynamicsIDynTree(self, samples, sample_idx, dynComp=None, xStdModel=None):
-        # type: (Dict[str, np._ArrayLike], int, iDynTree.DynamicsComputations, np._ArrayLike[float]) -> np._ArrayLike[float]
-        """ compute torques for one time step of measurements """
+        if self.opt['floatingBase']:
+            fb = 6
+            # the first three elements (0,1,2) of q are the position variables of the floating body
+            # elements 3,4,5 of q are the x,y,z components of the quaternion of the floating body
+            # the w component of the quaternion is appended at the end
+            rotq = transforms.quaternionFromRPY(samples['base_rpy'][sample_idx])
+            q = np.zeros((num_samples, fb+pos.shape[1]+1))
+            q[:, 3:6] = rotq[:, 0:3]
+            q[:, 6:-1] = pos
+            q[:, -1] = rotq[:, 3]
+
+            # the first three elements (0,1,2) of qdot and qddot are the linear velocity and
+            # acceleration of the floating body, elements 3,4,5 are the angular ones (base twist
+            # and classical acceleration as for iDynTree)
+            qdot = np.empty((num_samples, fb+vel.shape[1]))
+            qdot[:, :fb] = samples['base_velocity'][sample_idx]
+            qdot[:, fb:] = vel
+            qddot = np.empty((num_samples, fb+acc.shape[1]))
+            qddot[:, :fb] = samples['base_acceleration'][sample_idx]
+            qddot[:, fb:] = acc
+        else:
+            q = np.ascontiguousarray(pos)
+            qdot = np.ascontiguousarray(vel)
+            qddot = np.ascontiguousarray(acc)
+        return q, qdot, qddot
+
+    def addFrictionTorques(self, tau, vel, xStdModel):
+        # type: (np._ArrayLike, np._ArrayLike, np._ArrayLike[float]) -> None
+        ''' add friction torques of the joint velocities vel (samples, dofs) to the last num_dofs
+            columns of tau (in place) '''
+        fb = tau.shape[1] - self.num_dofs
+        # constant
+        sign = 1 #np.sign(vel)
+        p_constant = range(self.friction_params_start, self.friction_params_start+self.num_dofs)
+        tau[:, fb:] += sign*xStdModel[p_constant]
+
+        # vel dependents
+        if not self.opt['identifyGravityParamsOnly']:
+            # (take only first half of params as they are not direction dependent in urdf anyway)
+            p_vel = range(self.friction_params_start+self.num_dofs, self.friction_params_start+self.num_dofs*2)
+            tau[:, fb:] += xStdModel[p_vel]*vel
+
+
+    def simulateDynamicsIDynTree(self, samples, sample_idx, dynComp=None, xStdModel=None, world_R_base=None,
+                                 buffers=None):
+        # type: (Dict[str, np._ArrayLike], int, iDynTree.DynamicsComputations, np._ArrayLike[float], np._ArrayLike, DynamicsBuffers) -> np._ArrayLike[float]
+        """ compute torques for one time step of measurements (for floating base, the base rotation
+            can be given if already computed for all samples, see getBaseRotations). another
+            dynComp is used with its own buffers (new ones if not given, see getDynamicsBuffers) """
 
         if not dynComp:
             dynComp = self.dynComp
+            buffers = self.buffers
+        elif buffers is None:
+            buffers = self.getDynamicsBuffers()
         if xStdModel is None:
             xStdModel = self.xStdModel
-        world_gravity = iDynTree.SpatialAcc.fromList(self.gravity)
 
         # read sample data
         pos = samples['positions'][sample_idx]
@@ -285,52 +332,30 @@ class Model(object):
         acc = samples['accelerations'][sample_idx]
 
         # system state for iDynTree
-        q = iDynTree.VectorDynSize.fromList(pos)
-        dq = iDynTree.VectorDynSize.fromList(vel)
-        ddq = iDynTree.VectorDynSize.fromList(acc)
+        buffers.setJointState(pos, vel, acc)
 
         # calc torques and forces with iDynTree dynamicsComputation class
         if self.opt['floatingBase']:
             base_vel = samples['base_velocity'][sample_idx]
             base_acc = samples['base_acceleration'][sample_idx]
-            rpy = samples['base_rpy'][sample_idx]
+            if world_R_base is None:
+                world_R_base = self.getBaseRotations(samples['base_rpy'][sample_idx])
 
             # get the homogeneous transformation that transforms vectors expressed
             # in the base reference frame to frames expressed in the world
             # reference frame, i.e. pos_world = world_T_base*pos_base
             # for identification purposes, the position does not matter but rotation is taken
             # from IMU estimation. The gravity, base velocity and acceleration all need to be
-            # expressed in world frame
-            rot = iDynTree.Rotation.RPY(rpy[0], rpy[1], rpy[2])
-            pos = iDynTree.Position.Zero()
-            world_T_base = iDynTree.Transform(rot, pos).inverse()
-
-            '''
-            # rotate base vel and acc to world frame
-            to_world = world_T_base.getRotation().toNumPy()
-            base_vel[0:3] = to_world.dot(base_vel[0:3])
-            base_vel[3:] = to_world.dot(base_vel[3:])
-            base_acc[0:3] = to_world.dot(base_acc[0:3])
-            base_acc[3:] = to_world.dot(base_acc[3:])
-            '''
-
-            # The twist (linear, angular velocity) of the base, expressed in the world
+            # expressed in world frame. The twist (linear, angular velocity) and the 6d classical
+            # acceleration (linear, angular acceleration) of the base are expressed in the world
             # orientation frame and with respect to the base origin
-            base_velocity = iDynTree.Twist.fromList(base_vel)
-            # The 6d classical acceleration (linear, angular acceleration) of the base
-            # expressed in the world orientation frame and with respect to the base origin
-            base_acceleration = iDynTree.ClassicalAcc.fromList(base_acc)
+            buffers.setBaseState(world_R_base, base_vel, base_acc)
 
-            dynComp.setRobotState(q, dq, ddq, world_T_base, base_velocity, base_acceleration,
-                                  world_gravity)
-        else:
-            dynComp.setRobotState(q, dq, ddq, world_gravity)
+        buffers.setDynamicsState(dynComp, self.opt['floatingBase'])
 
         # compute inverse dynamics
-        torques = iDynTree.VectorDynSize(self.num_dofs)
-        baseReactionForce = iDynTree.Wrench()
-        dynComp.inverseDynamics(torques, baseReactionForce)
-        torques = torques.toNumPy()
+        dynComp.inverseDynamics(buffers.torques, buffers.base_force)
+        torques = buffers.torques.toNumPy()
 
         if self.opt['identifyFriction']:
             # add friction torques
@@ -346,17 +371,377 @@ class Model(object):
                 torques += xStdModel[p_vel]*vel
 
         if self.opt['floatingBase']:
-            return np.concatenate((baseReactionForce.toNumPy(), torques))
+            return np.concatenate((buffers.base_force.toNumPy(), torques))
         else:
             return torques
 
-    def computeRegressors(self, data, only_simulate=False):
-        # type: (Model, Data, bool) -> (None)
+    def getDynamicsBuffers(self):
+        # type: () -> DynamicsBuffers
+        ''' get new iDynTree containers for the per-sample dynamics of this model (the ones of
+            generator and dynComp are in self.buffers) '''
+        return DynamicsBuffers(self.num_dofs, self.N_OUT, self.num_model_params, self.gravity)
+
+    @staticmethod
+    def getBaseRotations(base_rpy):
+        # type: (np._ArrayLike) -> np._ArrayLike
+        ''' get rotations from base to world frame (world_R_base) for (N, 3) or single base rpy
+            angles (the inverse of the RPY rotation, same as iDynTree.Transform(RPY, 0).inverse()) '''
+        return transforms.invertRotations(transforms.rpyToRotation(base_rpy))
+
+    def getRegressor(self, pos, vel, acc, base_vel=None, base_acc=None, base_rpy=None, world_R_base=None,
+                     friction=True):
+        # type: (np._ArrayLike, np._ArrayLike, np._ArrayLike, np._ArrayLike, np._ArrayLike, np._ArrayLike, np._ArrayLike, bool) -> np._ArrayLike
+        ''' get numerical (std) regressor of one sample with columns of the identified params
+            (including friction unless friction is False), base values are needed for floating base
+            (base rotation instead of rpy angles if already computed) '''
+
+        if self.opt['floatingBase']: fb = 6
+        else: fb = 0
+
+        # system state for iDynTree
+        buffers = self.buffers
+        buffers.setJointState(pos, vel, acc)
+
+        if self.opt['floatingBase']:
+            # get transform from base to world
+            if world_R_base is None:
+                world_R_base = self.getBaseRotations(base_rpy)
+            buffers.setBaseState(world_R_base, base_vel, base_acc)
+        buffers.setGeneratorState(self.generator, self.opt['floatingBase'])
+
+        # get (standard) regressor (known terms are not used)
+        if not self.generator.computeRegressor(buffers.regressor, buffers.known_terms):
+            print("Error during numeric computation of regressor")
+
+        regressor = buffers.regressor.toNumPy()
+        if self.opt['floatingBase']:
+            # the base forces are expressed in the base frame for the regressor, so
+            # rotate them to world frame (inverse dynamics use world frame)
+            regressor[0:6, :] = transforms.transformSpatialVectors(world_R_base, None, regressor[0:6, :])
+
+        if self.opt['identifyGravityParamsOnly']:
+            #delete inertia param columns
+            regressor = np.delete(regressor, self.inertia_params, 1)
+
+        if self.opt['identifyFriction'] and friction:
+            # append unitary matrix to regressor for offsets/constant friction
+            sign = 1 #np.sign(dq.toNumPy())   #TODO: dependent on direction or always constant?
+            static_diag = np.identity(self.num_dofs)*sign
+            offset_regressor = np.vstack( (np.zeros((fb, self.num_dofs)), static_diag))
+            regressor = np.concatenate((regressor, offset_regressor), axis=1)
+
+            if not self.opt['identifyGravityParamsOnly']:
+                if self.opt['identifySymmetricVelFriction']:
+                    # just use velocity directly
+                    vel_diag = np.identity(self.num_dofs)*np.asarray(vel, dtype=np.float64)
+                    friction_regressor = np.vstack( (np.zeros((fb, self.num_dofs)), vel_diag))   # add base dynamics rows
+                else:
+                    # append positive/negative velocity matrix for velocity dependent asymmetrical friction
+                    dq_p = np.array(vel, dtype=np.float64)
+                    dq_p[dq_p < 0] = 0 #set to zero where v < 0
+                    dq_m = np.array(vel, dtype=np.float64)
+                    dq_m[dq_m > 0] = 0 #set to zero where v > 0
+                    vel_diag = np.hstack((np.identity(self.num_dofs)*dq_p, np.identity(self.num_dofs)*dq_m))
+                    friction_regressor = np.vstack( (np.zeros((fb, self.num_dofs*2)), vel_diag))   # add base dynamics rows
+                regressor = np.concatenate((regressor, friction_regressor), axis=1)
+
+        return regressor
+
+    def getRegressorDerivatives(self, pos, vel, acc, step=1e-6):
+        # type: (np._ArrayLike, np._ArrayLike, np._ArrayLike, float) -> Tuple[np._ArrayLike, np._ArrayLike]
+        ''' get (std) regressor of one sample (fixed base) and its derivatives with respect to each
+            joint position, velocity and acceleration, shape (3, num_dofs, rows, cols).
+            The regressor is linear in the accelerations and quadratic in the velocities, so
+            those differences are exact, positions use central differences with step. '''
+        pos = np.asarray(pos, dtype=np.float64)
+        vel = np.asarray(vel, dtype=np.float64)
+        acc = np.asarray(acc, dtype=np.float64)
+        regressor = self.getRegressor(pos, vel, acc)
+        derivatives = np.empty((3, self.num_dofs) + regressor.shape)
+        for k in range(self.num_dofs):
+            d = np.zeros(self.num_dofs)
+            d[k] = step
+            derivatives[0, k] = (self.getRegressor(pos+d, vel, acc) - self.getRegressor(pos-d, vel, acc)) / (2*step)
+            derivatives[1, k] = (self.getRegressor(pos, vel+d, acc) - self.getRegressor(pos, vel-d, acc)) / (2*step)
+            d[k] = 1.0
+            derivatives[2, k] = self.getRegressor(pos, vel, acc+d) - regressor
+        return regressor, derivatives
+
+    def useStaticRegressor(self):
+        # type: () -> bool
+        ''' if the gravity regressors can be computed in batch from the joint positions with
+            getStaticRegressors (static identification of a fixed base model without regressor file),
+            checked once against the regressor from iDynTree (not again if it differs) '''
+        if self.static_regressor is None:
+            self.static_regressor = False
+            if self.opt['identifyGravityParamsOnly'] and not self.opt['floatingBase'] and \
+                    not self.regressor_file and \
+                    ('useStaticRegressor' not in self.opt or self.opt['useStaticRegressor']):
+                self.static_regressor = self.initStaticRegressor() or False
+        return bool(self.static_regressor)
+
+    def initStaticRegressor(self):
+        # type: () -> Dict[str, Any]
+        ''' get kinematic structure for getStaticRegressors, None if the model is not supported '''
+        joints = self.description.getJoints()
+        link_params = {self.linkNames[i]: i for i in range(self.num_links)}
+        structure = {'joints': [], 'ancestors': {}, 'links': link_params}   # type: Dict[str, Any]
+        for j in joints:
+            if j['type'] in ['revolute', 'continuous', 'prismatic']:
+                if j['name'] not in self.jointNames:
+                    return None
+                dof = self.jointNames.index(j['name'])
+            elif j['type'] == 'fixed':
+                dof = -1
+            else:
+                return None
+            axis = j['axis'] / la.norm(j['axis'])
+            structure['joints'].append((j['parent'], j['child'], helpers.eulerAnglesToRotationMatrix(j['rpy']),
+                                        j['xyz'], axis, j['type'] == 'prismatic', dof))
+            # dofs that move each link
+            ancestors = list(structure['ancestors'].get(j['parent'], []))
+            if dof >= 0:
+                ancestors.append(dof)
+            structure['ancestors'][j['child']] = ancestors
+        if len(set(link_params).difference(structure['ancestors'])) > 1:
+            # links that are not part of the tree (besides the root)
+            return None
+
+        # compare with regressor from iDynTree at some postures
+        self.static_regressor = structure
+        rnd = np.random.RandomState(0)
+        positions = np.vstack((np.zeros(self.num_dofs), (rnd.rand(3, self.num_dofs)-0.5)*2*np.pi))
+        zeros = np.zeros(self.num_dofs)
+        static = self.getStaticRegressors(positions)
+        for i in range(positions.shape[0]):
+            regressor = self.getRegressor(positions[i], zeros, zeros)
+            if not np.allclose(static[i*self.num_dofs:(i+1)*self.num_dofs], regressor, rtol=1e-7, atol=1e-9):
+                print(Fore.YELLOW + "Static regressor differs from iDynTree, computing regressors for each "
+                      "sample" + Fore.RESET)
+                return None
+        return structure
+
+    def getStaticRegressors(self, positions, friction=True):
+        # type: (np._ArrayLike, bool) -> np._ArrayLike
+        ''' get stacked (std) regressors of static postures (positions of all samples, one row each),
+            same as getRegressor with zero velocities and accelerations (without friction columns
+            if friction is False). Only the columns of the
+            gravity params (mass and first moments of each link) are computed, torques of a joint are
+            the moments of the gravity forces of the links it moves around its axis. '''
+        positions = np.asarray(positions, dtype=np.float64)
+        num_samples = positions.shape[0]
+        structure = self.static_regressor
+        a0 = -np.array(self.gravity[0:3])   # acceleration that holds the links
+
+        # forward kinematics of all samples (world rotation and position of each link)
+        eye = np.tile(np.identity(3), (num_samples, 1, 1))
+        rot = {}   # type: Dict[str, np._ArrayLike]
+        pos = {}   # type: Dict[str, np._ArrayLike]
+        moment_arms = {}   # type: Dict[int, Tuple[np._ArrayLike, np._ArrayLike, bool]]
+        for (parent, child, R0, p0, axis, prismatic, dof) in structure['joints']:
+            R_p = rot.get(parent, eye)
+            p_p = pos.get(parent, np.zeros((num_samples, 3)))
+            R = np.einsum('nij,jk->nik', R_p, R0)
+            p = p_p + R_p.dot(p0)
+            if dof >= 0:
+                q = positions[:, dof]
+                z = R.dot(axis)
+                if prismatic:
+                    p = p + z*q[:, np.newaxis]
+                else:
+                    K = np.array([[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]], [-axis[1], axis[0], 0]])
+                    R_q = np.identity(3) + np.sin(q)[:, np.newaxis, np.newaxis]*K + \
+                          (1-np.cos(q))[:, np.newaxis, np.newaxis]*K.dot(K)
+                    R = np.einsum('nij,njk->nik', R, R_q)
+                # (direction of gravity moment for revolute joints, force along axis for prismatic)
+                moment_arms[dof] = (p, np.cross(a0, z) if not prismatic else z.dot(a0), prismatic)
+            rot[child] = R
+            pos[child] = p
+
+        if friction:
+            num_columns = self.num_identified_params
+        else:
+            num_columns = self.friction_params_start
+        regressor = np.zeros((num_samples, self.num_dofs, num_columns))
+        for link, i in structure['links'].items():
+            if link not in structure['ancestors']:
+                # root link
+                continue
+            for dof in structure['ancestors'][link]:
+                origin, w, prismatic = moment_arms[dof]
+                if prismatic:
+                    regressor[:, dof, i*4] = w
+                else:
+                    regressor[:, dof, i*4] = np.einsum('ni,ni->n', pos[link] - origin, w)
+                    regressor[:, dof, i*4+1:i*4+4] = np.einsum('nij,ni->nj', rot[link], w)
+
+        if self.opt['identifyFriction'] and friction:
+            # offsets/constant friction
+            regressor[:, :, self.friction_params_start:self.friction_params_start+self.num_dofs] = \
+                np.identity(self.num_dofs)
+
+        return regressor.reshape((num_samples*self.num_dofs, num_columns))
+
+    def getProjectionColumns(self):
+        # type: () -> np._ArrayLike[int]
+        ''' get the (std) regressor columns that are needed for the base regressor, i.e. the ones
+            with nonzero rows in the projection matrix (structurally zero columns are never needed) '''
+        if self.opt['useBasisProjection']:
+            proj = self.B
+        else:
+            proj = self.Pb
+        return np.where(np.any(proj != 0, axis=1))[0]
+
+    def projectRegressor(self, regressor, columns=None, friction_regressor=None):
+        # type: (np._ArrayLike, np._ArrayLike[int], FrictionRegressor) -> np._ArrayLike
+        ''' get base regressor from the std regressor (or only from its given columns, the first
+            columns otherwise) and the friction columns if given separately, single precision
+            regressors are projected in double precision in blocks of rows '''
+        if self.opt['useBasisProjection']:
+            proj = self.B
+        else:
+            proj = self.Pb  # regressor following Sousa, 2014
+        if columns is None:
+            columns = np.arange(regressor.shape[1])
+        if regressor.dtype == np.float64:
+            YBase = np.dot(regressor, proj[columns])
+        else:
+            YBase = np.empty((regressor.shape[0], proj.shape[1]))
+            block = 10000
+            for i in range(0, regressor.shape[0], block):
+                YBase[i:i+block] = np.dot(regressor[i:i+block].astype(np.float64), proj[columns])
+
+        if friction_regressor is not None:
+            YBase += friction_regressor.project(proj[self.friction_params_start:])
+        return YBase
+
+    @property
+    def YStd(self):
+        # type: () -> np._ArrayLike
+        ''' stacked std regressor of the data (None if not kept). The friction columns are stored
+            as friction_regressor, the dense matrix is only built for the decompositions that need
+            it (on first access, then kept until useRegressorState sets new rows). Use
+            stdRegressorDot or projectRegressor for products. '''
+        if self._YStd is None and self.regressor_stack is not None:
+            if self.friction_regressor is None:
+                self._YStd = self.regressor_stack
+            else:
+                self._YStd = np.hstack((self.regressor_stack, self.friction_regressor.toDense()))
+        return self._YStd
+
+    def stdRegressorDot(self, x):
+        # type: (np._ArrayLike) -> np._ArrayLike
+        ''' get YStd.dot(x) without expanding the friction columns '''
+        if self.friction_regressor is None:
+            return np.dot(self.regressor_stack, x)
+        n = self.regressor_stack.shape[1]
+        return np.dot(self.regressor_stack, x[:n]) + self.friction_regressor.dot(x[n:])
+
+    def computeRegressors(self, data, only_simulate=False, keep_std=True):
+        # type: (Model, Data, bool, bool) -> (None)
         """ compute regressors from measurements for each time step of the measurement data
             and stack them vertically. also stack measured torques and get simulation data.
             for floating base, get estimated base forces (6D wrench) and add to torque measure stack
+            if keep_std is False, only the base regressor YBase is kept (YStd is None), the std
+            regressor is then only stored for the columns needed for the projection
+            friction columns are not stored densely but as friction terms (see FrictionRegressor)
+            the stacked rows are kept in regressor_state (with keep_std) so that samples appended
+            to data later on only need their own rows (see appendRegressors)
         """
 
+        state = self.computeRegressorRows(data, only_simulate, keep_std)
+        self.useRegressorState(data, state, only_simulate, keep_std)
+
+    def appendRegressors(self, data):
+        # type: (Data) -> None
+        """ get regressors for data whose samples start with the ones of the previous
+            computeRegressors (or appendRegressors) call, e.g. after appending samples. only the rows
+            of the new samples are computed and stacked to the kept ones, for a structural base
+            projection this includes the base regressor rows and the information matrix (see
+            getBaseInformation). the result is the same as computeRegressors(data), which is used
+            instead if the inputs of the previous rows changed (used samples, options or a priori
+            params, see getRegressorInputs) """
+
+        state = self.regressor_state
+        skip = self.opt['skipSamples']+1
+        if state is None or not self.hasRegressorInputs(state, data):
+            self.computeRegressors(data)
+            return
+
+        if data.num_used_samples > state['num_samples']:
+            if self.opt['verbose']:
+                print("computing regressors for {} appended samples".format(
+                    data.num_used_samples - state['num_samples']))
+            new_rows = self.computeRegressorRows(data.getSampleRange(state['num_samples']*skip))
+            state = self.stackRegressorStates([state, new_rows])
+        self.useRegressorState(data, state)
+
+    def getRegressorSettings(self, data):
+        # type: (Data) -> Dict[str, Any]
+        ''' get the settings that the regressor, torque and contact rows depend on besides the
+            samples (names of the used sample arrays, options and a priori params) '''
+        keys = ['positions', 'velocities', 'accelerations', 'contacts']
+        if not self.opt['simulateTorques']:
+            keys.append('torques')
+        if self.opt['floatingBase']:
+            keys.extend(['base_velocity', 'base_acceleration', 'base_rpy'])
+        return {'sample_keys': sorted([k for k in keys if k in data.samples]),
+                'options': [self.opt.get(k) for k in self.regressor_options],
+                'contact_frames': list(data.contact_frames) if 'contacts' in data.samples else [],
+                'xStdModel': self.xStdModel.copy()}
+
+    def hashSamples(self, data, keys, start, end):
+        # type: (Data, List[str], int, int) -> str
+        ''' get hash of the used samples from start to end of the sample arrays keys of data '''
+        skip = self.opt['skipSamples']+1
+        sha = hashlib.sha1()
+        for k in keys:
+            samples = np.ascontiguousarray(data.samples[k][start*skip:end*skip:skip])
+            sha.update('{}{}{};'.format(k, samples.dtype, samples.shape).encode('utf-8'))
+            sha.update(samples)
+        return sha.hexdigest()
+
+    def getRegressorInputs(self, data):
+        # type: (Data) -> Dict[str, Any]
+        ''' get the inputs that the regressor, torque and contact rows of the used samples of data
+            depend on, kept with the regressor state to check if its rows are still valid. the
+            samples are only kept as fingerprints (number and hash of the used samples for each
+            range of samples that rows were computed for, see getRegressorSettings for the rest) '''
+        inputs = self.getRegressorSettings(data)
+        inputs['ranges'] = [(data.num_used_samples,
+                             self.hashSamples(data, inputs['sample_keys'], 0, data.num_used_samples))]
+        return inputs
+
+    def hasRegressorInputs(self, state, data):
+        # type: (Dict[str, Any], Data) -> bool
+        ''' check if the rows of a regressor state were computed from the first used samples of
+            data with the current options and a priori params '''
+        inputs = state['inputs']
+        if state['num_samples'] > data.num_used_samples or \
+                not self.sameRegressorSettings(inputs, self.getRegressorSettings(data)):
+            return False
+        start = 0
+        for (num_samples, digest) in inputs['ranges']:
+            if self.hashSamples(data, inputs['sample_keys'], start, start+num_samples) != digest:
+                return False
+            start += num_samples
+        return True
+
+    @staticmethod
+    def sameRegressorSettings(inputs, other):
+        # type: (Dict[str, Any], Dict[str, Any]) -> bool
+        ''' if two regressor inputs have the same options, a priori params and sample arrays '''
+        return inputs is not None and other is not None and \
+            inputs['options'] == other['options'] and \
+            inputs['contact_frames'] == other['contact_frames'] and \
+            np.array_equal(inputs['xStdModel'], other['xStdModel']) and \
+            inputs['sample_keys'] == other['sample_keys']
+
+    def computeRegressorRows(self, data, only_simulate=False, keep_std=True):
+        # type: (Data, bool, bool) -> Dict[str, Any]
+        """ compute the stacked regressor, torque and contact rows of the used samples of data
+            (see computeRegressors) and get them as regressor state """
+
         self.data = data
 
         num_time = 0
@@ -365,14 +750,76 @@ class Model(object):
         #extra regressor rows for floating base
         if self.opt['floatingBase']: fb = 6
         else: fb = 0
-        self.regressor_stack = np.zeros(shape=((self.num_dofs+fb)*data.num_used_samples, self.num_identified_params))
+        static = not only_simulate and self.useStaticRegressor()
+        friction = self.opt['identifyFriction'] and not only_simulate
+        if friction:
+            num_std_columns = self.friction_params_start
+        else:
+            num_std_columns = self.num_identified_params
+        if 'regressorFloat32' in self.opt and self.opt['regressorFloat32']:
+            regressor_dtype = np.float32
+        else:
+            regressor_dtype = np.float64
+        # columns of the std regressor to store (all unless std regressor is not kept and the base
+        # projection is known already)
+        if not keep_std and self.opt['useStructuralRegressor']:
+            columns = self.getProjectionColumns()
+            columns = columns[columns < num_std_columns]
+        else:
+            columns = None
+        self.YBase = None
+        self.friction_regressor = None
+
+        if only_simulate:
+            # only (simulated) torques are needed, skip regressor
+            self.regressor_stack = np.zeros(shape=(0, self.num_identified_params))
+        elif static:
+            # static postures: get the gravity regressors of all samples at once
+            with helpers.Timer() as t:
+                used_idx = np.arange(data.num_used_samples)*(self.opt['skipSamples']+1)
+                self.regressor_stack = self.getStaticRegressors(data.samples['positions'][used_idx],
+                                                                friction=False)
+                if columns is not None:
+                    self.regressor_stack = self.regressor_stack[:, columns]
+                self.regressor_stack = self.regressor_stack.astype(regressor_dtype, copy=False)
+            num_time += t.interval
+        else:
+            num_columns = num_std_columns if columns is None else len(columns)
+            self.regressor_stack = np.zeros(shape=((self.num_dofs+fb)*data.num_used_samples, num_columns),
+                                            dtype=regressor_dtype)
         self.torques_stack = np.zeros(shape=((self.num_dofs+fb)*data.num_used_samples))
-        self.sim_torq_stack = np.zeros(shape=((self.num_dofs+fb)*data.num_used_samples))
-        self.torquesAP_stack = np.zeros(shape=((self.num_dofs+fb)*data.num_used_samples))
+        if self.opt['useAPriori']:
+            self.torquesAP_stack = np.zeros(shape=((self.num_dofs+fb)*data.num_used_samples))
+        else:
+            self.torquesAP_stack = None
+
+        # per sample regressors with friction columns are only needed for simulation
+        sample_friction = not friction or self.opt['useRegressorForSimulation']
 
-        num_contacts = len(data.samples['contacts'].item(0).keys()) if 'contacts' in data.samples else 0
+        if self.opt['floatingBase']:
+            # base rotations of all used samples
+            world_R_base = self.getBaseRotations(
+                data.samples['base_rpy'][np.arange(data.num_used_samples)*(self.opt['skipSamples']+1)])
+
+        num_contacts = len(data.contact_frames) if 'contacts' in data.samples else 0
         self.contacts_stack = np.zeros(shape=(num_contacts, (self.num_dofs+fb)*data.num_used_samples))
         self.contactForcesSum = np.zeros(shape=((self.num_dofs+fb)*data.num_used_samples))
+        if num_contacts:
+            # jacobians of all contact frames for each sample (frames that are not found are left zero)
+            contact_frame_idx = [self.dynComp.getFrameIndex(str(frame)) for frame in data.contact_frames]
+            contact_jacobians = np.zeros((data.num_used_samples, num_contacts, 6, self.num_dofs+fb))
+            jacobian = self.buffers.jacobian
+
+        # in case that we simulate the torque measurements, need torque estimation for a priori parameters
+        # or that we need to simulate the base reaction forces for floating base
+        simulate = self.opt['simulateTorques'] or self.opt['useAPriori'] or self.opt['floatingBase']
+        if simulate and self.opt['useRBDL']:
+            # simulate all used samples at once
+            with helpers.Timer() as t:
+                #TODO: make sure joint order of torques is the same as iDynTree!
+                rbdl_torques = self.simulateTrajectoryRBDL(
+                    data.samples, np.arange(data.num_used_samples)*(self.opt['skipSamples']+1))
+            simulate_time += t.interval
 
         """loop over measurement data, optionally skip some values
             - get the regressor for each time step
@@ -380,7 +827,6 @@ class Model(object):
             - if necessary, get torques from contact wrenches and add them to the torques
             - stack the torques, regressors and contacts into matrices
         """
-        contacts = {}
         for sample_index in self.progress(range(data.num_used_samples)):
             m_idx = sample_index*(self.opt['skipSamples'])+sample_index
             with helpers.Timer() as t:
@@ -389,26 +835,18 @@ class Model(object):
                 vel = data.samples['velocities'][m_idx]
                 acc = data.samples['accelerations'][m_idx]
                 torq = data.samples['torques'][m_idx]
-                if 'contacts' in data.samples:
-                    for frame in data.samples['contacts'].item(0).keys():
-                        contacts[frame] = data.samples['contacts'].item(0)[frame][m_idx]
 
                 if self.opt['identifyGravityParamsOnly']:
                     #set vel and acc to zero (should be almost zero already) to remove noise
                     vel[:] = 0.0
                     acc[:] = 0.0
 
-                # system state for iDynTree
-                q = iDynTree.VectorDynSize.fromList(pos)
-                dq = iDynTree.VectorDynSize.fromList(vel)
-                ddq = iDynTree.VectorDynSize.fromList(acc)
-
-                # in case that we simulate the torque measurements, need torque estimation for a priori parameters
-                # or that we need to simulate the base reaction forces for floating base
-                if self.opt['simulateTorques'] or self.opt['useAPriori'] or self.opt['floatingBase']:
+                if simulate:
                     if self.opt['useRBDL']:
-                        #TODO: make sure joint order of torques is the same as iDynTree!
-                        sim_torques = self.simulateDynamicsRBDL(data.samples, m_idx)
+                        sim_torques = rbdl_torques[sample_index]
+                    elif self.opt['floatingBase']:
+                        sim_torques = self.simulateDynamicsIDynTree(data.samples, m_idx,
+                                                                    world_R_base=world_R_base[sample_index])
                     else:
                         sim_torques = self.simulateDynamicsIDynTree(data.samples, m_idx)
 
@@ -438,72 +876,19 @@ class Model(object):
             if not only_simulate:
                 # get numerical regressor (std)
                 with helpers.Timer() as t:
-                    if self.opt['floatingBase']:
-                        base_vel = data.samples['base_velocity'][m_idx]
-                        base_acc = data.samples['base_acceleration'][m_idx]
-
-                        # get transform from base to world
-                        rpy = data.samples['base_rpy'][m_idx]
-                        rot = iDynTree.Rotation.RPY(rpy[0], rpy[1], rpy[2])
-                        pos = iDynTree.Position.Zero()
-                        world_T_base = iDynTree.Transform(rot, pos).inverse()
-
-                        '''
-                        # rotate base vel and acc to world frame
-                        to_world = world_T_base.getRotation().toNumPy()
-                        base_vel[0:3] = to_world.dot(base_vel[0:3])
-                        base_vel[3:] = to_world.dot(base_vel[3:])
-                        base_acc[0:3] = to_world.dot(base_acc[0:3])
-                        base_acc[3:] = to_world.dot(base_acc[3:])
-                        '''
-
-                        base_velocity = iDynTree.Twist.fromList(base_vel)
-                        base_acceleration = iDynTree.Twist.fromList(base_acc)
-
-                        self.generator.setRobotState(q,dq,ddq, world_T_base, base_velocity, base_acceleration,
-                                                     self.gravity_twist)
+                    if static:
+                        if columns is None and regressor_dtype == np.float64 and not friction:
+                            regressor = self.regressor_stack[row_index:row_index+self.num_dofs+fb]
+                        elif self.opt['useRegressorForSimulation']:
+                            # (simulation needs all columns in double precision)
+                            regressor = self.getStaticRegressors(pos[np.newaxis])
+                    elif self.opt['floatingBase']:
+                        regressor = self.getRegressor(pos, vel, acc, data.samples['base_velocity'][m_idx],
+                                                      data.samples['base_acceleration'][m_idx],
+                                                      world_R_base=world_R_base[sample_index],
+                                                      friction=sample_friction)
                     else:
-                        self.generator.setRobotState(q,dq,ddq, self.gravity_twist)
-
-                    # get (standard) regressor
-                    regressor = iDynTree.MatrixDynSize(self.N_OUT, self.num_model_params)
-                    knownTerms = iDynTree.VectorDynSize(self.N_OUT)   # what are known terms useable for?
-                    if not self.generator.computeRegressor(regressor, knownTerms):
-                        print("Error during numeric computation of regressor")
-
-                    regressor = regressor.toNumPy()
-                    if self.opt['floatingBase']:
-                        # the base forces are expressed in the base frame for the regressor, so
-                        # rotate them to world frame (inverse dynamics use world frame)
-                        to_world = world_T_base.getRotation().toNumPy()
-                        regressor[0:3, :] = to_world.dot(regressor[0:3, :])
-                        regressor[3:6, :] = to_world.dot(regressor[3:6, :])
-
-                    if self.opt['identifyGravityParamsOnly']:
-                        #delete inertia param columns
-                        regressor = np.delete(regressor, self.inertia_params, 1)
-
-                    if self.opt['identifyFriction']:
-                        # append unitary matrix to regressor for offsets/constant friction
-                        sign = 1 #np.sign(dq.toNumPy())   #TODO: dependent on direction or always constant?
-                        static_diag = np.identity(self.num_dofs)*sign
-                        offset_regressor = np.vstack( (np.zeros((fb, self.num_dofs)), static_diag))
-                        regressor = np.concatenate((regressor, offset_regressor), axis=1)
-
-                        if not self.opt['identifyGravityParamsOnly']:
-                            if self.opt['identifySymmetricVelFriction']:
-                                # just use velocity directly
-                                vel_diag = np.identity(self.num_dofs)*dq.toNumPy()
-                                friction_regressor = np.vstack( (np.zeros((fb, self.num_dofs)), vel_diag))   # add base dynamics rows
-                            else:
-                                # append positive/negative velocity matrix for velocity dependent asymmetrical friction
-                                dq_p = dq.toNumPy().copy()
-                                dq_p[dq_p < 0] = 0 #set to zero where v < 0
-                                dq_m = dq.toNumPy().copy()
-                                dq_m[dq_m > 0] = 0 #set to zero where v > 0
-                                vel_diag = np.hstack((np.identity(self.num_dofs)*dq_p, np.identity(self.num_dofs)*dq_m))
-                                friction_regressor = np.vstack( (np.zeros((fb, self.num_dofs*2)), vel_diag))   # add base dynamics rows
-                            regressor = np.concatenate((regressor, friction_regressor), axis=1)
+                        regressor = self.getRegressor(pos, vel, acc, friction=sample_friction)
 
                     # simulate with regressor
                     if self.opt['useRegressorForSimulation'] and (self.opt['simulateTorques'] or
@@ -523,7 +908,13 @@ class Model(object):
                         torques_simulated = np.nan_to_num(torques)
 
                     # stack on previous regressors
-                    np.copyto(self.regressor_stack[row_index:row_index+self.num_dofs+fb], regressor)
+                    if not static:
+                        if columns is not None:
+                            regressor = regressor[:, columns]
+                        elif friction:
+                            regressor = regressor[:, :num_std_columns]
+                        np.copyto(self.regressor_stack[row_index:row_index+self.num_dofs+fb], regressor,
+                                  casting='same_kind')
                 num_time += t.interval
 
             # stack results onto matrices of previous time steps
@@ -532,26 +923,24 @@ class Model(object):
             if self.opt['useAPriori']:
                 np.copyto(self.torquesAP_stack[row_index:row_index+self.num_dofs+fb], torqAP)
 
-            if len(contacts.keys()):
-                #convert contact wrenches into torque contribution
-                for c in range(num_contacts):
-                    frame = list(contacts.keys())[c]
+            # get jacobians of the contact frames at the current state
+            for c in range(num_contacts):
+                if contact_frame_idx[c] >= 0 and self.dynComp.getFrameJacobian(contact_frame_idx[c], jacobian):
+                    contact_jacobians[sample_index, c] = jacobian.toNumPy()[:, -(self.num_dofs+fb):]
 
-                    dim = self.num_dofs+fb
-                    # get jacobian and contact wrench for each contact frame and measurement sample
-                    jacobian = iDynTree.MatrixDynSize(6, dim)
-                    if not self.dynComp.getFrameJacobian(str(frame), jacobian):
-                        continue
-                    jacobian = jacobian.toNumPy()
+        # finished looping over samples
 
-                    # mul each sample of measured contact wrenches with frame jacobian
-                    contacts_torq = np.empty(dim)
-                    contacts_torq = jacobian.T.dot(contacts[frame])
+        if friction:
+            # (velocities are zero for gravity only)
+            self.friction_regressor = FrictionRegressor(
+                data.samples['velocities'][np.arange(data.num_used_samples)*(self.opt['skipSamples']+1)],
+                self.num_dofs, fb, self.opt['identifyGravityParamsOnly'], self.opt['identifySymmetricVelFriction'])
 
-                    contact_idx = (sample_index*dim)
-                    np.copyto(self.contacts_stack[c][contact_idx:contact_idx+dim], contacts_torq[-dim:])
-
-        # finished looping over samples
+        if num_contacts:
+            # convert contact wrenches of all samples into torque contribution (J^T*f for each contact)
+            wrenches = data.samples['contacts'][np.arange(data.num_used_samples)*(self.opt['skipSamples']+1)]
+            self.contacts_stack = np.einsum('ncki,nck->cni', contact_jacobians, wrenches).reshape(
+                (num_contacts, (self.num_dofs+fb)*data.num_used_samples))
 
         # sum over (contact torques) for each contact frame
         self.contactForcesSum = np.sum(self.contacts_stack, axis=0)
@@ -565,27 +954,111 @@ class Model(object):
                 # if not simulating, measurements of joint torques already contain contact contribution,
                 # so only add it to the (always simulated) base force estimation
                 torques_stack_2dim = np.reshape(self.torques_stack, (data.num_used_samples, self.num_dofs+fb))
-                self.contactForcesSum_2dim = np.reshape(self.contactForcesSum, (data.num_used_samples, self.num_dofs+fb))
+                contactForcesSum_2dim = np.reshape(self.contactForcesSum, (data.num_used_samples, self.num_dofs+fb))
                 if self.opt['addContacts']:
-                    torques_stack_2dim[:, :6] += self.contactForcesSum_2dim[:, :6]
+                    torques_stack_2dim[:, :6] += contactForcesSum_2dim[:, :6]
                 self.torques_stack = torques_stack_2dim.flatten()
 
-        if self.opt['addContacts']:
-            self.sim_torq_stack = self.sim_torq_stack + self.contactForcesSum
+        if self.opt['showTiming']:
+            print('(simulation for regressors took %.03f sec.)' % simulate_time)
+            print('(getting regressors took %.03f sec.)' % num_time)
 
-        if len(contacts.keys()) or self.opt['simulateTorques']:
-            # write back torques to data object when simulating or contacts were added
-            self.data.samples['torques'] = np.reshape(self.torques_stack, (data.num_used_samples, self.num_dofs+fb))
+        return {'num_samples': data.num_used_samples,
+                'inputs': self.getRegressorInputs(data),
+                'columns': columns,
+                'regressor_stack': self.regressor_stack,
+                'friction_regressor': self.friction_regressor,
+                'torques_stack': self.torques_stack,
+                'torquesAP_stack': self.torquesAP_stack,
+                'contacts_stack': self.contacts_stack,
+                'contactForcesSum': self.contactForcesSum,
+                'YBase': None,
+                'information': None}
+
+    def keepsBaseRows(self, state):
+        # type: (Dict[str, Any]) -> bool
+        ''' if the base regressor rows of a regressor state stay valid when stacking it with others,
+            i.e. for a structural base projection, unfiltered and with all std columns '''
+        return self.opt['useStructuralRegressor'] and not self.opt['filterRegressor'] and \
+            state['columns'] is None and state['regressor_stack'].shape[0] > 0
+
+    def addBaseRows(self, state):
+        # type: (Dict[str, Any]) -> None
+        ''' add base regressor rows and their information matrix YBase.T*YBase to a regressor state
+            (if they can be kept and are not there yet) '''
+        if state['YBase'] is None and self.keepsBaseRows(state):
+            state['YBase'] = self.projectRegressor(state['regressor_stack'], state['columns'],
+                                                   state['friction_regressor'])
+            state['information'] = np.dot(state['YBase'].T, state['YBase'])
+
+    def stackRegressorStates(self, states):
+        # type: (List[Dict[str, Any]]) -> Dict[str, Any]
+        ''' stack regressor states of consecutive sample ranges (e.g. of appended samples or
+            selected blocks) to the state of all samples, base regressor rows are projected only for
+            states that don't have them yet and their information matrices are summed up. the inputs
+            of the rows are stacked as well if they were computed with the same settings '''
+        for state in states:
+            self.addBaseRows(state)
+
+        def stack(key, axis=0):
+            if states[0][key] is None:
+                return None
+            return np.concatenate([state[key] for state in states], axis=axis)
+
+        friction_regressor = states[0]['friction_regressor']
+        for state in states[1:]:
+            if friction_regressor is not None:
+                friction_regressor = friction_regressor.append(state['friction_regressor'])
+
+        # inputs of the stacked rows (if all were computed with the same options and params)
+        inputs = None
+        if all([self.sameRegressorSettings(states[0]['inputs'], state['inputs']) for state in states]):
+            inputs = dict(states[0]['inputs'])
+            inputs['ranges'] = sum([state['inputs']['ranges'] for state in states], [])
+
+        stacked = {'num_samples': sum([state['num_samples'] for state in states]),
+                   'inputs': inputs,
+                   'columns': states[0]['columns'],
+                   'regressor_stack': stack('regressor_stack'),
+                   'friction_regressor': friction_regressor,
+                   'torques_stack': stack('torques_stack'),
+                   'torquesAP_stack': stack('torquesAP_stack'),
+                   'contacts_stack': stack('contacts_stack', axis=1),
+                   'contactForcesSum': stack('contactForcesSum'),
+                   'YBase': None,
+                   'information': None}
+        if all([state['YBase'] is not None for state in states]):
+            stacked['YBase'] = stack('YBase')
+            stacked['information'] = np.sum([state['information'] for state in states], axis=0)
+        return stacked
+
+    def useRegressorState(self, data, state, only_simulate=False, keep_std=True):
+        # type: (Data, Dict[str, Any], bool, bool) -> None
+        ''' set stacked regressors and torques from a regressor state of (all) samples of data and
+            get tau and the base regressor YBase '''
 
-        with helpers.Timer() as t:
-            if self.opt['useAPriori']:
-                # get torque delta to identify with
-                self.tau = self.torques_stack - self.torquesAP_stack
-            else:
-                self.tau = self.torques_stack
-        simulate_time+=t.interval
+        self.data = data
+        if self.opt['floatingBase']: fb = 6
+        else: fb = 0
+        num_samples = state['num_samples']
+
+        self.regressor_stack = state['regressor_stack']
+        self.friction_regressor = state['friction_regressor']
+        self._YStd = None
+        self.torques_stack = state['torques_stack']
+        self.torquesAP_stack = state['torquesAP_stack']
+        self.contacts_stack = state['contacts_stack']
+        self.contactForcesSum = state['contactForcesSum']
+
+        if len(self.contacts_stack) or self.opt['simulateTorques']:
+            # write back torques to data object when simulating or contacts were added
+            self.data.samples['torques'] = np.reshape(self.torques_stack, (num_samples, self.num_dofs+fb))
 
-        self.YStd = self.regressor_stack
+        if self.opt['useAPriori']:
+            # get torque delta to identify with
+            self.tau = self.torques_stack - self.torquesAP_stack
+        else:
+            self.tau = self.torques_stack
 
         # if difference between random regressor (that was used for base projection) and regressor
         # from the data is too big, the base regressor can still have linear dependencies.
@@ -593,38 +1066,93 @@ class Model(object):
         if not self.opt['useStructuralRegressor'] and not only_simulate:
             if self.opt['verbose']:
                 print('Getting independent base columns again from data regressor')
-            self.computeRegressorLinDepsQR(self.YStd)
+            self.computeRegressorLinDepsQR(self.YStd.astype(np.float64, copy=False))
 
-        if self.opt['useBasisProjection']:
-            self.YBase = np.dot(self.YStd, self.B)   # project regressor to base regressor
+        if keep_std and not only_simulate and self.keepsBaseRows(state):
+            # keep base rows (not modified in place by users of YBase) to stack on them later
+            self.addBaseRows(state)
+            self.YBase = state['YBase']
         else:
-            self.YBase = np.dot(self.YStd, self.Pb)  # regressor following Sousa, 2014
+            self.YBase = self.projectRegressor(self.regressor_stack, state['columns'], self.friction_regressor)
 
-        if self.opt['filterRegressor']:
-            order = 5                            # Filter order
-            fs = self.data.samples['frequency']  # Sampling freq
-            fc = self.opt['filterRegCutoff']     # Cut-off frequency (Hz)
-            b, a = signal.butter(order, fc / (fs / 2), btype='low', analog=False)
-            for j in range(0, self.num_base_inertial_params):
-                for i in range(0, self.num_dofs):
-                    self.YBase[i::self.num_dofs, j] = signal.filtfilt(b, a, self.YBase[i::self.num_dofs, j])
+        if keep_std and not only_simulate:
+            self.regressor_state = state
+        else:
+            # release std regressor
+            self.regressor_state = None
+            if not keep_std:
+                self.regressor_stack = None
+                self.friction_regressor = None
+                self._YStd = None
+
+        if self.opt['filterRegressor'] and not only_simulate:
+            self.filterRegressor(self.YBase, self.num_base_inertial_params)
 
         self.sample_end = data.samples['positions'].shape[0]
         if self.opt['skipSamples'] > 0: self.sample_end -= (self.opt['skipSamples'])
 
         # keep absolute torques (self.tau can be relative)
-        self.tauMeasured = np.reshape(self.torques_stack, (data.num_used_samples, self.num_dofs+fb))
+        self.tauMeasured = np.reshape(self.torques_stack, (num_samples, self.num_dofs+fb))
 
         self.T = data.samples['times'][0:self.sample_end:self.opt['skipSamples']+1]
 
-        if self.opt['showTiming']:
-            print('(simulation for regressors took %.03f sec.)' % simulate_time)
-            print('(getting regressors took %.03f sec.)' % num_time)
-
-        if self.opt['verbose'] == 2:
-            print("YStd: {}".format(self.YStd.shape), end=' ')
+        if self.opt['verbose'] == 2 and not only_simulate:
+            if keep_std:
+                print("YStd: {}".format((self.regressor_stack.shape[0], self.num_identified_params)), end=' ')
             print("YBase: {}, cond: {}".format(self.YBase.shape, la.cond(self.YBase)))
 
+    def getBaseInformation(self):
+        # type: () -> np._ArrayLike
+        ''' get YBase.T*YBase, the one kept with the regressor state (updated when appending samples)
+            as long as YBase was not replaced (e.g. weighted) '''
+        state = self.regressor_state
+        if state is not None and state['information'] is not None and self.YBase is state['YBase']:
+            return state['information']
+        return np.dot(self.YBase.T, self.YBase)
+
+    def filterRegressor(self, regressor, num_columns, row_stride=None):
+        # type: (np._ArrayLike, int, int) -> None
+        ''' zero-phase low-pass filter the first num_columns columns of a stacked regressor in place
+            along time, i.e. separately for the rows i, i+row_stride, i+2*row_stride, ... of each
+            i < row_stride (default: the rows of a sample, including floating base rows). All
+            columns are filtered at once, in filterRegThreads threads over groups of columns if set. '''
+        if row_stride is None:
+            row_stride = self.num_dofs + (6 if self.opt['floatingBase'] else 0)
+        order = 5                            # Filter order
+        fs = self.data.samples['frequency']  # Sampling freq
+        fc = self.opt['filterRegCutoff']     # Cut-off frequency (Hz)
+        b, a = signal.butter(order, fc / (fs / 2), btype='low', analog=False)
+
+        # (time, series, columns) view of the columns to filter. If row_stride does not divide
+        # the number of rows, the first r series are one sample longer and are filtered from a copy
+        n, r = divmod(regressor.shape[0], row_stride)
+        Y = regressor[:n*row_stride, :num_columns].reshape((n, row_stride, num_columns))[:, r:]
+        if r:
+            Y_long = np.stack([regressor[i::row_stride, :num_columns] for i in range(r)], axis=1)
+
+        def filterColumns(cols):
+            # filter contiguous time series of each series and column
+            for Z in ([Y, Y_long] if r else [Y]):
+                X = np.ascontiguousarray(Z[:, :, cols].transpose(1, 2, 0))
+                Z[:, :, cols] = signal.filtfilt(b, a, X, axis=-1).transpose(2, 0, 1)
+
+        threads = 1
+        if 'filterRegThreads' in self.opt and self.opt['filterRegThreads'] > 1:
+            threads = min(self.opt['filterRegThreads'], num_columns)
+        groups = [slice(c[0], c[-1]+1) for c in np.array_split(np.arange(num_columns), threads) if len(c)]
+        if len(groups) > 1:
+            from multiprocessing.pool import ThreadPool
+            pool = ThreadPool(len(groups))
+            try:
+                pool.map(filterColumns, groups)
+            finally:
+                pool.close()
+                pool.join()
+        elif groups:
+            filterColumns(groups[0])
+
+        for i in range(r):
+            regressor[i::row_stride, :num_columns] = Y_long[:, i]
 
     def getRandomRegressor(self, n_samples=None):
         """
@@ -671,107 +1199,99 @@ class Model(object):
                 print("(re-)generating structural regressor ({} random positions)".format(n_samples))
 
             R = np.array((self.N_OUT, self.num_model_params))
-            regressor = iDynTree.MatrixDynSize(self.N_OUT, self.num_model_params)
-            knownTerms = iDynTree.VectorDynSize(self.N_OUT)
+            buffers = self.buffers
             if len(self.limits) > 0:
                 jn = self.jointNames
                 q_lim_pos = [self.limits[jn[n]]['upper'] for n in range(self.num_dofs)]
                 q_lim_neg = [self.limits[jn[n]]['lower'] for n in range(self.num_dofs)]
                 dq_lim = [self.limits[jn[n]]['velocity'] for n in range(self.num_dofs)]
                 q_range = (np.array(q_lim_pos) - np.array(q_lim_neg)).tolist()
-            for i in self.progress(range(0, n_samples)):
-                # set random system state
+            if self.opt['identifyGravityParamsOnly'] and self.useStaticRegressor():
+                # only the positions are random for static postures, get regressors in batches
                 if len(self.limits) > 0:
-                    rnd = np.random.rand(self.num_dofs) #0..1
-                    q = iDynTree.VectorDynSize.fromList((q_lim_neg+q_range*rnd))
-                    if self.opt['identifyGravityParamsOnly']:
-                        #set vel and acc to zero for static case
-                        vel = np.zeros(self.num_dofs)
-                        acc = np.zeros(self.num_dofs)
-                    else:
-                        vel = ((np.random.rand(self.num_dofs)-0.5)*2*dq_lim)
-                        acc = ((np.random.rand(self.num_dofs)-0.5)*2*np.pi)
-                    dq = iDynTree.VectorDynSize.fromList(vel.tolist())
-                    ddq = iDynTree.VectorDynSize.fromList(acc.tolist())
+                    positions = q_lim_neg + q_range*np.random.rand(n_samples, self.num_dofs)
                 else:
-                    q = iDynTree.VectorDynSize.fromList(((np.random.ranf(self.num_dofs)*2-1)*np.pi).tolist())
-                    dq = iDynTree.VectorDynSize.fromList(((np.random.ranf(self.num_dofs)*2-1)*np.pi).tolist())
-                    ddq = iDynTree.VectorDynSize.fromList(((np.random.ranf(self.num_dofs)*2-1)*np.pi).tolist())
+                    # (same random values as when drawing positions, velocities and accelerations)
+                    positions = (np.random.ranf((n_samples, 3, self.num_dofs))[:, 0]*2-1)*np.pi
+                R = np.zeros((self.num_identified_params, self.num_identified_params))
+                for i in self.progress(range(0, n_samples, 1000)):
+                    A = self.getStaticRegressors(positions[i:i+1000])
+                    R += A.T.dot(A)
+            else:
+                for i in self.progress(range(0, n_samples)):
+                    # set random system state
+                    if len(self.limits) > 0:
+                        rnd = np.random.rand(self.num_dofs) #0..1
+                        pos = q_lim_neg+q_range*rnd
+                        if self.opt['identifyGravityParamsOnly']:
+                            #set vel and acc to zero for static case
+                            vel = np.zeros(self.num_dofs)
+                            acc = np.zeros(self.num_dofs)
+                        else:
+                            vel = ((np.random.rand(self.num_dofs)-0.5)*2*dq_lim)
+                            acc = ((np.random.rand(self.num_dofs)-0.5)*2*np.pi)
+                    else:
+                        pos = (np.random.ranf(self.num_dofs)*2-1)*np.pi
+                        vel = (np.random.ranf(self.num_dofs)*2-1)*np.pi
+                        acc = (np.random.ranf(self.num_dofs)*2-1)*np.pi
+                    buffers.setJointState(pos, vel, acc)
 
-                # TODO: make work with fixed dofs (set vel and acc to zero, look at iDynTree method)
+                    # TODO: make work with fixed dofs (set vel and acc to zero, look at iDynTree method)
 
-                if self.opt['floatingBase']:
-                    base_vel = np.pi*np.random.rand(6)
-                    base_acc = np.pi*np.random.rand(6)
-                    if self.opt['identifyGravityParamsOnly']:
-                        #set vel and acc to zero for static case (reduces resulting amount of base dependencies)
-                        base_vel[:] = 0.0
-                        base_acc[:] = 0.0
-                    rpy = np.random.ranf(3)*0.1
-                    rot = iDynTree.Rotation.RPY(rpy[0], rpy[1], rpy[2])
-                    pos = iDynTree.Position.Zero()
-                    world_T_base = iDynTree.Transform(rot, pos).inverse()
-
-                    '''
-                    # rotate base vel and acc to world frame
-                    to_world = world_T_base.getRotation().toNumPy()
-                    base_vel[0:3] = to_world.dot(base_vel[0:3])
-                    base_vel[3:] = to_world.dot(base_vel[3:])
-                    base_acc[0:3] = to_world.dot(base_acc[0:3])
-                    base_acc[3:] = to_world.dot(base_acc[3:])
-                    '''
-
-                    base_velocity = iDynTree.Twist.fromList(base_vel)
-                    base_acceleration = iDynTree.Twist.fromList(base_acc)
-
-                    self.generator.setRobotState(q,dq,ddq, world_T_base, base_velocity, base_acceleration, self.gravity_twist)
-                else:
-                    self.generator.setRobotState(q,dq,ddq, self.gravity_twist)
+                    if self.opt['floatingBase']:
+                        base_vel = np.pi*np.random.rand(6)
+                        base_acc = np.pi*np.random.rand(6)
+                        if self.opt['identifyGravityParamsOnly']:
+                            #set vel and acc to zero for static case (reduces resulting amount of base dependencies)
+                            base_vel[:] = 0.0
+                            base_acc[:] = 0.0
+                        rpy = np.random.ranf(3)*0.1
+                        world_R_base = self.getBaseRotations(rpy)
+                        buffers.setBaseState(world_R_base, base_vel, base_acc)
+                    buffers.setGeneratorState(self.generator, self.opt['floatingBase'])
+
+                    # get regressor
+                    if not self.generator.computeRegressor(buffers.regressor, buffers.known_terms):
+                        print("Error during numeric computation of regressor")
 
-                # get regressor
-                if not self.generator.computeRegressor(regressor, knownTerms):
-                    print("Error during numeric computation of regressor")
+                    A = buffers.regressor.toNumPy()
 
-                A = regressor.toNumPy()
+                    #the base forces are expressed in the base frame for the regressor, so rotate them
+                    if self.opt['floatingBase']:
+                        A[0:6, :] = transforms.transformSpatialVectors(world_R_base, None, A[0:6, :])
 
-                #the base forces are expressed in the base frame for the regressor, so rotate them
-                if self.opt['floatingBase']:
-                    to_world = np.fromstring(world_T_base.getRotation().toString(), sep=' ').reshape((3,3))
-                    A[0:3, :] = to_world.dot(A[0:3, :])
-                    A[3:6, :] = to_world.dot(A[3:6, :])
+                    if self.opt['identifyGravityParamsOnly']:
+                        #delete inertia param columns
+                        A = np.delete(A, self.inertia_params, 1)
 
-                if self.opt['identifyGravityParamsOnly']:
-                    #delete inertia param columns
-                    A = np.delete(A, self.inertia_params, 1)
-
-                if self.opt['identifyFriction']:
-                    # append unitary matrix to regressor for offsets/constant friction
-                    sign = 1 #np.sign(dq.toNumPy())
-                    static_diag = np.identity(self.num_dofs)*sign
-                    offset_regressor = np.vstack( (np.zeros((fb*6, self.num_dofs)), static_diag))
-                    A = np.concatenate((A, offset_regressor), axis=1)
-
-                    if not self.opt['identifyGravityParamsOnly']:
-                        if self.opt['identifySymmetricVelFriction']:
-                            # just use velocity directly
-                            vel_diag = np.identity(self.num_dofs)*dq.toNumPy()
-                            friction_regressor = np.vstack( (np.zeros((fb*6, self.num_dofs)), vel_diag))   # add base dynamics rows
-                        else:
-                            # append positive/negative velocity matrix for velocity dependent asymmetrical friction
-                            dq_p = dq.toNumPy().copy()
-                            dq_p[dq_p < 0] = 0 #set to zero where v < 0
-                            dq_m = dq.toNumPy().copy()
-                            dq_m[dq_m > 0] = 0 #set to zero where v > 0
-                            vel_diag = np.hstack((np.identity(self.num_dofs)*dq_p, np.identity(self.num_dofs)*dq_m))
-                            friction_regressor = np.vstack( (np.zeros((fb*6, self.num_dofs*2)), vel_diag))   # add base dynamics rows
-                        A = np.concatenate((A, friction_regressor), axis=1)
-
-                # add to previous regressors, linear dependencies don't change
-                # (if too many, saturation or accuracy problems?)
-                if i==0:
-                    R = A.T.dot(A)
-                else:
-                    R += A.T.dot(A)
+                    if self.opt['identifyFriction']:
+                        # append unitary matrix to regressor for offsets/constant friction
+                        sign = 1 #np.sign(dq.toNumPy())
+                        static_diag = np.identity(self.num_dofs)*sign
+                        offset_regressor = np.vstack( (np.zeros((fb*6, self.num_dofs)), static_diag))
+                        A = np.concatenate((A, offset_regressor), axis=1)
+
+                        if not self.opt['identifyGravityParamsOnly']:
+                            if self.opt['identifySymmetricVelFriction']:
+                                # just use velocity directly
+                                vel_diag = np.identity(self.num_dofs)*vel
+                                friction_regressor = np.vstack( (np.zeros((fb*6, self.num_dofs)), vel_diag))   # add base dynamics rows
+                            else:
+                                # append positive/negative velocity matrix for velocity dependent asymmetrical friction
+                                dq_p = vel.copy()
+                                dq_p[dq_p < 0] = 0 #set to zero where v < 0
+                                dq_m = vel.copy()
+                                dq_m[dq_m > 0] = 0 #set to zero where v > 0
+                                vel_diag = np.hstack((np.identity(self.num_dofs)*dq_p, np.identity(self.num_dofs)*dq_m))
+                                friction_regressor = np.vstack( (np.zeros((fb*6, self.num_dofs*2)), vel_diag))   # add base dynamics rows
+                            A = np.concatenate((A, friction_regressor), axis=1)
+
+                    # add to previous regressors, linear dependencies don't change
+                    # (if too many, saturation or accuracy problems?)
+                    if i==0:
+                        R = A.T.dot(A)
+                    else:
+                        R += A.T.dot(A)
 
             # get column space dependencies
             Q,RQ,PQ = sla.qr(R, pivoting=True, mode='economic')
@@ -884,25 +1404,69 @@ class Model(object):
                 # in general, pinv is always working (but is numerically a bit different)
                 self.Binv = la.pinv(self.B)
 
-        # define sympy symbols for each std column
-        self.base_syms = sympy.Matrix([sympy.Symbol('beta'+str(i),real=True) for i in range(self.num_base_params)])
-        self.param_syms = list()     # type: List[sympy.Symbol]
-        self.mass_syms = list()      # type: List[sympy.Symbol]
-        self.friction_syms = list()  # type: List[sympy.Symbol]
         #indices of params within full param vector that are going to be identified
         self.identified_params = list()  # type: List[int]
+        for i in range(0, self.num_links):
+            if self.opt['identifyGravityParamsOnly']:
+                self.identified_params.extend([i*10, i*10+1, i*10+2, i*10+3])
+            else:
+                self.identified_params.extend(list(range(i*10, i*10+10)))
+
+        if self.opt['identifyFriction']:
+            mp = self.num_model_params
+            self.identified_params.extend(list(range(mp, mp+self.num_dofs)))
+            if not self.opt['identifyGravityParamsOnly']:
+                if self.opt['identifySymmetricVelFriction']:
+                    self.identified_params.extend(list(range(mp+self.num_dofs, mp+2*self.num_dofs)))
+                else:
+                    self.identified_params.extend(list(range(mp+self.num_dofs, mp+3*self.num_dofs)))
+
+        # matrix of linear factors with which each identified std param contributes to the base params
+        if self.opt['useBasisProjection']:
+            if self.opt['orthogonalizeBasis']:
+                #this is only correct if basis is orthogonal
+                self.base_factors = self.B.T
+            else:
+                #otherwise, we need to get relationships from the inverse
+                B_qr_inv_z = la.pinv(self.B)
+                B_qr_inv_z[np.abs(B_qr_inv_z) < self.opt['minTol']] = 0
+                self.base_factors = B_qr_inv_z
+        else:
+            # using projection matrix from Gautier/Sousa method for base eqns
+            # (K is orthogonal)
+            self.base_factors = self.K
+
+        # find std parameters that have no effect on estimation (not single or contributing to base
+        # equations)
+        contributing = np.array(self.identified_params)[np.any(self.base_factors != 0, axis=0)]
+        self.non_id = [p for p in range(self.num_all_params) if p not in contributing]
+        self.identifiable = [p for p in range(self.num_all_params) if p not in self.non_id]
+
+        # symbolic params and base equations are only created on first use (sympy is slow to load)
+        self._param_syms = None
+
+
+    def initSymbols(self):
+        # type: () -> None
+        """ create sympy symbols for std and base params and symbolic base parameter equations """
+        import sympy
+        from sympy import symbols, Matrix
+
+        # define sympy symbols for each std column
+        self._base_syms = sympy.Matrix([sympy.Symbol('beta'+str(i),real=True) for i in range(self.num_base_params)])
+        param_syms = list()     # type: List[sympy.Symbol]
+        self._mass_syms = list()      # type: List[sympy.Symbol]
+        self._friction_syms = list()  # type: List[sympy.Symbol]
         for i in range(0, self.num_links):
             #mass
             m = symbols('m_{}'.format(i))
-            self.param_syms.append(m)
-            self.identified_params.append(i*10)
-            self.mass_syms.append(m)
+            param_syms.append(m)
+            self._mass_syms.append(m)
 
             #first moment of mass
             p = 'c_{}'.format(i)  #symbol prefix
             syms = [symbols(p+'x'), symbols(p+'y'), symbols(p+'z')]
-            self.param_syms.extend(syms)
-            self.identified_params.extend([i*10+1, i*10+2, i*10+3])
+            param_syms.extend(syms)
 
             #3x3 inertia tensor about link-frame (for link i)
             p = 'I_{}'.format(i)
@@ -910,66 +1474,61 @@ class Model(object):
                     symbols(p+'xy'), symbols(p+'yy'), symbols(p+'yz'),
                     symbols(p+'xz'), symbols(p+'yz'), symbols(p+'zz')
                    ]
-            self.param_syms.extend([syms[0], syms[1], syms[2], syms[4], syms[5], syms[8]])
-
-            if not self.opt['identifyGravityParamsOnly']:
-                self.identified_params.extend([i*10+4, i*10+5, i*10+6, i*10+7, i*10+8, i*10+9])
+            param_syms.extend([syms[0], syms[1], syms[2], syms[4], syms[5], syms[8]])
 
         if self.opt['identifyFriction']:
-            mp = self.num_model_params
-            for i in range(0,self.num_dofs):
-                s = [symbols('Fc_{}'.format(i))]
-                self.param_syms.extend(s)
-                self.friction_syms.extend(s)
-                self.identified_params.append(mp+i)
+            s = [symbols('Fc_{}'.format(i)) for i in range(0,self.num_dofs)]
+            param_syms.extend(s)
+            self._friction_syms.extend(s)
             if not self.opt['identifyGravityParamsOnly']:
                 if self.opt['identifySymmetricVelFriction']:
-                    for i in range(0,self.num_dofs):
-                        s = [symbols('Fv_{}'.format(i))]
-                        self.param_syms.extend(s)
-                        self.friction_syms.extend(s)
-                        self.identified_params.append(mp+self.num_dofs+i)
+                    s = [symbols('Fv_{}'.format(i)) for i in range(0,self.num_dofs)]
+                    param_syms.extend(s)
+                    self._friction_syms.extend(s)
                 else:
-                    for i in range(0,self.num_dofs):
-                        s = [symbols('Fv+_{}'.format(i))]
-                        self.param_syms.extend(s)
-                        self.friction_syms.extend(s)
-                        self.identified_params.append(mp+self.num_dofs+i)
-                    for i in range(0,self.num_dofs):
-                        s = [symbols('Fv-_{}'.format(i))]
-                        self.param_syms.extend(s)
-                        self.friction_syms.extend(s)
-                        self.identified_params.append(mp+2*self.num_dofs+i)
-        self.param_syms = np.array(self.param_syms)
+                    s = [symbols('Fv+_{}'.format(i)) for i in range(0,self.num_dofs)]
+                    s += [symbols('Fv-_{}'.format(i)) for i in range(0,self.num_dofs)]
+                    param_syms.extend(s)
+                    self._friction_syms.extend(s)
+        self._param_syms = np.array(param_syms)
 
         ## get symbolic equations for base param dependencies
         # Each dependent parameter can be ignored (non-identifiable) or it can be
         # represented by grouping some base and/or dependent parameters.
-        # TODO: put this in regressor cache file (it's slow)
         if self.opt['useBasisProjection']:
-            if self.opt['orthogonalizeBasis']:
-                #this is only correct if basis is orthogonal
-                self.base_deps = np.dot(self.param_syms[self.identified_params], self.B)
-            else:
-                #otherwise, we need to get relationships from the inverse
-                B_qr_inv_z = la.pinv(self.B)
-                B_qr_inv_z[np.abs(B_qr_inv_z) < self.opt['minTol']] = 0
-                self.base_deps = np.dot(self.param_syms[self.identified_params], B_qr_inv_z.T)
+            self._base_deps = np.dot(self._param_syms[self.identified_params], self.base_factors.T)
         else:
-            # using projection matrix from Gautier/Sousa method for base eqns
-            # (K is orthogonal)
-            self.base_deps = Matrix(self.K) * Matrix(self.param_syms[self.identified_params])
-
-        # find std parameters that have no effect on estimation (not single or contributing to base
-        # equations)
-        # TODO: also put this in regressor cache file
-        base_deps_syms = []   # type: List[sympy.Symbol]
-        for i in range(self.base_deps.shape[0]):
-            for s in self.base_deps[i].free_symbols:
-                if s not in base_deps_syms:
-                    base_deps_syms.append(s)
-        self.non_id = [p for p in range(self.num_all_params) if self.param_syms[p] not in base_deps_syms]
-        self.identifiable = [p for p in range(self.num_all_params) if p not in self.non_id]
+            self._base_deps = Matrix(self.base_factors) * Matrix(self._param_syms[self.identified_params])
+
+    @property
+    def param_syms(self):
+        if self._param_syms is None:
+            self.initSymbols()
+        return self._param_syms
+
+    @property
+    def mass_syms(self):
+        if self._param_syms is None:
+            self.initSymbols()
+        return self._mass_syms
+
+    @property
+    def friction_syms(self):
+        if self._param_syms is None:
+            self.initSymbols()
+        return self._friction_syms
+
+    @property
+    def base_syms(self):
+        if self._param_syms is None:
+            self.initSymbols()
+        return self._base_syms
+
+    @property
+    def base_deps(self):
+        if self._param_syms is None:
+            self.initSymbols()
+        return self._base_deps
 
 
     def getSubregressorsConditionNumbers(self):
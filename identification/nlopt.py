@@ -16,7 +16,6 @@ from .quaternion import Quaternion
 sys.path.insert(1, os.path.join(sys.path[0], '..'))
 from excitation.optimizer import Optimizer
 
-from IPython import embed
 
 class NLOPT(Optimizer):
     def __init__(self, idf):
@@ -169,7 +168,7 @@ class NLOPT(Optimizer):
         #minimize estimation error
         if self.min_est_error:
             tau = self.model.torques_stack
-            u = la.norm( (tau - self.model.contactForcesSum) - self.model.YStd[:, self.start_param:].dot(x))**2 #/ self.idf.data.num_used_samples
+            u = la.norm( (tau - self.model.contactForcesSum) - self.model.stdRegressorDot(np.concatenate((np.zeros(self.start_param), x))))**2 #/ self.idf.data.num_used_samples
         else:
             #minimize distance to CAD
             apriori = self.model.xStdModel[self.identified_params]
@@ -271,7 +270,7 @@ class NLOPT(Optimizer):
         #minimize estimation error
         if self.min_est_error:
             tau = self.model.torques_stack
-            u = la.norm( (tau - self.model.contactForcesSum) - self.model.YStd[:, self.start_param:].dot(x_std))**2 #/ self.idf.data.num_used_samples
+            u = la.norm( (tau - self.model.contactForcesSum) - self.model.stdRegressorDot(np.concatenate((np.zeros(self.start_param), x_std))))**2 #/ self.idf.data.num_used_samples
         else:
             #minimize distance to CAD
             apriori = self.model.xStdModel[self.identified_params]
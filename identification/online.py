@@ -0,0 +1,259 @@
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from builtins import range
+from builtins import object
+import sys
+from typing import Any, Dict, Tuple
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue   # python 2
+
+import numpy as np
+import numpy.linalg as la
+from scipy import signal
+from colorama import Fore
+
+from identification import helpers
+
+class CausalFilter(object):
+    ''' low-pass butterworth filter for a stream of samples with several channels (keeps the filter
+        state between samples) '''
+
+    def __init__(self, cutoff, order, fs, channels):
+        # type: (float, int, float, int) -> None
+        self.b, self.a = signal.butter(order, cutoff / (fs/2), btype='low', analog=False)
+        self.zi_step = signal.lfilter_zi(self.b, self.a)
+        self.zi = None   # type: np._ArrayLike
+        self.channels = channels
+
+    def filter(self, x):
+        # type: (np._ArrayLike) -> np._ArrayLike
+        if self.zi is None:
+            # start in steady state for the first value (no transient from zero)
+            self.zi = np.outer(self.zi_step, x)
+        y, self.zi = signal.lfilter(self.b, self.a, x[np.newaxis, :], axis=0, zi=self.zi)
+        return y[0]
+
+
+class OnlineIdentification(object):
+    ''' Identify base parameters recursively from samples as they arrive (e.g. while exciting the
+        robot), to see early if the excitation is informative enough.
+
+        Raw samples are preprocessed causally (positions and torques are low-pass filtered,
+        velocities and accelerations differentiated from the filtered positions, no median filter),
+        so the estimates will differ somewhat from the offline preprocessing of Data.preprocess.
+        Already preprocessed samples can be given to update() directly.
+
+        The estimate and its covariance are updated with recursive least squares for the rows of
+        each sample, optionally with exponential forgetting. The (weighted) normal equations are
+        accumulated as well, their solution is the batch OLS solution for all samples (without
+        forgetting) and the condition number of the information matrix is checked regularly.
+        Only fixed base models without contacts are supported.
+    '''
+
+    def __init__(self, model, opt, frequency):
+        # type: (Model, Dict[str, Any], float) -> None
+        self.model = model
+        self.opt = opt
+
+        if self.opt['floatingBase']:
+            print(Fore.RED + "Online identification is only supported for fixed base models." + Fore.RESET)
+            sys.exit(1)
+
+        self.num_dofs = self.model.num_dofs
+        if self.opt['useBasisProjection']:
+            self.projection = self.model.B
+            self.xBaseModel = self.model.xStdModel.dot(self.model.B)
+        else:
+            self.projection = self.model.Pb
+            self.xBaseModel = self.model.K.dot(self.model.xStdModel[self.model.identified_params])
+        self.xStdModel = self.model.xStdModel[self.model.identified_params]
+        num_params = self.projection.shape[1]
+
+        self.forgetting = self.opt['onlineForgetting'] if 'onlineForgetting' in self.opt \
+                          and self.opt['onlineForgetting'] else 1.0
+        self.cond_interval = self.opt['onlineConditionInterval'] if 'onlineConditionInterval' in self.opt \
+                             and self.opt['onlineConditionInterval'] else 100
+        init_cov = self.opt['onlineInitialCovariance'] if 'onlineInitialCovariance' in self.opt \
+                   and self.opt['onlineInitialCovariance'] else 1e6
+
+        # recursive estimate (error to a priori if useAPriori) and its unscaled covariance
+        self.x = np.zeros(num_params)
+        self.P = np.identity(num_params) * init_cov
+
+        # (weighted) normal equations and torque sum of squares
+        self.info = np.zeros((num_params, num_params))
+        self.info_tau = np.zeros(num_params)
+        self.tau_sq = 0.0
+        self.torq_sq = 0.0    # of absolute torques (tau is relative if useAPriori)
+        self.num_rows = 0.0   # effective number of rows (with forgetting)
+        self.cond = np.inf
+
+        self.num_samples = 0
+        self.update_time = 0.0
+        self.max_update_time = 0.0
+
+        # causal preprocessing state
+        self.pos_filter = CausalFilter(self.opt['filterLowPass1'][0], self.opt['filterLowPass1'][1],
+                                       frequency, self.num_dofs)
+        self.vel_filter = CausalFilter(self.opt['filterLowPass2'][0], self.opt['filterLowPass2'][1],
+                                       frequency, self.num_dofs)
+        self.torq_filter = CausalFilter(self.opt['filterLowPass1'][0], self.opt['filterLowPass1'][1],
+                                        frequency, self.num_dofs)
+        self.last_time = None   # type: float
+        self.last_pos = None    # type: np._ArrayLike
+        self.last_vel = None    # type: np._ArrayLike
+
+    def addSample(self, t, pos, torq):
+        # type: (float, np._ArrayLike, np._ArrayLike) -> None
+        ''' preprocess a raw measurement sample and use it for identification (the first two samples
+            are only used to start differentiation) '''
+        pos = np.array(pos, dtype=np.float64)
+        if self.opt['useDeg']:
+            pos = np.deg2rad(pos)
+        pos = self.pos_filter.filter(pos)
+        torq = self.torq_filter.filter(np.array(torq, dtype=np.float64))
+
+        if self.last_time is not None:
+            dt = t - self.last_time
+            if dt <= 0:
+                # repeated sample
+                return
+            vel = self.vel_filter.filter((pos - self.last_pos) / dt)
+            if self.last_vel is not None:
+                acc = (vel - self.last_vel) / dt
+                self.update(pos, vel, acc, torq)
+            self.last_vel = vel
+
+        self.last_time = t
+        self.last_pos = pos
+
+    def update(self, pos, vel, acc, torq):
+        # type: (np._ArrayLike, np._ArrayLike, np._ArrayLike, np._ArrayLike) -> None
+        ''' update estimates with the regressor rows of one (preprocessed) sample '''
+        with helpers.Timer() as t:
+            YStd = self.model.getRegressor(pos, vel, acc)
+            Y = YStd.dot(self.projection)
+            tau = np.asarray(torq, dtype=np.float64)
+            if self.opt['useAPriori']:
+                tau = tau - YStd.dot(self.xStdModel)
+
+            lam = self.forgetting
+
+            # recursive least squares for the block of rows
+            PYt = self.P.dot(Y.T)
+            S = lam*np.identity(Y.shape[0]) + Y.dot(PYt)
+            K = la.solve(S, PYt.T).T
+            self.x += K.dot(tau - Y.dot(self.x))
+            self.P -= K.dot(PYt.T)
+            self.P /= lam
+            self.P = 0.5*(self.P + self.P.T)
+
+            self.info *= lam
+            self.info += Y.T.dot(Y)
+            self.info_tau *= lam
+            self.info_tau += Y.T.dot(tau)
+            self.tau_sq = lam*self.tau_sq + tau.dot(tau)
+            self.torq_sq = lam*self.torq_sq + np.dot(torq, torq)
+            self.num_rows = lam*self.num_rows + Y.shape[0]
+
+            self.num_samples += 1
+            if self.num_samples % self.cond_interval == 0:
+                self.cond = la.cond(self.info)
+
+        self.update_time += t.interval
+        self.max_update_time = max(self.max_update_time, t.interval)
+
+    def getResidualVariance(self, x):
+        # type: (np._ArrayLike) -> float
+        ''' variance of the torque residuals for solution x (from the normal equations) '''
+        residual = self.tau_sq - 2*x.dot(self.info_tau) + x.dot(self.info).dot(x)
+        dof = max(self.num_rows - x.size, 1)
+        return max(residual, 0) / dof
+
+    def getEstimate(self):
+        # type: () -> Tuple[np._ArrayLike, np._ArrayLike]
+        ''' get current recursive estimate of the base params and its covariance '''
+        xBase = self.x.copy()
+        cov = self.P * self.getResidualVariance(self.x)
+        if self.opt['useAPriori']:
+            xBase += self.xBaseModel
+        return xBase, cov
+
+    def getLeastSquaresEstimate(self):
+        # type: () -> Tuple[np._ArrayLike, np._ArrayLike]
+        ''' solve the accumulated normal equations, gives the same base params as batch OLS on all
+            samples (if not forgetting) '''
+        x = la.lstsq(self.info, self.info_tau)[0]
+        cov = la.pinv(self.info) * self.getResidualVariance(x)
+        if self.opt['useAPriori']:
+            x = x + self.xBaseModel
+        return x, cov
+
+    def printStatus(self):
+        # type: () -> None
+        rel_error = np.sqrt(self.getResidualVariance(self.x) * max(self.num_rows - self.x.size, 1) /
+                            max(self.torq_sq, 1e-10)) * 100
+        print("online identification: {} samples, cond. {:.1f}, rel. error {:.2f}%, update {:.3f}ms (max {:.3f}ms)".format(
+              self.num_samples, np.sqrt(self.cond), rel_error,
+              self.update_time / max(self.num_samples, 1) * 1000, self.max_update_time * 1000))
+
+    def printResults(self):
+        # type: () -> None
+        xBase, cov = self.getLeastSquaresEstimate()
+        print(Fore.GREEN + "Online identified base params ({} samples):".format(self.num_samples) + Fore.RESET)
+        std = np.sqrt(np.abs(np.diag(cov)))
+        for i in range(xBase.size):
+            print("#{}: {:.5f} (std {:.5f}, a priori {:.5f})".format(i, xBase[i], std[i], self.xBaseModel[i]))
+        self.printStatus()
+
+
+class OnlineWorker(object):
+    ''' Update an OnlineIdentification from a background thread, so that receiving samples (in a
+        robot communication loop or message callback) only puts them on a queue and is not delayed
+        by filtering and the recursive update. Status and results are printed with a lock, stop()
+        processes the queued samples and ends the thread. '''
+
+    def __init__(self, online):
+        # type: (OnlineIdentification) -> None
+        self.online = online
+        self.lock = threading.Lock()
+        self.samples = queue.Queue()   # type: queue.Queue
+        self.thread = threading.Thread(target=self._update)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _update(self):
+        # type: () -> None
+        ''' worker thread, identifies with the queued samples '''
+        while True:
+            item = self.samples.get()
+            if item is None:
+                break
+            with self.lock:
+                self.online.addSample(*item)
+
+    def addSample(self, t, pos, torq):
+        # type: (float, np._ArrayLike, np._ArrayLike) -> None
+        ''' queue a raw measurement sample (copied, the caller can reuse its arrays) '''
+        self.samples.put((t, np.array(pos, dtype=np.float64), np.array(torq, dtype=np.float64)))
+
+    def stop(self):
+        # type: () -> None
+        self.samples.put(None)
+        self.thread.join()
+
+    def printStatus(self):
+        # type: () -> None
+        with self.lock:
+            self.online.printStatus()
+        if self.samples.qsize() > 0:
+            print("({} samples queued for online identification)".format(self.samples.qsize()))
+
+    def printResults(self):
+        # type: () -> None
+        with self.lock:
+            self.online.printResults()
@@ -35,12 +35,14 @@ color_triplets_6 = [
            [ 0.82745098,  0.24705882,  0.41568627],
           ]
 
-#set some more colors for higher DOF
-from palettable.tableau import Tableau_10, Tableau_20
-colors = Tableau_10.mpl_colors[0:6] + Tableau_20.mpl_colors + Tableau_20.mpl_colors
+def getColors():
+    #set some more colors for higher DOF
+    from palettable.tableau import Tableau_10, Tableau_20
+    colors = Tableau_10.mpl_colors[0:6] + Tableau_20.mpl_colors + Tableau_20.mpl_colors
 
-#swap some values for aesthetics
-colors[2], colors[0] = colors[0], colors[2]
+    #swap some values for aesthetics
+    colors[2], colors[0] = colors[0], colors[2]
+    return colors
 
 class OutputConsole(object):
     def __init__(self, idf):
@@ -579,6 +581,8 @@ class OutputMatplotlib(object):
         # maximum number of points is plotted (determined by screen etc.)
         skip = 5
 
+        colors = getColors()
+
         #create figures and plots
         figures = list()
         for ds in self.progress(range(len(self.datasets))):
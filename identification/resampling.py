@@ -0,0 +1,249 @@
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from builtins import range
+from builtins import object
+from typing import Any, Dict, List, Tuple
+
+import multiprocessing
+
+import numpy as np
+import numpy.linalg as la
+from colorama import Fore
+
+# resampling instance the worker processes operate on (inherited when forking, the pool is always
+# started with fork as the model and sdp objects can't be pickled)
+_resampling = None   # type: Resampling
+
+def _solveChunk(args):
+    # type: (Tuple[np._ArrayLike, bool]) -> np._ArrayLike
+    weights, constrained = args
+    if constrained:
+        return np.array([_resampling.solveConstrained(w) for w in weights])
+    else:
+        return np.array([_resampling.solveBase(w) for w in weights])
+
+
+class Resampling(object):
+    ''' Empirical uncertainty of the identified parameters using block bootstrap and k-fold cross
+        validation over blocks of the measurement samples.
+
+        The regressor is computed only once (by the previous identification). It is split into
+        blocks of consecutive samples, for which the normal equations are precomputed. A resample
+        then is a weighted sum of the block equations, so the OLS solutions are cheap. Optionally,
+        each resample is solved again with the constrained SDP (needs the resampled regressor rows).
+    '''
+
+    def __init__(self, idf, block_size=None):
+        # type: (Identification, int) -> None
+        self.idf = idf
+        self.model = idf.model
+        self.opt = idf.opt
+
+        if self.opt['floatingBase']: fb = 6
+        else: fb = 0
+        self.rows_per_sample = self.model.num_dofs + fb
+
+        if block_size is None:
+            block_size = self.opt['bootstrapBlockSize'] if 'bootstrapBlockSize' in self.opt \
+                         and self.opt['bootstrapBlockSize'] else self.opt['blockSize']
+        num_samples = self.model.YBase.shape[0] // self.rows_per_sample
+        self.num_blocks = max(num_samples // block_size, 1)
+
+        # block boundaries in samples (last block also takes remaining samples)
+        self.block_starts = np.arange(self.num_blocks) * block_size
+        self.block_ends = np.append(self.block_starts[1:], num_samples)
+
+        Y = self.model.YBase
+        tau = self.model.tau
+        if self.opt['addContacts']:
+            tau = tau - self.model.contactForcesSum
+        # measured torques for normalization of validation error
+        tau_abs = self.model.torques_stack
+
+        num_params = Y.shape[1]
+        self.YtY = np.zeros((self.num_blocks, num_params, num_params))
+        self.Ytt = np.zeros((self.num_blocks, num_params))
+        self.ttt = np.zeros(self.num_blocks)
+        self.tau_norm = np.zeros(self.num_blocks)
+        for b in range(self.num_blocks):
+            rows = self.getBlockRows(b)
+            self.YtY[b] = Y[rows].T.dot(Y[rows])
+            self.Ytt[b] = Y[rows].T.dot(tau[rows])
+            self.ttt[b] = tau[rows].dot(tau[rows])
+            self.tau_norm[b] = tau_abs[rows].dot(tau_abs[rows])
+
+        self.processes = self.opt['resamplingProcesses'] if 'resamplingProcesses' in self.opt \
+                         and self.opt['resamplingProcesses'] else multiprocessing.cpu_count()
+
+    def getBlockRows(self, b):
+        # type: (int) -> slice
+        return slice(self.block_starts[b]*self.rows_per_sample, self.block_ends[b]*self.rows_per_sample)
+
+    def solveBase(self, weights):
+        # type: (np._ArrayLike) -> np._ArrayLike
+        ''' solve OLS for base parameters (error to a priori if useAPriori) with weighted blocks '''
+        A = np.tensordot(weights, self.YtY, axes=1)
+        c = weights.dot(self.Ytt)
+        try:
+            return la.solve(A, c)
+        except la.LinAlgError:
+            return la.lstsq(A, c)[0]
+
+    def solveConstrained(self, weights):
+        # type: (np._ArrayLike) -> np._ArrayLike
+        ''' solve for feasible std parameters with SDP using the regressor rows of the weighted
+            blocks (blocks drawn several times are repeated) '''
+        rows = np.concatenate([np.arange(self.getBlockRows(b).start, self.getBlockRows(b).stop)
+                               for b in range(self.num_blocks) for _ in range(int(weights[b]))])
+
+        # temporarily replace data of model with resampled rows
+        model = self.model
+        keys = ['YBase', 'tau', 'torques_stack', 'contactForcesSum']
+        saved = {k: getattr(model, k) for k in keys + ['xBase', 'xStd', 'YBaseInv']}
+        try:
+            for k in keys:
+                setattr(model, k, saved[k][rows])
+            self.idf.identifyBaseParameters(id_only=True)
+            if self.opt['useAPriori']:
+                self.idf.getBaseParamsFromParamError()
+            self.idf.sdp.identifyFeasibleStandardParameters(self.idf)
+            xStd = model.xStd.copy()
+        finally:
+            for k in saved:
+                setattr(model, k, saved[k])
+        return xStd
+
+    def solveAll(self, weights, constrained=False):
+        # type: (np._ArrayLike, bool) -> np._ArrayLike
+        ''' solve for each row of weights in parallel worker processes '''
+        global _resampling
+        _resampling = self
+
+        if constrained and self.idf.sdp is None:
+            from identification.sdp import SDP
+            self.idf.sdp = SDP(self.idf)
+        if constrained:
+            self.idf.sdp.initSDP_LMIs(self.idf)
+
+        processes = min(self.processes, weights.shape[0])
+        if processes < 2:
+            return _solveChunk((weights, constrained))
+
+        chunks = [(w, constrained) for w in np.array_split(weights, processes)]
+        if hasattr(multiprocessing, 'get_context'):
+            ctx = multiprocessing.get_context('fork')
+        else:
+            ctx = multiprocessing
+        pool = ctx.Pool(processes)
+        try:
+            results = pool.map(_solveChunk, chunks)
+        finally:
+            pool.terminate()
+        return np.concatenate(results, axis=0)
+
+    def toAbsoluteParams(self, x):
+        # type: (np._ArrayLike) -> Tuple[np._ArrayLike, np._ArrayLike]
+        ''' get base and std parameters for (rows of) OLS solutions, in the same way as
+            Identification.findStdFromBaseParameters '''
+        if self.opt['useBasisProjection']:
+            xStd = x.dot(self.model.B.T)
+        else:
+            xStd = x.dot(la.pinv(self.model.K).T)
+
+        xBase = x.copy()
+        if self.opt['useAPriori']:
+            xStd += self.model.xStdModel[self.model.identified_params]
+            xBase += self.model.xBaseModel
+        return xBase, xStd
+
+    def toBaseParams(self, xStd):
+        # type: (np._ArrayLike) -> np._ArrayLike
+        if self.opt['useBasisProjection']:
+            return xStd.dot(self.model.Binv.T)
+        else:
+            return xStd.dot(self.model.K.T)
+
+    def getValidationError(self, x, blocks):
+        # type: (np._ArrayLike, List[int]) -> float
+        ''' relative torque error (in percent) of solution x (as given by solveBase) on blocks '''
+        A = np.sum(self.YtY[blocks], axis=0)
+        c = np.sum(self.Ytt[blocks], axis=0)
+        residual = x.dot(A).dot(x) - 2*x.dot(c) + np.sum(self.ttt[blocks])
+        return np.sqrt(max(residual, 0)) * 100 / np.sqrt(np.sum(self.tau_norm[blocks]))
+
+    def bootstrap(self, num_resamples=1000, constrained=False, percentiles=(2.5, 97.5), seed=None):
+        # type: (int, bool, Tuple[float, float], int) -> Dict[str, Any]
+        ''' block bootstrap: draw blocks with replacement and identify again for each resample '''
+        rng = np.random.RandomState(seed)
+        weights = rng.multinomial(self.num_blocks, np.ones(self.num_blocks) / self.num_blocks,
+                                  size=num_resamples).astype(np.float64)
+
+        solutions = self.solveAll(weights, constrained)
+        if constrained:
+            xStd = solutions
+            xBase = self.toBaseParams(xStd)
+        else:
+            xBase, xStd = self.toAbsoluteParams(solutions)
+
+        return {
+            'xBase': xBase,
+            'xStd': xStd,
+            'xBase_std': np.std(xBase, axis=0),
+            'xStd_std': np.std(xStd, axis=0),
+            'xBase_ci': np.percentile(xBase, percentiles, axis=0),
+            'xStd_ci': np.percentile(xStd, percentiles, axis=0),
+            'percentiles': percentiles,
+        }
+
+    def crossValidate(self, folds=5, constrained=False):
+        # type: (int, bool) -> Dict[str, Any]
+        ''' k-fold cross validation over consecutive blocks, returns parameters and validation error
+            for each fold '''
+        folds = min(folds, self.num_blocks)
+        fold_blocks = np.array_split(np.arange(self.num_blocks), folds)
+        weights = np.ones((folds, self.num_blocks))
+        for k in range(folds):
+            weights[k, fold_blocks[k]] = 0
+
+        solutions = self.solveAll(weights, constrained)
+        if constrained:
+            xStd = solutions
+            xBase = self.toBaseParams(xStd)
+            # get errors with solution vectors as used by solveBase
+            x = xBase - self.model.xBaseModel if self.opt['useAPriori'] else xBase
+        else:
+            x = solutions
+            xBase, xStd = self.toAbsoluteParams(solutions)
+
+        errors = np.array([self.getValidationError(x[k], fold_blocks[k]) for k in range(folds)])
+        return {
+            'xBase': xBase,
+            'xStd': xStd,
+            'fold_blocks': fold_blocks,
+            'val_error': errors,
+        }
+
+    def printResults(self, bootstrap=None, crossvalidation=None):
+        # type: (Dict[str, Any], Dict[str, Any]) -> None
+        if bootstrap is not None:
+            lo, hi = bootstrap['percentiles']
+            print(Fore.GREEN + "Bootstrap ({} resamples of {} blocks), {}%-{}% intervals:".format(
+                bootstrap['xStd'].shape[0], self.num_blocks, lo, hi) + Fore.RESET)
+            print("Base params:")
+            for i in range(self.model.num_base_params):
+                print("#{}: {:.5f} (std {:.5f}) [{:.5f}, {:.5f}]".format(i, self.model.xBase[i],
+                      bootstrap['xBase_std'][i], bootstrap['xBase_ci'][0][i], bootstrap['xBase_ci'][1][i]))
+            print("Std params:")
+            for i in range(len(self.model.identified_params)):
+                p = self.model.identified_params[i]
+                print("#{} {}: {:.5f} (std {:.5f}) [{:.5f}, {:.5f}]".format(p, self.model.param_syms[p],
+                      self.model.xStd[i], bootstrap['xStd_std'][i], bootstrap['xStd_ci'][0][i],
+                      bootstrap['xStd_ci'][1][i]))
+
+        if crossvalidation is not None:
+            errors = crossvalidation['val_error']
+            print(Fore.GREEN + "Cross validation ({} folds):".format(errors.size) + Fore.RESET)
+            for k in range(errors.size):
+                print("fold {}: validation error {:.3f}%".format(k, errors[k]))
+            print("mean validation error: {:.3f}% (std {:.3f}%)".format(np.mean(errors), np.std(errors)))
@@ -25,7 +25,6 @@ from identification import helpers
 
 from colorama import Fore
 
-from IPython import embed
 
 
 class SDP(object):
@@ -0,0 +1,178 @@
+''' Batched rigid-body transformations. Rotations are (N, 3, 3) matrices, quaternions (N, 4) arrays
+    in (x, y, z, w) order and spatial vectors (N, 6) arrays with the linear part first (like iDynTree
+    twists and wrenches). Single values (without the leading sample axis) are accepted as well and
+    give single results. RPY angles follow iDynTree, i.e. R = Rz(yaw)*Ry(pitch)*Rx(roll). '''
+
+from __future__ import division
+from __future__ import absolute_import
+
+from typing import Tuple
+
+import numpy as np
+
+
+def _batch(a, ndim):
+    # type: (np._ArrayLike, int) -> Tuple[np._ArrayLike, bool]
+    ''' get float array with leading sample axis and whether a single value was given '''
+    a = np.asarray(a, dtype=np.float64)
+    if a.ndim == ndim:
+        return a[np.newaxis], True
+    return a, False
+
+def _unbatch(a, single):
+    # type: (np._ArrayLike, bool) -> np._ArrayLike
+    if single:
+        return a[0]
+    return a
+
+def rpyToRotation(rpy):
+    # type: (np._ArrayLike) -> np._ArrayLike
+    ''' rotation matrices from (N, 3) roll, pitch, yaw angles (same as iDynTree.Rotation.RPY) '''
+    rpy, single = _batch(rpy, 1)
+    cr, cp, cy = np.cos(rpy).T
+    sr, sp, sy = np.sin(rpy).T
+
+    R = np.empty((rpy.shape[0], 3, 3))
+    R[:, 0, 0] = cy*cp
+    R[:, 0, 1] = cy*sp*sr - sy*cr
+    R[:, 0, 2] = cy*sp*cr + sy*sr
+    R[:, 1, 0] = sy*cp
+    R[:, 1, 1] = sy*sp*sr + cy*cr
+    R[:, 1, 2] = sy*sp*cr - cy*sr
+    R[:, 2, 0] = -sp
+    R[:, 2, 1] = cp*sr
+    R[:, 2, 2] = cp*cr
+    return _unbatch(R, single)
+
+def rotationToRPY(R):
+    # type: (np._ArrayLike) -> np._ArrayLike
+    ''' roll, pitch, yaw angles of rotation matrices (yaw is set to zero for singular pitch) '''
+    R, single = _batch(R, 2)
+    sy = np.sqrt(R[:, 0, 0]**2 + R[:, 1, 0]**2)
+    singular = sy < 1e-6
+
+    rpy = np.empty((R.shape[0], 3))
+    rpy[:, 0] = np.where(singular, np.arctan2(-R[:, 1, 2], R[:, 1, 1]), np.arctan2(R[:, 2, 1], R[:, 2, 2]))
+    rpy[:, 1] = np.arctan2(-R[:, 2, 0], sy)
+    rpy[:, 2] = np.where(singular, 0.0, np.arctan2(R[:, 1, 0], R[:, 0, 0]))
+    return _unbatch(rpy, single)
+
+def composeRotations(R1, R2):
+    # type: (np._ArrayLike, np._ArrayLike) -> np._ArrayLike
+    ''' R1*R2 for each sample '''
+    return np.matmul(R1, R2)
+
+def invertRotations(R):
+    # type: (np._ArrayLike) -> np._ArrayLike
+    ''' inverse (transpose) of rotation matrices '''
+    return np.swapaxes(R, -1, -2)
+
+def rotateVectors(R, v):
+    # type: (np._ArrayLike, np._ArrayLike) -> np._ArrayLike
+    ''' rotate (N, 3) vectors with (N, 3, 3) or one (3, 3) rotation '''
+    return np.einsum('...ij,...j->...i', R, v)
+
+def transformSpatialVectors(R, p, x, wrench=False):
+    # type: (np._ArrayLike, np._ArrayLike, np._ArrayLike, bool) -> np._ArrayLike
+    ''' transform (N, 6) twists (or wrenches) with rotation R and position p of the current frame
+        origin in the new frame (e.g. world_R_base and world_p_base to express base twists in world
+        frame), like iDynTree.Transform*Twist (*Wrench). p can be None for a pure rotation. x can
+        also be (N, 6, K) to transform K columns of each sample (e.g. base rows of regressors). '''
+    R = np.asarray(R, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    vectors = x.ndim < R.ndim
+    if vectors:
+        x = x[..., np.newaxis]
+
+    lin = np.matmul(R, x[..., 0:3, :])
+    ang = np.matmul(R, x[..., 3:6, :])
+    if p is not None:
+        p = np.asarray(p, dtype=np.float64)[..., np.newaxis]
+        if wrench:
+            # m' = R*m + p x (R*f)
+            ang += np.cross(p, lin, axis=-2)
+        else:
+            # v' = R*v + p x (R*w)
+            lin += np.cross(p, ang, axis=-2)
+    out = np.concatenate((lin, ang), axis=-2)
+
+    if vectors:
+        return out[..., 0]
+    return out
+
+def quaternionFromRPY(rpy):
+    # type: (np._ArrayLike) -> np._ArrayLike
+    ''' (x, y, z, w) quaternions from (N, 3) roll, pitch, yaw angles '''
+    rpy, single = _batch(rpy, 1)
+    cr, cp, cy = np.cos(rpy*0.5).T
+    sr, sp, sy = np.sin(rpy*0.5).T
+
+    q = np.empty((rpy.shape[0], 4))
+    q[:, 0] = cy*sr*cp - sy*cr*sp
+    q[:, 1] = cy*cr*sp + sy*sr*cp
+    q[:, 2] = sy*cr*cp - cy*sr*sp
+    q[:, 3] = cy*cr*cp + sy*sr*sp
+    return _unbatch(q, single)
+
+def quaternionToRotation(q):
+    # type: (np._ArrayLike) -> np._ArrayLike
+    ''' rotation matrices from (N, 4) unit quaternions '''
+    q, single = _batch(q, 1)
+    x, y, z, w = q.T
+
+    R = np.empty((q.shape[0], 3, 3))
+    R[:, 0, 0] = 2*(w*w + x*x) - 1
+    R[:, 0, 1] = 2*(x*y - w*z)
+    R[:, 0, 2] = 2*(x*z + w*y)
+    R[:, 1, 0] = 2*(x*y + w*z)
+    R[:, 1, 1] = 2*(w*w + y*y) - 1
+    R[:, 1, 2] = 2*(y*z - w*x)
+    R[:, 2, 0] = 2*(x*z - w*y)
+    R[:, 2, 1] = 2*(y*z + w*x)
+    R[:, 2, 2] = 2*(w*w + z*z) - 1
+    return _unbatch(R, single)
+
+def quaternionFromRotation(R):
+    # type: (np._ArrayLike) -> np._ArrayLike
+    ''' unit quaternions from rotation matrices (from "Converting a Rotation Matrix to a Quaternion"
+        by Mike Day, using the largest diagonal element of each sample for stability) '''
+    R, single = _batch(R, 2)
+    r00, r11, r22 = R[:, 0, 0], R[:, 1, 1], R[:, 2, 2]
+
+    # candidates for each case (case by largest of x, y, z, w)
+    t = np.stack((1 + r00 - r11 - r22, 1 - r00 + r11 - r22, 1 - r00 - r11 + r22, 1 + r00 + r11 + r22))
+    candidates = np.stack((
+        np.stack((t[0], R[:, 1, 0]+R[:, 0, 1], R[:, 0, 2]+R[:, 2, 0], R[:, 2, 1]-R[:, 1, 2]), axis=-1),
+        np.stack((R[:, 1, 0]+R[:, 0, 1], t[1], R[:, 2, 1]+R[:, 1, 2], R[:, 0, 2]-R[:, 2, 0]), axis=-1),
+        np.stack((R[:, 0, 2]+R[:, 2, 0], R[:, 2, 1]+R[:, 1, 2], t[2], R[:, 1, 0]-R[:, 0, 1]), axis=-1),
+        np.stack((R[:, 2, 1]-R[:, 1, 2], R[:, 0, 2]-R[:, 2, 0], R[:, 1, 0]-R[:, 0, 1], t[3]), axis=-1)))
+    case = np.where(r22 < 0, np.where(r00 > r11, 0, 1), np.where(r00 < -r11, 2, 3))
+    idx = np.arange(R.shape[0])
+    q = candidates[case, idx] * (0.5 / np.sqrt(t[case, idx]))[:, np.newaxis]
+    return _unbatch(q, single)
+
+def quaternionConjugate(q):
+    # type: (np._ArrayLike) -> np._ArrayLike
+    ''' conjugate (inverse for unit quaternions) of (N, 4) quaternions '''
+    q = np.array(q, dtype=np.float64)
+    q[..., 0:3] *= -1
+    return q
+
+def quaternionProduct(q1, q2):
+    # type: (np._ArrayLike, np._ArrayLike) -> np._ArrayLike
+    ''' Hamilton product q1*q2 of (N, 4) quaternions (composition of the rotations) '''
+    q1 = np.asarray(q1, dtype=np.float64)
+    q2 = np.asarray(q2, dtype=np.float64)
+    v1, w1 = q1[..., 0:3], q1[..., 3:4]
+    v2, w2 = q2[..., 0:3], q2[..., 3:4]
+    return np.concatenate((w1*v2 + w2*v1 + np.cross(v1, v2),
+                           w1*w2 - np.sum(v1*v2, axis=-1, keepdims=True)), axis=-1)
+
+def quaternionRotateVectors(q, v):
+    # type: (np._ArrayLike, np._ArrayLike) -> np._ArrayLike
+    ''' rotate (N, 3) vectors by (N, 4) unit quaternions '''
+    q = np.asarray(q, dtype=np.float64)
+    u, w = q[..., 0:3], q[..., 3:4]
+    # v + 2w(u x v) + 2u x (u x v)
+    uv = np.cross(u, v)
+    return v + 2*(w*uv + np.cross(u, uv))
@@ -16,10 +16,8 @@ import numpy as np
 import numpy.linalg as la
 import scipy
 import scipy.linalg as sla
-import scipy.stats as stats
 
-# plotting
-import matplotlib.pyplot as plt
+# plotting, symbolic math (sdp) and statistics are imported only where needed to keep startup fast
 
 # kinematics, dynamics and URDF reading
 import iDynTree; iDynTree.init_helpers(); iDynTree.init_numpy_helpers()
@@ -28,11 +26,9 @@ import iDynTree; iDynTree.init_helpers(); iDynTree.init_numpy_helpers()
 from identification.model import Model
 from identification.data import Data
 from identification.output import OutputConsole
-from identification import sdp
 import identification.helpers as helpers
 
 from colorama import Fore
-from IPython import embed
 
 np.core.arrayprint._line_width = 160
 
@@ -85,7 +81,7 @@ class Identification(object):
 
         self.paramHelpers = helpers.ParamHelpers(self.model, self.opt)
         self.urdfHelpers = helpers.URDFHelpers(self.paramHelpers, self.model, self.opt)
-        self.sdp = sdp.SDP(self)
+        self.sdp = None   # type: sdp.SDP  # created when needed (loads sympy and cvxopt)
         if self.opt['constrainUsingNL']:
             from identification.nlopt import NLOPT
             self.nlopt = NLOPT(self)
@@ -95,14 +91,7 @@ class Identification(object):
 
         self.urdf_file_real = urdf_file_real
         if self.urdf_file_real:
-            dc = iDynTree.DynamicsRegressorGenerator()
-            if not dc.loadRobotAndSensorsModelFromFile(urdf_file_real):
-                sys.exit()
-            tmp = iDynTree.VectorDynSize(self.model.num_model_params)
-            #set regressor, otherwise getModelParameters segfaults
-            dc.loadRegressorStructureFromString(self.model.regrXml)
-            dc.getModelParameters(tmp)
-            self.xStdReal = tmp.toNumPy()
+            self.xStdReal = helpers.RobotDescription.get(urdf_file_real).getModelParameters(self.model.regrXml)
             #add some zeros for friction
             self.xStdReal = np.concatenate((self.xStdReal, np.zeros(self.model.num_all_params-self.model.num_model_params)))
             if self.opt['identifyFriction']:
@@ -123,13 +112,13 @@ class Identification(object):
             estimateWith = self.opt['estimateWith']
         # estimate torques with idyntree regressor and different params
         if estimateWith == 'urdf':
-            tauEst = np.dot(self.model.YStd, self.model.xStdModel[self.model.identified_params])
+            tauEst = self.model.stdRegressorDot(self.model.xStdModel[self.model.identified_params])
         elif estimateWith == 'base_essential':
             tauEst = np.dot(self.model.YBase, self.xBase_essential)
         elif estimateWith == 'base':
             tauEst = np.dot(self.model.YBase, self.model.xBase)
         elif estimateWith in ['std', 'std_direct']:
-            tauEst = np.dot(self.model.YStd, self.model.xStd)
+            tauEst = self.model.stdRegressorDot(self.model.xStd)
         else:
             print("unknown type of parameters: {}".format(self.opt['estimateWith']))
 
@@ -178,6 +167,7 @@ class Identification(object):
                 print("W: {} (> 0.999 isn't too far from normality)".format(W))
                 '''
 
+                import scipy.stats as stats
                 k2, p = stats.mstats.normaltest(error_per_joint)
                 if p > 0.05:
                     print("error is normal distributed")
@@ -186,6 +176,7 @@ class Identification(object):
                 print("k2: {} (the closer it is to 0, the closer to normal distributed)".format(k2))
 
             if self.opt['showErrorHistogram'] == 1:
+                import matplotlib.pyplot as plt
                 plt.hist(error_per_joint, 50)
                 plt.title("error histogram")
                 plt.draw()
@@ -224,7 +215,7 @@ class Identification(object):
             self.model.rbdlModel = rbdl.loadModel(outfile,
                                                   floating_base=self.opt['floatingBase'],
                                                   verbose=False)
-            self.model.rbdlModel.gravity = np.array(self.model.gravity)
+            self.model.rbdlModel.gravity = np.array(self.model.gravity[0:3])
         else:
             dynComp.loadRobotModelFromFile(outfile)
         os.remove(outfile)
@@ -232,17 +223,18 @@ class Identification(object):
         old_skip = self.opt['skipSamples']
         self.opt['skipSamples'] = 8
 
-        self.tauEstimatedValidation = None   # type: np._ArrayLike
-        for m_idx in self.progress(range(0, v_data['positions'].shape[0], self.opt['skipSamples'] + 1)):
-            if self.opt['useRBDL']:
-                torques = self.model.simulateDynamicsRBDL(v_data, m_idx, None, params)
-            else:
-                torques = self.model.simulateDynamicsIDynTree(v_data, m_idx, dynComp, params)
-
-            if self.tauEstimatedValidation is None:
-                self.tauEstimatedValidation = torques
-            else:
-                self.tauEstimatedValidation = np.vstack((self.tauEstimatedValidation, torques))
+        sample_idx = np.arange(0, v_data['positions'].shape[0], self.opt['skipSamples'] + 1)
+        if self.opt['useRBDL']:
+            # simulate all samples at once
+            self.tauEstimatedValidation = self.model.simulateTrajectoryRBDL(v_data, sample_idx, params)
+        else:
+            # (read arrays once instead of for each sample from the file)
+            v_samples = {k: v_data[k] for k in ['positions', 'velocities', 'accelerations', 'base_velocity',
+                                                'base_acceleration', 'base_rpy'] if k in v_data.files}
+            buffers = self.model.getDynamicsBuffers()   # (own containers for the validation dynComp)
+            self.tauEstimatedValidation = np.array([
+                self.model.simulateDynamicsIDynTree(v_samples, m_idx, dynComp, params, buffers=buffers)
+                for m_idx in self.progress(sample_idx)])
 
         if self.opt['skipSamples'] > 0:
             self.tauMeasuredValidation = v_data['torques'][::self.opt['skipSamples'] + 1]
@@ -316,7 +308,7 @@ class Identification(object):
         sigma_rho = rho / (r - self.model.num_base_params)
 
         # get standard deviation \sigma_{x} (of the estimated parameter vector x)
-        C_xx = sigma_rho * (sla.pinv(np.dot(self.model.YBase.T, self.model.YBase)))
+        C_xx = sigma_rho * (sla.pinv(self.model.getBaseInformation()))
         sigma_x = np.diag(C_xx)
 
         # get relative standard deviation
@@ -327,6 +319,28 @@ class Identification(object):
 
         return p_sigma_x
 
+    def estimateParameterUncertainty(self):
+        # type: () -> None
+        '''get empirical uncertainty of the estimated parameters with block bootstrap and/or k-fold
+           cross validation (reuses the regressor of the last estimation)'''
+        from identification.resampling import Resampling
+
+        resampling = Resampling(self)
+        constrained = bool(self.opt['constrainToConsistent'] and 'resamplingConstrained' in self.opt
+                           and self.opt['resamplingConstrained'])
+
+        self.bootstrapResult = None
+        self.crossValidationResult = None
+        with helpers.Timer() as t:
+            if 'bootstrapResamples' in self.opt and self.opt['bootstrapResamples']:
+                self.bootstrapResult = resampling.bootstrap(self.opt['bootstrapResamples'], constrained)
+            if 'crossValidationFolds' in self.opt and self.opt['crossValidationFolds']:
+                self.crossValidationResult = resampling.crossValidate(self.opt['crossValidationFolds'], constrained)
+        if self.opt['showTiming']:
+            print("(resampling took %.03f sec.)" % t.interval)
+
+        resampling.printResults(self.bootstrapResult, self.crossValidationResult)
+
     def findBaseEssentialParameters(self):
         """
         iteratively get essential parameters from previously identified base parameters.
@@ -371,6 +385,7 @@ class Identification(object):
             error_start = error_func(tauDiff)
 
             if self.opt['verbose']:
+                import scipy.stats as stats
                 W, p = stats.shapiro(error_start)
                 #k2, p = stats.normaltest(error_start, axis=0)
                 if np.mean(p) > 0.05:
@@ -641,6 +656,7 @@ class Identification(object):
             #G = scipy.sparse.spdiags(np.tile(1/self.sigma_rho, self.num_used_samples), 0,
             #        self.num_dofs*self.num_used_samples, self.num_dofs*self.num_used_samples)
             #G = scipy.sparse.spdiags(np.repeat(1/np.sqrt(self.sigma_rho), self.data.num_used_samples), 0, r, r)
+            import scipy.sparse
             G = scipy.sparse.spdiags(np.repeat(np.array([1/self.p_sigma_x]), self.data.num_used_samples), 0, r, r)
 
             # weigh Y and tau with deviations
@@ -702,7 +718,7 @@ class Identification(object):
         with helpers.Timer() as t:
             # weighting with previously determined essential params
             # calculates V_1e, U_1e etc. (Gautier, 2013)
-            Yst_e = self.model.YStd.dot(np.diag(self.xStdEssential))   # = W_st^e
+            Yst_e = self.model.YStd * self.xStdEssential   # = W_st^e (scaled columns)
             Ue, se, VHe = sla.svd(Yst_e, full_matrices=False)
             ne = self.num_essential_params  # nr. of essential params among base params
             V_1e = VHe.T[:, 0:ne]
@@ -736,7 +752,11 @@ class Identification(object):
         if self.opt['verbose']:
             print("computing standard regressor matrix for data samples")
 
-        self.model.computeRegressors(self.data)
+        if 'reuseRegressors' in self.opt and self.opt['reuseRegressors']:
+            # only compute rows of samples that are new since the last call
+            self.model.appendRegressors(self.data)
+        else:
+            self.model.computeRegressors(self.data)
 
         if self.opt['verbose']:
             print("estimating parameters using regressor")
@@ -753,6 +773,10 @@ class Identification(object):
             self.identifyBaseParameters()
 
             if self.opt['constrainToConsistent']:
+                if self.sdp is None:
+                    from identification.sdp import SDP
+                    self.sdp = SDP(self)
+
                 if self.opt['useAPriori']:
                     self.getBaseParamsFromParamError()
 
@@ -1049,9 +1073,14 @@ def main():
         old_feasible_option = idf.opt['constrainToConsistent']
         idf.opt['constrainToConsistent'] = 0
 
+        reuse_regressors = 'reuseRegressors' in idf.opt and idf.opt['reuseRegressors']
+        block_states = {}
+
         # loop over input blocks and select good ones
         while 1:
             idf.estimateParameters()
+            if reuse_regressors:
+                block_states[idf.data.block_pos] = idf.model.regressor_state
             idf.data.getBlockStats(idf.model)
             idf.estimateRegressorTorques()
             oc = OutputConsole(idf)
@@ -1064,6 +1093,14 @@ def main():
 
         idf.data.selectBlocks()
         idf.data.assembleSelectedBlocks()
+        if reuse_regressors and len(idf.data.usedBlocks):
+            # stack the regressor rows of the selected blocks instead of computing them again
+            # (estimateParameters still computes them if the inputs of the stacked rows don't match
+            # the assembled samples, see Model.appendRegressors)
+            blocks = [(b, bs) for (b, bs, cond, linkConds) in idf.data.usedBlocks]
+            if all([bs % (idf.opt['skipSamples']+1) == 0 for (b, bs) in blocks[:-1]]):
+                idf.model.regressor_state = idf.model.stackRegressorStates([block_states[b] for (b, bs) in blocks])
+            block_states = {}
         idf.opt['selectingBlocks'] = 0
         idf.opt['useEssentialParams'] = old_essential_option
         idf.opt['constrainToConsistent'] = old_feasible_option
@@ -1078,6 +1115,10 @@ def main():
     oc.render()
     if args.validation: idf.estimateValidationTorques()
 
+    if ('bootstrapResamples' in idf.opt and idf.opt['bootstrapResamples']) or \
+       ('crossValidationFolds' in idf.opt and idf.opt['crossValidationFolds']):
+        idf.estimateParameterUncertainty()
+
     if args.model_output:
         if not idf.paramHelpers.isPhysicalConsistent(idf.model.xStd):
             print("can't create urdf file with estimated parameters since they are not physical consistent.")
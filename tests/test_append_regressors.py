@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+import numpy as np
+
+from identification.model import Model
+from identification.data import Data
+
+num_dofs, num_inertial, num_base = 3, 10, 6
+
+def getModel(calls):
+    # model with only the attributes used for computing regressors (without simulation), with a
+    # stand-in for the iDynTree regressor that counts its calls
+    opt = {'skipSamples': 1, 'floatingBase': 0, 'identifyFriction': 1, 'identifyGravityParamsOnly': 0,
+           'identifySymmetricVelFriction': 0, 'useStructuralRegressor': 1, 'useBasisProjection': 0,
+           'filterRegressor': 0, 'simulateTorques': 0, 'useAPriori': 0, 'useRBDL': 0,
+           'useRegressorForSimulation': 0, 'regressorFloat32': 0, 'addContacts': 0, 'useStaticRegressor': 0,
+           'verbose': 0, 'showTiming': 0}
+    model = Model.__new__(Model)
+    model.opt = opt
+    model.num_dofs = num_dofs
+    model.friction_params_start = num_inertial
+    model.num_identified_params = num_inertial + 3*num_dofs
+    model.identified_params = np.arange(model.num_identified_params)
+    model.xStdModel = np.random.RandomState(0).randn(model.num_identified_params)
+    model.Pb = np.random.RandomState(1).randn(model.num_identified_params, num_base)
+    model.static_regressor = False
+    model.regressor_state = None
+    model.progress = lambda it: it
+
+    W = np.random.RandomState(2).randn(3*num_dofs, num_dofs*model.num_identified_params)
+    def getRegressor(pos, vel, acc, friction=True):
+        calls.append(pos)
+        regressor = np.sin(np.concatenate((pos, vel, acc)).dot(W)).reshape((num_dofs, model.num_identified_params))
+        return regressor if friction else regressor[:, :num_inertial]
+    model.getRegressor = getRegressor
+    return model
+
+def getData(opt, samples):
+    data = Data(opt)
+    data.samples = samples
+    data.updateNumSamples()
+    data.inited = True
+    return data
+
+def getSamples(num_samples):
+    rnd = np.random.RandomState(3)
+    samples = {}
+    for k in ['positions', 'velocities', 'accelerations', 'torques']:
+        samples[k] = rnd.randn(num_samples, num_dofs)
+    samples['times'] = np.arange(num_samples)*0.01
+    samples['frequency'] = np.array(100.0)
+    return samples
+
+def getSelection(samples, end):
+    return dict([(k, v[:end] if v.ndim else v) for (k, v) in samples.items()])
+
+def computeAll(samples):
+    # regressors of all samples computed at once
+    model = getModel([])
+    model.computeRegressors(getData(model.opt, samples))
+    return model
+
+def assertSameRows(model, other):
+    assert np.allclose(model.YBase, other.YBase, rtol=1e-12, atol=1e-12)
+    assert np.array_equal(model.YStd, other.YStd)
+    assert np.array_equal(model.tau, other.tau)
+    assert np.array_equal(model.T, other.T)
+
+def test_append_regressors():
+    samples = getSamples(61)
+    calls = []
+    model = getModel(calls)
+    model.computeRegressors(getData(model.opt, getSelection(samples, 20)))
+    assert len(calls) == 10
+
+    # appended samples, only the rows of the new (used) samples are computed
+    for end in [41, 61]:
+        del calls[:]
+        data = getData(model.opt, getSelection(samples, end))
+        model.appendRegressors(data)
+        assert len(calls) == 10
+        assertSameRows(model, computeAll(getSelection(samples, end)))
+    assert [r[0] for r in model.regressor_state['inputs']['ranges']] == [10, 10, 10]
+
+    # no new samples
+    del calls[:]
+    model.appendRegressors(data)
+    assert len(calls) == 0
+
+    # changing a skipped sample doesn't change the rows
+    samples['positions'][1] += 1.0
+    model.appendRegressors(getData(model.opt, samples))
+    assert len(calls) == 0
+
+def test_changed_inputs():
+    # rows are computed again for all samples if the kept ones don't fit anymore
+    for change in ['sample', 'first range', 'options', 'params', 'removed']:
+        samples = getSamples(61)
+        calls = []
+        model = getModel(calls)
+        model.computeRegressors(getData(model.opt, getSelection(samples, 20)))
+        model.appendRegressors(getData(model.opt, getSelection(samples, 40)))
+
+        if change == 'sample':
+            samples['torques'][24, 1] += 1.0
+        elif change == 'first range':
+            samples['velocities'][2, 0] += 1e-12
+        elif change == 'options':
+            model.opt['addContacts'] = 1
+        elif change == 'params':
+            model.xStdModel = model.xStdModel + 1.0
+        else:
+            samples = getSelection(samples, 30)
+        del calls[:]
+        data = getData(model.opt, samples)
+        model.appendRegressors(data)
+        assert len(calls) == data.num_used_samples
+        assertSameRows(model, computeAll(samples))
+        assert len(model.regressor_state['inputs']['ranges']) == 1
+
+if __name__ == '__main__':
+    test_append_regressors()
+    test_changed_inputs()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+import numpy as np
+
+from identification import buffers
+from identification.buffers import DynamicsBuffers
+
+class Vector(object):
+    # stand-in for the iDynTree vector containers, with or without a data pointer
+    size = 6
+    has_data = True
+
+    def __init__(self, n=None):
+        self.v = np.zeros(self.size if n is None else n)
+
+    @classmethod
+    def fromList(cls, values):
+        container = cls(len(values))
+        container.v[:] = values
+        return container
+
+    def toNumPy(self):
+        return self.v.copy()
+
+    def data(self):
+        if not self.has_data:
+            raise AttributeError()
+        return self.v.ctypes.data
+
+class Rotation(object):
+    has_data = True
+
+    def __init__(self, *values):
+        self.m = np.array(values, dtype=np.float64).reshape(3, 3) if values else np.identity(3)
+
+    @classmethod
+    def Identity(cls):
+        return cls()
+
+    def toNumPy(self):
+        return self.m.copy()
+
+    def data(self):
+        if not self.has_data:
+            raise AttributeError()
+        return self.m.ctypes.data
+
+class Transform(object):
+    def __init__(self):
+        self.R = np.identity(3)
+
+    @classmethod
+    def Identity(cls):
+        return cls()
+
+    def setRotation(self, rotation):
+        self.R = rotation.toNumPy()
+
+class MatrixDynSize(object):
+    def __init__(self, rows, cols):
+        self.m = np.zeros((rows, cols))
+
+def getContainers(has_data):
+    containers = type('iDynTree', (), {})
+    for name in ['VectorDynSize', 'Twist', 'ClassicalAcc', 'SpatialAcc', 'Wrench']:
+        setattr(containers, name, type(name, (Vector,), {'has_data': has_data}))
+    containers.Rotation = type('Rotation', (Rotation,), {'has_data': has_data})
+    containers.Transform = Transform
+    containers.MatrixDynSize = MatrixDynSize
+    return containers
+
+class Generator(object):
+    # records the state it is given
+    def setRobotState(self, *state):
+        self.state = [s.R if isinstance(s, Transform) else s.toNumPy() for s in state]
+
+def getBuffers(has_data):
+    idt = buffers.iDynTree
+    buffers.iDynTree = getContainers(has_data)
+    try:
+        return DynamicsBuffers(4, 10, 12, [0, 0, -9.81, 0, 0, 0])
+    finally:
+        buffers.iDynTree = idt
+
+def oldState(pos, vel, acc, rotation, base_vel, base_acc, floating_base):
+    # state of containers created for each sample (as before)
+    gravity = [0, 0, -9.81, 0, 0, 0]
+    if floating_base:
+        return [pos, vel, acc, rotation, base_vel, base_acc, gravity]
+    return [pos, vel, acc, gravity]
+
+def test_buffers():
+    # the buffered state set from numpy arrays is the one of new containers for each sample, for
+    # containers with and without data pointers
+    rnd = np.random.RandomState(0)
+    for has_data in [True, False]:
+        b = getBuffers(has_data)
+        assert all([(v is not None) == has_data for v in b.views.values()])
+        q = b.q
+        for i in range(3):
+            pos, vel, acc = rnd.randn(3, 4)
+            rotation = np.linalg.qr(rnd.randn(3, 3))[0]
+            base_vel, base_acc = rnd.randn(2, 6)
+            b.setJointState(pos, vel, acc)
+            b.setBaseState(rotation, base_vel, base_acc)
+            for floating_base in [False, True]:
+                generator = Generator()
+                b.setGeneratorState(generator, floating_base)
+                old = oldState(pos, vel, acc, rotation, base_vel, base_acc, floating_base)
+                assert len(generator.state) == len(old)
+                for (s, o) in zip(generator.state, old):
+                    assert np.array_equal(s, o)
+                dynComp = Generator()
+                b.setDynamicsState(dynComp, floating_base)
+                assert all([np.array_equal(s, o) for (s, o) in zip(dynComp.state, old)])
+            assert np.array_equal(b.base_acceleration_twist.toNumPy(), base_acc)
+            # containers with data pointers are written in place
+            assert (b.q is q) == has_data
+
+    # views use the memory of the containers
+    b = getBuffers(True)
+    b.setVector('dq', [1.0, 2.0, 3.0, 4.0])
+    assert np.shares_memory(b.views['dq'], b.dq.v)
+    assert np.array_equal(b.dq.toNumPy(), [1.0, 2.0, 3.0, 4.0])
+
+if __name__ == '__main__':
+    test_buffers()
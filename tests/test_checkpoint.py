@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from excitation.checkpoint import OptimizerCheckpoint
+
+class Interrupted(Exception):
+    pass
+
+class Optimizer(object):
+    # optimizer with the evaluation and phase handling of Optimizer.evaluate and runOptimizer. the
+    # objective draws from the global random number generator (like random start values would), so
+    # resumed runs only match if its state is restored at the checkpoint
+    def __init__(self, checkpoint, interrupt_at=None):
+        self.checkpoint = checkpoint
+        self.checkpoint_attrs = ['iter_cnt', 'last_best_f', 'last_best_sol']
+        self.mpi_size = 1
+        self.iter_cnt = 0
+        self.last_best_f = np.inf
+        self.last_best_sol = None
+        self.interrupt_at = interrupt_at
+        self.num_computed = 0
+        self.path = []
+
+    def objectiveFunc(self, x):
+        if self.num_computed == self.interrupt_at:
+            raise Interrupted()
+        self.num_computed += 1
+        self.iter_cnt += 1
+        f = np.sum((x - 0.3)**2) + 1e-3*np.random.uniform()
+        g = np.array([x[0] - 0.8])
+        fail = False
+        if f < self.last_best_f and g[0] <= 0:
+            self.last_best_f = f
+            self.last_best_sol = x.copy()
+        return f, g, fail
+
+    def evaluate(self, x):
+        self.path.append(x.copy())
+        rec = self.checkpoint.getReplay(x)
+        if rec is not None:
+            return rec
+        f, g, fail = self.objectiveFunc(x)
+        self.checkpoint.record(self, x, f, g, fail)
+        return f, g, fail
+
+    def startPhase(self, phase):
+        if self.checkpoint.startPhase(phase):
+            self.checkpoint.save(self)
+
+    def search(self, start, seed, num_evals, step):
+        # seeded stand-in solver, its path depends on the seed and the objective values
+        rnd = np.random.RandomState(int(seed*1e6))
+        x = start.copy()
+        f, g, fail = self.evaluate(x)
+        for i in range(num_evals - 1):
+            x_new = x + step*rnd.randn(x.size)
+            f_new, g_new, fail = self.evaluate(x_new)
+            if f_new < f and g_new[0] <= 0:
+                x, f = x_new, f_new
+        return x
+
+    def run(self):
+        if self.checkpoint.load():
+            self.checkpoint.restoreAttributes(self)
+        else:
+            np.random.seed(3)
+            self.checkpoint.seed = 0.42
+        phase = self.checkpoint.phase
+        seed = self.checkpoint.seed
+
+        if phase == 'global':
+            self.startPhase('global')
+            self.search(np.zeros(3), seed, 40, 0.5)
+        if phase != 'done':
+            if phase == 'local':
+                starts = self.checkpoint.local_starts
+            else:
+                starts = [self.last_best_sol.copy()]
+                self.checkpoint.local_starts = starts
+            self.startPhase('local')
+            x = self.search(starts[0], seed + 0.1, 30, 0.05)
+            self.startPhase('done')
+            self.solution = x
+        return self.solution if phase != 'done' else self.last_best_sol
+
+def runInterrupted(filename, interrupt_at):
+    opt = Optimizer(OptimizerCheckpoint(filename, interval=5), interrupt_at)
+    try:
+        opt.run()
+    except Interrupted:
+        pass
+    return opt
+
+def test_resume():
+    # runs that are interrupted (in the global or local phase) and resumed from the last checkpoint
+    # follow the path of the uninterrupted run and give the same solution
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmp_dir, 'uninterrupted.pkl')
+        full = Optimizer(OptimizerCheckpoint(filename, interval=5))
+        solution = full.run()
+        assert full.num_computed == 70
+
+        for interrupt_at in [0, 3, 17, 40, 52]:
+            filename = os.path.join(tmp_dir, 'run{}.pkl'.format(interrupt_at))
+            interrupted = runInterrupted(filename, interrupt_at)
+            assert interrupted.num_computed == interrupt_at
+            assert not os.path.exists(filename + '.tmp')
+
+            resumed = Optimizer(OptimizerCheckpoint(filename, interval=5))
+            assert np.array_equal(resumed.run(), solution)
+            # the recorded evaluations are replayed, the others computed again
+            phase_start = 40 if interrupt_at >= 40 else 0
+            num_saved = phase_start + (interrupt_at - phase_start)//5*5
+            assert resumed.num_computed == 70 - num_saved
+            assert resumed.iter_cnt == full.iter_cnt
+            assert resumed.last_best_f == full.last_best_f
+            # (the path of the resumed run starts with the replayed part)
+            assert len(resumed.path) == len(full.path) - phase_start
+            assert all([np.array_equal(a, b) for (a, b) in zip(resumed.path, full.path[phase_start:])])
+
+        # resuming a finished run gives the solution again without evaluating
+        done = Optimizer(OptimizerCheckpoint(filename, interval=5))
+        assert np.array_equal(done.run(), full.last_best_sol)
+        assert done.num_computed == 0
+    finally:
+        shutil.rmtree(tmp_dir)
+
+def test_replay():
+    # recorded evaluations are only given back in the recorded order
+    checkpoint = OptimizerCheckpoint('unused', interval=100)
+    checkpoint.startPhase('global')
+    x = [np.array([float(i), 0.0]) for i in range(3)]
+    for i in range(3):
+        checkpoint.record(None, x[i], float(i), [-1.0], False)
+    checkpoint.resumed = True
+    assert not checkpoint.startPhase('global')
+    f, g, fail = checkpoint.getReplay(x[0])
+    assert f == 0.0 and np.array_equal(g, [-1.0]) and not fail
+    assert checkpoint.getReplay(x[2]) is None
+    # left the recorded path, nothing else is replayed
+    assert checkpoint.getReplay(x[1]) is None
+    assert len(checkpoint.replay) == 0
+
+    # a new phase starts without recorded evaluations
+    assert checkpoint.startPhase('local')
+    assert checkpoint.evaluations['local'] == []
+    assert checkpoint.getReplay(x[0]) is None
+
+def test_random_state():
+    # random number generators are at the state of the checkpoint after the replay
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmp_dir, 'checkpoint.pkl')
+        opt = type('Optimizer', (), {'checkpoint_attrs': ['iter_cnt'], 'iter_cnt': 5, 'mpi_size': 1})()
+        checkpoint = OptimizerCheckpoint(filename, interval=2)
+        checkpoint.startPhase('global')
+        checkpoint.record(opt, np.zeros(2), 1.0, [0.0], False)
+        np.random.seed(1)
+        checkpoint.record(opt, np.ones(2), 2.0, [0.0], False)
+        expected = np.random.uniform(size=3)
+
+        np.random.seed(2)
+        resumed = OptimizerCheckpoint(filename)
+        assert resumed.load()
+        assert resumed.attrs == {'iter_cnt': 5}
+        resumed.startPhase('global')
+        resumed.getReplay(np.zeros(2))
+        assert not np.array_equal(np.random.uniform(size=3), expected)
+        resumed.getReplay(np.ones(2))
+        assert np.array_equal(np.random.uniform(size=3), expected)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+if __name__ == '__main__':
+    test_resume()
+    test_replay()
+    test_random_state()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+import numpy as np
+
+from identification.model import Model
+from identification.data import Data
+
+num_dofs, num_params = 3, 10
+frames = ['l_sole', 'r_sole', 'missing']
+
+class Jacobian(object):
+    def __init__(self):
+        self.m = np.zeros((6, num_dofs))
+
+    def toNumPy(self):
+        return self.m.copy()
+
+class DynComp(object):
+    # stand-in for the iDynTree dynamics computations, the jacobian of a frame depends on the joint
+    # positions of the last set state
+    def __init__(self):
+        self.pos = None
+
+    def getFrameIndex(self, frame):
+        return frames.index(frame) if frame != 'missing' else -1
+
+    def getFrameJacobian(self, frame_index, jacobian):
+        jacobian.m[:] = getJacobian(self.pos, frame_index)
+        return True
+
+def getJacobian(pos, frame_index):
+    J = np.random.RandomState(frame_index).randn(6, num_dofs)
+    return J*np.cos(pos + frame_index)
+
+def getModel():
+    opt = {'skipSamples': 1, 'floatingBase': 0, 'identifyFriction': 0, 'identifyGravityParamsOnly': 0,
+           'useStructuralRegressor': 1, 'useBasisProjection': 0, 'filterRegressor': 0,
+           'simulateTorques': 0, 'useAPriori': 0, 'useRBDL': 0, 'useRegressorForSimulation': 0,
+           'regressorFloat32': 0, 'addContacts': 1, 'useStaticRegressor': 0, 'verbose': 0,
+           'showTiming': 0}
+    model = Model.__new__(Model)
+    model.opt = opt
+    model.num_dofs = num_dofs
+    model.num_identified_params = num_params
+    model.identified_params = np.arange(num_params)
+    model.xStdModel = np.zeros(num_params)
+    model.static_regressor = False
+    model.regressor_state = None
+    model.progress = lambda it: it
+    model.dynComp = DynComp()
+    model.buffers = type('Buffers', (), {'jacobian': Jacobian()})()
+    def getRegressor(pos, vel, acc, friction=True):
+        # (sets the state for the jacobians)
+        model.dynComp.pos = pos
+        return np.outer(pos, np.arange(num_params))
+    model.getRegressor = getRegressor
+    return model
+
+def getContacts(num_samples):
+    rnd = np.random.RandomState(1)
+    contacts = dict([(f, rnd.randn(num_samples, 6)) for f in frames])
+    contacts['dummy_sim'] = np.zeros((num_samples, 6))
+    return contacts
+
+def getData(opt, num_samples):
+    rnd = np.random.RandomState(2)
+    data = Data(opt)
+    data.init_from_data({'positions': rnd.randn(num_samples, num_dofs),
+                         'velocities': rnd.randn(num_samples, num_dofs),
+                         'accelerations': rnd.randn(num_samples, num_dofs),
+                         'torques': rnd.randn(num_samples, num_dofs),
+                         'contacts': np.array(getContacts(num_samples))})
+    return data
+
+def oldContactTorques(data, skip):
+    # previous per-sample loop, J^T*f for each sample and contact frame (that is found)
+    contacts = getContacts(data.num_loaded_samples)
+    dim = num_dofs
+    contacts_stack = np.zeros((len(frames), dim*data.num_used_samples))
+    for sample_index in range(data.num_used_samples):
+        m_idx = sample_index*(skip+1)
+        for c in range(len(frames)):
+            if frames[c] == 'missing':
+                continue
+            jacobian = getJacobian(data.samples['positions'][m_idx], c)
+            contacts_torq = jacobian.T.dot(contacts[frames[c]][m_idx])
+            contact_idx = sample_index*dim
+            np.copyto(contacts_stack[c][contact_idx:contact_idx+dim], contacts_torq[-dim:])
+    return contacts_stack
+
+def test_contact_array():
+    # contact wrenches of all frames are stored as one (samples, contacts, 6) array
+    contacts = getContacts(20)
+    data = Data({'skipSamples': 0, 'verbose': 0})
+    samples = {}
+    data.setContacts(samples, np.array(contacts), start=5)
+    assert data.contact_frames == frames
+    assert samples['contacts'].shape == (15, 3, 6)
+    for c in range(len(frames)):
+        assert np.array_equal(samples['contacts'][:, c], contacts[frames[c]][5:])
+    assert np.array_equal(Data.getContactArray(contacts, ['r_sole', 'l_sole'])[5:],
+                          samples['contacts'][:, [1, 0]])
+
+    # without contact frames, the contacts are removed
+    data.setContacts(samples, {'dummy_sim': np.zeros((20, 6))})
+    assert data.contact_frames == []
+    assert 'contacts' not in samples
+
+    # data from trajectories keeps the frames
+    data = getData({'skipSamples': 0, 'verbose': 0}, 20)
+    assert data.contact_frames == frames
+    assert data.samples['contacts'].shape == (20, 3, 6)
+    part = data.getSampleRange(4, 10)
+    assert part.contact_frames == frames
+    assert np.array_equal(part.samples['contacts'], data.samples['contacts'][4:10])
+
+def test_contact_torques():
+    # contact torques of all samples at once are the ones of the per-sample loop
+    model = getModel()
+    data = getData(model.opt, 41)
+    model.computeRegressorRows(data)
+    old = oldContactTorques(data, model.opt['skipSamples'])
+    assert model.contacts_stack.shape == (3, num_dofs*20)
+    assert np.allclose(model.contacts_stack, old, rtol=0, atol=1e-14)
+    assert not np.any(model.contacts_stack[2])
+    assert np.allclose(model.contactForcesSum, np.sum(old, axis=0), rtol=0, atol=1e-14)
+
+    # without contacts
+    del data.samples['contacts']
+    model.computeRegressorRows(data)
+    assert model.contacts_stack.shape == (0, num_dofs*20)
+    assert not np.any(model.contactForcesSum)
+
+if __name__ == '__main__':
+    test_contact_array()
+    test_contact_torques()
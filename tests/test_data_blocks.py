@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+import numpy as np
+
+from identification.data import Data
+
+def getData(num_samples=100, block_size=20):
+    # measurements with time stamps, joint arrays, contact wrenches and scalar values
+    rnd = np.random.RandomState(0)
+    opt = {'verbose': 0, 'skipSamples': 0, 'blockSize': block_size, 'minVel': 0.1}
+    data = Data(opt)
+    data.measurements = {'times': np.cumsum(rnd.uniform(0.005, 0.015, num_samples)),
+                         'positions': rnd.randn(num_samples, 3),
+                         'velocities': rnd.randn(num_samples, 3),
+                         'contacts': rnd.randn(num_samples, 2, 6),
+                         'frequency': np.array(100.0)}
+    data.num_loaded_samples = num_samples
+    data.model = type('Model', (), {'getSubregressorsConditionNumbers': lambda self: None})()
+    return data
+
+def oldAssembleSelectedBlocks(measurements, used_blocks):
+    # previous assembly, block after block
+    samples = {}
+    for k in measurements.keys():
+        (b, bs, cond, linkConds) = used_blocks[0]
+        if measurements[k].ndim == 0:
+            samples[k] = measurements[k]
+        else:
+            samples[k] = measurements[k][b:b+bs]
+        for i in range(1, len(used_blocks)):
+            (b, bs, cond, linkConds) = used_blocks[i]
+            if measurements[k].ndim == 0:
+                samples[k] = measurements[k]
+            elif measurements[k].ndim == 1:
+                mv = measurements[k][b:b + bs]
+                mv = mv - mv[0] + (mv[1]-mv[0])
+                mv = mv + samples[k][-1]
+                samples[k] = np.concatenate((samples[k], mv), axis=0)
+            else:
+                mv = measurements[k][b:b + bs]
+                samples[k] = np.concatenate((samples[k], mv), axis=0)
+    return samples
+
+def test_assemble_blocks():
+    for blocks in [[(40, 20)], [(0, 20), (60, 20), (20, 20)], [(80, 20), (20, 15)]]:
+        data = getData()
+        measurements = dict([(k, v.copy()) for (k, v) in data.measurements.items()])
+        data.usedBlocks = [(b, bs, 1.0, []) for (b, bs) in blocks]
+        data.assembleSelectedBlocks()
+        old = oldAssembleSelectedBlocks(measurements, data.usedBlocks)
+        for k in old:
+            assert np.array_equal(data.samples[k], old[k])
+            # measurements are unchanged
+            assert np.array_equal(data.measurements[k], measurements[k])
+        assert data.num_selected_samples == sum([bs for (b, bs) in blocks])
+        # a single block is a view of the measurements
+        assert np.shares_memory(data.samples['positions'], data.measurements['positions']) == (len(blocks) == 1)
+
+def test_remove_last_block():
+    data = getData()
+    data.samples = dict([(k, v[:60] if v.ndim else v) for (k, v) in data.measurements.items()])
+    data.updateNumSamples()
+    data.removeLastSampleBlock()
+    assert data.num_selected_samples == 40
+    for k in data.samples:
+        if data.measurements[k].ndim:
+            assert np.array_equal(data.samples[k], np.delete(data.measurements[k][:60], range(40, 60), axis=0))
+        else:
+            assert data.samples[k] is data.measurements[k]
+
+def test_remove_near_zero_samples():
+    data = getData()
+    data.measurements['velocities'][[3, 4, 50]] *= 0.01
+    data.samples = dict(data.measurements)
+    data.removeNearZeroSamples()
+    # previous per-sample check
+    to_delete = [t for t in range(data.num_loaded_samples)
+                 if np.max(np.abs(data.measurements['velocities'][t])) < data.opt['minVel']]
+    assert len(to_delete) >= 3
+    for k in data.samples:
+        if data.measurements[k].ndim:
+            assert np.array_equal(data.samples[k], np.delete(data.measurements[k], to_delete, 0))
+    assert data.num_selected_samples == data.num_loaded_samples - len(to_delete)
+
+    # nothing to remove, arrays are kept
+    samples = dict(data.samples)
+    data.removeNearZeroSamples()
+    assert all([data.samples[k] is samples[k] for k in samples])
+
+if __name__ == '__main__':
+    test_assemble_blocks()
+    test_remove_last_block()
+    test_remove_near_zero_samples()
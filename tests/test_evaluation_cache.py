@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+import os
+import tempfile
+
+import numpy as np
+
+from excitation.evaluationCache import EvaluationCache
+
+def test_lru_eviction():
+    cache = EvaluationCache(max_size=3)
+    points = np.arange(12, dtype=np.float64).reshape((4, 3))
+    for i in range(3):
+        cache.add(points[i], float(i), [i, -i], False)
+
+    # using the first point makes the second one the least recently used
+    f, g, fail, info = cache.get(points[0])
+    assert f == 0.0 and np.array_equal(g, [0, 0]) and not fail and info == {}
+    cache.add(points[3], 3.0, [3, -3], True, {'sample': 1})
+    assert len(cache.entries) == 3
+    assert cache.get(points[1]) is None
+    for i in [0, 2, 3]:
+        assert cache.get(points[i])[0] == float(i)
+    assert cache.get(points[3])[2:] == (True, {'sample': 1})
+    assert (cache.hits, cache.misses) == (5, 1)
+
+    # adding a point again replaces its entry and doesn't evict others
+    cache.add(points[2], 4.0, [4, -4], False)
+    assert len(cache.entries) == 3
+    assert cache.get(points[2])[0] == 4.0
+    assert cache.get(points[0])[0] == 0.0
+
+def test_tolerance_key():
+    x = np.array([0.1, -2.5, 3.0])
+
+    # exact matches only
+    cache = EvaluationCache()
+    cache.add(x, 1.0, [], False)
+    assert cache.get(x + 1e-12) is None
+    assert cache.get(list(x))[0] == 1.0
+
+    # points rounded to the same multiple of tolerance match
+    cache = EvaluationCache(tolerance=1e-3)
+    cache.add(x, 1.0, [], False)
+    assert cache.get(x + 4e-4)[0] == 1.0
+    assert cache.get(x - 4e-4)[0] == 1.0
+    assert cache.get(x + 6e-4) is None
+    assert cache.getKey(x) == cache.getKey(x + 1e-9)
+    assert cache.getKey(x) != cache.getKey(x * -1)
+
+def test_load_save():
+    x = np.array([1.0, 2.0])
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = os.path.join(tmp_dir, 'cache.pkl')
+        cache = EvaluationCache(filename=filename, signature='a')
+        assert not cache.load()
+        cache.add(x, 1.0, [0.5], False, {'iter': 2})
+        cache.add(x + 1, 2.0, [0.5], True)
+        cache.save()
+        assert os.listdir(tmp_dir) == ['cache.pkl']
+
+        # same signature and tolerance, entries are loaded (up to max_size, the most recent ones)
+        cache = EvaluationCache(filename=filename, signature='a')
+        assert cache.load()
+        assert cache.loaded == 2
+        f, g, fail, info = cache.get(x)
+        assert f == 1.0 and np.array_equal(g, [0.5]) and not fail and info == {'iter': 2}
+        cache = EvaluationCache(max_size=1, filename=filename, signature='a')
+        assert cache.load()
+        assert cache.get(x) is None and cache.get(x + 1)[0] == 2.0
+
+        # different signature or tolerance, nothing is loaded
+        for other in [EvaluationCache(filename=filename, signature='b'),
+                      EvaluationCache(tolerance=1e-3, filename=filename, signature='a')]:
+            assert not other.load()
+            assert other.loaded == 0 and len(other.entries) == 0
+
+def test_signature():
+    config = {'urdf': 'model.urdf', 'excitationFrequency': 0.1, 'evaluationCacheSize': 10, 'showOptimizationGraph': 1,
+              'verbose': 1, 'model': object()}
+    signature = EvaluationCache.getSignature(config, [], 'trajectory')
+    # options of the cache, output and non-plain values don't change the signature
+    changed = dict(config, evaluationCacheSize=20, showOptimizationGraph=0, verbose=0, model=object())
+    assert EvaluationCache.getSignature(changed, [], 'trajectory') == signature
+    assert EvaluationCache.getSignature(dict(config, excitationFrequency=0.2), [], 'trajectory') != signature
+    assert EvaluationCache.getSignature(config, [], 'posture') != signature
+
+if __name__ == '__main__':
+    test_lru_eviction()
+    test_tolerance_key()
+    test_load_save()
+    test_signature()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+import numpy as np
+from scipy import signal
+
+from identification.model import Model
+
+def getModel(num_dofs, fb):
+    # model with only the attributes used for filtering
+    model = Model.__new__(Model)
+    model.opt = {'floatingBase': int(fb > 0), 'filterRegCutoff': 5.0, 'filterRegThreads': 1}
+    model.num_dofs = num_dofs
+    model.data = type('Data', (), {'samples': {'frequency': 100.0}})()
+    return model
+
+def test_filter_regressor_rows():
+    # each row of a (floating base) sample must be filtered only with the same row of the other
+    # samples, so rows that are constant over time (but differ between rows) stay unchanged
+    num_dofs, fb, num_samples = 4, 6, 300
+    model = getModel(num_dofs, fb)
+    rows = num_dofs + fb
+    row_values = np.arange(rows*5, dtype=np.float64).reshape((rows, 5))
+    regressor = np.tile(row_values, (num_samples, 1))
+    filtered = regressor.copy()
+    model.filterRegressor(filtered, 5)
+    assert np.allclose(filtered, regressor, atol=1e-8)
+
+    # same as filtering each row and column on its own
+    regressor = np.random.RandomState(0).randn(rows*num_samples, 8)
+    filtered = regressor.copy()
+    model.filterRegressor(filtered, 6)
+    b, a = signal.butter(5, 5.0 / (100.0 / 2), btype='low', analog=False)
+    for i in range(rows):
+        for j in range(6):
+            regressor[i::rows, j] = signal.filtfilt(b, a, regressor[i::rows, j])
+    assert np.allclose(filtered, regressor)
+
+if __name__ == '__main__':
+    test_filter_regressor_rows()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+import numpy as np
+
+from identification.friction import FrictionRegressor
+
+def oldFrictionColumns(dq, fb, gravity_only, symmetric):
+    # friction columns of the previous per-sample regressor
+    num_dofs = dq.size
+    static_diag = np.identity(num_dofs)
+    columns = np.vstack((np.zeros((fb, num_dofs)), static_diag))
+    if not gravity_only:
+        if symmetric:
+            vel_diag = np.identity(num_dofs)*dq
+        else:
+            dq_p = dq.copy()
+            dq_p[dq_p < 0] = 0
+            dq_m = dq.copy()
+            dq_m[dq_m > 0] = 0
+            vel_diag = np.hstack((np.identity(num_dofs)*dq_p, np.identity(num_dofs)*dq_m))
+        columns = np.concatenate((columns, np.vstack((np.zeros((fb, vel_diag.shape[1])), vel_diag))), axis=1)
+    return columns
+
+def test_friction_regressor():
+    num_dofs, num_samples = 5, 40
+    velocities = np.random.RandomState(0).randn(num_samples, num_dofs)
+    velocities[0, 0] = 0.0
+    for fb in [0, 6]:
+        for gravity_only in [False, True]:
+            for symmetric in [False, True]:
+                old = np.vstack([oldFrictionColumns(dq, fb, gravity_only, symmetric) for dq in velocities])
+                friction = FrictionRegressor(velocities, num_dofs, fb, gravity_only, symmetric)
+                assert np.array_equal(friction.toDense(), old)
+
+                x = np.random.RandomState(1).randn(old.shape[1])
+                assert np.allclose(friction.dot(x), old.dot(x))
+                P = np.random.RandomState(2).randn(old.shape[1], 7)
+                assert np.allclose(friction.project(P), old.dot(P))
+
+                # appending the samples of another regressor
+                first = FrictionRegressor(velocities[:15], num_dofs, fb, gravity_only, symmetric)
+                second = FrictionRegressor(velocities[15:], num_dofs, fb, gravity_only, symmetric)
+                assert np.array_equal(first.append(second).toDense(), old)
+                assert first.num_samples == 15
+
+if __name__ == '__main__':
+    test_friction_regressor()
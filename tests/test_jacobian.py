@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+import numpy as np
+
+from excitation.jacobian import FiniteDifferenceJacobian
+
+class Optimizer(object):
+    # optimizer with only the attributes used for finite differences, objective and constraints are
+    # smooth functions of x. constraint 0 depends on x0 and x1, constraint 1 on x2 and constraint 2 on
+    # x1 and x3
+    def __init__(self):
+        self.config = {}
+        self.cache = None
+        self.opt_prob = type('Optimization', (), {})()
+        self.constraint_mask = None
+        self.iter_cnt = 0
+        self.best = []
+        self.masks = []
+
+    def getFunctions(self, x):
+        f = np.sum(np.arange(1, 5)*x**2) + x[0]*x[1] + np.sin(x[3])
+        g = np.array([x[0]**2 + x[1], np.sin(x[2]), x[1]*x[3]**3])
+        return f, g
+
+    def objectiveFunc(self, x):
+        self.iter_cnt += 1
+        self.masks.append(self.constraint_mask)
+        f, g = self.getFunctions(x)
+        return f, list(g), False
+
+    def getEvaluationInfo(self):
+        return {'iter': self.iter_cnt}
+
+    def keepBest(self, x, f, g, info):
+        self.best.append((x, f, info))
+
+    def getConstraintDependencies(self):
+        deps = np.zeros((3, 4), dtype=bool)
+        deps[0, 0:2] = deps[1, 2] = deps[2, [1, 3]] = True
+        return deps
+
+lower = np.array([-1.0, -1.0, -2.0, 0.0])
+upper = np.array([1.0, 1.0, 2.0, 0.5])
+
+def getSerialGradient(opt, x, steps, central):
+    # finite differences for one variable after the other, steps are flipped at the upper bound and
+    # central differences only used within the bounds
+    f0, g0 = opt.getFunctions(x)
+    df = np.zeros(x.size)
+    dg = np.zeros((g0.size, x.size))
+    for j in range(x.size):
+        h = steps[j]
+        dx = np.zeros(x.size)
+        dx[j] = h
+        if central and x[j] + h <= upper[j] and x[j] - h >= lower[j]:
+            (f_p, g_p), (f_m, g_m) = opt.getFunctions(x + dx), opt.getFunctions(x - dx)
+            df[j] = (f_p - f_m) / (2*h)
+            dg[:, j] = (g_p - g_m) / (2*h)
+        else:
+            if x[j] + h > upper[j]:
+                h = -h
+                dx = -dx
+            f_p, g_p = opt.getFunctions(x + dx)
+            df[j] = (f_p - f0) / h
+            dg[:, j] = (g_p - g0) / h
+    return df, dg
+
+def getGradient(jacobian, x):
+    f0, g0 = jacobian.optimizer.getFunctions(x)
+    return jacobian.computeGradient(x, f0, g0)
+
+def test_finite_differences():
+    opt = Optimizer()
+    x = np.array([0.3, -0.2, 1.95, 0.45])   # last two variables close to the upper bound
+    for method in ['forward', 'central']:
+        for relative_step in [False, True]:
+            jacobian = FiniteDifferenceJacobian(opt, lower, upper, method=method, step=0.1,
+                                                relative_step=relative_step)
+            df, dg, fail = getGradient(jacobian, x)
+            steps = 0.1*(upper - lower) if relative_step else np.full(x.size, 0.1)
+            df_s, dg_s = getSerialGradient(opt, x, steps, method == 'central')
+            assert not fail
+            assert np.allclose(df, df_s, rtol=1e-12, atol=1e-12)
+            assert np.allclose(dg, dg_s, rtol=1e-12, atol=1e-12)
+            assert not opt.opt_prob.is_gradient
+
+    # steps that would leave the bounds are taken to the other side
+    jacobian = FiniteDifferenceJacobian(opt, lower, upper, method='central', step=0.1)
+    points, fwd, bwd = jacobian.getPerturbations(x)
+    assert np.array_equal(fwd, [0.1, 0.1, -0.1, -0.1])
+    assert np.array_equal(bwd, [-0.1, -0.1, 0, 0])
+    assert len(points) == 6
+
+    # central differences are exact for quadratic functions
+    x = np.array([0.1, 0.2, 0.1, 0.2])
+    df, dg, _ = getGradient(FiniteDifferenceJacobian(opt, lower, upper, method='central', step=0.01), x)
+    assert np.allclose(df[:3], [2*x[0] + x[1], 4*x[1] + x[0], 6*x[2]], rtol=1e-12)
+    assert np.allclose(dg[0, :2], [2*x[0], 1.0], rtol=1e-12)
+
+def test_sparse():
+    # only dependent constraints are requested and the others have zero derivatives
+    opt = Optimizer()
+    x = np.array([0.3, -0.2, 0.5, 0.25])
+    jacobian = FiniteDifferenceJacobian(opt, lower, upper, method='forward', step=0.01, sparse=True)
+    df, dg, _ = getGradient(jacobian, x)
+    deps = opt.getConstraintDependencies()
+    assert [m.tolist() for m in opt.masks] == [deps[:, j].tolist() for j in range(x.size)]
+    assert opt.constraint_mask is None
+    df_s, dg_s = getSerialGradient(opt, x, np.full(x.size, 0.01), False)
+    assert np.array_equal(dg[~deps], np.zeros(np.sum(~deps)))
+    assert np.allclose(dg[deps], dg_s[deps], rtol=1e-12)
+    assert np.allclose(df, df_s, rtol=1e-12)
+
+def test_processes():
+    # evaluations in worker processes give the same gradients and are counted as evaluations here
+    x = np.array([0.3, -0.2, 1.95, 0.45])
+    serial = Optimizer()
+    df_s, dg_s, _ = getGradient(FiniteDifferenceJacobian(serial, lower, upper, method='central'), x)
+    opt = Optimizer()
+    jacobian = FiniteDifferenceJacobian(opt, lower, upper, method='central', processes=2)
+    try:
+        df, dg, _ = getGradient(jacobian, x)
+    finally:
+        jacobian.close()
+    assert np.array_equal(df, df_s)
+    assert np.array_equal(dg, dg_s)
+    assert opt.iter_cnt == serial.iter_cnt == 6
+    assert len(opt.best) == 6
+
+if __name__ == '__main__':
+    test_finite_differences()
+    test_sparse()
+    test_processes()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+import numpy as np
+
+from excitation.trajectoryGenerator import simulateTrajectory, PulsedTrajectory
+from excitation.trajectoryOptimizer import TrajectoryOptimizer
+
+dofs = 3
+num_params = 8
+rnd = np.random.RandomState(0)
+coefficients = rnd.randn(dofs, num_params, 3)
+
+class RobotModel(object):
+    # model with a synthetic regressor instead of the dynamics
+    num_dofs = dofs
+    num_links = 0   # (no collision checks)
+    linkNames = []
+    jointNames = ['j0', 'j1', 'j2']
+    xStdModel = rnd.rand(num_params) + 0.5
+    Pb = np.linalg.qr(rnd.randn(num_params, 6))[0]
+
+    def getRegressor(self, q, qd, qdd):
+        c = coefficients
+        return c[:, :, 0]*np.sin(q)[:, None] + c[:, :, 1]*(qd**2)[:, None] + c[:, :, 2]*qdd[:, None]
+
+    def computeRegressors(self, data, keep_std=True):
+        s = data.samples
+        YStd = np.vstack([self.getRegressor(s['positions'][t], s['velocities'][t], s['accelerations'][t])
+                          for t in range(data.num_loaded_samples)])
+        self.YBase = YStd.dot(self.Pb)
+        data.samples['torques'] = YStd.dot(self.xStdModel).reshape(-1, dofs)
+
+def getOptimizer():
+    opt = TrajectoryOptimizer.__new__(TrajectoryOptimizer)
+    opt.config = {'useDeg': 0, 'excitationFrequency': 100, 'floatingBase': 0, 'num_dofs': dofs,
+                  'simulateTorques': 0, 'skipSamples': 0, 'startOffset': 0, 'verbose': 0,
+                  'minVelocityConstraint': 0, 'ovrPosLimit': [], 'minTolConstr': 0.0,
+                  'showOptimizationTrajs': 0, 'showOptimizationGraph': 0}
+    opt.model = RobotModel()
+    opt.num_dofs = dofs
+    opt.nf = [4]*dofs
+    opt.sim_func = simulateTrajectory
+    opt.trajectory = PulsedTrajectory(dofs, use_deg=False)
+    opt.limits = dict([(j, {'lower': -10.0, 'upper': 10.0, 'velocity': 100.0, 'torque': 60.0})
+                       for j in opt.model.jointNames])
+    opt.world_links = []
+    opt.num_coll_constraints = 0
+    opt.num_constraints = 4*dofs
+    opt.fidelity_schedule = [[0.25, 3, 1.5]]
+    opt.fidelity_stats = [[0, 0.0], [0, 0.0]]
+    opt.is_global = True
+    opt.iter_cnt = 0
+    opt.iter_max = 0
+    opt.mpi_rank = 0
+    opt.last_best_f = np.inf
+    opt.last_best_f_f1 = 0
+    opt.last_best_sol = None
+    opt.wf_min, opt.wf_max = 0.1, 1.0
+    opt.qmin, opt.qmax = -np.ones(dofs), np.ones(dofs)
+    opt.amin = opt.bmin = -1.0
+    opt.amax = opt.bmax = 1.0
+    opt.showVisualizerTrajectory = lambda trajectory: None
+    opt.opt_prob = type('Optimization', (), {'is_gradient': False})()
+    return opt
+
+def getCandidates(num_candidates):
+    rs = np.random.RandomState(1)
+    return [np.r_[rs.uniform(0.3, 0.6), rs.uniform(-0.2, 0.2, dofs), rs.uniform(-0.3, 0.3, 2*dofs*4)]
+            for i in range(num_candidates)]
+
+def setTrajectory(opt, x):
+    wf, q, a, b = opt.vecToParams(x)
+    opt.trajectory.initWithParams(a, b, q, opt.nf, wf)
+
+def test_strided_samples():
+    # reduced sample grids are every n-th sample of the full one
+    opt = getOptimizer()
+    setTrajectory(opt, getCandidates(1)[0])
+    full, full_data = simulateTrajectory(opt.config, opt.trajectory, model=opt.model, sample_step=1)
+    reduced, reduced_data = simulateTrajectory(opt.config, opt.trajectory, model=opt.model, sample_step=4)
+    for k in ['times', 'positions', 'velocities', 'accelerations']:
+        assert np.array_equal(reduced[k], full[k][::4])
+    assert np.allclose(reduced_data.samples['torques'], full_data.samples['torques'][::4], rtol=1e-14, atol=0)
+    assert reduced['measured_frequency'] == 25
+    assert opt.config['excitationFrequency'] == 100
+
+def test_reduced_constraints():
+    # limits that are violated at reduced fidelity are also violated at full fidelity
+    opt = getOptimizer()
+    for x in getCandidates(10):
+        setTrajectory(opt, x)
+        f, g, f1, _ = opt.evaluateTrajectory()
+        f_r, g_r, f1_r, _ = opt.evaluateTrajectory(0)
+        assert np.all(np.array(g_r) <= np.array(g))
+        assert f1_r >= f1
+    assert opt.config['verbose'] == 0
+
+    # config is restored if the simulation fails
+    opt.config['verbose'] = 1
+    def fail(*args, **kwargs):
+        raise RuntimeError()
+    opt.sim_func = fail
+    try:
+        opt.evaluateTrajectory(0)
+    except RuntimeError:
+        pass
+    assert opt.config['verbose'] == 1
+
+def test_screening():
+    # candidates are only evaluated at full fidelity if they are promoted and the best solution is
+    # only taken from full evaluations
+    opt = getOptimizer()
+    candidates = getCandidates(30)
+    full_f = []
+    for x in candidates:
+        best_f = opt.last_best_f
+        f, g, fail = opt.objectiveFunc(x)
+        setTrajectory(opt, x)
+        f_r, g_r, f1_r, _ = opt.evaluateTrajectory(0)
+        if opt.last_reduced:
+            assert f == f_r + f1_r
+            assert f_r + f1_r > best_f*1.5
+        else:
+            full_f.append(f)
+            assert np.isinf(best_f) or f_r + f1_r <= best_f*1.5
+    assert 0 < len(full_f) < len(candidates)
+    assert opt.fidelity_stats[0][0] == len(candidates)
+    assert opt.fidelity_stats[1][0] == len(full_f)
+    assert opt.last_best_f == min(full_f)
+
+    # candidates that violate limits at reduced fidelity are not promoted
+    opt.last_best_f = 1e10
+    assert opt.isPromoted(0, 1.0, [-1.0]*opt.num_constraints)
+    assert not opt.isPromoted(0, 1.0, [-1.0]*(opt.num_constraints-1) + [0.5])
+    assert not opt.isPromoted(0, 2e10, [-1.0]*opt.num_constraints)
+
+if __name__ == '__main__':
+    test_strided_samples()
+    test_reduced_constraints()
+    test_screening()
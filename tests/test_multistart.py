@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+import io
+import contextlib
+
+import numpy as np
+
+from excitation.multiStart import MultiStart
+from excitation.trajectoryOptimizer import TrajectoryOptimizer
+
+lower = [0.0, -10.0, 5.0]
+upper = [1.0, 10.0, 5.0]   # (last variable is fixed)
+
+def isFeasible(g):
+    return np.all(np.asarray(g) <= 0)
+
+def getCandidates():
+    # (x, f, g) of global evaluations
+    return [(np.array([0.5, 0.0, 5.0]), 3.0, [-1.0]),
+            (np.array([0.51, 0.1, 5.0]), 2.0, [-1.0]),    # close to the first one
+            (np.array([0.1, 8.0, 5.0]), 4.0, [-1.0]),
+            (np.array([0.9, -8.0, 5.0]), 1.0, [1.0]),     # best but infeasible
+            (np.array([0.2, 5.0, 5.0]), np.inf, [-1.0]),  # failed
+            (np.array([0.91, -8.0, 5.0]), 1.5, [1.0]),    # infeasible and close to the best infeasible one
+            (np.array([0.5, -5.0, 5.0]), 5.0, [-1.0])]
+
+def test_select_starts():
+    candidates = getCandidates()
+    select = lambda num_starts, min_distance=0.05: [
+        [i for i in range(len(candidates)) if candidates[i][0] is x][0]
+        for x in MultiStart.selectStarts(candidates, lower, upper, num_starts, min_distance, isFeasible)]
+
+    # feasible ones by objective value (skipping the close one), infeasible ones after them
+    assert select(1) == [1]
+    assert select(3) == [1, 2, 6]
+    assert select(4) == [1, 2, 6, 3]
+    assert select(10) == [1, 2, 6, 3]
+
+    # without min distance, close candidates are selected as well
+    assert select(10, 0.0) == [1, 0, 2, 6, 3, 5]
+
+    # infeasible candidates aren't selected close to feasible ones either
+    candidates[3] = (np.array([0.505, 0.05, 5.0]), 1.0, [1.0])
+    assert select(10) == [1, 2, 6, 5]
+
+    # rms distance relative to the ranges of the variables
+    candidates = [(np.array([0.0, 0.0, 5.0]), 1.0, [-1.0]), (np.array([0.1, 0.0, 5.0]), 2.0, [-1.0])]
+    assert len(MultiStart.selectStarts(candidates, lower, upper, 2, 0.1/np.sqrt(3) + 1e-9, isFeasible)) == 1
+    assert len(MultiStart.selectStarts(candidates, lower, upper, 2, 0.1/np.sqrt(3) - 1e-9, isFeasible)) == 2
+    assert MultiStart.selectStarts([], lower, upper, 2, 0.05, isFeasible) == []
+
+def test_quiet_constraints():
+    # testing feasibility of global candidates doesn't print the violated constraints
+    opt = TrajectoryOptimizer.__new__(TrajectoryOptimizer)
+    opt.num_dofs = 1
+    opt.num_constraints = 5
+    opt.num_coll_constraints = 1
+    opt.config = {'minTolConstr': 0.0, 'minVelocityConstraint': 0}
+    g = [-1.0, 1.0, -1.0, -1.0, 0.5]
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        assert not opt.isFeasible(g)
+        assert not opt.testConstraints(g, quiet=True)
+        assert not opt.isFeasible([-1.0, -1.0, -1.0, -1.0, -0.5])
+        assert opt.isFeasible([-1.0, -1.0, -1.0, -1.0, 0.5])
+    assert out.getvalue() == ''
+
+if __name__ == '__main__':
+    test_select_starts()
+    test_quiet_constraints()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+import numpy as np
+import numpy.linalg as la
+
+from identification.online import OnlineIdentification
+
+num_dofs, num_std, num_base = 3, 8, 5
+
+def getModel():
+    # model with only the attributes used for online identification, with a stand-in for the
+    # iDynTree regressor
+    rnd = np.random.RandomState(0)
+    W = rnd.randn(3*num_dofs, num_dofs*num_std)
+    model = type('Model', (), {})()
+    model.num_dofs = num_dofs
+    model.getRegressor = lambda pos, vel, acc: np.sin(np.concatenate((pos, vel, acc)).dot(W)).reshape(
+        (num_dofs, num_std))
+    model.Pb = la.qr(rnd.randn(num_std, num_base))[0]
+    model.K = model.Pb.T
+    model.identified_params = np.arange(num_std)
+    # (a priori params that the base params describe completely, as for a regressor with structurally
+    # dependent columns)
+    model.xStdModel = model.Pb.dot(rnd.randn(num_base))
+    return model
+
+def getOnline(use_apriori=0, forgetting=1.0):
+    opt = {'floatingBase': 0, 'useBasisProjection': 0, 'useAPriori': use_apriori, 'useDeg': 0,
+           'onlineForgetting': forgetting, 'onlineConditionInterval': 10, 'onlineInitialCovariance': 1e6,
+           'filterLowPass1': [6.0, 5], 'filterLowPass2': [3.0, 4]}
+    return OnlineIdentification(getModel(), opt, 100.0)
+
+def getSamples(model, xBase, num_samples=300, noise=0.05, seed=1):
+    # samples and torques of the base params with noise, with the stacked base regressor
+    rnd = np.random.RandomState(seed)
+    samples = rnd.uniform(-2, 2, (num_samples, 3, num_dofs))
+    Y = np.vstack([model.getRegressor(*s).dot(model.Pb) for s in samples])
+    tau = Y.dot(xBase) + rnd.randn(Y.shape[0])*noise
+    return samples, Y, tau
+
+def test_least_squares():
+    for use_apriori in [0, 1]:
+        online = getOnline(use_apriori)
+        model = online.model
+        samples, Y, tau = getSamples(model, np.arange(1.0, num_base+1))
+        for i in range(samples.shape[0]):
+            online.update(samples[i, 0], samples[i, 1], samples[i, 2], tau[i*num_dofs:(i+1)*num_dofs])
+        assert online.num_samples == samples.shape[0]
+
+        # solution of the normal equations is the one of all rows (also when identifying the error to the
+        # a priori params)
+        xBase, cov = online.getLeastSquaresEstimate()
+        x_ols, residual = la.lstsq(Y, tau, rcond=None)[0:2]
+        assert np.allclose(xBase, x_ols, rtol=1e-10, atol=1e-10)
+        sigma2 = residual[0] / (Y.shape[0] - num_base)
+        assert np.allclose(cov, la.inv(Y.T.dot(Y))*sigma2, rtol=1e-8, atol=1e-14)
+
+        # recursive estimate without forgetting converges to it (up to the initial covariance)
+        x_rls, cov_rls = online.getEstimate()
+        assert np.allclose(x_rls, x_ols, rtol=0, atol=1e-6)
+        assert np.allclose(cov_rls, cov, rtol=1e-4, atol=1e-12)
+        assert np.isfinite(online.cond)
+
+def test_forgetting():
+    # with forgetting, the recursive estimate follows changed params
+    online = getOnline(forgetting=0.95)
+    model = online.model
+    for (seed, xBase) in [(1, np.arange(1.0, num_base+1)), (2, -np.arange(1.0, num_base+1))]:
+        samples, Y, tau = getSamples(model, xBase, num_samples=200, noise=0.0, seed=seed)
+        for i in range(samples.shape[0]):
+            online.update(samples[i, 0], samples[i, 1], samples[i, 2], tau[i*num_dofs:(i+1)*num_dofs])
+        assert np.allclose(online.getEstimate()[0], xBase, rtol=0, atol=1e-3)
+    assert online.num_rows < 1/(1-0.95)*num_dofs + 1e-6
+
+def test_floating_base():
+    online = getOnline()
+    online.opt['floatingBase'] = 1
+    try:
+        OnlineIdentification(online.model, online.opt, 100.0)
+    except SystemExit:
+        pass
+    else:
+        assert False
+
+if __name__ == '__main__':
+    test_least_squares()
+    test_forgetting()
+    test_floating_base()
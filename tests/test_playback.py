@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+import numpy as np
+
+from excitation.trajectoryGenerator import Trajectory, PulsedTrajectory, FixedPositionTrajectory
+from excitation.playback import TrajectoryTable, TrajectoryPlayer
+
+def getPulsedTrajectory(use_deg=False):
+    rnd = np.random.RandomState(0)
+    dofs = 7
+    nf = [3, 1, 5, 2, 4, 3, 3]
+    a = [rnd.uniform(-0.5, 0.5, n) for n in nf]
+    b = [rnd.uniform(-0.5, 0.5, n) for n in nf]
+    q = rnd.uniform(-0.3, 0.3, dofs)
+    return PulsedTrajectory(dofs, use_deg=use_deg).initWithParams(a, b, q, nf, wf=0.8)
+
+def getPostureTrajectory():
+    trajectory = FixedPositionTrajectory({'useDeg': 0, 'num_dofs': 3})
+    angles = np.random.RandomState(1).uniform(-1, 1, (5, 3))
+    trajectory.initWithAngles([{'start_time': 2.0*p, 'angles': angles[p]} for p in range(5)])
+    return trajectory
+
+def oldPostureAngles(trajectory, t):
+    # previous lookup, first posture that started at most one posture length before t
+    for p in trajectory.angles:
+        if p['start_time'] >= t - trajectory.posLength:
+            return p['angles']
+    return np.zeros(trajectory.dofs)
+
+def test_trajectory_samples():
+    # samples of all times at once are the ones of setting each time
+    times = np.linspace(0, 20, 1001)
+    for use_deg in [False, True]:
+        trajectory = getPulsedTrajectory(use_deg)
+        samples = trajectory.getSamples(times)
+        per_time = Trajectory.getSamples(trajectory, times)
+        for i in range(3):
+            scale = np.max(np.abs(per_time[i]))
+            assert np.allclose(samples[i], per_time[i], rtol=0, atol=1e-13*scale)
+
+    trajectory = getPostureTrajectory()
+    times = np.concatenate((np.linspace(0, 9.99, 500), [2.0, 4.0, 8.0]))
+    angles, velocities, accelerations = trajectory.getSamples(times)
+    assert np.array_equal(angles, [oldPostureAngles(trajectory, t) for t in times])
+    assert np.array_equal(angles, Trajectory.getSamples(trajectory, times)[0])
+    assert not np.any(velocities) and not np.any(accelerations)
+
+def test_table():
+    trajectory = getPulsedTrajectory()
+    table = TrajectoryTable(trajectory, duration=5.0, frequency=1000.0, start_time=0.3)
+    assert table.num_samples == 5000
+
+    # values at ticks
+    k = np.array([0, 1, 1234, 4999])
+    samples = trajectory.getSamples(0.3 + k*0.001)
+    for i in range(3):
+        assert np.array_equal(np.array([table.getSample(j)[i] for j in k]), samples[i])
+        assert np.array_equal(np.array([table.lookup(0.3 + j*0.001)[i] for j in k]), samples[i])
+
+    # interpolated values between ticks
+    times = np.random.RandomState(2).uniform(0.3, 5.3, 300)
+    samples = trajectory.getSamples(times)
+    looked_up = [np.array([table.lookup(t)[i] for t in times]) for i in range(3)]
+    assert np.allclose(looked_up[0], samples[0], rtol=0, atol=1e-12)
+    assert np.allclose(looked_up[1], samples[1], rtol=0, atol=1e-10)
+    # (accelerations are interpolated linearly)
+    assert np.allclose(looked_up[2], samples[2], rtol=0, atol=1e-5)
+
+    # clamped to the table
+    assert np.array_equal(table.lookup(0.0)[0], table.getSample(0)[0])
+
+    # postures are held
+    trajectory = getPostureTrajectory()
+    table = TrajectoryTable(trajectory, duration=10.0, frequency=10.0)
+    for t in [0.05, 1.95, 2.05, 7.33]:
+        assert np.array_equal(table.lookup(t)[0], oldPostureAngles(trajectory, np.floor(t*10)/10))
+
+class Clock(object):
+    # simulated clock, sending takes some time and waiting ends at the requested time
+    def __init__(self, stall_at=None):
+        self.t = 100.0
+        self.stall_at = stall_at
+        self.num_sent = 0
+
+    def now(self):
+        self.t += 1e-6
+        return self.t
+
+    def delay(self, duration):
+        self.t += duration
+
+    def send(self, angles, velocities, accelerations):
+        self.t += 1e-4
+        if self.num_sent == self.stall_at:
+            # e.g. preempted
+            self.t += 0.0035
+        self.num_sent += 1
+
+def test_player():
+    trajectory = getPulsedTrajectory()
+    table = TrajectoryTable(trajectory, duration=0.05, frequency=1000.0)
+    sent = []
+    clock = Clock()
+    def send(angles, velocities, accelerations):
+        sent.append(angles)
+        clock.send(angles, velocities, accelerations)
+    player = TrajectoryPlayer(table, send, now=clock.now, delay=clock.delay)
+    player.play()
+    log = player.getTimingLog()
+    assert player.num_ticks == 50
+    assert np.array_equal(np.array(sent), table.angles[:50])
+    assert np.all(log['start'] >= log['deadline'])
+    assert np.all(log['met'])
+    assert np.allclose(np.diff(log['deadline']), 0.001)
+
+    # ticks that are more than a period late are skipped
+    sent = []
+    clock = Clock(stall_at=10)
+    player = TrajectoryPlayer(table, send, now=clock.now, delay=clock.delay)
+    player.play()
+    log = player.getTimingLog()
+    assert player.num_ticks == 50
+    assert list(np.nonzero(~log['met'])[0]) == [10, 11, 12]
+    assert len(sent) == 48
+    assert np.array_equal(np.array(sent), table.angles[[k for k in range(50) if k not in [11, 12]]])
+
+if __name__ == '__main__':
+    test_trajectory_samples()
+    test_table()
+    test_player()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+import numpy as np
+import numpy.linalg as la
+
+from identify import Identification
+from excitation.postureEvaluator import PostureEvaluator
+
+num_dofs, num_std, num_base = 3, 12, 6
+
+def getIdentification(scales):
+    # identification with a linear stand-in for the regressor of static postures, columns of the
+    # base regressor are scaled with scales (to get badly conditioned problems)
+    rnd = np.random.RandomState(0)
+    W = rnd.randn(num_dofs, num_dofs*num_std)
+    model = type('Model', (), {})()
+    model.num_dofs = num_dofs
+    model.getRegressor = lambda pos, vel, acc: np.sin(pos.dot(W) + np.arange(num_dofs*num_std)).reshape(
+        (num_dofs, num_std))
+    model.Pb = la.qr(rnd.randn(num_std, num_base))[0] * scales
+    model.K = la.pinv(model.Pb)
+    model.identified_params = np.arange(num_std)
+    model.xStdModel = rnd.randn(num_std)
+
+    idf = type('Identification', (), {})()
+    idf.model = model
+    idf.opt = {'useRegressorForSimulation': 1, 'constrainToConsistent': 0, 'useBasisProjection': 0,
+               'addContacts': 0}
+    idf.urdf_file_real = None
+    idf.xStdReal = model.xStdModel + rnd.randn(num_std)*0.1
+    return idf
+
+def getSamplePostures(num_postures):
+    rnd = np.random.RandomState(1)
+    postures = rnd.uniform(-np.pi, np.pi, (num_postures, num_dofs))
+    counts = rnd.randint(1, 50, num_postures)
+    return postures, counts
+
+def estimateOLS(idf, postures, counts):
+    # base params and error with the rows of all samples (as Identification.estimateParameters)
+    m = idf.model
+    YStd = np.vstack([m.getRegressor(q, None, None) for q, c in zip(postures, counts) for _ in range(c)])
+    m.YBase = YStd.dot(m.Pb)
+    m.tau = YStd.dot(m.xStdModel)
+    Identification.identifyBaseParameters(idf, id_only=True)
+    xBaseReal = m.K.dot(idf.xStdReal)
+    return m.xBase, la.norm(xBaseReal - m.xBase)**2
+
+def test_posture_error():
+    for scales in [np.ones(num_base), np.logspace(0, -8, num_base)]:
+        idf = getIdentification(scales)
+        postures, counts = getSamplePostures(8)
+        xBase, error = estimateOLS(idf, postures, counts)
+        evaluator = PostureEvaluator(idf)
+        assert np.isclose(evaluator.getParameterError(postures, counts), error, rtol=1e-8)
+        assert np.allclose(idf.model.xBase, xBase, rtol=1e-8, atol=0)
+
+        # cached postures and changed counts
+        counts[2] = 0
+        counts[5] += 10
+        xBase, error = estimateOLS(idf, postures, counts)
+        assert np.isclose(evaluator.getParameterError(postures, counts), error, rtol=1e-8)
+        assert len(evaluator.postures) == 8
+
+def test_reduced_rows():
+    # QR reduction of the weighted rows for the SDP gives the same residual norms as the rows of all samples
+    idf = getIdentification(np.logspace(0, -4, num_base))
+    m = idf.model
+    postures, counts = getSamplePostures(5)
+    evaluator = PostureEvaluator(idf)
+    Y, tau = evaluator.getStackedRows([evaluator.getPosture(q) for q in postures], counts)
+    R, h = evaluator.reduceRows(Y, tau)
+    estimateOLS(idf, postures, counts)
+    const = la.norm(m.tau)**2 - la.norm(h)**2
+    for x in np.random.RandomState(2).randn(5, num_base):
+        assert np.isclose(la.norm(h - R.dot(x))**2 + const, la.norm(m.tau - m.YBase.dot(x))**2)
+
+if __name__ == '__main__':
+    test_posture_error()
+    test_reduced_rows()
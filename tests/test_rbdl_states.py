@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+import numpy as np
+
+from identification.model import Model
+from identification import transforms
+
+num_dofs = 7
+
+def getModel(floating_base, gravity_only=False):
+    model = Model.__new__(Model)
+    model.opt = {'floatingBase': floating_base, 'identifyFriction': 1,
+                 'identifyGravityParamsOnly': gravity_only}
+    model.num_dofs = num_dofs
+    model.friction_params_start = 10*num_dofs
+    model.xStdModel = np.random.RandomState(0).randn(10*num_dofs + 2*num_dofs)
+    return model
+
+def getSamples(num_samples):
+    rnd = np.random.RandomState(1)
+    samples = dict([(k, rnd.randn(num_samples, num_dofs)) for k in ['positions', 'velocities', 'accelerations']])
+    samples['base_velocity'] = rnd.randn(num_samples, 6)
+    samples['base_acceleration'] = rnd.randn(num_samples, 6)
+    samples['base_rpy'] = rnd.randn(num_samples, 3)
+    return samples
+
+def oldStates(model, samples, sample_idx):
+    # previous per-sample state vectors
+    q = samples['positions'][sample_idx]
+    qdot = samples['velocities'][sample_idx]
+    qddot = samples['accelerations'][sample_idx]
+    if model.opt['floatingBase']:
+        rotq = transforms.quaternionFromRPY(samples['base_rpy'][sample_idx])
+        q = np.concatenate((np.array([0, 0, 0]), rotq[0:3], q, np.array([rotq[3]])))
+        qdot = np.concatenate([samples['base_velocity'][sample_idx], qdot])
+        qddot = np.concatenate([samples['base_acceleration'][sample_idx], qddot])
+    return q, qdot, qddot
+
+def oldFrictionTorques(model, tau, qdot):
+    # previous per-sample friction torques
+    fb = 6 if model.opt['floatingBase'] else 0
+    tau = tau.copy()
+    p_constant = range(model.friction_params_start, model.friction_params_start+model.num_dofs)
+    tau[fb:] += model.xStdModel[p_constant]
+    if not model.opt['identifyGravityParamsOnly']:
+        p_vel = range(model.friction_params_start+model.num_dofs, model.friction_params_start+model.num_dofs*2)
+        tau[fb:] += model.xStdModel[p_vel]*qdot[fb:]
+    return tau
+
+def test_states():
+    # state vectors of all samples at once are the ones of each sample
+    samples = getSamples(50)
+    for floating_base in [0, 1]:
+        model = getModel(floating_base)
+        for sample_idx in [np.arange(50), np.arange(3, 50, 4), [7]]:
+            states = model.getRBDLStates(samples, sample_idx)
+            for (n, i) in enumerate(sample_idx):
+                old = oldStates(model, samples, i)
+                for k in range(3):
+                    assert np.array_equal(states[k][n], old[k])
+            for s in states:
+                # (rows are passed to rbdl without copies)
+                assert s.flags['C_CONTIGUOUS'] and s.dtype == np.float64
+                assert s.shape[0] == len(sample_idx)
+
+def test_friction_torques():
+    # friction torques of all samples at once are the ones of each sample
+    samples = getSamples(50)
+    for floating_base in [0, 1]:
+        for gravity_only in [False, True]:
+            model = getModel(floating_base, gravity_only)
+            q, qdot, qddot = model.getRBDLStates(samples, np.arange(50))
+            tau = np.random.RandomState(2).randn(*qdot.shape)
+            old = [oldFrictionTorques(model, tau[n], qdot[n]) for n in range(50)]
+            model.addFrictionTorques(tau, qdot[:, qdot.shape[1]-num_dofs:], model.xStdModel)
+            assert np.array_equal(tau, np.array(old))
+
+if __name__ == '__main__':
+    test_states()
+    test_friction_torques()
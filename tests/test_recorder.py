@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+import os
+import time
+import threading
+
+import numpy as np
+
+from excitation.robotCommunication.recorder import SampleRecorder, TimingStats
+
+fields = {'positions': (3,), 'torques': (3,), 'times': ()}
+
+def getSamples(num_samples):
+    rnd = np.random.RandomState(0)
+    return {'positions': rnd.randn(num_samples, 3), 'torques': rnd.randn(num_samples, 3),
+            'times': np.arange(num_samples)*0.005}
+
+def test_sample_recorder():
+    # recorded arrays are the ones of appending to lists (as before), also across chunks and spilled
+    # to files
+    samples = getSamples(53)
+    for spill in [False, True]:
+        recorder = SampleRecorder(fields, chunk_size=10, spill=spill)
+        lists = dict([(k, []) for k in fields])
+        for i in range(23):
+            recorder.append(**dict([(k, samples[k][i]) for k in fields]))
+            for k in fields:
+                lists[k].append(samples[k][i])
+        recorder.extend(**dict([(k, samples[k][23:]) for k in fields]))
+        for k in fields:
+            lists[k].extend(samples[k][23:])
+        assert recorder.num_samples == 53
+        assert recorder.num_chunks == 5
+        if spill:
+            spill_dir = recorder.spill_dir
+        arrays = recorder.getArrays()
+        for k in fields:
+            assert np.array_equal(arrays[k], np.array(lists[k]))
+        if spill:
+            assert not os.path.exists(spill_dir)
+
+    # without samples
+    arrays = SampleRecorder(fields, chunk_size=10).getArrays()
+    assert arrays['positions'].shape == (0, 3)
+    assert arrays['times'].shape == (0,)
+
+def test_timing_stats():
+    # running statistics are the ones of all periods
+    period = 0.005
+    times = np.cumsum(np.random.RandomState(1).uniform(0.8, 1.2, 200)*period)
+    times[100:] += 2*period   # two dropped messages
+    deadlines = np.arange(200)*period + times[0]
+    stats = TimingStats(period)
+    dropped = []
+    for (t, d) in zip(times, deadlines):
+        dropped.append(stats.checkDropped(t))
+        stats.tick(t, d)
+    dt = np.diff(times)
+    values = stats.toDict('t')
+    assert np.isclose(values['t_period_mean'], np.mean(dt))
+    assert np.isclose(values['t_period_std'], np.std(dt))
+    assert values['t_period_max'] == np.max(dt)
+    assert np.isclose(values['t_jitter_max'], np.max(np.abs(times - deadlines)))
+    assert values['t_dropped_messages'] == 2
+    assert dropped[100] == 2 and sum(dropped) == 2
+
+class CountingRecorder(SampleRecorder):
+    # recorder that counts allocated buffers
+    def _newBuffer(self):
+        self.num_allocated = getattr(self, 'num_allocated', 0) + 1
+        return super(CountingRecorder, self)._newBuffer()
+
+def test_concurrent_recording():
+    # samples appended from several threads (e.g. message callbacks and the main thread) are
+    # recorded completely and without mixing values of different samples
+    recorder = SampleRecorder({'positions': (3,), 'times': ()}, chunk_size=50)
+    def record(thread):
+        for i in range(1000):
+            sample_id = thread*10000 + i
+            recorder.append(positions=np.full(3, sample_id), times=sample_id)
+    threads = [threading.Thread(target=record, args=(t,)) for t in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    arrays = recorder.getArrays()
+    assert np.array_equal(np.sort(arrays['times']),
+                          np.sort(np.concatenate([t*10000 + np.arange(1000) for t in range(4)])))
+    assert np.array_equal(arrays['positions'], np.repeat(arrays['times'][:, np.newaxis], 3, axis=1))
+    for t in range(4):
+        # in order of appending for each thread
+        own = arrays['times'][arrays['times'] // 10000 == t]
+        assert np.all(np.diff(own) > 0)
+
+def test_bounded_memory():
+    # spilled chunks are not kept in memory and their buffers are reused once they are written
+    samples = getSamples(200)
+    recorder = CountingRecorder(fields, chunk_size=10, num_buffers=3)
+    for i in range(200):
+        recorder.append(**dict([(k, samples[k][i]) for k in fields]))
+        if recorder.pos == 0:
+            # wait for the writer
+            start = time.time()
+            while recorder.free_buffers.qsize() < 2 and time.time() - start < 10:
+                time.sleep(0.001)
+    assert recorder.num_allocated == 3
+    assert recorder.chunks == []
+    arrays = recorder.getArrays()
+    for k in fields:
+        assert np.array_equal(arrays[k], samples[k])
+
+if __name__ == '__main__':
+    test_sample_recorder()
+    test_timing_stats()
+    test_concurrent_recording()
+    test_bounded_memory()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+import numpy as np
+
+from identification.model import Model
+from identification.data import Data
+
+num_dofs, num_inertial, num_base = 3, 10, 6
+
+def getModel(**opt):
+    # model with only the attributes used for computing regressors (without simulation), with a
+    # stand-in for the iDynTree regressor. the projection has zero rows for some columns (that are
+    # not needed for the base regressor)
+    model = Model.__new__(Model)
+    model.opt = {'skipSamples': 0, 'floatingBase': 0, 'identifyFriction': 1, 'identifyGravityParamsOnly': 0,
+                 'identifySymmetricVelFriction': 0, 'useStructuralRegressor': 1, 'useBasisProjection': 0,
+                 'filterRegressor': 0, 'simulateTorques': 0, 'useAPriori': 0, 'useRBDL': 0,
+                 'useRegressorForSimulation': 0, 'regressorFloat32': 0, 'addContacts': 0,
+                 'useStaticRegressor': 0, 'verbose': 0, 'showTiming': 0}
+    model.opt.update(opt)
+    model.num_dofs = num_dofs
+    model.friction_params_start = num_inertial
+    model.num_identified_params = num_inertial + 3*num_dofs
+    model.identified_params = np.arange(model.num_identified_params)
+    model.xStdModel = np.random.RandomState(0).randn(model.num_identified_params)
+    model.Pb = np.random.RandomState(1).randn(model.num_identified_params, num_base)
+    model.Pb[[0, 4, 5]] = 0
+    model.static_regressor = False
+    model.regressor_state = None
+    model.progress = lambda it: it
+
+    W = np.random.RandomState(2).randn(3*num_dofs, num_dofs*model.num_identified_params)
+    def getRegressor(pos, vel, acc, friction=True):
+        regressor = np.sin(np.concatenate((pos, vel, acc)).dot(W)).reshape((num_dofs, model.num_identified_params))
+        return regressor if friction else regressor[:, :num_inertial]
+    model.getRegressor = getRegressor
+    return model
+
+def getData(opt, num_samples):
+    rnd = np.random.RandomState(3)
+    data = Data(opt)
+    data.samples = dict([(k, rnd.randn(num_samples, num_dofs))
+                         for k in ['positions', 'velocities', 'accelerations', 'torques']])
+    data.samples['times'] = np.arange(num_samples)*0.01
+    data.updateNumSamples()
+    data.inited = True
+    return data
+
+def test_project_regressor():
+    # single precision regressors are projected in double precision in blocks of rows
+    model = getModel()
+    regressor = np.random.RandomState(4).randn(25003, model.num_identified_params)
+    YBase = model.projectRegressor(regressor)
+    assert np.array_equal(YBase, np.dot(regressor, model.Pb))
+    regressor32 = regressor.astype(np.float32)
+    YBase32 = model.projectRegressor(regressor32)
+    assert YBase32.dtype == np.float64
+    assert np.allclose(YBase32, np.dot(regressor32.astype(np.float64), model.Pb), rtol=1e-12, atol=1e-12)
+    assert np.allclose(YBase32, YBase, rtol=0, atol=1e-5)
+
+    # only the columns with nonzero rows in the projection are needed
+    columns = model.getProjectionColumns()
+    assert np.array_equal(columns, [c for c in range(model.num_identified_params) if c not in [0, 4, 5]])
+    assert np.allclose(model.projectRegressor(regressor[:, columns], columns), YBase, rtol=1e-12, atol=1e-12)
+
+    model.opt['useBasisProjection'] = 1
+    model.B = model.Pb[:, :4]
+    assert np.array_equal(model.projectRegressor(regressor), np.dot(regressor, model.B))
+
+def test_regressor_storage():
+    # base regressors without the std regressor or stored in single precision are (close to) the
+    # ones of the full double precision std regressor
+    model = getModel()
+    model.computeRegressors(getData(model.opt, 50))
+    assert model.regressor_stack.dtype == np.float64
+    assert model.torquesAP_stack is None
+    YStd = model.YStd.copy()
+    YBase = model.YBase.copy()
+    assert np.allclose(YBase, YStd.dot(model.Pb), rtol=1e-12, atol=1e-12)
+
+    base_only = getModel()
+    state = base_only.computeRegressorRows(getData(base_only.opt, 50), keep_std=False)
+    # (only the needed inertial columns are stored)
+    assert np.array_equal(state['regressor_stack'], YStd[:, [1, 2, 3, 6, 7, 8, 9]])
+    base_only.computeRegressors(getData(base_only.opt, 50), keep_std=False)
+    assert base_only.YStd is None
+    assert np.allclose(base_only.YBase, YBase, rtol=1e-12, atol=1e-12)
+
+    single = getModel(regressorFloat32=1)
+    single.computeRegressors(getData(single.opt, 50))
+    assert single.regressor_stack.dtype == np.float32
+    assert np.array_equal(single.regressor_stack, YStd[:, :num_inertial].astype(np.float32))
+    assert np.allclose(single.YBase, YBase, rtol=0, atol=1e-5)
+
+if __name__ == '__main__':
+    test_project_regressor()
+    test_regressor_storage()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+import multiprocessing
+
+import numpy as np
+import numpy.linalg as la
+
+from identification.resampling import Resampling
+
+def getIdentification(num_samples=4000, num_dofs=2, num_params=4, noise=0.5):
+    # identification with only the attributes used for resampling, for a linear model
+    # tau = Y*x + e with known parameters and noise
+    rng = np.random.RandomState(0)
+    model = type('Model', (), {})()
+    model.num_dofs = num_dofs
+    model.YBase = rng.randn(num_samples*num_dofs, num_params)
+    model.x_true = np.arange(1, num_params+1, dtype=np.float64)
+    model.tau = model.YBase.dot(model.x_true) + rng.randn(num_samples*num_dofs)*noise
+    model.torques_stack = model.tau
+    model.B = np.identity(num_params)
+
+    idf = type('Identification', (), {})()
+    idf.model = model
+    idf.sdp = None
+    idf.opt = {'floatingBase': 0, 'blockSize': 20, 'addContacts': 0, 'useAPriori': 0,
+               'useBasisProjection': 1, 'resamplingProcesses': 1}
+    return idf
+
+def test_bootstrap():
+    noise = 0.5
+    idf = getIdentification(noise=noise)
+    model = idf.model
+    resampling = Resampling(idf)
+    assert resampling.num_blocks == 200
+
+    # using all blocks once gives the OLS solution
+    x = resampling.solveBase(np.ones(resampling.num_blocks))
+    x_ols = la.lstsq(model.YBase, model.tau, rcond=None)[0]
+    assert np.allclose(x, x_ols)
+
+    # spread of the resampled params is the one of the OLS estimate, sigma^2*(Y^T*Y)^-1
+    result = resampling.bootstrap(num_resamples=2000, seed=1)
+    std_ols = np.sqrt(np.diag(la.inv(model.YBase.T.dot(model.YBase)))) * noise
+    assert np.allclose(result['xBase_std'], std_ols, rtol=0.15)
+    assert np.allclose(result['xStd'], result['xBase'])
+    assert np.all(result['xBase_ci'][0] < model.x_true + 4*std_ols)
+    assert np.all(result['xBase_ci'][1] > model.x_true - 4*std_ols)
+    assert np.all(np.abs(np.mean(result['xBase'], axis=0) - x_ols) < std_ols)
+
+def test_cross_validation():
+    noise = 0.5
+    idf = getIdentification(noise=noise)
+    model = idf.model
+    resampling = Resampling(idf)
+    result = resampling.crossValidate(folds=4)
+    assert len(result['fold_blocks']) == 4
+
+    # each fold gets close to the true params and its validation error is the noise level
+    assert np.all(np.abs(result['xBase'] - model.x_true) < 0.05)
+    expected_error = noise / np.sqrt(np.mean(model.tau**2)) * 100
+    assert np.allclose(result['val_error'], expected_error, rtol=0.1)
+
+    # validation error from block equations is the one from the held out rows
+    x = result['xBase'][0]
+    rows = np.concatenate([np.arange(resampling.getBlockRows(b).start, resampling.getBlockRows(b).stop)
+                           for b in result['fold_blocks'][0]])
+    error = la.norm(model.tau[rows] - model.YBase[rows].dot(x)) / la.norm(model.tau[rows]) * 100
+    assert np.isclose(result['val_error'][0], error)
+
+def test_parallel():
+    # worker processes give the same resamples as solving in this process, also if the default
+    # start method doesn't fork
+    idf = getIdentification()
+    serial = Resampling(idf).bootstrap(num_resamples=50, seed=1)
+    idf.opt['resamplingProcesses'] = 2
+    old_method = multiprocessing.get_start_method(allow_none=True)
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        multiprocessing.set_start_method('forkserver', force=True)
+    try:
+        parallel = Resampling(idf).bootstrap(num_resamples=50, seed=1)
+    finally:
+        multiprocessing.set_start_method(old_method, force=True)
+    assert np.allclose(parallel['xBase'], serial['xBase'], rtol=0, atol=1e-12)
+
+if __name__ == '__main__':
+    test_bootstrap()
+    test_cross_validation()
+    test_parallel()
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+import subprocess
+import os
+import sys
+
+# modules that should only be loaded when the code path using them runs
+heavy_modules = ['sympy', 'matplotlib', 'IPython', 'scipy.stats', 'cvxopt', 'lmi_sdp', 'palettable', 'fcl', 'rbdl']
+
+def test_startup():
+    path = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+    code = "import time; t = time.time(); import identify; t = time.time() - t; import sys; " \
+           "print(t); print(','.join([m for m in {} if m in sys.modules]))".format(heavy_modules)
+    try:
+        output = subprocess.check_output([sys.executable, '-c', code], cwd=path, env=os.environ.copy())
+    except subprocess.CalledProcessError as e:
+        print (e.output)
+        sys.exit(e.returncode)
+
+    startup_time, loaded = output.decode('utf-8').strip().split('\n')[-2:]
+    print("import time of identify.py: {:.3f}s".format(float(startup_time)))
+    assert loaded == '', "modules loaded on startup: {}".format(loaded)
+
+    # wall clock time depends on the machine, only check it if a limit (in s) is given
+    if os.environ.get('STARTUP_TIME_LIMIT'):
+        assert float(startup_time) < float(os.environ['STARTUP_TIME_LIMIT'])
+
+if __name__ == '__main__':
+    test_startup()
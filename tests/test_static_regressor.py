@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+import numpy as np
+from scipy.spatial.transform import Rotation
+
+from identification.model import Model
+
+gravity = [0, 0, -9.81, 0, 0, 0]
+
+def getJoints():
+    # chain with a fixed and a prismatic joint and tilted axes (ordered from the root)
+    rnd = np.random.RandomState(0)
+    joints = []
+    types = ['revolute', 'fixed', 'revolute', 'prismatic', 'continuous']
+    for i, t in enumerate(types):
+        joints.append({'name': 'j{}'.format(i), 'type': t, 'parent': 'l{}'.format(i), 'child': 'l{}'.format(i+1),
+                       'xyz': rnd.randn(3)*0.3, 'rpy': rnd.randn(3), 'axis': rnd.randn(3)})
+    return joints
+
+def getModel(joints):
+    # model with only the attributes used for static regressors
+    model = Model.__new__(Model)
+    model.opt = {'identifyGravityParamsOnly': 1, 'floatingBase': 0, 'identifyFriction': 0}
+    model.description = type('Description', (), {'getJoints': lambda self: joints})()
+    model.regressor_file = None
+    model.static_regressor = None
+    model.gravity = gravity
+    model.linkNames = ['l{}'.format(i) for i in range(len(joints)+1)]
+    model.num_links = len(model.linkNames)
+    model.jointNames = [j['name'] for j in joints if j['type'] != 'fixed']
+    model.num_dofs = len(model.jointNames)
+    model.friction_params_start = model.num_identified_params = model.num_links*4
+    return model
+
+def getPotentialEnergy(joints, link_names, q, params):
+    # potential energy of the links for gravity params (mass and first moments of each link), with
+    # forward kinematics of one posture
+    R = {'l0': np.identity(3)}
+    p = {'l0': np.zeros(3)}
+    dof = 0
+    for j in joints:
+        R_j = R[j['parent']].dot(Rotation.from_euler('xyz', j['rpy']).as_matrix())
+        p_j = p[j['parent']] + R[j['parent']].dot(j['xyz'])
+        axis = j['axis'] / np.linalg.norm(j['axis'])
+        if j['type'] == 'prismatic':
+            p_j = p_j + R_j.dot(axis)*q[dof]
+        elif j['type'] != 'fixed':
+            R_j = R_j.dot(Rotation.from_rotvec(axis*q[dof]).as_matrix())
+        if j['type'] != 'fixed':
+            dof += 1
+        R[j['child']] = R_j
+        p[j['child']] = p_j
+    energy = 0.0
+    for i, link in enumerate(link_names):
+        m, mc = params[i*4], params[i*4+1:i*4+4]
+        energy -= np.dot(gravity[0:3], m*p[link] + R[link].dot(mc))
+    return energy
+
+def getSampleRegressor(joints, link_names, q):
+    # gravity regressor of one posture as derivative of the potential energy (five point central
+    # differences for each param)
+    num_params = len(link_names)*4
+    regressor = np.zeros((q.size, num_params))
+    h = 1e-3
+    for k in range(num_params):
+        params = np.zeros(num_params)
+        params[k] = 1.0
+        for d in range(q.size):
+            dq = np.zeros(q.size)
+            dq[d] = h
+            U = [getPotentialEnergy(joints, link_names, q + s*dq, params) for s in [-2, -1, 1, 2]]
+            regressor[d, k] = (U[0] - 8*U[1] + 8*U[2] - U[3]) / (12*h)
+    return regressor
+
+def test_static_regressors():
+    joints = getJoints()
+    model = getModel(joints)
+    model.getRegressor = lambda pos, vel, acc: getSampleRegressor(joints, model.linkNames, pos)
+    assert model.useStaticRegressor()
+
+    positions = np.random.RandomState(1).uniform(-np.pi, np.pi, (5, model.num_dofs))
+    static = model.getStaticRegressors(positions)
+    for i in range(positions.shape[0]):
+        regressor = getSampleRegressor(joints, model.linkNames, positions[i])
+        assert np.allclose(static[i*model.num_dofs:(i+1)*model.num_dofs], regressor, rtol=1e-7, atol=1e-9)
+
+def test_static_regressor_checked_once():
+    # if the static regressors differ from the per sample ones, they are not used and not checked again
+    joints = getJoints()
+    model = getModel(joints)
+    calls = []
+    def getRegressor(pos, vel, acc):
+        calls.append(pos)
+        return getSampleRegressor(joints, model.linkNames, pos) + 1.0
+    model.getRegressor = getRegressor
+    assert not model.useStaticRegressor()
+    num_calls = len(calls)
+    assert not model.useStaticRegressor()
+    assert len(calls) == num_calls
+
+if __name__ == '__main__':
+    test_static_regressors()
+    test_static_regressor_checked_once()
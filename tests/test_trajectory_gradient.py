@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+import numpy as np
+
+from identification.model import Model
+from excitation.trajectoryGenerator import OscillationGenerator, PulsedTrajectory
+from excitation.trajectoryOptimizer import TrajectoryOptimizer
+
+dofs = 3
+num_params = 8
+rnd = np.random.RandomState(0)
+coefficients = rnd.randn(dofs, num_params, 4)
+
+class RobotModel(object):
+    # model with a synthetic regressor that is (like the dynamics) linear in the accelerations and
+    # quadratic in the velocities
+    num_dofs = dofs
+    num_links = dofs
+    linkNames = ['l0', 'l1', 'l2']
+    jointNames = ['j0', 'j1', 'j2']
+    num_identified_params = num_params
+    identified_params = np.arange(num_params)
+    xStdModel = rnd.rand(num_params) + 0.5
+    Pb = np.linalg.qr(rnd.randn(num_params, 6))[0]
+    getRegressorDerivatives = Model.getRegressorDerivatives
+
+    def getRegressor(self, q, qd, qdd):
+        Y = np.zeros((dofs, num_params))
+        for n in range(dofs):
+            c = coefficients[n]
+            Y[n] = c[:, 0]*np.sin(q[n] + q[(n+1) % dofs]) + c[:, 1]*qd[n]**2 + \
+                   c[:, 2]*qd[n]*qd[(n+2) % dofs] + c[:, 3]*qdd[n]*np.cos(q[n])
+        return Y
+
+def simulate(config, trajectory, model, keep_std=True, sample_step=1):
+    # sampling and regressors as in simulateTrajectory
+    freq = config['excitationFrequency']
+    times = np.arange(0, int(trajectory.getPeriodLength()*freq), sample_step) / freq
+    q, qd, qdd = trajectory.getSamples(times)
+    YStd = np.vstack([model.getRegressor(q[t], qd[t], qdd[t]) for t in range(len(times))])
+    model.YBase = YStd.dot(model.Pb)
+    data = type('Data', (), {})()
+    data.samples = {'torques': YStd.dot(model.xStdModel).reshape(len(times), dofs)}
+    return {'positions': q, 'velocities': qd}, data
+
+def getOptimizer():
+    opt = TrajectoryOptimizer.__new__(TrajectoryOptimizer)
+    opt.config = {'useDeg': 0, 'excitationFrequency': 50, 'useStructuralRegressor': 1,
+                  'useBasisProjection': 0, 'minVelocityConstraint': 1, 'minVelocityPercentage': 0.1,
+                  'ovrPosLimit': [], 'verbose': 0, 'ignoreLinksForCollision': [],
+                  'ignoreLinkPairsForCollision': []}
+    opt.model = RobotModel()
+    opt.num_dofs = dofs
+    opt.nf = [4]*dofs
+    opt.sim_func = simulate
+    opt.trajectory = PulsedTrajectory(dofs, use_deg=False)
+    # (low torques of the first joint are penalized)
+    opt.limits = dict([(j, {'lower': -2.0, 'upper': 2.0, 'velocity': 3.0, 'torque': 200.0})
+                       for j in opt.model.jointNames])
+    opt.limits['j0']['torque'] = 1000.0
+    opt.world_links = []
+    opt.neighbors = dict([(l, {'links': []}) for l in opt.model.linkNames])
+    opt.num_coll_constraints = 3
+    opt.num_constraints = 5*dofs + 3
+    centers = np.random.RandomState(1).randn(3, dofs)
+    opt.getLinkDistance = lambda l0, l1, q: np.sum((q - centers[(int(l0[1]) + int(l1[1])) % 3])**2)
+    return opt
+
+def evaluate(opt, x):
+    wf, q, a, b = opt.vecToParams(x)
+    opt.trajectory.initWithParams(a, b, q, opt.nf, wf)
+    f, g, f1, _ = opt.evaluateTrajectory()
+    return f + f1, np.array(g), f1
+
+def test_oscillation_derivatives():
+    # derivatives of the samples with respect to [w_f, q0, a, b] are the ones of central differences
+    params = np.array([0.7, 0.3, 0.2, -0.4, 0.1, 0.5, 0.3, -0.2, 0.6, 0.1])
+    times = np.linspace(0, 9, 50)
+    for use_deg in [False, True]:
+        generator = lambda p: OscillationGenerator(p[0], p[2:6], p[6:10], p[1], 4, use_deg)
+        derivatives = generator(params).getSampleDerivatives(times)
+        for j in range(params.size):
+            d = np.zeros(params.size)
+            d[j] = 1e-6
+            plus = generator(params + d).getSamples(times)
+            minus = generator(params - d).getSamples(times)
+            for i in range(3):
+                scale = max(1.0, np.max(np.abs(derivatives[i][:, j])))
+                assert np.allclose(derivatives[i][:, j], (plus[i] - minus[i])/2e-6, rtol=0, atol=1e-7*scale)
+
+def test_regressor_derivatives():
+    # derivatives of the regressor with respect to positions, velocities and accelerations
+    model = RobotModel()
+    samples = np.random.RandomState(2).randn(3, dofs)
+    regressor, derivatives = model.getRegressorDerivatives(*samples)
+    assert np.array_equal(regressor, model.getRegressor(*samples))
+    for i in range(3):
+        for k in range(dofs):
+            plus = samples.copy()
+            minus = samples.copy()
+            plus[i, k] += 1e-5
+            minus[i, k] -= 1e-5
+            numeric = (model.getRegressor(*plus) - model.getRegressor(*minus))/2e-5
+            assert np.allclose(derivatives[i, k], numeric, rtol=0, atol=1e-8)
+
+def test_objective_gradient():
+    # analytic gradient and constraint jacobian are the ones of central differences of whole
+    # evaluations
+    opt = getOptimizer()
+    x = np.r_[0.5, rnd.randn(dofs)*0.2, rnd.randn(2*dofs*4)*0.3]
+    f, g, f1 = evaluate(opt, x)
+    assert f1 > 0
+    df, dg, fail = opt.objectiveGradient(x, f, g)
+    assert not fail
+
+    h = 1e-6
+    df_num = np.zeros_like(df)
+    dg_num = np.zeros_like(dg)
+    for j in range(len(x)):
+        d = np.zeros(len(x))
+        d[j] = h
+        f_p, g_p, _ = evaluate(opt, x + d)
+        f_m, g_m, _ = evaluate(opt, x - d)
+        df_num[j] = (f_p - f_m)/(2*h)
+        dg_num[:, j] = (g_p - g_m)/(2*h)
+
+    assert np.allclose(df, df_num, rtol=0, atol=1e-6*np.max(np.abs(df_num)))
+    for c in range(5):
+        rows = slice(c*dofs, (c+1)*dofs)
+        assert np.allclose(dg[rows], dg_num[rows], rtol=0, atol=1e-6*np.max(np.abs(dg_num[rows])))
+    # collision distances are differentiated numerically along the change of the angles
+    assert np.allclose(dg[5*dofs:], dg_num[5*dofs:], rtol=0, atol=1e-2*np.max(np.abs(dg_num[5*dofs:])))
+
+if __name__ == '__main__':
+    test_oscillation_derivatives()
+    test_regressor_derivatives()
+    test_objective_gradient()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+import numpy as np
+
+from identification import transforms
+
+# previous per-sample formulas (of helpers and Quaternion)
+
+def oldRPYToRotation(theta):
+    R_x = np.array([[1,         0,                  0               ],
+                    [0,         np.cos(theta[0]), -np.sin(theta[0]) ],
+                    [0,         np.sin(theta[0]), np.cos(theta[0])  ]
+                   ])
+    R_y = np.array([[np.cos(theta[1]),    0,      np.sin(theta[1])  ],
+                    [0,                     1,      0               ],
+                    [-np.sin(theta[1]),   0,      np.cos(theta[1])  ]
+                   ])
+    R_z = np.array([[np.cos(theta[2]),    -np.sin(theta[2]),    0],
+                    [np.sin(theta[2]),    np.cos(theta[2]),     0],
+                    [0,                     0,                  1]
+                   ])
+    return np.dot(R_z, np.dot(R_y, R_x))
+
+def oldRotationToRPY(R):
+    sy = np.sqrt(R[0,0] * R[0,0] +  R[1,0] * R[1,0])
+    if sy >= 1e-6:
+        return np.array([np.arctan2(R[2,1], R[2,2]), np.arctan2(-R[2,0], sy), np.arctan2(R[1,0], R[0,0])])
+    return np.array([np.arctan2(-R[1,2], R[1,1]), np.arctan2(-R[2,0], sy), 0.0])
+
+def oldQuaternionFromRPY(roll, pitch, yaw):
+    t0 = np.cos(yaw * 0.5)
+    t1 = np.sin(yaw * 0.5)
+    t2 = np.cos(roll * 0.5)
+    t3 = np.sin(roll * 0.5)
+    t4 = np.cos(pitch * 0.5)
+    t5 = np.sin(pitch * 0.5)
+    return np.array([t0 * t3 * t4 - t1 * t2 * t5,
+                     t0 * t2 * t5 + t1 * t3 * t4,
+                     t1 * t2 * t4 - t0 * t3 * t5,
+                     t0 * t2 * t4 + t1 * t3 * t5])
+
+def oldQuaternionToRotation(q):
+    x, y, z, w = q
+    return np.array([[2*(w*w + x*x) - 1, 2*(x*y - w*z),     2*(x*z + w*y)],
+                     [2*(x*y + w*z),     2*(w*w + y*y) - 1, 2*(y*z - w*x)],
+                     [2*(x*z - w*y),     2*(y*z + w*x),     2*(w*w + z*z) - 1]])
+
+def oldQuaternionFromRotation(r):
+    # (gave the conjugate of the quaternion for r, i.e. the one for r.T)
+    if r[2,2] < 0:
+        if r[0,0] > r[1,1]:
+            t = 1 + r[0,0] - r[1,1] - r[2,2]
+            q = np.array([t, r[0,1]+r[1,0], r[2,0]+r[0,2], r[1,2]-r[2,1]])
+        else:
+            t = 1 - r[0,0] + r[1,1] - r[2,2]
+            q = np.array([r[0,1]+r[1,0], t, r[1,2]+r[2,1], r[2,0]-r[0,2]])
+    else:
+        if r[0,0] < -r[1,1]:
+            t = 1 - r[0,0] - r[1,1] + r[2,2]
+            q = np.array([r[2,0]+r[0,2], r[1,2]+r[2,1], t, r[0,1]-r[1,0]])
+        else:
+            t = 1 + r[0,0] + r[1,1] + r[2,2]
+            q = np.array([r[1,2]-r[2,1], r[2,0]-r[0,2], r[0,1]-r[1,0], t])
+    return q * 0.5 / np.sqrt(t)
+
+def oldQuaternionProduct(q1, q2):
+    return np.array([q1[3]*q2[0] + q1[0]*q2[3] + q1[1]*q2[2] - q1[2]*q2[1],
+                     q1[3]*q2[1] - q1[0]*q2[2] + q1[1]*q2[3] + q1[2]*q2[0],
+                     q1[3]*q2[2] + q1[0]*q2[1] - q1[1]*q2[0] + q1[2]*q2[3],
+                     q1[3]*q2[3] - q1[0]*q2[0] - q1[1]*q2[1] - q1[2]*q2[2]])
+
+def oldQuaternionRotate(q, v):
+    qconj = np.array([-q[0], -q[1], -q[2], q[3]])
+    return oldQuaternionProduct(oldQuaternionProduct(q, np.append(v, 0.0)), qconj)[:3]
+
+def getSamples(n=500):
+    r = np.random.RandomState(0)
+    rpy = r.uniform(-np.pi, np.pi, (n, 3))
+    rpy[:, 1] /= 2     # pitch in (-pi/2, pi/2) for unique angles
+    rpy[0] = [0.3, np.pi/2, 0.0]   # singular pitch
+    return rpy, r.uniform(-1, 1, (n, 3))
+
+def assertBatched(batched, single, old):
+    # batched and per-sample results match the old per-sample formulas
+    assert np.allclose(batched, old, rtol=0, atol=1e-15)
+    assert np.allclose(single, old, rtol=0, atol=1e-15)
+
+def test_rpy_rotation():
+    rpy, _ = getSamples()
+    R = transforms.rpyToRotation(rpy)
+    assertBatched(R, [transforms.rpyToRotation(a) for a in rpy], [oldRPYToRotation(a) for a in rpy])
+    assertBatched(transforms.rotationToRPY(R), [transforms.rotationToRPY(m) for m in R],
+                  [oldRotationToRPY(m) for m in R])
+    assert np.allclose(transforms.rotationToRPY(R)[1:], rpy[1:])
+
+def test_quaternions():
+    rpy, v = getSamples()
+    q = transforms.quaternionFromRPY(rpy)
+    assertBatched(q, [transforms.quaternionFromRPY(a) for a in rpy], [oldQuaternionFromRPY(*a) for a in rpy])
+    R = transforms.quaternionToRotation(q)
+    assertBatched(R, [transforms.quaternionToRotation(a) for a in q], [oldQuaternionToRotation(a) for a in q])
+    assert np.allclose(R, transforms.rpyToRotation(rpy), rtol=0, atol=1e-15)
+    assertBatched(transforms.quaternionFromRotation(R), [transforms.quaternionFromRotation(m) for m in R],
+                  [oldQuaternionFromRotation(m.T) for m in R])
+
+    q2 = q[::-1]
+    assertBatched(transforms.quaternionProduct(q, q2),
+                  [transforms.quaternionProduct(a, b) for (a, b) in zip(q, q2)],
+                  [oldQuaternionProduct(a, b) for (a, b) in zip(q, q2)])
+    assertBatched(transforms.quaternionRotateVectors(q, v),
+                  [transforms.quaternionRotateVectors(a, b) for (a, b) in zip(q, v)],
+                  [oldQuaternionRotate(a, b) for (a, b) in zip(q, v)])
+
+def test_rotate_vectors():
+    # rotation of vectors and of the base rows of regressors
+    rpy, v = getSamples()
+    R = transforms.rpyToRotation(rpy)
+    assertBatched(transforms.rotateVectors(R, v), [transforms.rotateVectors(m, a) for (m, a) in zip(R, v)],
+                  [m.dot(a) for (m, a) in zip(R, v)])
+    rows = np.random.RandomState(1).uniform(-1, 1, (R.shape[0], 6, 4))
+    old = [np.vstack((m.dot(a[0:3]), m.dot(a[3:6]))) for (m, a) in zip(R, rows)]
+    assertBatched(transforms.transformSpatialVectors(R, None, rows),
+                  [transforms.transformSpatialVectors(m, None, a) for (m, a) in zip(R, rows)], old)
+
+if __name__ == '__main__':
+    test_rpy_rotation()
+    test_quaternions()
+    test_rotate_vectors()
@@ -10,6 +10,7 @@ from builtins import range
 import sys
 import os
 import argparse
+from typing import List, Tuple, Iterator
 import numpy as np
 
 import iDynTree; iDynTree.init_helpers(); iDynTree.init_numpy_helpers()
@@ -27,6 +28,47 @@ from identification.model import Model
 #set to simulate torques with iDynTree and override wrong torques from gazebo
 is_gazebo = 1
 
+def loadCSV(filepath, usecols=None):
+    # type: (str, List[int]) -> np._ArrayLike
+    ''' load whitespace separated numeric text file, returns columns in order of usecols.
+        np.loadtxt is very slow for numpy < 1.23, use the C tokenizer of pandas instead if available
+        (gives the same values) '''
+    if LooseVersion(np.__version__) < LooseVersion('1.23'):
+        try:
+            import pandas as pd
+            cols = sorted(set(usecols)) if usecols is not None else None
+            f = pd.read_csv(filepath, sep=r'\s+', header=None, comment='#', usecols=cols,
+                            dtype=np.float64, engine='c', float_precision='round_trip').values
+            if usecols is not None and list(usecols) != cols:
+                f = f[:, [cols.index(c) for c in usecols]]
+            return f
+        except ImportError:
+            pass
+    return np.loadtxt(filepath, usecols=usecols, ndmin=2)
+
+def _loadCSVJob(job):
+    # type: (Tuple[int, str, List[int]]) -> Tuple[int, np._ArrayLike]
+    i, filepath, usecols = job
+    return i, loadCSV(filepath, usecols)
+
+def loadCSVFiles(filepaths, usecols=None):
+    # type: (List[str], List[int]) -> Iterator[Tuple[int, np._ArrayLike]]
+    ''' load several csv files in parallel processes, yield (index, data) as soon as a file is loaded '''
+    import multiprocessing
+    workers = min(len(filepaths), multiprocessing.cpu_count())
+    jobs = [(i, filepaths[i], usecols) for i in range(len(filepaths))]
+    if workers < 2:
+        for job in jobs:
+            yield _loadCSVJob(job)
+        return
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        for result in pool.imap_unordered(_loadCSVJob, jobs):
+            yield result
+    finally:
+        pool.terminate()
+
 def readCentauroCSV(path, config, plot):
     #names in order of the supplied data
     jointNames = ['torso_yaw', 'j_arm2_1', 'j_arm2_2', 'j_arm2_3', 'j_arm2_4', 'j_arm2_5',
@@ -43,12 +85,18 @@ def readCentauroCSV(path, config, plot):
         ax1 = fig.add_subplot(2,1,1) # three rows, two columns, first plot
         ax2 = fig.add_subplot(2,1,2)
 
-    #read one file per joint
-    for dof in urdf_jointOrder:
-        filepath = os.path.join(path, 'CentAcESC_{}_log.txt'.format(dof+1))
-        f = np.loadtxt(filepath)
+    #read one file per joint (only the used columns: time, link encoders, torque sensors, position reference)
+    filepaths = [os.path.join(path, 'CentAcESC_{}_log.txt'.format(dof+1)) for dof in range(config['num_dofs'])]
+    files = loadCSVFiles(filepaths, usecols=[0, 8, 12, 17])
+
+    # the first joint file determines the time base, keep others until it is loaded
+    pending = {}
+    for dof, f in files:
+        if 'times' not in out:
+            if dof != 0:
+                pending[dof] = f
+                continue
 
-        if dof == 0:
             # generate some empty arrays, will be calculated in preprocess()
             out['positions'] = np.zeros( (f.shape[0], config['num_dofs']) )
             out['target_positions'] = np.zeros( (f.shape[0], config['num_dofs']) )
@@ -60,12 +108,20 @@ def readCentauroCSV(path, config, plot):
             #out['times'][:] = np.arange(0, f.shape[0])*sampleTime
             out['times'][:] = f[:, 0]/1e9
 
-        #read data
-        out['target_positions'][:, dof] = f[:, 17]       #position reference
-        out['positions'][:, dof] = f[:, 8]  #link encoders
-        out['torques'][:, dof] = f[:, 12]    #torque sensors
+        for dof, f in [(dof, f)] + list(pending.items()):
+            times = f[:, 0]/1e9
+            if times.shape != out['times'].shape or np.any(times != out['times']):
+                # align to common time base
+                f = np.array([np.interp(out['times'], times, f[:, c]) for c in range(4)]).T
 
-        if plot:
+            #read data
+            out['target_positions'][:, dof] = f[:, 3]       #position reference
+            out['positions'][:, dof] = f[:, 1]  #link encoders
+            out['torques'][:, dof] = f[:, 2]    #torque sensors
+        pending = {}
+
+    if plot:
+        for dof in urdf_jointOrder:
             ax1.plot(out['times'][::4], out['positions'][::4, dof], label=jointNames[dof])
             ax2.plot(out['times'][::4], out['torques'][::4, dof], label=jointNames[dof])
 
@@ -154,8 +210,10 @@ def readWalkmanCSV(path, config, plot):
 
     config['num_dofs'] = len(jointNames) - len(ignoreJoints)
 
-    filepath = os.path.join(path, 'jointLog.csv')     #joint positions and torques
-    f = np.loadtxt(filepath)
+    #load joint positions and torques, force torque and IMU data concurrently
+    files = dict(loadCSVFiles([os.path.join(path, 'jointLog.csv'), os.path.join(path, 'feedbackData.csv')]))
+
+    f = files.pop(0)     #joint positions and torques
     out['positions'] = np.zeros( (f.shape[0], config['num_dofs']) )
     out['torques'] = np.zeros( (f.shape[0], config['num_dofs']) )
     out['times'] = np.zeros( f.shape[0] )
@@ -190,8 +248,7 @@ def readWalkmanCSV(path, config, plot):
     if not is_gazebo:
         out['torques'] = out['torques'] * joint_signs + joint_offsets
 
-    filepath = os.path.join(path, 'feedbackData.csv')    # force torque and IMU
-    f = np.loadtxt(filepath)
+    f = files.pop(1)    # force torque and IMU
     out['FTleft'] = np.zeros((f.shape[0], 6))       # FT left foot, 3 force, 3 torque values
     out['FTright'] = np.zeros((f.shape[0], 6))      # FT right foot, 3 force, 3 torque values
     out['IMUrpy'] = np.zeros((f.shape[0], 3))       # IMU orientation, r,p,y
@@ -413,7 +470,7 @@ if __name__ == '__main__':
         model = Model(config, config['model'], args.regressor)
         if config['verbose']:
             print('simulating torques for motion data')
-        model.computeRegressors(data)
+        model.computeRegressors(data, only_simulate=True)
         out['torques'] = out['torques_raw'] = model.data.samples['torques']
         config['skipSamples'] = old_skip
         config['startOffset'] = old_offset
@@ -22,6 +22,8 @@ parser.add_argument('--config', required=True, type=str, help="use options from
 parser.add_argument('--model', required=True, type=str, help='the file to load the robot model from')
 parser.add_argument('--model_real', required=False, type=str, help='the file to load the "real" robot model from')
 parser.add_argument('--world', required=False, type=str, help='the file to load world links from')
+parser.add_argument('--resume', help='resume optimization from checkpoint file (optimizationCheckpoint option)', action='store_true')
+parser.set_defaults(resume=False)
 args = parser.parse_args()
 
 import yaml
@@ -41,6 +43,8 @@ if not iDynTree.dofsListFromURDF(config['urdf'], config['jointNames']):
     sys.exit()
 config['num_dofs'] = len(config['jointNames'])
 config['skipSamples'] = 0
+if args.resume:
+    config['optimizationResume'] = 1
 
 def main():
     # save either optimized or random trajectory parameters to filename
@@ -116,18 +116,15 @@ class Grid(object):
 
 
 class Mesh(object):
-    def __init__(self, mesh_file, scaling):
-        # type: (str, np._ArrayLike) -> None
-        import trimesh
-        self.mesh = trimesh.load_mesh(mesh_file)
+    def __init__(self, mesh_file, scaling, description):
+        # type: (str, np._ArrayLike, RobotDescription) -> None
+        # (mesh is shared with other users of the robot description, so scale a copy)
+        self.mesh = description.getMesh(mesh_file)
         self.num_vertices = np.size(self.mesh.vertices)
 
         self.normals = self.mesh.vertex_normals.reshape(-1).tolist() #.flatten()
         self.faces = self.mesh.faces.reshape(-1).tolist()
-        self.vertices = self.mesh.vertices
-        self.vertices[:, 0] *= scaling[0]
-        self.vertices[:, 1] *= scaling[1]
-        self.vertices[:, 2] *= scaling[2]
+        self.vertices = self.mesh.vertices * np.asarray(scaling, dtype=np.float64)
         self.vertices = self.vertices.reshape(-1).tolist()
 
     def getVerticeList(self):
@@ -739,13 +736,15 @@ class Visualizer(object):
     def loadMeshes(self, urdfpath, linkNames, urdfHelpers):
         # load meshes
         if not len(self.mesh_lists):
+            from identification.helpers import RobotDescription
+            description = RobotDescription.get(urdfpath)
             for i in range(0, len(linkNames)):
                 filename = urdfHelpers.getMeshPath(urdfpath, linkNames[i])
                 if filename and os.path.exists(filename):
                     # use last mesh scale (from getMeshPath)
                     scale = urdfHelpers.mesh_scaling.split(' ')
                     scale = [float(scale[0]), float(scale[1]), float(scale[2])]
-                    self.mesh_lists[linkNames[i]] = Mesh(filename, scale).getVerticeList()
+                    self.mesh_lists[linkNames[i]] = Mesh(filename, scale, description).getVerticeList()
             if len(self.mesh_lists):
                 self.show_meshes = True
 